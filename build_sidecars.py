@@ -0,0 +1,133 @@
+"""
+Builds the sidecar files of precomputed summaries that the server reads
+alongside the data files of a data repository. Each sidecar is written
+next to its data file, and is only rebuilt if the data file has changed
+since it was built, or if --force is given.
+
+    python build_sidecars.py coverage ga4gh-example-data
+    python build_sidecars.py coverage sample.bam --binSizes 1 1000 100000
+    python build_sidecars.py variants ga4gh-example-data
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import ga4gh.datamodel.coverage as coverage
+import ga4gh.datamodel.variants as variants
+import ga4gh.exceptions as exceptions
+
+
+def getDataFiles(paths, pattern):
+    """
+    Returns the list of the data files given by the specified paths,
+    each of which is either a data file or a data repository directory,
+    in which the data files matching the specified pattern are used.
+    """
+    dataFiles = []
+    for path in paths:
+        if os.path.isdir(path):
+            dataFiles.extend(sorted(glob.glob(os.path.join(path, pattern))))
+        else:
+            dataFiles.append(path)
+    return dataFiles
+
+
+def isPyramidCurrent(pyramidClass, dataFile, pyramidPath, binSizes):
+    """
+    Returns True if the pyramid of the specified class at pyramidPath
+    exists, was built from the current version of the specified data
+    file and has the specified bin sizes.
+    """
+    try:
+        pyramid = pyramidClass.open(pyramidPath)
+    except (IOError, ValueError, exceptions.FileOpenFailedException):
+        return False
+    return (
+        pyramid.isCurrent(dataFile) and
+        pyramid.getBinSizes() == binSizes)
+
+
+def buildPyramids(
+        args, dataFiles, pyramidClass, pyramidSuffix, buildPyramid):
+    """
+    Builds the pyramids of the specified data files that are not up to
+    date using buildPyramid(dataFile, binSizes).
+    """
+    for dataFile in dataFiles:
+        if not args.force and isPyramidCurrent(
+                pyramidClass, dataFile, dataFile + pyramidSuffix,
+                args.binSizes):
+            print("{}: up to date".format(dataFile))
+            continue
+        startTime = time.time()
+        outputPath = buildPyramid(dataFile, args.binSizes)
+        print("{}: wrote {} in {:.1f}s".format(
+            dataFile, outputPath, time.time() - startTime))
+
+
+def buildCoveragePyramids(args):
+    pattern = os.path.join("datasets", "*", "reads", "*.bam")
+    buildPyramids(
+        args, getDataFiles(args.paths, pattern), coverage.CoveragePyramid,
+        coverage.PYRAMID_SUFFIX, coverage.buildCoveragePyramid)
+
+
+def buildVariantSummaryPyramids(args):
+    dataFiles = []
+    for extension in ["*.bcf", "*.vcf.gz"]:
+        pattern = os.path.join("datasets", "*", "variants", "*", extension)
+        dataFiles.extend(getDataFiles(args.paths, pattern))
+    buildPyramids(
+        args, sorted(set(dataFiles)), variants.VariantSummaryPyramid,
+        variants.VARIANT_SUMMARY_SUFFIX, variants.buildVariantSummaryPyramid)
+
+
+def addPyramidArguments(parser, defaultBinSizes):
+    parser.add_argument(
+        "--binSizes", nargs="+", type=int, default=defaultBinSizes,
+        help="The bin sizes of the levels of the pyramid, each of which "
+        "must be a multiple of the one before")
+    parser.add_argument(
+        "--force", "-f", action="store_true",
+        help="Rebuild the pyramids even if they are up to date")
+
+
+def parseArgs(args):
+    parser = argparse.ArgumentParser(
+        description="Builds the sidecar files of a data repository")
+    subparsers = parser.add_subparsers(title="subcommands")
+    coverageParser = subparsers.add_parser(
+        "coverage",
+        help="Build the multi-resolution coverage pyramids of BAM files")
+    coverageParser.set_defaults(runner=buildCoveragePyramids)
+    coverageParser.add_argument(
+        "paths", nargs="+",
+        help="The BAM files, or data repository directories containing "
+        "them")
+    addPyramidArguments(coverageParser, coverage.DEFAULT_BIN_SIZES)
+    variantsParser = subparsers.add_parser(
+        "variants",
+        help="Build the variant summary pyramids of VCF and BCF files")
+    variantsParser.set_defaults(runner=buildVariantSummaryPyramids)
+    variantsParser.add_argument(
+        "paths", nargs="+",
+        help="The indexed VCF or BCF files, or data repository "
+        "directories containing them")
+    addPyramidArguments(variantsParser, variants.DEFAULT_SUMMARY_BIN_SIZES)
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parseArgs(sys.argv[1:] if args is None else args)
+    args.runner(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
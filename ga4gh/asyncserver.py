@@ -0,0 +1,503 @@
+"""
+An event driven server for the GA4GH WSGI application.
+
+A single thread multiplexes all of the client connections (including
+idle HTTP/1.1 keep-alive connections) using asyncore, and the
+application itself is run on a bounded pool of threads. Slow clients
+therefore only cost a socket, and the number of requests doing
+blocking I/O or CPU-bound conversion at any time is bounded by the
+size of the pool.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import asynchat
+import asyncore
+import collections
+import email.utils
+import errno
+import fcntl
+import io
+import logging
+import os
+import Queue
+import socket
+import sys
+import threading
+import time
+import urllib
+
+
+def _toBytes(value):
+    """
+    Returns the specified header or status string as bytes.
+    """
+    if isinstance(value, bytes):
+        return value
+    return value.encode("latin-1")
+
+
+class ApplicationThreadPool(object):
+    """
+    A fixed size pool of threads that run WSGI applications. Each job is
+    a callable that is run on one of the threads; its result is passed
+    to the completion callback for the job.
+    """
+    def __init__(self, numThreads):
+        if numThreads <= 0:
+            raise ValueError("The number of threads must be positive")
+        self._jobs = Queue.Queue()
+        self._threads = []
+        for _ in range(numThreads):
+            thread = threading.Thread(target=self._runJobs)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def getNumThreads(self):
+        """
+        Returns the number of threads in this pool.
+        """
+        return len(self._threads)
+
+    def submit(self, job, completionCallback):
+        """
+        Schedules the specified job to run on one of the threads.
+        """
+        self._jobs.put((job, completionCallback))
+
+    def shutdown(self):
+        """
+        Stops all of the threads after the jobs already submitted have
+        been run.
+        """
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _runJobs(self):
+        while True:
+            item = self._jobs.get()
+            if item is None:
+                break
+            job, completionCallback = item
+            completionCallback(job())
+
+
+class _Trigger(asyncore.file_dispatcher):
+    """
+    Wakes up the event loop from other threads, and runs the callbacks
+    they have queued in the event loop thread.
+    """
+    def __init__(self, socketMap):
+        self._readFd, self._writeFd = os.pipe()
+        asyncore.file_dispatcher.__init__(self, self._readFd, socketMap)
+        os.close(self._readFd)
+        flags = fcntl.fcntl(self._writeFd, fcntl.F_GETFL)
+        fcntl.fcntl(self._writeFd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        self._callbacks = collections.deque()
+        # Guards the write end of the pipe, which may be closed while
+        # another thread is pulling the trigger.
+        self._lock = threading.RLock()
+
+    def writable(self):
+        return False
+
+    def pull(self, callback):
+        """
+        Arranges for the specified callback to be called in the event
+        loop thread. Safe to call from any thread.
+        """
+        self._callbacks.append(callback)
+        with self._lock:
+            if self._writeFd is None:
+                return
+            try:
+                os.write(self._writeFd, b"x")
+            except OSError as error:
+                if error.errno != errno.EAGAIN:
+                    raise
+
+    def handle_read(self):
+        try:
+            self.recv(8192)
+        except socket.error:
+            pass
+        while self._callbacks:
+            callback = self._callbacks.popleft()
+            try:
+                callback()
+            except Exception:
+                logging.getLogger(__name__).exception("Callback failed")
+
+    def handle_close(self):
+        pass
+
+    def close(self):
+        # The write end is closed first, so that a concurrent pull never
+        # writes to a pipe whose read end has been closed.
+        with self._lock:
+            if self._writeFd is not None:
+                os.close(self._writeFd)
+                self._writeFd = None
+        asyncore.file_dispatcher.close(self)
+
+
+class HttpConnection(asynchat.async_chat):
+    """
+    A single HTTP/1.x client connection. Requests are read in the event
+    loop thread and run on the server's application thread pool, one at
+    a time; the connection stops reading while a request is running so
+    that pipelined responses are sent in order.
+    """
+    maxHeaderSize = 65536
+    headerTerminator = b"\r\n\r\n"
+
+    def __init__(self, server, connection, clientAddress):
+        asynchat.async_chat.__init__(self, connection, server.socketMap)
+        self._server = server
+        self._clientAddress = clientAddress
+        self._busy = False
+        self._closeWhenDone = False
+        self._failed = False
+        self._inputBuffer = []
+        self._inputSize = 0
+        self._environ = None
+        self.lastActivity = time.time()
+        self.set_terminator(self.headerTerminator)
+
+    def isIdle(self):
+        """
+        Returns True if no request is being read, run or sent on this
+        connection.
+        """
+        return (
+            not self._busy and self._inputSize == 0 and
+            len(self.producer_fifo) == 0)
+
+    def readable(self):
+        return not self._busy and not self._closeWhenDone
+
+    def collect_incoming_data(self, data):
+        if self._failed:
+            return
+        self.lastActivity = time.time()
+        self._inputBuffer.append(data)
+        self._inputSize += len(data)
+        if self._environ is None and self._inputSize > self.maxHeaderSize:
+            self._sendError(b"431 Request Header Fields Too Large")
+
+    def found_terminator(self):
+        if self._failed:
+            return
+        self.lastActivity = time.time()
+        data = b"".join(self._inputBuffer)
+        self._inputBuffer = []
+        self._inputSize = 0
+        if self._environ is None:
+            self._parseHeader(data)
+        else:
+            self._environ[b"wsgi.input"] = io.BytesIO(data)
+            self._runRequest()
+
+    def _parseHeader(self, data):
+        lines = data.split(b"\r\n")
+        requestLine = lines[0]
+        if requestLine == b"":
+            # Tolerate empty lines between requests.
+            return
+        try:
+            method, uri, version = requestLine.split(b" ")
+        except ValueError:
+            self._sendError(b"400 Bad Request")
+            return
+        if not version.startswith(b"HTTP/1."):
+            self._sendError(b"505 HTTP Version Not Supported")
+            return
+        path, _, queryString = uri.partition(b"?")
+        environ = {
+            b"REQUEST_METHOD": method,
+            b"SCRIPT_NAME": b"",
+            b"PATH_INFO": urllib.unquote(path),
+            b"QUERY_STRING": queryString,
+            b"SERVER_NAME": self._server.serverName,
+            b"SERVER_PORT": str(self._server.serverPort),
+            b"SERVER_PROTOCOL": version,
+            b"REMOTE_ADDR": self._clientAddress[0],
+            b"wsgi.version": (1, 0),
+            b"wsgi.url_scheme": b"http",
+            b"wsgi.errors": sys.stderr,
+            b"wsgi.multithread": True,
+            b"wsgi.multiprocess": False,
+            b"wsgi.run_once": False,
+        }
+        for line in lines[1:]:
+            name, separator, value = line.partition(b":")
+            if separator == b"":
+                continue
+            key = name.strip().upper().replace(b"-", b"_")
+            value = value.strip()
+            if key not in (b"CONTENT_TYPE", b"CONTENT_LENGTH"):
+                key = b"HTTP_" + key
+            if key in environ:
+                environ[key] += b"," + value
+            else:
+                environ[key] = value
+        connectionTokens = environ.get(b"HTTP_CONNECTION", b"").lower()
+        if version == b"HTTP/1.0":
+            keepAlive = b"keep-alive" in connectionTokens
+        else:
+            keepAlive = b"close" not in connectionTokens
+        self._closeWhenDone = not keepAlive
+        if b"chunked" in environ.get(b"HTTP_TRANSFER_ENCODING", b"").lower():
+            self._sendError(b"501 Not Implemented")
+            return
+        try:
+            contentLength = int(environ.get(b"CONTENT_LENGTH", 0))
+        except ValueError:
+            self._sendError(b"400 Bad Request")
+            return
+        if contentLength < 0:
+            self._sendError(b"400 Bad Request")
+            return
+        if contentLength > self._server.maxBodySize:
+            # Refuse the body before buffering any of it.
+            self._sendError(b"413 Request Entity Too Large")
+            return
+        self._environ = environ
+        if contentLength > 0:
+            self.set_terminator(contentLength)
+        else:
+            environ[b"wsgi.input"] = io.BytesIO()
+            self._runRequest()
+
+    def _runRequest(self):
+        environ = self._environ
+        self._environ = None
+        self.set_terminator(self.headerTerminator)
+        self._busy = True
+        self._server.submitRequest(self, environ, self._closeWhenDone)
+
+    def sendResponse(self, response, keepAlive):
+        """
+        Sends the specified response, which was produced by the
+        application thread pool. Must be called in the event loop
+        thread.
+        """
+        self.lastActivity = time.time()
+        self._busy = False
+        self.push(response)
+        if not keepAlive:
+            self._closeWhenDone = True
+            self.close_when_done()
+
+    def _sendError(self, status):
+        self._failed = True
+        self._inputBuffer = []
+        self._inputSize = 0
+        self._closeWhenDone = True
+        self.push(self._server.formatResponse(status, [], b"", False))
+        self.close_when_done()
+
+    def handle_error(self):
+        self._server.logger.exception(
+            "Error on connection from %s", self._clientAddress[0])
+        self.close()
+
+    def close(self):
+        asynchat.async_chat.close(self)
+        self._server.removeConnection(self)
+
+
+class _Listener(asyncore.dispatcher):
+    """
+    Accepts new connections on the server's listening socket.
+    """
+    def __init__(self, server, host, port):
+        asyncore.dispatcher.__init__(self, map=server.socketMap)
+        self._server = server
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(server.listenBacklog)
+
+    def writable(self):
+        return False
+
+    def handle_accept(self):
+        try:
+            accepted = self.accept()
+        except socket.error as error:
+            if error.args[0] in (errno.EMFILE, errno.ENFILE):
+                self._server.logger.warning(
+                    "Too many open files; not accepting connections")
+                return
+            raise
+        if accepted is not None:
+            self._server.addConnection(*accepted)
+
+
+class AsyncWSGIServer(object):
+    """
+    Serves the specified WSGI app on host:port, using an event loop for
+    network I/O and numThreads threads to run the app. Connections that
+    have been idle for more than keepAliveTimeout seconds are closed,
+    and requests whose bodies are larger than maxBodySize bytes are
+    refused, as bodies are held in memory until they have been read.
+    """
+    pollInterval = 1  # seconds
+    listenBacklog = 1024
+    serverSoftware = b"ga4gh-async"
+
+    def __init__(
+            self, app, host, port, numThreads, keepAliveTimeout=60,
+            maxBodySize=2**20):
+        if numThreads <= 0:
+            raise ValueError("The number of threads must be positive")
+        self._app = app
+        self._numThreads = numThreads
+        self._keepAliveTimeout = keepAliveTimeout
+        self.maxBodySize = maxBodySize
+        self._connections = set()
+        self._threadPool = None
+        self._stopping = False
+        self._lastIdleCheck = time.time()
+        self.logger = logging.getLogger(__name__)
+        self.socketMap = {}
+        self._listener = _Listener(self, host, port)
+        self._trigger = _Trigger(self.socketMap)
+        self.serverName = _toBytes(socket.getfqdn(host))
+        self.serverPort = self.getServerAddress()[1]
+
+    def getServerAddress(self):
+        """
+        Returns the (host, port) address the server is listening on.
+        """
+        return self._listener.socket.getsockname()
+
+    def getNumConnections(self):
+        """
+        Returns the number of client connections currently open.
+        """
+        return len(self._connections)
+
+    def addConnection(self, connection, clientAddress):
+        self._connections.add(
+            HttpConnection(self, connection, clientAddress))
+
+    def removeConnection(self, connection):
+        self._connections.discard(connection)
+
+    def serveForever(self):
+        """
+        Runs the event loop until stop() is called.
+        """
+        self._threadPool = ApplicationThreadPool(self._numThreads)
+        self.logger.info(
+            "Serving on %s:%d with %d application threads",
+            self.getServerAddress()[0], self.serverPort, self._numThreads)
+        try:
+            while not self._stopping:
+                asyncore.loop(
+                    timeout=self.pollInterval, use_poll=True,
+                    map=self.socketMap, count=1)
+                self._closeIdleConnections()
+        finally:
+            self._threadPool.shutdown()
+            self._threadPool = None
+            asyncore.close_all(self.socketMap)
+            self._connections.clear()
+
+    def stop(self):
+        """
+        Stops the event loop. Safe to call from any thread, or from a
+        signal handler.
+        """
+        self._stopping = True
+        self._trigger.pull(lambda: None)
+
+    def _closeIdleConnections(self):
+        now = time.time()
+        if (self._keepAliveTimeout is None or
+                now - self._lastIdleCheck < self.pollInterval):
+            return
+        self._lastIdleCheck = now
+        deadline = now - self._keepAliveTimeout
+        for connection in list(self._connections):
+            if connection.isIdle() and connection.lastActivity < deadline:
+                connection.close()
+
+    def submitRequest(self, connection, environ, closeAfterwards):
+        """
+        Runs the app for the specified request on the thread pool, and
+        sends the response on the connection when it is done.
+        """
+        def job():
+            return self._callApplication(environ, closeAfterwards)
+
+        def completionCallback(result):
+            def send():
+                if connection.connected:
+                    connection.sendResponse(*result)
+            self._trigger.pull(send)
+
+        self._threadPool.submit(job, completionCallback)
+
+    def _callApplication(self, environ, closeAfterwards):
+        """
+        Calls the app and returns the formatted response and whether the
+        connection should be kept alive. Runs on the thread pool.
+        """
+        responseStatus = []
+        responseHeaders = []
+        body = []
+
+        def startResponse(status, headers, excInfo=None):
+            # Nothing is sent until the app has returned, so an error
+            # response can always replace the original one.
+            responseStatus[:] = [status]
+            responseHeaders[:] = headers
+            return body.append
+
+        try:
+            result = self._app(environ, startResponse)
+            try:
+                for data in result:
+                    body.append(data)
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+        except Exception:
+            self.logger.exception("Error running application")
+            return (self.formatResponse(
+                b"500 Internal Server Error", [], b"", False), False)
+        keepAlive = not closeAfterwards
+        response = self.formatResponse(
+            responseStatus[0], responseHeaders, b"".join(body), keepAlive)
+        return response, keepAlive
+
+    def formatResponse(self, status, headers, body, keepAlive):
+        """
+        Returns the HTTP/1.1 response with the specified status, headers
+        and body as bytes.
+        """
+        lines = [b"HTTP/1.1 " + _toBytes(status)]
+        headerNames = set()
+        for name, value in headers:
+            name = _toBytes(name)
+            headerNames.add(name.lower())
+            lines.append(name + b": " + _toBytes(value))
+        if b"content-length" not in headerNames:
+            lines.append(b"Content-Length: " + str(len(body)))
+        if b"date" not in headerNames:
+            lines.append(b"Date: " + _toBytes(
+                email.utils.formatdate(usegmt=True)))
+        lines.append(b"Server: " + self.serverSoftware)
+        if keepAlive:
+            lines.append(b"Connection: keep-alive")
+        else:
+            lines.append(b"Connection: close")
+        return b"\r\n".join(lines) + b"\r\n\r\n" + body
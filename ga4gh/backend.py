@@ -6,13 +6,25 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
+import functools
+import glob
+import hashlib
+import heapq
 import json
+import multiprocessing
 import os
+import sys
+import threading
 
 import ga4gh.datamodel as datamodel
 import ga4gh.datamodel.datasets as datasets
+import ga4gh.datamodel.reads as reads
 import ga4gh.datamodel.references as references
+import ga4gh.datamodel.variants as variants
 import ga4gh.exceptions as exceptions
+import ga4gh.extensions as extensions
+import ga4gh.metrics as metrics
 import ga4gh.protocol as protocol
 
 
@@ -52,6 +64,27 @@ def _parsePageToken(pageToken, numValues):
     return values
 
 
+def _hashJson(value):
+    """
+    Returns the SHA-1 hex digest of the canonical JSON serialization of
+    the specified value, which is the same in every server process.
+    """
+    return hashlib.sha1(json.dumps(value, sort_keys=True)).hexdigest()
+
+
+def _cachedResponse(runMethod):
+    """
+    Decorates a backend method that takes an object ID and returns a
+    serialized response so that responses are served from the response
+    cache of the backend where possible.
+    """
+    @functools.wraps(runMethod)
+    def wrapper(self, id_):
+        return self.runCachedRequest(
+            [runMethod.__name__, id_], lambda: runMethod(self, id_))
+    return wrapper
+
+
 class IntervalIterator(object):
     """
     Implements generator logic for types which accept a start/end
@@ -150,17 +183,52 @@ class IntervalIterator(object):
         return self
 
 
+def _getReadAlignmentFilter(request):
+    """
+    Returns the ReadAlignmentFilter defined by the specified reads
+    search request, or None if it does not filter the reads. A plain
+    SearchReadsRequest has none of the filter fields.
+    """
+    readFilter = reads.ReadAlignmentFilter(
+        minMappingQuality=getattr(request, "minMappingQuality", None),
+        requiredFlags=getattr(request, "requiredFlags", None),
+        excludedFlags=getattr(request, "excludedFlags", None),
+        minReadLength=getattr(request, "minReadLength", None),
+        maxReadLength=getattr(request, "maxReadLength", None))
+    if readFilter.isEmpty():
+        return None
+    return readFilter
+
+
+def _getReadDownsampler(request):
+    """
+    Returns the ReadDownsampler defined by the specified reads search
+    request, or None if it does not downsample the reads.
+    """
+    maxReadsPerBucket = getattr(request, "maxReadsPerBucket", None)
+    if maxReadsPerBucket is None:
+        return None
+    return reads.ReadDownsampler(
+        maxReadsPerBucket, getattr(request, "bucketSize", None),
+        getattr(request, "downsamplingSeed", None))
+
+
 class ReadsIntervalIterator(IntervalIterator):
     """
-    An interval iterator for reads
+    An interval iterator for reads. As for variants, the reads are
+    filtered and downsampled before they are counted, so page tokens
+    are positions in the stream of the reads that are returned.
     """
     def __init__(self, request, parentContainer, reference):
         self._reference = reference
+        self._readFilter = _getReadAlignmentFilter(request)
+        self._downsampler = _getReadDownsampler(request)
         super(ReadsIntervalIterator, self).__init__(request, parentContainer)
 
     def _search(self, start, end):
         return self._parentContainer.getReadAlignments(
-            self._reference, start, end)
+            self._reference, start, end, readFilter=self._readFilter,
+            downsampler=self._downsampler)
 
     @classmethod
     def _getStart(cls, readAlignment):
@@ -173,15 +241,88 @@ class ReadsIntervalIterator(IntervalIterator):
             len(readAlignment.alignedSequence))
 
 
+def _getVariantSiteFilter(request):
+    """
+    Returns the VariantSiteFilter defined by the specified variants
+    search request, or None if it does not filter the variants. A plain
+    SearchVariantsRequest has none of the filter fields.
+    """
+    siteFilter = variants.VariantSiteFilter(
+        passOnly=getattr(request, "passOnly", None),
+        variantClasses=getattr(request, "variantClasses", None),
+        minQuality=getattr(request, "minQuality", None),
+        minAlleleFrequency=getattr(request, "minAlleleFrequency", None))
+    if siteFilter.isEmpty():
+        return None
+    return siteFilter
+
+
+def _getGenotypeFilters(request, variantSets):
+    """
+    Returns a map from the IDs of the specified variant sets to the
+    GenotypeFilter that the specified variants search request defines
+    for each of them, or None if it does not filter on genotypes. Each
+    variant set is given the requested call sets that it contains, so
+    as with an empty anyNonReferenceCallSetIds, a variant set that
+    contains none of the anyNonReferenceCallSetIds matches no variants.
+    A variant set that contains none of a non-empty list of
+    allNonReferenceCallSetIds also matches no variants.
+    """
+    variantSetMap = dict(
+        (variantSet.getId(), variantSet) for variantSet in variantSets)
+    callSetsMaps = []
+    for fieldName in ["anyNonReferenceCallSetIds",
+                      "allNonReferenceCallSetIds"]:
+        callSetIds = getattr(request, fieldName, None)
+        if callSetIds is None:
+            callSetsMaps.append(dict.fromkeys(variantSetMap))
+            continue
+        callSetsMap = dict(
+            (variantSetId, []) for variantSetId in variantSetMap)
+        for callSetId in callSetIds:
+            compoundId = datamodel.CallSetCompoundId.parse(callSetId)
+            if compoundId.variantSetId not in variantSetMap:
+                raise exceptions.CallSetNotInVariantSetException(
+                    callSetId, ", ".join(sorted(variantSetMap)))
+            variantSet = variantSetMap[compoundId.variantSetId]
+            callSetsMap[compoundId.variantSetId].append(
+                variantSet.getCallSet(callSetId))
+        callSetsMaps.append(callSetsMap)
+    anyCallSetsMap, allCallSetsMap = callSetsMaps
+    genotypeFilters = {}
+    for variantSetId in variantSetMap:
+        anyCallSets = anyCallSetsMap[variantSetId]
+        if (getattr(request, "allNonReferenceCallSetIds", None) and
+                len(allCallSetsMap[variantSetId]) == 0):
+            # An empty any list rejects every variant of the variant set.
+            anyCallSets = []
+        genotypeFilter = variants.GenotypeFilter(
+            anyNonReference=anyCallSets,
+            allNonReference=allCallSetsMap[variantSetId])
+        if genotypeFilter.isEmpty():
+            genotypeFilter = None
+        genotypeFilters[variantSetId] = genotypeFilter
+    return genotypeFilters
+
+
 class VariantsIntervalIterator(IntervalIterator):
     """
-    An interval iterator for variants
+    An interval iterator for variants. As the variants are filtered
+    before they are counted, the page tokens are positions in the
+    filtered stream, and stay valid as long as the filters of the
+    request are unchanged.
     """
+    def __init__(self, request, parentContainer, genotypeFilter=None):
+        self._siteFilter = _getVariantSiteFilter(request)
+        self._genotypeFilter = genotypeFilter
+        super(VariantsIntervalIterator, self).__init__(
+            request, parentContainer)
 
     def _search(self, start, end):
         return self._parentContainer.getVariants(
             self._request.referenceName, start, end,
-            self._request.callSetIds)
+            self._request.callSetIds, siteFilter=self._siteFilter,
+            genotypeFilter=self._genotypeFilter)
 
     @classmethod
     def _getStart(cls, variant):
@@ -192,6 +333,153 @@ class VariantsIntervalIterator(IntervalIterator):
         return variant.end
 
 
+class GenotypeMatrixIntervalIterator(IntervalIterator):
+    """
+    An interval iterator for the rows of a genotype matrix. There is a
+    row for each variant, so the page tokens are the same as those of a
+    variant search over the same region.
+    """
+    def _search(self, start, end):
+        return self._parentContainer.getGenotypeMatrixRows(
+            self._request.referenceName, start, end,
+            self._request.callSetIds)
+
+    @classmethod
+    def _getStart(cls, row):
+        return row.start
+
+    @classmethod
+    def _getEnd(cls, row):
+        return row.end
+
+
+class PrefetchingIterator(object):
+    """
+    An iterator over the values of another iterator, which is consumed
+    in a background thread up to bufferSize values ahead of the caller,
+    so that several iterators doing file I/O can make progress at the
+    same time. Exceptions raised by the iterator are re-raised by next,
+    with the traceback of the background thread. The caller must call
+    close if it stops before the end, so that the thread can finish and
+    close the underlying iterator.
+    """
+    def __init__(self, iterator, bufferSize):
+        self._iterator = iterator
+        self._bufferSize = bufferSize
+        self._buffer = collections.deque()
+        self._condition = threading.Condition()
+        self._finished = False
+        self._closed = False
+        self._excInfo = None
+        thread = threading.Thread(target=self._fill)
+        thread.daemon = True
+        thread.start()
+
+    def _fill(self):
+        try:
+            for value in self._iterator:
+                with self._condition:
+                    while (len(self._buffer) >= self._bufferSize and
+                            not self._closed):
+                        self._condition.wait()
+                    if self._closed:
+                        break
+                    self._buffer.append(value)
+                    self._condition.notify_all()
+        except Exception:
+            self._excInfo = sys.exc_info()
+        finally:
+            # Generators that hold file handles release them on close.
+            if hasattr(self._iterator, "close"):
+                self._iterator.close()
+            with self._condition:
+                self._finished = True
+                self._condition.notify_all()
+
+    def next(self):
+        with self._condition:
+            while len(self._buffer) == 0 and not self._finished:
+                self._condition.wait()
+            if len(self._buffer) > 0:
+                value = self._buffer.popleft()
+                self._condition.notify_all()
+                return value
+        if self._excInfo is not None:
+            raise self._excInfo[0], self._excInfo[1], self._excInfo[2]
+        raise StopIteration()
+
+    def close(self):
+        """
+        Stops the background iteration and discards any buffered values.
+        """
+        with self._condition:
+            self._closed = True
+            self._buffer.clear()
+            self._condition.notify_all()
+
+    def __iter__(self):
+        return self
+
+
+def mergeIterators(iterators, getStart):
+    """
+    Returns an iterator merging the values of the specified iterators,
+    each of which must be in order of getStart, into a single stream in
+    order of getStart. Values with equal starts are returned in the order
+    of their iterators, so the merged order is deterministic. The
+    iterators are closed when the merged iterator is exhausted or closed.
+    """
+    try:
+        heap = []
+        for index, iterator in enumerate(iterators):
+            value = next(iterator, None)
+            if value is not None:
+                heap.append((getStart(value), index, value))
+        heapq.heapify(heap)
+        while len(heap) > 0:
+            _, index, value = heap[0]
+            yield value
+            value = next(iterators[index], None)
+            if value is None:
+                heapq.heappop(heap)
+            else:
+                heapq.heapreplace(heap, (getStart(value), index, value))
+    finally:
+        for iterator in iterators:
+            if hasattr(iterator, "close"):
+                iterator.close()
+
+
+class MultiVariantSetsIntervalIterator(VariantsIntervalIterator):
+    """
+    An interval iterator over the variants of several variant sets,
+    merged by start position. The variants of each variant set are read
+    concurrently. Since the merged order is deterministic, the usual
+    anchor and skip count page tokens apply to the merged stream.
+    """
+    def __init__(
+            self, request, variantSets, callSetIdsMap, genotypeFiltersMap):
+        self._callSetIdsMap = callSetIdsMap
+        self._genotypeFiltersMap = genotypeFiltersMap
+        super(MultiVariantSetsIntervalIterator, self).__init__(
+            request, variantSets)
+
+    def _search(self, start, end):
+        # No variant set can contribute more than a page to the merged
+        # stream, so there is no point in reading further ahead.
+        iterators = [
+            PrefetchingIterator(
+                variantSet.getVariants(
+                    self._request.referenceName, start, end,
+                    self._callSetIdsMap[variantSet.getId()],
+                    siteFilter=self._siteFilter,
+                    genotypeFilter=self._genotypeFiltersMap[
+                        variantSet.getId()]),
+                self._request.pageSize)
+            for variantSet in self._parentContainer]
+        return mergeIterators(iterators, self._getStart)
+
+
 class AbstractBackend(object):
     """
     An abstract GA4GH backend.
@@ -202,6 +490,10 @@ class AbstractBackend(object):
         self._responseValidation = False
         self._defaultPageSize = 100
         self._maxResponseLength = 2**20  # 1 MiB
+        self._responseCache = None
+        # Responses are only cached by backends that know the version
+        # of their data.
+        self._dataVersion = None
         self._datasetIdMap = {}
         self._datasetNameMap = {}
         self._datasetIds = []
@@ -252,6 +544,28 @@ class AbstractBackend(object):
         """
         self._maxResponseLength = maxResponseLength
 
+    def setResponseCache(self, responseCache):
+        """
+        Sets the cache of serialized responses, which is shared with the
+        backends that replace this one when the data is rescanned. If
+        responseCache is None, responses are not cached.
+        """
+        self._responseCache = responseCache
+
+    def getResponseCache(self):
+        """
+        Returns the cache of serialized responses, or None if responses
+        are not cached.
+        """
+        return self._responseCache
+
+    def getDataVersion(self):
+        """
+        Returns a stamp identifying the version of the data served by
+        this backend, or None if it is unknown.
+        """
+        return self._dataVersion
+
     def getDatasets(self):
         """
         Returns a list of datasets in this backend
@@ -501,6 +815,102 @@ class AbstractBackend(object):
         intervalIterator = ReadsIntervalIterator(request, readGroup, reference)
         return intervalIterator
 
+    def coverageGenerator(self, request):
+        """
+        Returns a generator over the (coverageBin, nextPageToken) pairs
+        defined by the specified SearchCoverageRequest. The page token is
+        the index of the next bin, and the bins are computed one page at
+        a time.
+        """
+        compoundId = datamodel.ReadGroupCompoundId.parse(request.readGroupId)
+        dataset = self.getDataset(compoundId.datasetId)
+        readGroupSet = dataset.getReadGroupSet(compoundId.readGroupSetId)
+        readGroup = readGroupSet.getReadGroup(compoundId.readGroupId)
+        referenceSet = readGroupSet.getReferenceSet()
+        reference = referenceSet.getReference(request.referenceId)
+        start = request.start
+        if start is None:
+            start = 0
+        end = request.end
+        if end is None:
+            end = reference.getLength()
+        # As for reads, the end may be past the end of the reference, as
+        # the alignments are not checked against its length.
+        if start < 0 or start > end:
+            raise exceptions.ReferenceRangeErrorException(
+                reference.getId(), start, end)
+        binSize = request.binSize
+        if binSize is None:
+            binSize = 1
+        if binSize <= 0:
+            raise exceptions.BadBinSizeException(binSize)
+        binIndex = 0
+        if request.pageToken is not None:
+            binIndex, = _parsePageToken(request.pageToken, 1)
+        readFilter = _getReadAlignmentFilter(request)
+        numBins = (end - start + binSize - 1) // binSize
+        while binIndex < numBins:
+            chunkStart = start + binIndex * binSize
+            chunkEnd = min(chunkStart + request.pageSize * binSize, end)
+            coverageBins = readGroup.getCoverage(
+                reference, chunkStart, chunkEnd, binSize,
+                includeBaseCounts=bool(request.includeBaseCounts),
+                readFilter=readFilter)
+            for coverageBin in coverageBins:
+                binIndex += 1
+                nextPageToken = None
+                if binIndex < numBins:
+                    nextPageToken = str(binIndex)
+                yield coverageBin, nextPageToken
+
+    def coverageTilesGenerator(self, request):
+        """
+        Returns a generator over the (coverageBin, nextPageToken) pairs
+        defined by the specified SearchCoverageTilesRequest. The bins
+        are read from the coverage pyramid one page at a time, so the
+        cost of a page does not depend on the bin size.
+        """
+        compoundId = datamodel.ReadGroupCompoundId.parse(request.readGroupId)
+        dataset = self.getDataset(compoundId.datasetId)
+        readGroupSet = dataset.getReadGroupSet(compoundId.readGroupSetId)
+        readGroup = readGroupSet.getReadGroup(compoundId.readGroupId)
+        referenceSet = readGroupSet.getReferenceSet()
+        reference = referenceSet.getReference(request.referenceId)
+        pyramid = readGroupSet.getCoveragePyramid()
+        binSize = request.binSize
+        if binSize not in pyramid.getBinSizes():
+            raise exceptions.BinSizeNotFoundException(
+                binSize, pyramid.getBinSizes())
+        referenceName = reference.getLocalId()
+        length = pyramid.getReferenceLength(referenceName)
+        if length is None:
+            # The reference has no reads in this read group set.
+            return
+        start = request.start
+        if start is None:
+            start = 0
+        end = request.end
+        if end is None:
+            end = length
+        if start < 0 or start > end:
+            raise exceptions.ReferenceRangeErrorException(
+                reference.getId(), start, end)
+        binIndex = start // binSize
+        if request.pageToken is not None:
+            binIndex, = _parsePageToken(request.pageToken, 1)
+        endBin = (min(end, length) + binSize - 1) // binSize
+        readGroupName = readGroup.getLocalId()
+        while binIndex < endBin:
+            pageEndBin = min(binIndex + request.pageSize, endBin)
+            coverageBins = pyramid.getCoverage(
+                readGroupName, referenceName, binSize, binIndex, pageEndBin)
+            for coverageBin in coverageBins:
+                binIndex += 1
+                nextPageToken = None
+                if binIndex < endBin:
+                    nextPageToken = str(binIndex)
+                yield coverageBin, nextPageToken
+
     def variantsGenerator(self, request):
         """
         Returns a generator over the (variant, nextPageToken) pairs defined
@@ -509,9 +919,95 @@ class AbstractBackend(object):
         compoundId = datamodel.VariantSetCompoundId.parse(request.variantSetId)
         dataset = self.getDataset(compoundId.datasetId)
         variantSet = dataset.getVariantSet(compoundId.variantSetId)
-        intervalIterator = VariantsIntervalIterator(request, variantSet)
+        genotypeFilters = _getGenotypeFilters(request, [variantSet])
+        intervalIterator = VariantsIntervalIterator(
+            request, variantSet, genotypeFilters[variantSet.getId()])
         return intervalIterator
 
+    def genotypeMatrixGenerator(self, request):
+        """
+        Returns a generator over the (genotypeMatrixRow, nextPageToken)
+        pairs defined by the specified SearchGenotypeMatrixRequest.
+        """
+        compoundId = datamodel.VariantSetCompoundId.parse(request.variantSetId)
+        dataset = self.getDataset(compoundId.datasetId)
+        variantSet = dataset.getVariantSet(compoundId.variantSetId)
+        return GenotypeMatrixIntervalIterator(request, variantSet)
+
+    def multiVariantSetsVariantsGenerator(self, request):
+        """
+        Returns a generator over the (variant, nextPageToken) pairs defined
+        by the specified SearchMultiVariantSetsRequest.
+        """
+        if len(request.variantSetIds) == 0:
+            raise exceptions.BadRequestException()
+        variantSets = []
+        for variantSetId in request.variantSetIds:
+            compoundId = datamodel.VariantSetCompoundId.parse(variantSetId)
+            dataset = self.getDataset(compoundId.datasetId)
+            variantSets.append(dataset.getVariantSet(compoundId.variantSetId))
+        # Each variant set is given only the requested call sets it contains.
+        callSetIdsMap = {}
+        for variantSet in variantSets:
+            callSetIdsMap[variantSet.getId()] = None
+            if request.callSetIds is not None:
+                callSetIdsMap[variantSet.getId()] = []
+        for callSetId in request.callSetIds or []:
+            compoundId = datamodel.CallSetCompoundId.parse(callSetId)
+            if compoundId.variantSetId not in callSetIdsMap:
+                raise exceptions.CallSetNotInVariantSetException(
+                    callSetId, ", ".join(request.variantSetIds))
+            callSetIdsMap[compoundId.variantSetId].append(callSetId)
+        return MultiVariantSetsIntervalIterator(
+            request, variantSets, callSetIdsMap,
+            _getGenotypeFilters(request, variantSets))
+
+    def variantSummariesGenerator(self, request):
+        """
+        Returns a generator over the (variantSummaryBin, nextPageToken)
+        pairs defined by the specified SearchVariantSummariesRequest.
+        The bins are read from the variant summary pyramid one page at a
+        time, so the cost of a page does not depend on the bin size.
+        """
+        compoundId = datamodel.VariantSetCompoundId.parse(request.variantSetId)
+        dataset = self.getDataset(compoundId.datasetId)
+        variantSet = dataset.getVariantSet(compoundId.variantSetId)
+        referenceName = request.referenceName
+        pyramid = variantSet.getVariantSummaryPyramid(referenceName)
+        if pyramid is None:
+            # There are no variants on the reference in this variant set.
+            return
+        binSize = request.binSize
+        if binSize not in pyramid.getBinSizes():
+            raise exceptions.BinSizeNotFoundException(
+                binSize, pyramid.getBinSizes())
+        length = pyramid.getReferenceLength(referenceName)
+        if length is None:
+            return
+        start = request.start
+        if start is None:
+            start = 0
+        end = request.end
+        if end is None:
+            end = length
+        if start < 0 or start > end:
+            raise exceptions.ReferenceRangeErrorException(
+                referenceName, start, end)
+        binIndex = start // binSize
+        if request.pageToken is not None:
+            binIndex, = _parsePageToken(request.pageToken, 1)
+        endBin = (min(end, length) + binSize - 1) // binSize
+        while binIndex < endBin:
+            pageEndBin = min(binIndex + request.pageSize, endBin)
+            summaryBins = pyramid.getSummaries(
+                referenceName, binSize, binIndex, pageEndBin)
+            for summaryBin in summaryBins:
+                binIndex += 1
+                nextPageToken = None
+                if binIndex < endBin:
+                    nextPageToken = str(binIndex)
+                yield summaryBin, nextPageToken
+
     def callSetsGenerator(self, request):
         """
         Returns a generator over the (callSet, nextPageToken) pairs defined
@@ -539,13 +1035,34 @@ class AbstractBackend(object):
     #
     ###########################################################
 
+    def runCachedRequest(self, keyParts, runRequest):
+        """
+        Returns the serialized response to the request identified by the
+        specified list of JSON serialisable keyParts, calling runRequest
+        to compute it if it is not in the response cache. The key of the
+        response also includes the data version and the settings that
+        change the contents of responses.
+        """
+        if self._responseCache is None or self._dataVersion is None:
+            return runRequest()
+        key = _hashJson(
+            [self._dataVersion, self._maxResponseLength] + keyParts)
+        with metrics.registry.stage("cache"):
+            responseString = self._responseCache.get(key)
+        if responseString is None:
+            responseString = runRequest()
+            with metrics.registry.stage("cache"):
+                self._responseCache.put(key, responseString)
+        return responseString
+
     def runGetRequest(self, obj):
         """
         Runs a get request by converting the specified datamodel
         object into its protocol representation.
         """
-        protocolElement = obj.toProtocolElement()
-        jsonString = protocolElement.toJsonString()
+        with metrics.registry.stage("serialize"):
+            protocolElement = obj.toProtocolElement()
+            jsonString = protocolElement.toJsonString()
         return jsonString
 
     def runSearchRequest(
@@ -560,27 +1077,54 @@ class AbstractBackend(object):
         any point using the nextPageToken attribute of the request object.
         """
         self.startProfile()
-        try:
-            requestDict = json.loads(requestStr)
-        except ValueError:
-            raise exceptions.InvalidJsonException(requestStr)
-        self.validateRequest(requestDict, requestClass)
-        request = requestClass.fromJsonDict(requestDict)
+        with metrics.registry.stage("parse"):
+            try:
+                requestDict = json.loads(requestStr)
+            except ValueError:
+                raise exceptions.InvalidJsonException(requestStr)
+        with metrics.registry.stage("validate"):
+            self.validateRequest(requestDict, requestClass)
+        with metrics.registry.stage("parse"):
+            request = requestClass.fromJsonDict(requestDict)
         if request.pageSize is None:
             request.pageSize = self._defaultPageSize
         if request.pageSize <= 0:
             raise exceptions.BadPageSizeException(request.pageSize)
+        # The key is built from the parsed request, so requests that
+        # differ only in formatting or in fields left at their defaults
+        # share a cache entry.
+        responseString = self.runCachedRequest(
+            [requestClass.__name__, objectGenerator.__name__,
+             request.toJsonDict()],
+            lambda: self._runSearchPage(
+                request, responseClass, objectGenerator))
+        self.endProfile()
+        return responseString
+
+    def _runSearchPage(self, request, responseClass, objectGenerator):
+        """
+        Returns the serialized page of the response to the specified
+        parsed search request.
+        """
         responseBuilder = protocol.SearchResponseBuilder(
             responseClass, request.pageSize, self._maxResponseLength)
         nextPageToken = None
-        for obj, nextPageToken in objectGenerator(request):
-            responseBuilder.addValue(obj)
-            if responseBuilder.isFull():
-                break
+        numObjects = 0
+        # The time taken to convert the objects is recorded separately
+        # by the datamodel.
+        with metrics.registry.stage("fetch"):
+            for obj, nextPageToken in objectGenerator(request):
+                responseBuilder.addValue(obj)
+                numObjects += 1
+                if responseBuilder.isFull():
+                    break
+        metrics.registry.recordPage(
+            numObjects, request.pageToken is not None)
         responseBuilder.setNextPageToken(nextPageToken)
-        responseString = responseBuilder.getJsonString()
-        self.validateResponse(responseString, responseClass)
-        self.endProfile()
+        with metrics.registry.stage("serialize"):
+            responseString = responseBuilder.getJsonString()
+        with metrics.registry.stage("validate"):
+            self.validateResponse(responseString, responseClass)
         return responseString
 
     def runListReferenceBases(self, id_, requestArgs):
@@ -596,13 +1140,24 @@ class AbstractBackend(object):
         if 'pageToken' in requestArgs:
             pageTokenStr = requestArgs['pageToken']
             start = _parsePageToken(pageTokenStr, 1)[0]
+        return self.runCachedRequest(
+            ["runListReferenceBases", id_, start, end],
+            lambda: self._runListReferenceBasesPage(
+                reference, start, end, 'pageToken' in requestArgs))
 
+    def _runListReferenceBasesPage(self, reference, start, end, isPaged):
+        """
+        Returns the serialized page of the bases of the specified
+        reference from start that ends at or before end.
+        """
         chunkSize = self._maxResponseLength
         nextPageToken = None
         if start + chunkSize < end:
             end = start + chunkSize
             nextPageToken = str(start + chunkSize)
-        sequence = reference.getBases(start, end)
+        with metrics.registry.stage("fetch"):
+            sequence = reference.getBases(start, end)
+        metrics.registry.recordPage(None, isPaged)
 
         # build response
         response = protocol.ListReferenceBasesResponse()
@@ -613,6 +1168,7 @@ class AbstractBackend(object):
 
     # Get requests.
 
+    @_cachedResponse
     def runGetCallset(self, id_):
         """
         Returns a callset with the given id
@@ -623,6 +1179,7 @@ class AbstractBackend(object):
         callSet = variantSet.getCallSet(id_)
         return self.runGetRequest(callSet)
 
+    @_cachedResponse
     def runGetVariant(self, id_):
         """
         Returns a variant with the given id
@@ -637,6 +1194,7 @@ class AbstractBackend(object):
         jsonString = gaVariant.toJsonString()
         return jsonString
 
+    @_cachedResponse
     def runGetReadGroupSet(self, id_):
         """
         Returns a readGroupSet with the given id_
@@ -646,6 +1204,7 @@ class AbstractBackend(object):
         readGroupSet = dataset.getReadGroupSet(id_)
         return self.runGetRequest(readGroupSet)
 
+    @_cachedResponse
     def runGetReadGroup(self, id_):
         """
         Returns a read group with the given id_
@@ -656,6 +1215,7 @@ class AbstractBackend(object):
         readGroup = readGroupSet.getReadGroup(id_)
         return self.runGetRequest(readGroup)
 
+    @_cachedResponse
     def runGetReference(self, id_):
         """
         Runs a getReference request for the specified ID.
@@ -665,6 +1225,7 @@ class AbstractBackend(object):
         reference = referenceSet.getReference(id_)
         return self.runGetRequest(reference)
 
+    @_cachedResponse
     def runGetReferenceSet(self, id_):
         """
         Runs a getReferenceSet request for the specified ID.
@@ -672,6 +1233,7 @@ class AbstractBackend(object):
         referenceSet = self.getReferenceSet(id_)
         return self.runGetRequest(referenceSet)
 
+    @_cachedResponse
     def runGetVariantSet(self, id_):
         """
         Runs a getVariantSet request for the specified ID.
@@ -681,6 +1243,7 @@ class AbstractBackend(object):
         variantSet = dataset.getVariantSet(id_)
         return self.runGetRequest(variantSet)
 
+    @_cachedResponse
     def runGetDataset(self, id_):
         """
         Runs a getDataset request for the specified ID.
@@ -701,13 +1264,32 @@ class AbstractBackend(object):
 
     def runSearchReads(self, request):
         """
-        Runs the specified SearchReadsRequest.
+        Runs the specified SearchReadsRequest, which may also have the
+        filters of a SearchFilteredReadsRequest.
         """
         return self.runSearchRequest(
-            request, protocol.SearchReadsRequest,
+            request, extensions.SearchFilteredReadsRequest,
             protocol.SearchReadsResponse,
             self.readsGenerator)
 
+    def runSearchCoverage(self, request):
+        """
+        Runs the specified SearchCoverageRequest.
+        """
+        return self.runSearchRequest(
+            request, extensions.SearchCoverageRequest,
+            extensions.SearchCoverageResponse,
+            self.coverageGenerator)
+
+    def runSearchCoverageTiles(self, request):
+        """
+        Runs the specified SearchCoverageTilesRequest.
+        """
+        return self.runSearchRequest(
+            request, extensions.SearchCoverageTilesRequest,
+            extensions.SearchCoverageResponse,
+            self.coverageTilesGenerator)
+
     def runSearchReferenceSets(self, request):
         """
         Runs the specified SearchReferenceSetsRequest.
@@ -737,13 +1319,41 @@ class AbstractBackend(object):
 
     def runSearchVariants(self, request):
         """
-        Runs the specified SearchVariantRequest.
+        Runs the specified SearchVariantRequest, which may also have the
+        filters of a SearchFilteredVariantsRequest.
         """
         return self.runSearchRequest(
-            request, protocol.SearchVariantsRequest,
+            request, extensions.SearchFilteredVariantsRequest,
             protocol.SearchVariantsResponse,
             self.variantsGenerator)
 
+    def runSearchMultiVariantSets(self, request):
+        """
+        Runs the specified SearchMultiVariantSetsRequest.
+        """
+        return self.runSearchRequest(
+            request, extensions.SearchMultiVariantSetsRequest,
+            protocol.SearchVariantsResponse,
+            self.multiVariantSetsVariantsGenerator)
+
+    def runSearchVariantSummaries(self, request):
+        """
+        Runs the specified SearchVariantSummariesRequest.
+        """
+        return self.runSearchRequest(
+            request, extensions.SearchVariantSummariesRequest,
+            extensions.SearchVariantSummariesResponse,
+            self.variantSummariesGenerator)
+
+    def runSearchGenotypeMatrix(self, request):
+        """
+        Runs the specified SearchGenotypeMatrixRequest.
+        """
+        return self.runSearchRequest(
+            request, extensions.SearchGenotypeMatrixRequest,
+            extensions.SearchGenotypeMatrixResponse,
+            self.genotypeMatrixGenerator)
+
     def runSearchCallSets(self, request):
         """
         Runs the specified SearchCallSetsRequest.
@@ -778,15 +1388,22 @@ class SimulatedBackend(AbstractBackend):
             numVariantSets=1, numCalls=1, variantDensity=0.5,
             numReferenceSets=1, numReferencesPerReferenceSet=1,
             numReadGroupSets=1, numReadGroupsPerReadGroupSet=1,
-            numAlignments=2):
+            referenceLength=200, readDepth=10, readLength=100):
         super(SimulatedBackend, self).__init__()
+        # The simulated data is determined by the parameters.
+        self._dataVersion = _hashJson([
+            "simulated", randomSeed, numDatasets, numVariantSets, numCalls,
+            variantDensity, numReferenceSets, numReferencesPerReferenceSet,
+            numReadGroupSets, numReadGroupsPerReadGroupSet, referenceLength,
+            readDepth, readLength])
 
         # References
         for i in range(numReferenceSets):
             localId = "referenceSet{}".format(i)
             seed = randomSeed + i
             referenceSet = references.SimulatedReferenceSet(
-                localId, seed, numReferencesPerReferenceSet)
+                localId, seed, numReferencesPerReferenceSet,
+                referenceLength)
             self.addReferenceSet(referenceSet)
 
         # Datasets
@@ -800,25 +1417,182 @@ class SimulatedBackend(AbstractBackend):
                 numVariantSets=numVariantSets,
                 numReadGroupSets=numReadGroupSets,
                 numReadGroupsPerReadGroupSet=numReadGroupsPerReadGroupSet,
-                numAlignments=numAlignments)
+                readDepth=readDepth, readLength=readLength)
             self.addDataset(dataset)
 
 
 class FileSystemBackend(AbstractBackend):
     """
-    A GA4GH backend backed by data on the file system
+    A GA4GH backend backed by data on the file system. The headers and
+    indexes of the data files are scanned using a pool of numScanWorkers
+    processes before the datamodel is built; if this is None, one
+    worker per CPU is used. If lazyLoading is True, the data files are
+    instead only scanned when the reference sets, variant sets and read
+    group sets that contain them are first used. The pool is only used
+    for the initial scan, as rescans run on a thread of a server whose
+    other threads may hold locks that forked workers would inherit, so
+    the changed files are scanned serially when the datamodel is built.
     """
-    def __init__(self, dataDir):
+    scanPatterns = [
+        (os.path.join("referenceSets", "*", "*.fa.gz"),
+         references.scanFastaFile),
+        (os.path.join("datasets", "*", "variants", "*", "*.bcf"),
+         variants.scanVariantFile),
+        (os.path.join("datasets", "*", "variants", "*", "*.vcf.gz"),
+         variants.scanVariantFile),
+        (os.path.join("datasets", "*", "reads", "*.bam"),
+         reads.scanAlignmentFile),
+    ]
+
+    def __init__(
+            self, dataDir, numScanWorkers=1, lazyLoading=False,
+            previousBackend=None):
         super(FileSystemBackend, self).__init__()
         self._dataDir = dataDir
-        sourceDirNames = ["referenceSets", "datasets"]
-        constructors = [
-            references.HtslibReferenceSet, datasets.FileSystemDataset]
-        objectAdders = [self.addReferenceSet, self.addDataset]
-        for sourceDirName, constructor, objectAdder in zip(
-                sourceDirNames, constructors, objectAdders):
+        self._numScanWorkers = numScanWorkers
+        self._lazyLoading = lazyLoading
+        self._referenceSetSignatures, self._datasetSignatures = \
+            self._getDataSignatures()
+        self._dataVersion = _hashJson([
+            os.path.abspath(dataDir), self._referenceSetSignatures,
+            self._datasetSignatures])
+        if numScanWorkers is None:
+            numScanWorkers = multiprocessing.cpu_count()
+        # Only a full scan requests the information of every data file,
+        # so only then can we tell which files have been removed.
+        fullScan = previousBackend is None and not lazyLoading
+        if fullScan:
+            datamodel.fileCatalog.startScan()
+        if numScanWorkers > 1 and not lazyLoading and \
+                previousBackend is None:
+            self._prefetchFileInfo(numScanWorkers)
+        # References
+        referenceSetsChanged = previousBackend is None or set(
+            previousBackend._referenceSetSignatures.keys()) != set(
+            self._referenceSetSignatures.keys())
+        for referenceSetName, signature in sorted(
+                self._referenceSetSignatures.items()):
+            if previousBackend is not None and \
+                    previousBackend._referenceSetSignatures.get(
+                        referenceSetName) == signature:
+                referenceSet = previousBackend.getReferenceSetByName(
+                    referenceSetName)
+            else:
+                referenceSetsChanged = True
+                relativePath = os.path.join(
+                    self._dataDir, "referenceSets", referenceSetName)
+                datamodel.fileHandleCache.removeFileHandles(relativePath)
+                if lazyLoading:
+                    referenceSet = datamodel.LazyDatamodelObject(
+                        None, referenceSetName,
+                        references.HtslibReferenceSet, relativePath, self)
+                else:
+                    referenceSet = references.HtslibReferenceSet(
+                        referenceSetName, relativePath, self)
+            self.addReferenceSet(referenceSet)
+        # Datasets
+        for datasetName, signature in sorted(
+                self._datasetSignatures.items()):
+            # Read group sets refer to their reference sets, so we must
+            # rebuild all datasets if any reference set has changed.
+            if not referenceSetsChanged and \
+                    previousBackend._datasetSignatures.get(
+                        datasetName) == signature:
+                dataset = previousBackend.getDatasetByName(datasetName)
+            else:
+                relativePath = os.path.join(
+                    self._dataDir, "datasets", datasetName)
+                datamodel.fileHandleCache.removeFileHandles(relativePath)
+                dataset = datasets.FileSystemDataset(
+                    datasetName, relativePath, self, lazyLoading)
+            self.addDataset(dataset)
+        # Persist any file information scanned while building the datamodel
+        if fullScan:
+            datamodel.fileCatalog.removeUnseenFiles(self._dataDir)
+        datamodel.fileCatalog.commit()
+
+    @classmethod
+    def _getDirectorySignature(cls, directoryPath):
+        """
+        Returns the relative path, size and modification time of each
+        file within the specified directory along with those of its JSON
+        metadata file, so that changes to the directory can be detected.
+        """
+        signature = []
+        paths = ['{}.json'.format(directoryPath)]
+        for dirPath, dirNames, fileNames in os.walk(directoryPath):
+            dirNames.sort()
+            paths.extend(
+                os.path.join(dirPath, fileName)
+                for fileName in sorted(fileNames))
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature.append((
+                os.path.relpath(path, directoryPath), stat.st_size,
+                stat.st_mtime))
+        return signature
+
+    def _getDataSignatures(self):
+        """
+        Returns dictionaries mapping the names of the reference sets and
+        datasets in the data directory to their directory signatures.
+        """
+        ret = []
+        for sourceDirName in ["referenceSets", "datasets"]:
+            signatures = {}
             sourceDir = os.path.join(self._dataDir, sourceDirName)
             for setName in os.listdir(sourceDir):
                 relativePath = os.path.join(sourceDir, setName)
                 if os.path.isdir(relativePath):
-                    objectAdder(constructor(setName, relativePath, self))
+                    signatures[setName] = self._getDirectorySignature(
+                        relativePath)
+            ret.append(signatures)
+        return ret
+
+    def hasChanged(self):
+        """
+        Returns True if the contents of the data directory have changed
+        since this backend was built.
+        """
+        return self._getDataSignatures() != [
+            self._referenceSetSignatures, self._datasetSignatures]
+
+    def rescan(self):
+        """
+        Rescans the data directory and returns a new FileSystemBackend
+        reflecting its current contents. Reference sets and datasets
+        whose files have not changed are shared with this backend rather
+        than being reloaded, and this backend is not modified, so that
+        requests in progress are unaffected.
+
+        The shared datasets are not re-parented. Their lazily loaded
+        variant sets and read group sets keep a reference to the backend
+        that first created them, and look up their reference sets by
+        name in it when they are loaded. Datasets are only shared when
+        no reference set has changed, so these lookups return the same
+        reference sets as the new backend would, but the earlier
+        backend is kept in memory until all of them have been loaded.
+        """
+        newBackend = FileSystemBackend(
+            self._dataDir, self._numScanWorkers, self._lazyLoading, self)
+        newBackend.setRequestValidation(self._requestValidation)
+        newBackend.setResponseValidation(self._responseValidation)
+        newBackend.setDefaultPageSize(self._defaultPageSize)
+        newBackend.setMaxResponseLength(self._maxResponseLength)
+        newBackend.setResponseCache(self._responseCache)
+        return newBackend
+
+    def _prefetchFileInfo(self, numWorkers):
+        """
+        Scans all of the data files under the data directory in parallel,
+        storing the results in the file catalog so that the datamodel
+        can then be built without blocking on file I/O.
+        """
+        dataFiles = []
+        for pattern, scanMethod in self.scanPatterns:
+            for dataFile in glob.glob(os.path.join(self._dataDir, pattern)):
+                dataFiles.append((dataFile, scanMethod))
+        datamodel.fileCatalog.prefetch(dataFiles, numWorkers)
@@ -0,0 +1,114 @@
+"""
+Capture of the requests handled by the GA4GH server, so that the mix of
+requests seen by a deployment can be replayed against another server.
+
+Each request is written as a line of JSON to a log file, which is
+rotated once it reaches a maximum size. Rotation is not coordinated
+between processes, so when the server runs several worker processes the
+file name should contain "{pid}", which is replaced by the process ID.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import logging
+import logging.handlers
+import os
+import threading
+
+
+class RequestCapture(object):
+    """
+    Writes the requests handled by the server to a rotating log file.
+    Query arguments that carry credentials are never captured.
+    """
+    excludedArgs = ["key"]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._path = None
+        self._maxBytes = 0
+        self._backupCount = 0
+        self._handler = None
+        self._handlerPid = None
+
+    def configure(self, path, maxBytes=0, backupCount=0):
+        """
+        Starts capturing requests to the file at the specified path,
+        which is rotated once it reaches maxBytes bytes, keeping
+        backupCount old files. If path is None, capture is stopped.
+        """
+        with self._lock:
+            if self._handler is not None:
+                self._handler.close()
+                self._handler = None
+            self._path = path
+            self._maxBytes = maxBytes
+            self._backupCount = backupCount
+
+    def isEnabled(self):
+        """
+        Returns True if requests are being captured.
+        """
+        return self._path is not None
+
+    def _getHandler(self):
+        # The file is opened by the process that writes to it, so that
+        # forked worker processes each open their own file.
+        with self._lock:
+            if self._path is None:
+                return None
+            pid = os.getpid()
+            if self._handler is None or self._handlerPid != pid:
+                self._handler = logging.handlers.RotatingFileHandler(
+                    self._path.replace("{pid}", str(pid)),
+                    maxBytes=self._maxBytes, backupCount=self._backupCount)
+                self._handlerPid = pid
+            return self._handler
+
+    def record(
+            self, method, path, endpoint, args, body, startTime, duration,
+            status, numBytes):
+        """
+        Writes the specified request, which started at startTime (seconds
+        since the epoch) and took duration seconds to produce a response
+        with the specified HTTP status and length in bytes, to the capture
+        file. args is a dictionary of query arguments, and body is the
+        request body as text.
+        """
+        handler = self._getHandler()
+        if handler is None:
+            return
+        entry = {
+            "time": startTime,
+            "method": method,
+            "path": path,
+            "endpoint": endpoint,
+            "args": dict(
+                (key, value) for key, value in args.items()
+                if key not in self.excludedArgs),
+            "body": body,
+            "duration": duration,
+            "status": status,
+            "bytes": numBytes,
+            "pid": os.getpid(),
+        }
+        handler.handle(logging.makeLogRecord(
+            {"msg": json.dumps(entry, sort_keys=True)}))
+
+
+def readCaptureFiles(paths):
+    """
+    Returns an iterator over the requests in the specified capture files,
+    as dictionaries. Rotated files should be given oldest first.
+    """
+    for path in paths:
+        with open(path) as captureFile:
+            for line in captureFile:
+                if line.strip() != "":
+                    yield json.loads(line)
+
+
+# The capture of the requests handled by the server
+requestCapture = RequestCapture()
@@ -9,18 +9,22 @@ from __future__ import unicode_literals
 
 import argparse
 import logging
+import signal
+import threading
 import unittest
 import unittest.loader
 import unittest.suite
 
 import requests
 
+import ga4gh.asyncserver as asyncserver
 import ga4gh.backend as backend
 import ga4gh.client as client
 import ga4gh.converters as converters
 import ga4gh.frontend as frontend
 import ga4gh.configtest as configtest
 import ga4gh.exceptions as exceptions
+import ga4gh.prefork as prefork
 
 
 # the maximum value of a long type in avro = 2**63 - 1
@@ -57,9 +61,44 @@ def addServerOptions(parser):
     parser.add_argument(
         "--dont-use-reloader", default=False, action="store_true",
         help="Don't use the flask reloader")
+    parser.add_argument(
+        "--workers", "-w", default=0, type=int,
+        help=(
+            "The number of worker processes to pre-fork. If this is 0, "
+            "the single process development server is used"))
+    parser.add_argument(
+        "--max-requests", default=None, type=int,
+        help=(
+            "The number of requests a worker process handles before it is "
+            "replaced by a new one"))
+    parser.add_argument(
+        "--async-threads", default=0, type=int,
+        help=(
+            "If this is positive, serve requests with an event loop that "
+            "runs the application on this number of threads"))
+    parser.add_argument(
+        "--keep-alive-timeout", default=60, type=int,
+        help=(
+            "The number of seconds an idle connection is kept open when "
+            "serving requests with an event loop"))
+    parser.add_argument(
+        "--max-body-size", default=2**20, type=int,
+        help=(
+            "The largest request body in bytes accepted when serving "
+            "requests with an event loop"))
     addDisableUrllibWarningsArgument(parser)
 
 
+def _rescanSignalHandler(signalNumber, frame):
+    """
+    Rescans the data directory in a separate thread, so that the
+    server is not blocked while the new data is loaded.
+    """
+    thread = threading.Thread(target=frontend.rescanBackend)
+    thread.daemon = True
+    thread.start()
+
+
 def server_main(parser=None):
     if parser is None:
         parser = argparse.ArgumentParser(
@@ -70,12 +109,50 @@ def server_main(parser=None):
         requests.packages.urllib3.disable_warnings()
     frontend.configure(
         args.config_file, args.config, args.port)
+    canRescan = isinstance(frontend.app.backend, backend.FileSystemBackend)
     sslContext = None
     if args.tls or ("OIDC_PROVIDER" in frontend.app.config):
         sslContext = "adhoc"
-    frontend.app.run(
-        host=args.host, port=args.port,
-        use_reloader=not args.dont_use_reloader, ssl_context=sslContext)
+    if args.workers > 0 and args.async_threads > 0:
+        parser.error("Multiple workers and async threads cannot be combined")
+    if args.workers > 0:
+        if sslContext is not None:
+            parser.error("TLS is not supported with multiple workers")
+        restartCallback = None
+        checkCallback = None
+        checkInterval = None
+        if canRescan:
+            # The master polls the data directory itself rather than in
+            # the rescan thread, so that it never forks while the thread
+            # holds a lock, and replaces its workers after each rescan so
+            # that they all serve the new backend.
+            frontend.stopRescanThread()
+            restartCallback = frontend.rescanBackend
+            checkInterval = frontend.app.config["DATA_RESCAN_INTERVAL"]
+            if checkInterval is not None:
+                checkCallback = frontend.hasBackendChanged
+        server = prefork.PreforkServer(
+            frontend.app, args.host, args.port, args.workers,
+            args.max_requests, restartCallback, checkCallback,
+            checkInterval)
+        server.serveForever()
+    elif args.async_threads > 0:
+        if sslContext is not None:
+            parser.error("TLS is not supported with async threads")
+        server = asyncserver.AsyncWSGIServer(
+            frontend.app, args.host, args.port, args.async_threads,
+            args.keep_alive_timeout, args.max_body_size)
+        signal.signal(
+            signal.SIGTERM, lambda signalNumber, frame: server.stop())
+        if canRescan:
+            signal.signal(signal.SIGHUP, _rescanSignalHandler)
+        server.serveForever()
+    else:
+        if canRescan:
+            signal.signal(signal.SIGHUP, _rescanSignalHandler)
+        frontend.app.run(
+            host=args.host, port=args.port,
+            use_reloader=not args.dont_use_reloader, ssl_context=sslContext)
 
 
 ##############################################################################
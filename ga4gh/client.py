@@ -11,6 +11,7 @@ import logging
 
 import ga4gh.protocol as protocol
 import ga4gh.exceptions as exceptions
+import ga4gh.extensions as extensions
 
 
 class AbstractClient(object):
@@ -245,6 +246,41 @@ class AbstractClient(object):
         return self._runSearchRequest(
             request, "variants", protocol.SearchVariantsResponse)
 
+    def searchMultiVariantSets(
+            self, variantSetIds, start=None, end=None, referenceName=None,
+            callSetIds=None):
+        """
+        Returns an iterator over the Variants fulfilling the specified
+        conditions from all of the specified VariantSets, in order of
+        their start positions.
+
+        :param list variantSetIds: The IDs of the
+            :class:`ga4gh.protocol.VariantSet` objects of interest.
+        :param int start: Required. The beginning of the window (0-based,
+            inclusive) for which overlapping variants should be returned.
+        :param int end: Required. The end of the window (0-based, exclusive)
+            for which overlapping variants should be returned.
+        :param str referenceName: The name of the
+            :class:`ga4gh.protocol.Reference` we wish to return variants from.
+        :param list callSetIds: Only return variant calls which belong to call
+            sets with these IDs, each of which must be in one of the
+            VariantSets. If an empty array, returns variants without any
+            call objects. If null, returns all variant calls.
+
+        :return: An iterator over the :class:`ga4gh.protocol.Variant` objects
+            defined by the query parameters.
+        :rtype: iter
+        """
+        request = extensions.SearchMultiVariantSetsRequest()
+        request.referenceName = referenceName
+        request.start = start
+        request.end = end
+        request.variantSetIds = variantSetIds
+        request.callSetIds = callSetIds
+        request.pageSize = self._pageSize
+        return self._runSearchRequest(
+            request, "variants/multi", protocol.SearchVariantsResponse)
+
     def searchDatasets(self):
         """
         Returns an iterator over the Datasets on the server.
@@ -389,6 +425,141 @@ class AbstractClient(object):
         return self._runSearchRequest(
             request, "reads", protocol.SearchReadsResponse)
 
+    def searchCoverage(
+            self, readGroupId, referenceId, start=None, end=None, binSize=None,
+            includeBaseCounts=None):
+        """
+        Returns an iterator over the CoverageBins summarising the depth of
+        the reads in the specified ReadGroup over a region of a Reference.
+
+        :param str readGroupId: The ID of the
+            :class:`ga4gh.protocol.ReadGroup` of interest.
+        :param str referenceId: The ID of the
+            :class:`ga4gh.protocol.Reference` of interest.
+        :param int start: The start position (0-based) of the region. This
+            defaults to 0.
+        :param int end: The end position (0-based, exclusive) of the region.
+            This defaults to the reference's length.
+        :param int binSize: The number of positions in each bin. This
+            defaults to 1.
+        :param bool includeBaseCounts: If True, each bin also counts the
+            aligned A, C, G and T bases.
+        :return: An iterator over the
+            :class:`ga4gh.extensions.CoverageBin` objects defined by
+            the query parameters.
+        :rtype: iter
+        """
+        request = extensions.SearchCoverageRequest()
+        request.readGroupId = readGroupId
+        request.referenceId = referenceId
+        request.start = start
+        request.end = end
+        request.binSize = binSize
+        request.includeBaseCounts = includeBaseCounts
+        request.pageSize = self._pageSize
+        return self._runSearchRequest(
+            request, "coverage", extensions.SearchCoverageResponse)
+
+    def searchCoverageTiles(
+            self, readGroupId, referenceId, binSize, start=None, end=None):
+        """
+        Returns an iterator over the CoverageBins of the precomputed
+        coverage pyramid of the specified ReadGroup at the level with
+        the specified bin size. The bins are aligned to multiples of the
+        bin size.
+
+        :param str readGroupId: The ID of the
+            :class:`ga4gh.protocol.ReadGroup` of interest.
+        :param str referenceId: The ID of the
+            :class:`ga4gh.protocol.Reference` of interest.
+        :param int binSize: The bin size of the level of the pyramid.
+        :param int start: The start position (0-based) of the region. This
+            defaults to 0.
+        :param int end: The end position (0-based, exclusive) of the region.
+            This defaults to the reference's length.
+        :return: An iterator over the
+            :class:`ga4gh.extensions.CoverageBin` objects overlapping
+            the region.
+        :rtype: iter
+        """
+        request = extensions.SearchCoverageTilesRequest()
+        request.readGroupId = readGroupId
+        request.referenceId = referenceId
+        request.binSize = binSize
+        request.start = start
+        request.end = end
+        request.pageSize = self._pageSize
+        return self._runSearchRequest(
+            request, "coverage/tiles", extensions.SearchCoverageResponse)
+
+    def searchVariantSummaries(
+            self, variantSetId, referenceName, binSize, start=None,
+            end=None):
+        """
+        Returns an iterator over the VariantSummaryBins of the
+        precomputed variant summary pyramid of the specified VariantSet
+        at the level with the specified bin size. The bins are aligned to
+        multiples of the bin size.
+
+        :param str variantSetId: The ID of the
+            :class:`ga4gh.protocol.VariantSet` of interest.
+        :param str referenceName: The name of the
+            :class:`ga4gh.protocol.Reference` of interest.
+        :param int binSize: The bin size of the level of the pyramid.
+        :param int start: The start position (0-based) of the region. This
+            defaults to 0.
+        :param int end: The end position (0-based, exclusive) of the region.
+            This defaults to the reference's length.
+        :return: An iterator over the
+            :class:`ga4gh.extensions.VariantSummaryBin` objects
+            overlapping the region.
+        :rtype: iter
+        """
+        request = extensions.SearchVariantSummariesRequest()
+        request.variantSetId = variantSetId
+        request.referenceName = referenceName
+        request.binSize = binSize
+        request.start = start
+        request.end = end
+        request.pageSize = self._pageSize
+        return self._runSearchRequest(
+            request, "variants/summaries",
+            extensions.SearchVariantSummariesResponse)
+
+    def searchGenotypeMatrix(
+            self, variantSetId, referenceName, start, end, callSetIds=None):
+        """
+        Returns an iterator over the rows of the genotype matrix of the
+        variants in the specified region of the specified VariantSet.
+        Each row holds the genotypes of the columns of the matrix at a
+        variant, encoded as a single string.
+
+        :param str variantSetId: The ID of the
+            :class:`ga4gh.protocol.VariantSet` of interest.
+        :param str referenceName: The name of the
+            :class:`ga4gh.protocol.Reference` of interest.
+        :param int start: The start position (0-based) of the region.
+        :param int end: The end position (0-based, exclusive) of the region.
+        :param list callSetIds: The IDs of the
+            :class:`ga4gh.protocol.CallSet` objects that are the columns
+            of the matrix, in order. This defaults to all of the call
+            sets of the variant set.
+        :return: An iterator over the
+            :class:`ga4gh.extensions.GenotypeMatrixRow` objects of the
+            variants overlapping the region.
+        :rtype: iter
+        """
+        request = extensions.SearchGenotypeMatrixRequest()
+        request.variantSetId = variantSetId
+        request.referenceName = referenceName
+        request.start = start
+        request.end = end
+        request.callSetIds = callSetIds
+        request.pageSize = self._pageSize
+        return self._runSearchRequest(
+            request, "variants/genotypematrix",
+            extensions.SearchGenotypeMatrixResponse)
+
 
 class HttpClient(AbstractClient):
     """
@@ -440,9 +611,24 @@ class HttpClient(AbstractClient):
 
     def _getHttpParameters(self):
         """
-        Returns the basic HTTP parameters we need all requests.
+        Returns the basic HTTP parameters we need all requests. When
+        debug logging is enabled, the server is asked for the timings of
+        the stages of each request.
+        """
+        params = {'key': self._authenticationKey}
+        if self._logger.isEnabledFor(logging.DEBUG):
+            params['serverTiming'] = 'true'
+        return params
+
+    def _logServerTiming(self, response):
+        """
+        Logs the stage timings returned by the server for the specified
+        HTTP response, if there are any.
         """
-        return {'key': self._authenticationKey}
+        serverTiming = response.headers.get('Server-Timing')
+        if serverTiming is not None:
+            self._logger.debug(
+                "Server-Timing for %s: %s", response.url, serverTiming)
 
     def _runSearchPageRequest(
             self, protocolRequest, objectName, protocolResponseClass):
@@ -451,6 +637,7 @@ class HttpClient(AbstractClient):
         self._logger.debug("request:{}".format(data))
         response = self._session.post(
             url, params=self._getHttpParameters(), data=data)
+        self._logServerTiming(response)
         self._checkResponseStatus(response)
         return self._deserializeResponse(response.text, protocolResponseClass)
 
@@ -458,6 +645,7 @@ class HttpClient(AbstractClient):
         urlSuffix = "{objectName}/{id}".format(objectName=objectName, id=id_)
         url = posixpath.join(self._urlPrefix, urlSuffix)
         response = self._session.get(url, params=self._getHttpParameters())
+        self._logServerTiming(response)
         self._checkResponseStatus(response)
         return self._deserializeResponse(response.text, protocolResponseClass)
 
@@ -467,6 +655,7 @@ class HttpClient(AbstractClient):
         params = self._getHttpParameters()
         params.update(request.toJsonDict())
         response = self._session.get(url, params=params)
+        self._logServerTiming(response)
         self._checkResponseStatus(response)
         return self._deserializeResponse(
             response.text, protocol.ListReferenceBasesResponse)
@@ -492,8 +681,13 @@ class LocalClient(AbstractClient):
             "references": self._backend.runSearchReferences,
             "variantsets": self._backend.runSearchVariantSets,
             "variants": self._backend.runSearchVariants,
+            "variants/multi": self._backend.runSearchMultiVariantSets,
+            "variants/summaries": self._backend.runSearchVariantSummaries,
+            "variants/genotypematrix": self._backend.runSearchGenotypeMatrix,
             "readgroupsets": self._backend.runSearchReadGroupSets,
             "reads": self._backend.runSearchReads,
+            "coverage": self._backend.runSearchCoverage,
+            "coverage/tiles": self._backend.runSearchCoverageTiles,
         }
 
     def _runGetRequest(self, objectName, protocolResponseClass, id_):
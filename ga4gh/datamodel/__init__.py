@@ -8,95 +8,442 @@ from __future__ import unicode_literals
 
 import base64
 import collections
+import contextlib
 import glob
+import json
+import multiprocessing
 import os
+import sqlite3
+import threading
 
 import ga4gh.exceptions as exceptions
 
 
 class PysamFileHandleCache(object):
     """
-    Cache for opened file handles. We use a deque which has the
-    advantage to have push/pop operations in O(1) We always add
-    elements on the left of the deque and pop elements from the right.
-    When a file is accessed via getFileHandle, its priority gets
-    updated, it is put at the "top" of the deque.
+    Cache for opened file handles. A handle is checked out of the cache
+    for the exclusive use of a single caller, and checked back in when
+    the caller has finished with it, so that concurrent threads and
+    interleaved generators never share a pysam handle. Idle handles are
+    kept in an OrderedDict in least recently used order, giving O(1)
+    updates. Only idle handles are ever evicted and closed, so a handle
+    that is being iterated over is never closed underneath its user.
+    Eviction is bounded by the number of open handles and, optionally,
+    by the total size of the index files of the open handles, which is
+    an estimate of the memory htslib uses for them.
     """
 
     def __init__(self):
-        self._cache = collections.deque()
-        self._memoTable = dict()
+        self._lock = threading.Lock()
+        # Maps id(handle) -> (dataFile, handle, weight) for idle handles,
+        # with the least recently used handle first.
+        self._idleHandles = collections.OrderedDict()
+        # Maps dataFile -> list of id(handle) for idle handles.
+        self._idleHandleIds = collections.defaultdict(list)
+        # Maps id(handle) -> (dataFile, handle, weight) for handles that
+        # are checked out.
+        self._busyHandles = {}
+        self._discardedHandleIds = set()
+        self._totalWeight = 0
         # Initialize the value even if it will be set up by the config
         self._maxCacheSize = 50
+        self._maxCacheWeight = None
+        self._numHits = 0
+        self._numMisses = 0
+        self._numEvictions = 0
 
     def setMaxCacheSize(self, size):
         """
-        Sets the maximum size of the cache
+        Sets the maximum number of open handles
         """
         if size <= 0:
             raise ValueError(
                 "The size of the cache must be a strictly positive value")
-        self._maxCacheSize = size
+        with self._lock:
+            self._maxCacheSize = size
+            self._evict()
 
-    def _add(self, dataFile, handle):
+    def setMaxCacheWeight(self, weight):
         """
-        Add a file handle to the left of the deque
+        Sets the maximum total size in bytes of the index files of the
+        open handles. If weight is None, the total size is unbounded.
         """
-        self._cache.appendleft((dataFile, handle))
-
-    def _update(self, dataFile, handle):
-        """
-        Update the priority of the file handle. The element is first
-        removed and then added to the left of the deque.
-        """
-        self._cache.remove((dataFile, handle))
-        self._add(dataFile, handle)
-
-    def _removeLru(self):
-        """
-        Remove the least recently used file handle from the cache.
-        The pop method removes an element from the right of the deque.
-        Returns the name of the file that has been removed.
-        """
-        (dataFile, handle) = self._cache.pop()
-        handle.close()
-        return dataFile
+        if weight is not None and weight <= 0:
+            raise ValueError(
+                "The weight of the cache must be a strictly positive value")
+        with self._lock:
+            self._maxCacheWeight = weight
+            self._evict()
+
+    def _getNumHandles(self):
+        return len(self._idleHandles) + len(self._busyHandles)
+
+    def _isFull(self):
+        return (
+            self._getNumHandles() > self._maxCacheSize or (
+                self._maxCacheWeight is not None and
+                self._totalWeight > self._maxCacheWeight))
+
+    def _evict(self):
+        """
+        Closes least recently used idle handles until the cache is
+        within its bounds, or no idle handles remain.
+        """
+        while self._isFull() and len(self._idleHandles) > 0:
+            handleId, (dataFile, handle, weight) = \
+                self._idleHandles.popitem(last=False)
+            self._idleHandleIds[dataFile].remove(handleId)
+            if len(self._idleHandleIds[dataFile]) == 0:
+                del self._idleHandleIds[dataFile]
+            self._totalWeight -= weight
+            self._numEvictions += 1
+            handle.close()
+
+    def checkout(self, dataFile, openMethod):
+        """
+        Returns a handle for the specified file for the exclusive use of
+        the caller, who must return it using checkin. If an idle handle
+        for the file is cached it is reused; otherwise, the file is
+        opened using openMethod.
+        """
+        with self._lock:
+            if dataFile in self._idleHandleIds:
+                handleId = self._idleHandleIds[dataFile].pop()
+                if len(self._idleHandleIds[dataFile]) == 0:
+                    del self._idleHandleIds[dataFile]
+                entry = self._idleHandles.pop(handleId)
+                self._busyHandles[handleId] = entry
+                self._numHits += 1
+                return entry[1]
+            self._numMisses += 1
+        try:
+            handle = openMethod(dataFile)
+        except ValueError:
+            raise exceptions.FileOpenFailedException(dataFile)
+        weight = estimateIndexSize(dataFile)
+        with self._lock:
+            self._busyHandles[id(handle)] = (dataFile, handle, weight)
+            self._totalWeight += weight
+            self._evict()
+        return handle
+
+    def checkin(self, handle):
+        """
+        Returns the specified handle, previously obtained from checkout,
+        to the cache.
+        """
+        with self._lock:
+            handleId = id(handle)
+            entry = self._busyHandles.pop(handleId)
+            if handleId in self._discardedHandleIds:
+                self._discardedHandleIds.remove(handleId)
+                self._totalWeight -= entry[2]
+                handle.close()
+            else:
+                self._idleHandles[handleId] = entry
+                self._idleHandleIds[entry[0]].append(handleId)
+                self._evict()
+
+    @contextlib.contextmanager
+    def fileHandle(self, dataFile, openMethod):
+        """
+        Context manager that checks out a handle for the specified file
+        and checks it back in on exit.
+        """
+        handle = self.checkout(dataFile, openMethod)
+        try:
+            yield handle
+        finally:
+            self.checkin(handle)
+
+    def removeFileHandles(self, directoryPath):
+        """
+        Removes the handles for all files within the specified directory
+        from the cache, so that the files are reopened the next time
+        they are used. Idle handles are closed immediately, and handles
+        that are checked out are closed when they are checked in.
+        """
+        prefix = os.path.join(directoryPath, '')
+        with self._lock:
+            for handleId, (dataFile, handle, weight) in list(
+                    self._idleHandles.items()):
+                if dataFile.startswith(prefix):
+                    del self._idleHandles[handleId]
+                    self._idleHandleIds[dataFile].remove(handleId)
+                    if len(self._idleHandleIds[dataFile]) == 0:
+                        del self._idleHandleIds[dataFile]
+                    self._totalWeight -= weight
+                    handle.close()
+            for handleId, (dataFile, _, _) in self._busyHandles.items():
+                if dataFile.startswith(prefix):
+                    self._discardedHandleIds.add(handleId)
+
+    def clear(self):
+        """
+        Removes all handles from the cache. Idle handles are closed
+        immediately, and handles that are checked out are closed when
+        they are checked in.
+        """
+        with self._lock:
+            for _, handle, _ in self._idleHandles.values():
+                handle.close()
+            self._idleHandles.clear()
+            self._idleHandleIds.clear()
+            self._discardedHandleIds.update(self._busyHandles.keys())
+            self._totalWeight = sum(
+                weight for _, _, weight in self._busyHandles.values())
+
+    def getStatistics(self):
+        """
+        Returns a dictionary of the number of cache hits, misses and
+        evictions since the cache was created, and the number of open
+        handles and their total index size.
+        """
+        with self._lock:
+            return {
+                "hits": self._numHits,
+                "misses": self._numMisses,
+                "evictions": self._numEvictions,
+                "openHandles": self._getNumHandles(),
+                "indexSize": self._totalWeight,
+            }
 
     def getCachedFiles(self):
         """
-        Returns all file names stored in the cache.
+        Returns the names of all files with open handles.
         """
-        return self._memoTable.keys()
+        with self._lock:
+            return list(set(
+                entry[0] for entry in self._idleHandles.values() +
+                self._busyHandles.values()))
 
-    def getFileHandle(self, dataFile, openMethod):
-        """
-        Returns handle associated to the filename. If the file is
-        already opened, update its priority in the cache and return
-        its handle. Otherwise, open the file using openMethod, store
-        it in the cache and return the corresponding handle.
-        """
-        if dataFile in self._memoTable:
-            handle = self._memoTable[dataFile]
-            self._update(dataFile, handle)
-            return handle
-        else:
-            try:
-                handle = openMethod(dataFile)
-            except ValueError:
-                raise exceptions.FileOpenFailedException(dataFile)
 
-            self._memoTable[dataFile] = handle
-            self._add(dataFile, handle)
-            if len(self._memoTable) > self._maxCacheSize:
-                dataFile = self._removeLru()
-                del self._memoTable[dataFile]
-            return handle
+def estimateIndexSize(dataFile):
+    """
+    Returns the total size in bytes of the index files for the specified
+    data file, as an estimate of the memory used by an open handle.
+    """
+    size = 0
+    for suffix in PysamFileCatalog.indexSuffixes:
+        try:
+            size += os.path.getsize(dataFile + suffix)
+        except OSError:
+            pass
+    return size
 
 
 # LRU cache of open file handles
 fileHandleCache = PysamFileHandleCache()
 
 
+class PysamFileCatalog(object):
+    """
+    Catalog of the information extracted from the headers and indexes
+    of data files when the server starts up. Each entry is keyed by the
+    absolute path of the data file and remains valid only as long as
+    the size and modification time of the file and its index are
+    unchanged. If a database path is set, the catalog is persisted in
+    an SQLite database so that a restarted server only needs to rescan
+    the files that have changed since the catalog was written. As lazily
+    loaded objects scan their files on request threads while a rescan
+    may be committing the catalog, its state is guarded by a lock.
+    """
+    indexSuffixes = ['.bai', '.tbi', '.csi', '.fai', '.gzi']
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dirtyPaths = set()
+        self._removedPaths = set()
+        self._seenPaths = set()
+        self._databasePath = None
+
+    def setDatabasePath(self, databasePath):
+        """
+        Sets the path of the SQLite database used to persist the
+        catalog and loads any entries already stored there. If the
+        path is None, the catalog is kept in memory only.
+        """
+        entries = {}
+        if databasePath is not None:
+            connection = self._connect(databasePath)
+            try:
+                rows = connection.execute(
+                    "SELECT path, signature, info FROM files")
+                for path, signature, info in rows:
+                    entries[path] = (json.loads(signature), json.loads(info))
+            finally:
+                connection.close()
+        with self._lock:
+            self._databasePath = databasePath
+            self._entries = entries
+            self._dirtyPaths = set()
+            self._removedPaths = set()
+            self._seenPaths = set()
+
+    def _connect(self, databasePath):
+        connection = sqlite3.connect(databasePath)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, signature TEXT, info TEXT)")
+        return connection
+
+    def getSignature(self, dataFile):
+        """
+        Returns the size and modification time of the specified data
+        file and any of its index files, in a form that can be
+        compared with the signature stored in the catalog.
+        """
+        signature = []
+        for suffix in [''] + self.indexSuffixes:
+            try:
+                stat = os.stat(dataFile + suffix)
+            except OSError:
+                continue
+            signature.append([suffix, stat.st_size, stat.st_mtime])
+        return signature
+
+    def _isCurrent(self, path, signature):
+        return path in self._entries and self._entries[path][0] == signature
+
+    def getFileInfo(self, dataFile, scanMethod):
+        """
+        Returns the information for the specified data file. If the
+        catalog holds an up-to-date entry for the file it is returned
+        directly; otherwise, the file is scanned using scanMethod and
+        the result is stored in the catalog.
+        """
+        path = os.path.abspath(dataFile)
+        signature = self.getSignature(path)
+        with self._lock:
+            self._seenPaths.add(path)
+            if self._isCurrent(path, signature):
+                return self._entries[path][1]
+        info = scanMethod(dataFile)
+        self.addFileInfo(path, signature, info)
+        return info
+
+    def prefetch(self, dataFiles, numWorkers):
+        """
+        Scans the specified list of (dataFile, scanMethod) tuples that
+        do not have up-to-date entries in the catalog using a pool of
+        numWorkers processes. The scan methods must therefore be module
+        level functions. Files that cannot be scanned are skipped, so
+        that the corresponding errors are raised when the datamodel
+        is built.
+        """
+        pending = []
+        for dataFile, scanMethod in dataFiles:
+            path = os.path.abspath(dataFile)
+            signature = self.getSignature(path)
+            with self._lock:
+                isCurrent = self._isCurrent(path, signature)
+            if not isCurrent:
+                pending.append((path, signature, scanMethod))
+        if len(pending) == 0:
+            return
+        pool = multiprocessing.Pool(numWorkers)
+        try:
+            infos = pool.map(
+                _scanFileOrNone,
+                [(pendingPath, scanMethod)
+                 for pendingPath, _, scanMethod in pending])
+        finally:
+            pool.close()
+            pool.join()
+        for (path, signature, _), info in zip(pending, infos):
+            if info is not None:
+                self.addFileInfo(path, signature, info)
+
+    def addFileInfo(self, dataFile, signature, info):
+        """
+        Stores the specified information for the data file with the
+        specified signature in the catalog.
+        """
+        path = os.path.abspath(dataFile)
+        # Round trip the info through JSON so that entries are the same
+        # whether they were loaded from the database or freshly scanned.
+        info = json.loads(json.dumps(info))
+        with self._lock:
+            self._entries[path] = (signature, info)
+            self._dirtyPaths.add(path)
+            self._removedPaths.discard(path)
+
+    def startScan(self):
+        """
+        Starts a scan of all of the data files of a data directory, which
+        is ended by removeUnseenFiles.
+        """
+        with self._lock:
+            self._seenPaths = set()
+
+    def removeUnseenFiles(self, directoryPath):
+        """
+        Removes the entries for the files within the specified directory
+        whose information has not been requested since startScan was
+        called, which are the files that have been deleted or renamed
+        since the catalog was written. The entries are removed from the
+        database on the next commit.
+        """
+        prefix = os.path.join(os.path.abspath(directoryPath), '')
+        with self._lock:
+            for path in list(self._entries.keys()):
+                if path.startswith(prefix) and path not in self._seenPaths:
+                    del self._entries[path]
+                    self._dirtyPaths.discard(path)
+                    self._removedPaths.add(path)
+
+    def getCatalogedFiles(self):
+        """
+        Returns the paths of all files in the catalog.
+        """
+        with self._lock:
+            return list(self._entries.keys())
+
+    def commit(self):
+        """
+        Writes the entries that have been added or removed since the
+        last commit to the database, if one has been set. The lock is
+        held while writing, so that commits from different threads are
+        applied in order and no entry added meanwhile is lost.
+        """
+        with self._lock:
+            if self._databasePath is not None and (
+                    len(self._dirtyPaths) > 0 or
+                    len(self._removedPaths) > 0):
+                connection = self._connect(self._databasePath)
+                try:
+                    with connection:
+                        connection.executemany(
+                            "INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+                            [(path, json.dumps(self._entries[path][0]),
+                              json.dumps(self._entries[path][1]))
+                             for path in self._dirtyPaths])
+                        connection.executemany(
+                            "DELETE FROM files WHERE path = ?",
+                            [(path,) for path in self._removedPaths])
+                finally:
+                    connection.close()
+            self._dirtyPaths = set()
+            self._removedPaths = set()
+
+
+def _scanFileOrNone(args):
+    """
+    Scans a data file in a worker process, returning None if the file
+    cannot be scanned.
+    """
+    dataFile, scanMethod = args
+    try:
+        return scanMethod(dataFile)
+    except Exception:
+        return None
+
+
+# Catalog of information extracted from data files
+fileCatalog = PysamFileCatalog()
+
+
 class CompoundId(object):
     """
     Base class for an id composed of several different parts, separated
@@ -336,6 +683,65 @@ class DatamodelObject(object):
         return self._parentContainer
 
 
+class LazyDatamodelObject(object):
+    """
+    A placeholder for a DatamodelObject that is expensive to construct.
+    The ID and localId of the object are available immediately, so that
+    the placeholder can be registered with its parent container, but the
+    object itself is only constructed when any other attribute is first
+    accessed. The object is constructed by calling objectClass with the
+    parentContainer (if it is not None), localId and args, after which
+    the information of the data files it scanned is committed to the
+    file catalog.
+    """
+    def __init__(self, parentContainer, localId, objectClass, *args):
+        self._parentContainer = parentContainer
+        self._localId = localId
+        parentId = None
+        if parentContainer is not None:
+            parentId = parentContainer.getCompoundId()
+        self._compoundId = objectClass.compoundIdClass(parentId, localId)
+        self._objectClass = objectClass
+        self._args = args
+        self._object = None
+        self._lock = threading.Lock()
+
+    def getId(self):
+        return str(self._compoundId)
+
+    def getCompoundId(self):
+        return self._compoundId
+
+    def getLocalId(self):
+        return self._localId
+
+    def getParentContainer(self):
+        return self._parentContainer
+
+    def isLoaded(self):
+        """
+        Returns True if the underlying object has been constructed.
+        """
+        return self._object is not None
+
+    def getObject(self):
+        """
+        Returns the underlying object, constructing it if necessary.
+        """
+        if self._object is None:
+            with self._lock:
+                if self._object is None:
+                    args = (self._localId,) + self._args
+                    if self._parentContainer is not None:
+                        args = (self._parentContainer,) + args
+                    self._object = self._objectClass(*args)
+                    fileCatalog.commit()
+        return self._object
+
+    def __getattr__(self, name):
+        return getattr(self.getObject(), name)
+
+
 class PysamDatamodelMixin(object):
     """
     A mixin class to simplify working with DatamodelObjects based on
@@ -443,11 +849,23 @@ class PysamDatamodelMixin(object):
         numDataFiles = 0
         for pattern in patterns:
             scanPath = os.path.join(dataDir, pattern)
-            for filename in glob.glob(scanPath):
+            for filename in sorted(glob.glob(scanPath)):
                 self._addDataFile(filename)
                 numDataFiles += 1
         if numDataFiles == 0:
             raise exceptions.EmptyDirException(dataDir, patterns)
 
-    def getFileHandle(self, dataFile):
-        return fileHandleCache.getFileHandle(dataFile, self.openFile)
+    def fileHandle(self, dataFile):
+        """
+        Returns a context manager providing a handle for the specified
+        data file, opened using self.openFile, for exclusive use within
+        the managed block.
+        """
+        return fileHandleCache.fileHandle(dataFile, self.openFile)
+
+    def getFileInfo(self, dataFile):
+        """
+        Returns the information extracted from the specified data file
+        by self.scanFile, using the file catalog where possible.
+        """
+        return fileCatalog.getFileInfo(dataFile, self.scanFile)
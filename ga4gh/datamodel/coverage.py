@@ -0,0 +1,216 @@
+"""
+Precomputed multi-resolution coverage pyramids for read group sets.
+
+A coverage pyramid is stored in a sidecar file next to a BAM file. It
+is a pyramid, in the format described in ga4gh.datamodel.pyramids, with
+a group for each read group in the BAM and a single field holding the
+number of aligned bases in each bin.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import array
+import os
+
+import pysam
+
+import ga4gh.datamodel.pyramids as pyramids
+import ga4gh.extensions as extensions
+
+
+PYRAMID_SUFFIX = ".coverage"
+DEFAULT_BIN_SIZES = [1, 100, 10000, 1000000]
+
+_magic = b"GA4GHCOV"
+_itemCode = pyramids.UNSIGNED_INT
+_fields = [("alignedBases", _itemCode)]
+
+# The CIGAR operations that align read bases to the reference (M, =
+# and X), that consume the reference only (D and N) and that consume
+# the read only (I and S).
+ALIGNED_OPERATIONS = frozenset([0, 7, 8])
+REFERENCE_OPERATIONS = frozenset([2, 3])
+QUERY_OPERATIONS = frozenset([1, 4])
+
+
+def getAlignedBlocks(position, cigar):
+    """
+    Returns an iterator over the (referenceStart, referenceEnd,
+    queryStart) triples of the blocks of a read aligned at the specified
+    reference position with the specified CIGAR, a sequence of
+    (operation, length) pairs using the pysam operation codes.
+    """
+    queryPosition = 0
+    for operation, length in cigar:
+        if operation in ALIGNED_OPERATIONS:
+            yield position, position + length, queryPosition
+            position += length
+            queryPosition += length
+        elif operation in REFERENCE_OPERATIONS:
+            position += length
+        elif operation in QUERY_OPERATIONS:
+            queryPosition += length
+
+
+def writeCoveragePyramid(
+        fileObject, binSizes, readGroupNames, references, getDepths,
+        signature=None):
+    """
+    Writes the coverage pyramid of the specified read groups over the
+    specified (name, length) references to the specified file object.
+    The per-base depths are obtained one window at a time by calling
+    getDepths(readGroupName, referenceName, start, end), which must
+    return an array of end - start depths, or None if there are no
+    reads in the window.
+    """
+    def getValues(readGroupName, referenceName, start, end):
+        depths = getDepths(readGroupName, referenceName, start, end)
+        if depths is None:
+            return None
+        smallestBinSize = binSizes[0]
+        if smallestBinSize > 1:
+            depths = [
+                sum(depths[i:i + smallestBinSize])
+                for i in range(0, len(depths), smallestBinSize)]
+        return {"alignedBases": depths}
+
+    pyramids.writePyramid(
+        fileObject, _magic, binSizes, _fields, readGroupNames, references,
+        getValues, signature)
+
+
+def getSamFileDepths(samFile, referenceName, start, end, readGroupName=None):
+    """
+    Returns the array of the depth of the reads in the specified pysam
+    AlignmentFile at each position in [start, end) of the specified
+    reference. If readGroupName is not None, only the reads with that
+    RG tag are counted, and None is returned if there are no aligned
+    bases in the window. The aligned blocks of the reads are accumulated
+    as the differences between neighbouring depths, so each read costs
+    one update per block rather than one per base.
+    """
+    # Most windows of a large reference have no reads, so the array is
+    # only allocated once a block is found.
+    differences = None
+    for read in samFile.fetch(referenceName, start, end):
+        if readGroupName is not None:
+            tags = dict(read.tags)
+            if tags.get('RG') != readGroupName:
+                continue
+        if not read.cigar:
+            continue
+        for blockStart, blockEnd, _ in getAlignedBlocks(
+                read.reference_start, read.cigar):
+            blockStart = max(blockStart, start)
+            blockEnd = min(blockEnd, end)
+            if blockStart < blockEnd:
+                if differences is None:
+                    differences = array.array(b"l", [0]) * (end - start + 1)
+                differences[blockStart - start] += 1
+                differences[blockEnd - start] -= 1
+    if differences is None:
+        return None
+    depths = array.array(_itemCode, [0]) * (end - start)
+    depth = 0
+    for i in range(end - start):
+        depth += differences[i]
+        depths[i] = depth
+    return depths
+
+
+def buildCoveragePyramid(
+        samFilePath, binSizes=DEFAULT_BIN_SIZES, outputPath=None):
+    """
+    Builds the coverage pyramid of every read group of the specified
+    BAM file and writes it to outputPath, which is the BAM file path
+    with PYRAMID_SUFFIX by default. The pyramid is written to a
+    temporary file that is then renamed, so that a server never maps
+    a partly written pyramid.
+    """
+    if outputPath is None:
+        outputPath = samFilePath + PYRAMID_SUFFIX
+    signature = pyramids.getDataSignature(samFilePath)
+    samFile = pysam.AlignmentFile(samFilePath)
+    try:
+        header = samFile.header
+        if 'RG' in header and len(header['RG']) > 0:
+            readGroupNames = [
+                readGroupHeader['ID'] for readGroupHeader in header['RG']]
+            filterReads = True
+        else:
+            readGroupNames = ['default']
+            filterReads = False
+        references = list(zip(samFile.references, samFile.lengths))
+
+        def getDepths(readGroupName, referenceName, start, end):
+            if not filterReads:
+                readGroupName = None
+            return getSamFileDepths(
+                samFile, referenceName, start, end, readGroupName)
+
+        temporaryPath = outputPath + ".tmp"
+        with open(temporaryPath, "wb") as fileObject:
+            writeCoveragePyramid(
+                fileObject, binSizes, readGroupNames, references, getDepths,
+                signature)
+        os.rename(temporaryPath, outputPath)
+    finally:
+        samFile.close()
+    return outputPath
+
+
+class CoveragePyramid(pyramids.Pyramid):
+    """
+    A coverage pyramid read from a buffer holding the contents of the
+    pyramid file at the specified path, which is usually a memory map
+    of the file.
+    """
+    magic = _magic
+
+    def getReadGroupNames(self):
+        """
+        Returns the names of the read groups in this pyramid.
+        """
+        return self.getGroupNames()
+
+    def getAlignedBases(
+            self, readGroupName, referenceName, binSize, startBin, endBin):
+        """
+        Returns the array of the numbers of aligned bases in the bins
+        with indexes in [startBin, endBin) of the specified level.
+        """
+        return self.getValues(
+            readGroupName, referenceName, "alignedBases", binSize, startBin,
+            endBin)
+
+    def getCoverage(
+            self, readGroupName, referenceName, binSize, startBin, endBin):
+        """
+        Returns the list of CoverageBins with indexes in [startBin,
+        endBin) of the specified level. The last bin of a reference is
+        clipped to its end.
+        """
+        alignedBases = self.getAlignedBases(
+            readGroupName, referenceName, binSize, startBin, endBin)
+        return getCoverageBins(
+            alignedBases, binSize, startBin,
+            self.getReferenceLength(referenceName))
+
+
+def getCoverageBins(alignedBases, binSize, startBin, length):
+    """
+    Returns the list of CoverageBins of binSize bases starting with the
+    bin with index startBin, given the numbers of aligned bases in each
+    bin. The last bin of the reference of the specified length is
+    clipped to its end.
+    """
+    coverageBins = []
+    for binIndex, numBases in enumerate(alignedBases, startBin):
+        coverageBin = extensions.CoverageBin()
+        coverageBin.start = binIndex * binSize
+        coverageBin.end = min(coverageBin.start + binSize, length)
+        coverageBin.meanDepth = numBases / (
+            coverageBin.end - coverageBin.start)
+        coverageBins.append(coverageBin)
+    return coverageBins
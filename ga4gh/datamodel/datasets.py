@@ -133,7 +133,7 @@ class SimulatedDataset(AbstractDataset):
             self, localId, referenceSet, randomSeed=0,
             numVariantSets=1, numCalls=1, variantDensity=0.5,
             numReadGroupSets=1, numReadGroupsPerReadGroupSet=1,
-            numAlignments=1):
+            readDepth=10, readLength=100):
         super(SimulatedDataset, self).__init__(localId)
         self._description = "Simulated dataset {}".format(localId)
         # Variants
@@ -141,7 +141,7 @@ class SimulatedDataset(AbstractDataset):
             localId = "simVs{}".format(i)
             seed = randomSeed + i
             variantSet = variants.SimulatedVariantSet(
-                self, localId, seed, numCalls, variantDensity)
+                self, localId, seed, numCalls, variantDensity, referenceSet)
             self.addVariantSet(variantSet)
         # Reads
         for i in range(numReadGroupSets):
@@ -149,35 +149,46 @@ class SimulatedDataset(AbstractDataset):
             seed = randomSeed + i
             readGroupSet = reads.SimulatedReadGroupSet(
                 self, localId, referenceSet, seed,
-                numReadGroupsPerReadGroupSet, numAlignments)
+                numReadGroupsPerReadGroupSet, readDepth, readLength)
             self.addReadGroupSet(readGroupSet)
 
 
 class FileSystemDataset(AbstractDataset):
     """
-    A dataset based on the file system
+    A dataset based on the file system. If lazyLoading is True, the
+    variant sets and read group sets are only opened when first used.
     """
-    def __init__(self, localId, dataDir, backend):
+    def __init__(self, localId, dataDir, backend, lazyLoading=False):
         super(FileSystemDataset, self).__init__(localId)
         self._dataDir = dataDir
         self._setMetadata()
 
         # Variants
         variantSetDir = os.path.join(dataDir, "variants")
-        for localId in os.listdir(variantSetDir):
+        for localId in sorted(os.listdir(variantSetDir)):
             relativePath = os.path.join(variantSetDir, localId)
             if os.path.isdir(relativePath):
-                variantSet = variants.HtslibVariantSet(
-                    self, localId, relativePath, backend)
+                if lazyLoading:
+                    variantSet = datamodel.LazyDatamodelObject(
+                        self, localId, variants.HtslibVariantSet,
+                        relativePath, backend)
+                else:
+                    variantSet = variants.HtslibVariantSet(
+                        self, localId, relativePath, backend)
                 self.addVariantSet(variantSet)
         # Reads
         readGroupSetDir = os.path.join(dataDir, "reads")
-        for filename in os.listdir(readGroupSetDir):
+        for filename in sorted(os.listdir(readGroupSetDir)):
             if fnmatch.fnmatch(filename, '*.bam'):
                 localId, _ = os.path.splitext(filename)
                 bamPath = os.path.join(readGroupSetDir, filename)
-                readGroupSet = reads.HtslibReadGroupSet(
-                    self, localId, bamPath, backend)
+                if lazyLoading:
+                    readGroupSet = datamodel.LazyDatamodelObject(
+                        self, localId, reads.HtslibReadGroupSet,
+                        bamPath, backend)
+                else:
+                    readGroupSet = reads.HtslibReadGroupSet(
+                        self, localId, bamPath, backend)
                 self.addReadGroupSet(readGroupSet)
 
     def _setMetadata(self):
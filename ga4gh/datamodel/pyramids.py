@@ -0,0 +1,297 @@
+"""
+Precomputed multi-resolution summaries of data files.
+
+A pyramid is stored in a sidecar file next to the data file it
+summarises. It holds, for each of its groups and each reference, one
+level per bin size for each of its fields, which is an array of the
+values of the field summed over consecutive bins of that size. The file
+is memory mapped, so a range of bins at any level can be read in time
+proportional to the number of bins, however large the region they
+cover.
+
+The file consists of a magic string identifying the kind of pyramid,
+the length of a JSON header, the header itself and then, from the next
+multiple of 8 bytes, the levels as little-endian arrays of unsigned 32
+bit integers or doubles, according to the type of their field. The
+header gives the bin sizes, the fields, the size and modification time
+of the data file the pyramid was built from, and the offset of each
+level from the start of the levels.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import array
+import json
+import mmap
+import os
+import struct
+import sys
+
+import ga4gh.exceptions as exceptions
+
+
+# The array typecodes of the fields of a pyramid
+UNSIGNED_INT = b"I"
+DOUBLE = b"d"
+
+_version = 2
+_magicLength = 8
+_headerLengthFormat = b"<I"
+_headerLengthSize = struct.calcsize(_headerLengthFormat)
+_maxValues = {UNSIGNED_INT: 2**32 - 1}
+
+
+def getDataSignature(dataFile):
+    """
+    Returns the size and modification time of the specified data file,
+    which identify the version of the data a pyramid was built from.
+    """
+    stat = os.stat(dataFile)
+    return [stat.st_size, stat.st_mtime]
+
+
+def checkBinSizes(binSizes):
+    """
+    Raises a BadBinSizeException unless the specified bin sizes are
+    positive and increasing, and each is a multiple of the one before.
+    """
+    if len(binSizes) == 0:
+        raise exceptions.BadBinSizeException(binSizes)
+    for binSize in binSizes:
+        if binSize <= 0:
+            raise exceptions.BadBinSizeException(binSize)
+    # Each level must be made of whole bins of the level below, so that
+    # a window of the largest bin size fills whole bins at every level.
+    for smaller, larger in zip(binSizes, binSizes[1:]):
+        if larger <= smaller or larger % smaller != 0:
+            raise exceptions.BadBinSizeException(larger)
+
+
+def _getItemSize(typecode):
+    return struct.calcsize(b"<" + typecode)
+
+
+def _getDataStart(headerLength):
+    headerEnd = _magicLength + _headerLengthSize + headerLength
+    return headerEnd + (-headerEnd % 8)
+
+
+class PyramidWriter(object):
+    """
+    Writes a pyramid to a seekable binary file object. The layout of the
+    file is fixed by the (name, typecode) pairs of the fields, the group
+    names and the (name, length) pairs of the references, and the values
+    are then written in windows of the largest bin size using
+    writeWindow. The levels are zero until they are written, so windows
+    without data need not be written, and are left as holes in a sparse
+    file.
+    """
+    def __init__(
+            self, fileObject, magic, binSizes, fields, groupNames,
+            references, signature=None):
+        if len(magic) != _magicLength:
+            raise ValueError("The magic string must be 8 bytes long")
+        checkBinSizes(binSizes)
+        self._fileObject = fileObject
+        self._binSizes = list(binSizes)
+        self._fields = list(fields)
+        offsets = {}
+        dataLength = 0
+        for groupName in groupNames:
+            offsets[groupName] = {}
+            for referenceName, length in references:
+                referenceOffsets = {}
+                for fieldName, typecode in self._fields:
+                    fieldOffsets = []
+                    for binSize in self._binSizes:
+                        fieldOffsets.append(dataLength)
+                        numBins = (length + binSize - 1) // binSize
+                        dataLength += numBins * _getItemSize(typecode)
+                    referenceOffsets[fieldName] = fieldOffsets
+                offsets[groupName][referenceName] = referenceOffsets
+        header = {
+            "version": _version,
+            "binSizes": self._binSizes,
+            "fields": [
+                [name, typecode.decode("ascii")]
+                for name, typecode in self._fields],
+            "signature": signature,
+            "groupNames": list(groupNames),
+            "references": [[name, length] for name, length in references],
+            "offsets": offsets,
+        }
+        headerBytes = json.dumps(header).encode("utf-8")
+        self._offsets = offsets
+        self._dataStart = _getDataStart(len(headerBytes))
+        fileObject.seek(0)
+        fileObject.write(magic)
+        fileObject.write(struct.pack(_headerLengthFormat, len(headerBytes)))
+        fileObject.write(headerBytes)
+        fileObject.write(b"\0" * (self._dataStart - fileObject.tell()))
+        if dataLength > 0:
+            fileObject.seek(self._dataStart + dataLength - 1)
+            fileObject.write(b"\0")
+
+    def getWindowSize(self):
+        """
+        Returns the size of the windows that values are written in.
+        """
+        return self._binSizes[-1]
+
+    def writeWindow(self, groupName, referenceName, windowStart, values):
+        """
+        Writes the bins of every level for the window of the specified
+        reference starting at windowStart, given a dictionary mapping
+        field names to the sequences of their values in the bins of the
+        smallest size in the window. Fields missing from the dictionary
+        are left as zero. Only the last window of a reference may be
+        shorter than the window size.
+        """
+        offsets = self._offsets[groupName][referenceName]
+        smallestBinSize = self._binSizes[0]
+        for fieldName, typecode in self._fields:
+            if fieldName not in values:
+                continue
+            fieldValues = values[fieldName]
+            for binSize, offset in zip(
+                    self._binSizes, offsets[fieldName]):
+                ratio = binSize // smallestBinSize
+                if ratio == 1:
+                    sums = fieldValues
+                else:
+                    sums = [
+                        sum(fieldValues[i:i + ratio])
+                        for i in range(0, len(fieldValues), ratio)]
+                if not isinstance(sums, array.array) or \
+                        sums.typecode != typecode:
+                    if typecode in _maxValues:
+                        maxValue = _maxValues[typecode]
+                        sums = [min(value, maxValue) for value in sums]
+                    sums = array.array(typecode, sums)
+                if sys.byteorder == "big":
+                    sums = array.array(typecode, sums)
+                    sums.byteswap()
+                self._fileObject.seek(
+                    self._dataStart + offset +
+                    windowStart // binSize * _getItemSize(typecode))
+                self._fileObject.write(sums.tostring())
+
+
+def writePyramid(
+        fileObject, magic, binSizes, fields, groupNames, references,
+        getValues, signature=None):
+    """
+    Writes the pyramid of the specified groups over the specified
+    (name, length) references to the specified file object. The values
+    are obtained one window at a time by calling getValues(groupName,
+    referenceName, start, end), which must return the dictionary of
+    values described in PyramidWriter.writeWindow, or None if there is
+    no data in the window.
+    """
+    writer = PyramidWriter(
+        fileObject, magic, binSizes, fields, groupNames, references,
+        signature)
+    windowSize = writer.getWindowSize()
+    for groupName in groupNames:
+        for referenceName, length in references:
+            for start in range(0, length, windowSize):
+                end = min(start + windowSize, length)
+                values = getValues(groupName, referenceName, start, end)
+                if values is not None:
+                    writer.writeWindow(groupName, referenceName, start, values)
+
+
+class Pyramid(object):
+    """
+    A pyramid read from a buffer holding the contents of the pyramid
+    file at the specified path, which is usually a memory map of the
+    file. Subclasses set magic to the magic string of their kind of
+    pyramid.
+    """
+    magic = None
+
+    def __init__(self, buffer_, path=None):
+        if buffer_[:_magicLength] != self.magic:
+            raise exceptions.FileOpenFailedException(path)
+        headerStart = _magicLength + _headerLengthSize
+        headerLength, = struct.unpack(
+            _headerLengthFormat, buffer_[_magicLength:headerStart])
+        header = json.loads(
+            buffer_[headerStart:headerStart + headerLength].decode("utf-8"))
+        if header.get("version") != _version:
+            raise exceptions.FileOpenFailedException(path)
+        self._buffer = buffer_
+        self._dataStart = _getDataStart(headerLength)
+        self._binSizes = header["binSizes"]
+        self._typecodes = dict(
+            (name, typecode.encode("ascii"))
+            for name, typecode in header["fields"])
+        self._signature = header["signature"]
+        self._groupNames = header["groupNames"]
+        self._referenceLengths = dict(header["references"])
+        self._offsets = header["offsets"]
+
+    @classmethod
+    def open(cls, path):
+        """
+        Returns the pyramid in the file at the specified path, which is
+        memory mapped for as long as the pyramid is in use.
+        """
+        with open(path, "rb") as fileObject:
+            buffer_ = mmap.mmap(
+                fileObject.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer_, path)
+
+    def getBinSizes(self):
+        """
+        Returns the list of the bin sizes of the levels of this pyramid.
+        """
+        return self._binSizes
+
+    def getGroupNames(self):
+        """
+        Returns the names of the groups in this pyramid.
+        """
+        return self._groupNames
+
+    def getReferenceLength(self, referenceName):
+        """
+        Returns the length of the specified reference, or None if it is
+        not in this pyramid.
+        """
+        return self._referenceLengths.get(referenceName)
+
+    def isCurrent(self, dataFile):
+        """
+        Returns True if this pyramid was built from the current version
+        of the specified data file.
+        """
+        return self._signature == getDataSignature(dataFile)
+
+    def getNumBins(self, referenceName, binSize):
+        """
+        Returns the number of bins of the specified size covering the
+        specified reference.
+        """
+        length = self._referenceLengths[referenceName]
+        return (length + binSize - 1) // binSize
+
+    def getValues(
+            self, groupName, referenceName, fieldName, binSize, startBin,
+            endBin):
+        """
+        Returns the array of the values of the specified field in the
+        bins with indexes in [startBin, endBin) of the specified level.
+        """
+        level = self._binSizes.index(binSize)
+        offset = self._offsets[groupName][referenceName][fieldName][level]
+        typecode = self._typecodes[fieldName]
+        itemSize = _getItemSize(typecode)
+        start = self._dataStart + offset + startBin * itemSize
+        values = array.array(typecode)
+        values.fromstring(
+            self._buffer[start:start + (endBin - startBin) * itemSize])
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
@@ -6,14 +6,23 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import array
+import binascii
+import bisect
 import datetime
+import hashlib
+import heapq
 import random
 
 import pysam
 
 import ga4gh.datamodel as datamodel
+import ga4gh.datamodel.coverage as coverage
+import ga4gh.datamodel.pyramids as pyramids
 import ga4gh.datamodel.references as references
 import ga4gh.exceptions as exceptions
+import ga4gh.extensions as extensions
+import ga4gh.metrics as metrics
 import ga4gh.protocol as protocol
 
 
@@ -86,6 +95,260 @@ class SamFlags(object):
         return flagAttr | flag
 
 
+class ReadAlignmentFilter(object):
+    """
+    A predicate on read alignments, evaluated on raw pysam
+    AlignedSegments so that the reads it rejects are never converted.
+    A read matches if its mapping quality is at least minMappingQuality,
+    its flag has all of the bits in requiredFlags and none of those in
+    excludedFlags, and its length is between minReadLength and
+    maxReadLength inclusive. Any of these may be None.
+    """
+    maxFlag = 0xfff
+
+    def __init__(
+            self, minMappingQuality=None, requiredFlags=None,
+            excludedFlags=None, minReadLength=None, maxReadLength=None):
+        for attrName, value in [
+                ("minMappingQuality", minMappingQuality),
+                ("requiredFlags", requiredFlags),
+                ("excludedFlags", excludedFlags),
+                ("minReadLength", minReadLength),
+                ("maxReadLength", maxReadLength)]:
+            if value is not None and value < 0:
+                raise exceptions.BadReadFilterException(attrName, value)
+        for attrName, value in [
+                ("requiredFlags", requiredFlags),
+                ("excludedFlags", excludedFlags)]:
+            if value is not None and value & ~self.maxFlag:
+                raise exceptions.BadReadFilterException(attrName, value)
+        self._minMappingQuality = minMappingQuality
+        self._requiredFlags = requiredFlags or 0
+        self._excludedFlags = excludedFlags or 0
+        self._minReadLength = minReadLength
+        self._maxReadLength = maxReadLength
+
+    def isEmpty(self):
+        """
+        Returns True if this filter accepts every read.
+        """
+        return (
+            self._minMappingQuality is None and self._requiredFlags == 0 and
+            self._excludedFlags == 0 and self._minReadLength is None and
+            self._maxReadLength is None)
+
+    def matches(self, mappingQuality, flag, readLength):
+        """
+        Returns True if a read with the specified mapping quality, SAM
+        flag and length passes this filter.
+        """
+        if flag & self._requiredFlags != self._requiredFlags:
+            return False
+        if flag & self._excludedFlags:
+            return False
+        if self._minMappingQuality is not None and \
+                mappingQuality < self._minMappingQuality:
+            return False
+        if self._minReadLength is not None and \
+                readLength < self._minReadLength:
+            return False
+        if self._maxReadLength is not None and \
+                readLength > self._maxReadLength:
+            return False
+        return True
+
+    def matchesRead(self, read):
+        """
+        Returns True if the specified pysam AlignedSegment passes this
+        filter.
+        """
+        return self.matches(read.mapping_quality, read.flag, read.query_length)
+
+
+class ReadDownsampler(object):
+    """
+    Caps the number of reads starting in each bucket of bucketSize
+    positions at maxReads. Each read is given a pseudo-random key from
+    the seed and its name, flag and position, and the maxReads reads of
+    a bucket with the smallest keys are kept, as in reservoir sampling
+    with random priorities. Whether a read is kept depends only on the
+    reads of its bucket, and not on the region or order in which they
+    are searched, so pages of downsampled reads are stable for a seed.
+    """
+    defaultBucketSize = 100
+
+    def __init__(self, maxReads, bucketSize=None, seed=None):
+        if bucketSize is None:
+            bucketSize = self.defaultBucketSize
+        if seed is None:
+            seed = 0
+        for attrName, value in [
+                ("maxReadsPerBucket", maxReads),
+                ("bucketSize", bucketSize)]:
+            if value < 1:
+                raise exceptions.BadReadFilterException(attrName, value)
+        self._maxReads = maxReads
+        self._bucketSize = bucketSize
+        self._seed = seed
+
+    def getKey(self, name, flag, position):
+        """
+        Returns the key of the read with the specified name, SAM flag
+        and position.
+        """
+        digest = hashlib.md5("{}:{}:{}:{}".format(
+            self._seed, name, flag, position).encode("utf-8")).hexdigest()
+        return int(digest[:16], 16)
+
+    def downsample(
+            self, reads, getPosition, getKey, getBucketKeys, start=None,
+            end=None):
+        """
+        Returns an iterator over the reads kept from the specified
+        iterator over the reads overlapping [start, end), in order of
+        position. The position and key of a read are given by
+        getPosition(read) and getKey(read). The reads of each bucket are
+        buffered, and the reads kept are found from their keys. The
+        stream only holds every read starting in the buckets within
+        [start, end), so getBucketKeys(start, end) must return the keys
+        of all of the reads starting in [start, end); it is only called
+        for the parts of the buckets at the edges of the region that
+        the stream does not cover. A start or end of None is the start
+        or end of the reference.
+        """
+        if start is None:
+            start = 0
+        bucket = None
+        bucketReads = []
+        for read in reads:
+            readBucket = getPosition(read) // self._bucketSize
+            if readBucket != bucket:
+                for keptRead in self._selectReads(
+                        bucket, bucketReads, getPosition, getBucketKeys,
+                        start, end):
+                    yield keptRead
+                bucket = readBucket
+                bucketReads = []
+            bucketReads.append((getKey(read), read))
+        for keptRead in self._selectReads(
+                bucket, bucketReads, getPosition, getBucketKeys, start,
+                end):
+            yield keptRead
+
+    def _selectReads(
+            self, bucket, bucketReads, getPosition, getBucketKeys, start,
+            end):
+        """
+        Returns the reads kept from the list of (key, read) tuples of
+        the reads in the specified bucket read from a search of
+        [start, end).
+        """
+        if len(bucketReads) == 0:
+            return []
+        bucketStart = bucket * self._bucketSize
+        bucketEnd = bucketStart + self._bucketSize
+        if bucketStart < start:
+            # Reads starting before the region are only in the stream if
+            # they overlap it.
+            keys = getBucketKeys(bucketStart, min(start, bucketEnd))
+            keys.extend(
+                key for key, read in bucketReads
+                if getPosition(read) >= start)
+        else:
+            keys = [key for key, _ in bucketReads]
+        if end is not None and bucketEnd > end:
+            keys.extend(getBucketKeys(max(end, bucketStart), bucketEnd))
+        maxKey = None
+        if len(keys) > self._maxReads:
+            maxKey = heapq.nsmallest(self._maxReads, keys)[-1]
+        return [
+            read for key, read in bucketReads
+            if maxKey is None or key <= maxKey]
+
+
+class CoverageAccumulator(object):
+    """
+    Accumulates the depth of coverage over consecutive bins of binSize
+    positions in [start, end) from the CIGARs of the reads overlapping
+    it, and optionally the numbers of each base. Each aligned block of a
+    read adds its overlap to the bins it spans, so the cost of the depth
+    is proportional to the number of reads rather than to the number of
+    positions; only base counting visits every aligned base.
+    """
+    _baseIndexes = {"A": 0, "C": 1, "G": 2, "T": 3}
+
+    def __init__(self, start, end, binSize, includeBaseCounts=False):
+        self._start = start
+        self._end = end
+        self._binSize = binSize
+        numBins = (end - start + binSize - 1) // binSize
+        self._alignedBases = array.array(b"l", [0]) * numBins
+        self._baseCounts = None
+        if includeBaseCounts:
+            self._baseCounts = array.array(b"l", [0]) * (4 * numBins)
+
+    def addRead(self, position, cigar, sequence):
+        """
+        Adds a read aligned at the specified reference position with the
+        specified CIGAR, a sequence of (operation, length) pairs, and
+        sequence of bases, which may be None if it is not known.
+        """
+        blocks = coverage.getAlignedBlocks(position, cigar)
+        for referenceStart, referenceEnd, queryStart in blocks:
+            blockStart = max(referenceStart, self._start)
+            blockEnd = min(referenceEnd, self._end)
+            if blockStart < blockEnd:
+                self._addBlock(blockStart, blockEnd)
+                if self._baseCounts is not None and sequence:
+                    offset = queryStart + blockStart - referenceStart
+                    self._addBases(
+                        blockStart,
+                        sequence[offset:offset + blockEnd - blockStart])
+
+    def _addBlock(self, blockStart, blockEnd):
+        binIndex = (blockStart - self._start) // self._binSize
+        binStart = self._start + binIndex * self._binSize
+        while binStart < blockEnd:
+            binEnd = binStart + self._binSize
+            self._alignedBases[binIndex] += (
+                min(blockEnd, binEnd) - max(blockStart, binStart))
+            binIndex += 1
+            binStart = binEnd
+
+    def _addBases(self, blockStart, bases):
+        offset = blockStart - self._start
+        for i, base in enumerate(bases):
+            baseIndex = self._baseIndexes.get(base)
+            if baseIndex is not None:
+                binIndex = (offset + i) // self._binSize
+                self._baseCounts[4 * binIndex + baseIndex] += 1
+
+    def getAlignedBases(self):
+        """
+        Returns the array of the numbers of aligned bases in each bin,
+        which are the depths at each position if binSize is 1.
+        """
+        return self._alignedBases
+
+    def getBins(self):
+        """
+        Returns the list of CoverageBins accumulated so far.
+        """
+        bins = []
+        for binIndex, alignedBases in enumerate(self._alignedBases):
+            coverageBin = extensions.CoverageBin()
+            coverageBin.start = self._start + binIndex * self._binSize
+            coverageBin.end = min(
+                coverageBin.start + self._binSize, self._end)
+            coverageBin.meanDepth = alignedBases / (
+                coverageBin.end - coverageBin.start)
+            if self._baseCounts is not None:
+                coverageBin.baseCounts = list(
+                    self._baseCounts[4 * binIndex:4 * binIndex + 4])
+            bins.append(coverageBin)
+        return bins
+
+
 class AbstractReadGroupSet(datamodel.DatamodelObject):
     """
     The base class of a read group set
@@ -127,6 +390,13 @@ class AbstractReadGroupSet(datamodel.DatamodelObject):
         """
         return self._referenceSet
 
+    def getCoveragePyramid(self):
+        """
+        Returns the CoveragePyramid of this ReadGroupSet, or raises a
+        CoveragePyramidNotFoundException if it has none.
+        """
+        raise exceptions.CoveragePyramidNotFoundException(self.getId())
+
     def toProtocolElement(self):
         """
         Returns the GA4GH protocol representation of this ReadGroupSet.
@@ -163,25 +433,40 @@ class AbstractReadGroupSet(datamodel.DatamodelObject):
         raise NotImplementedError()
 
 
+# Tables mapping random bytes to the bases and Phred qualities (20 to 40)
+# of simulated reads.
+_simulatedBases = bytes(bytearray(ord("ACGT"[i % 4]) for i in range(256)))
+_simulatedQualities = bytes(bytearray(20 + i % 21 for i in range(256)))
+
+
 class SimulatedReadGroupSet(AbstractReadGroupSet):
     """
     A simulated read group set
     """
     def __init__(
             self, parentContainer, localId, referenceSet, randomSeed=1,
-            numReadGroups=1, numAlignments=2):
+            numReadGroups=1, readDepth=10, readLength=100):
         super(SimulatedReadGroupSet, self).__init__(
             parentContainer, localId)
         self._referenceSet = referenceSet
-        self._numAlignments = numAlignments
         for i in range(numReadGroups):
             localId = "rg{}".format(i)
             readGroup = SimulatedReadGroup(
-                self, localId, randomSeed + i, numAlignments)
+                self, localId, randomSeed + i, readDepth, readLength)
             self.addReadGroup(readGroup)
+        self._coveragePyramid = SimulatedCoveragePyramid(
+            self.getReadGroups(), referenceSet)
+
+    def getCoveragePyramid(self):
+        """
+        Returns the SimulatedCoveragePyramid of the simulated reads.
+        """
+        return self._coveragePyramid
 
     def getNumAlignedReads(self):
-        return self._numAlignments
+        return sum(
+            readGroup.getNumAlignedReads()
+            for readGroup in self.getReadGroups())
 
     def getNumUnalignedReads(self):
         return 0
@@ -190,6 +475,79 @@ class SimulatedReadGroupSet(AbstractReadGroupSet):
         return []
 
 
+class SimulatedCoveragePyramid(object):
+    """
+    The coverage pyramid of the specified SimulatedReadGroups over the
+    references of the specified reference set, with the same interface
+    as a CoveragePyramid. Nothing is precomputed: the numbers of aligned
+    bases in the bins of a page are derived from the starts of the
+    simulated reads when the page is requested, so that the pyramid is
+    free to build whatever the length of the references, and the cost
+    of a page is roughly proportional to its number of bins.
+    """
+    def __init__(
+            self, readGroups, referenceSet,
+            binSizes=coverage.DEFAULT_BIN_SIZES):
+        self._readGroups = dict(
+            (readGroup.getLocalId(), readGroup) for readGroup in readGroups)
+        self._referenceSet = referenceSet
+        self._binSizes = list(binSizes)
+
+    def getBinSizes(self):
+        return self._binSizes
+
+    def getReadGroupNames(self):
+        return sorted(self._readGroups.keys())
+
+    def getReferenceLength(self, referenceName):
+        try:
+            reference = self._referenceSet.getReferenceByName(referenceName)
+        except exceptions.ReferenceNameNotFoundException:
+            return None
+        return reference.getLength()
+
+    def getNumBins(self, referenceName, binSize):
+        length = self.getReferenceLength(referenceName)
+        return (length + binSize - 1) // binSize
+
+    def getAlignedBases(
+            self, readGroupName, referenceName, binSize, startBin, endBin):
+        readGroup = self._readGroups[readGroupName]
+        length = self.getReferenceLength(referenceName)
+        # The bins of a page share the read starts of their edge blocks.
+        readStartsCache = {}
+        return [
+            readGroup.getAlignedBases(
+                referenceName, binIndex * binSize,
+                min((binIndex + 1) * binSize, length), readStartsCache)
+            for binIndex in range(startBin, endBin)]
+
+    def getCoverage(
+            self, readGroupName, referenceName, binSize, startBin, endBin):
+        alignedBases = self.getAlignedBases(
+            readGroupName, referenceName, binSize, startBin, endBin)
+        return coverage.getCoverageBins(
+            alignedBases, binSize, startBin,
+            self.getReferenceLength(referenceName))
+
+
+def scanAlignmentFile(dataFile):
+    """
+    Scans the specified BAM file and returns a dictionary containing
+    its header and reference names, suitable for storing in the file
+    catalog.
+    """
+    samFile = pysam.AlignmentFile(dataFile)
+    try:
+        fileInfo = {
+            'header': samFile.header,
+            'references': list(samFile.references),
+        }
+    finally:
+        samFile.close()
+    return fileInfo
+
+
 class HtslibReadGroupSet(datamodel.PysamDatamodelMixin, AbstractReadGroupSet):
     """
     Class representing a logical collection ReadGroups.
@@ -198,22 +556,25 @@ class HtslibReadGroupSet(datamodel.PysamDatamodelMixin, AbstractReadGroupSet):
             self, parentContainer, localId, samFilePath, backend):
         super(HtslibReadGroupSet, self).__init__(parentContainer, localId)
         self._samFilePath = samFilePath
-        samFile = self.getFileHandle(self._samFilePath)
-        self._setHeaderFields(samFile)
-        if 'RG' not in samFile.header or len(samFile.header['RG']) == 0:
+        self._coveragePyramid = None
+        fileInfo = self.getFileInfo(self._samFilePath)
+        header = fileInfo['header']
+        self._referenceNames = fileInfo['references']
+        self._setHeaderFields(header)
+        if 'RG' not in header or len(header['RG']) == 0:
             self._defaultReadGroup = True
             readGroup = HtslibReadGroup(self, 'default')
             self.addReadGroup(readGroup)
         else:
             self._defaultReadGroup = False
-            for readGroupHeader in samFile.header['RG']:
+            for readGroupHeader in header['RG']:
                 readGroup = HtslibReadGroup(
                     self, readGroupHeader['ID'], readGroupHeader)
                 self.addReadGroup(readGroup)
         # Find the reference set name (if there is one) by looking at
         # the BAM headers.
         referenceSetName = None
-        for referenceInfo in samFile.header['SQ']:
+        for referenceInfo in header['SQ']:
             if 'AS' not in referenceInfo:
                 infoDict = parseMalformedBamHeader(referenceInfo)
             else:
@@ -232,10 +593,10 @@ class HtslibReadGroupSet(datamodel.PysamDatamodelMixin, AbstractReadGroupSet):
             # in the reference set. Otherwise, we won't be able to
             # query for them.
 
-    def _setHeaderFields(self, samFile):
+    def _setHeaderFields(self, header):
         programs = []
-        if 'PG' in samFile.header:
-            htslibPrograms = samFile.header['PG']
+        if 'PG' in header:
+            htslibPrograms = header['PG']
             for htslibProgram in htslibPrograms:
                 program = protocol.Program()
                 program.id = htslibProgram['ID']
@@ -249,25 +610,62 @@ class HtslibReadGroupSet(datamodel.PysamDatamodelMixin, AbstractReadGroupSet):
     def openFile(self, dataFile):
         return pysam.AlignmentFile(dataFile)
 
+    def scanFile(self, dataFile):
+        return scanAlignmentFile(dataFile)
+
     def getSamFilePath(self):
         """
         Returns the file path of the sam file
         """
         return self._samFilePath
 
+    def getCoveragePyramid(self):
+        """
+        Returns the CoveragePyramid in the sidecar file next to the sam
+        file, which is memory mapped when it is first used and whenever
+        it is rebuilt. A CoveragePyramidNotFoundException is raised if
+        there is no sidecar, or if it was built from an older version
+        of the sam file.
+        """
+        path = self._samFilePath + coverage.PYRAMID_SUFFIX
+        try:
+            signature = (
+                pyramids.getDataSignature(path),
+                pyramids.getDataSignature(self._samFilePath))
+        except OSError:
+            raise exceptions.CoveragePyramidNotFoundException(self.getId())
+        cached = self._coveragePyramid
+        if cached is None or cached[0] != signature:
+            pyramid = coverage.CoveragePyramid.open(path)
+            if not pyramid.isCurrent(self._samFilePath):
+                raise exceptions.CoveragePyramidNotFoundException(
+                    self.getId())
+            # The signature and pyramid are replaced together, so that
+            # concurrent requests always see a consistent pair.
+            cached = signature, pyramid
+            self._coveragePyramid = cached
+        return cached[1]
+
     def isUsingDefaultReadGroup(self):
         """
         Returns whether the readGroupSet is using a default read group
         """
         return self._defaultReadGroup
 
+    def getReferenceName(self, referenceId):
+        """
+        Returns the name of the reference with the specified index in
+        the BAM header.
+        """
+        return self._referenceNames[referenceId]
+
     def getNumAlignedReads(self):
-        samFile = self.getFileHandle(self._samFilePath)
-        return samFile.mapped
+        with self.fileHandle(self._samFilePath) as samFile:
+            return samFile.mapped
 
     def getNumUnalignedReads(self):
-        samFile = self.getFileHandle(self._samFilePath)
-        return samFile.unmapped
+        with self.fileHandle(self._samFilePath) as samFile:
+            return samFile.unmapped
 
     def getPrograms(self):
         return self._programs
@@ -347,6 +745,28 @@ class AbstractReadGroup(datamodel.DatamodelObject):
             self.getCompoundId(), gaAlignment.fragmentName)
         return str(compoundId)
 
+    def _getCigarTuples(self, alignment):
+        return [
+            (SamCigar.ga2int(cigarUnit.operation), cigarUnit.operationLength)
+            for cigarUnit in alignment.alignment.cigar]
+
+    def getCoverage(
+            self, reference, start, end, binSize, includeBaseCounts=False,
+            readFilter=None):
+        """
+        Returns the list of CoverageBins of binSize positions over
+        [start, end) of the specified reference, counting the reads that
+        pass the specified ReadAlignmentFilter.
+        """
+        accumulator = CoverageAccumulator(
+            start, end, binSize, includeBaseCounts)
+        for alignment in self.getReadAlignments(
+                reference, start, end, readFilter=readFilter):
+            accumulator.addRead(
+                alignment.alignment.position.position,
+                self._getCigarTuples(alignment), alignment.alignedSequence)
+        return accumulator.getBins()
+
     def getNumAlignedReads(self):
         """
         Return the number of aligned reads in the read group
@@ -429,47 +849,192 @@ class AbstractReadGroup(datamodel.DatamodelObject):
 
 class SimulatedReadGroup(AbstractReadGroup):
     """
-    A simulated readgroup
+    A simulated readgroup. Single ended reads of readLength bases are
+    placed uniformly at random along each reference, covering it to a
+    mean depth of readDepth. The reads starting in each block of
+    readBlockSize bases are generated from a random number generator
+    seeded with the read group's seed, the reference name and the index
+    of the block, so any window is generated independently of the others
+    and always contains the same reads, at a cost proportional to the
+    number of reads in it.
     """
-    def __init__(self, parentContainer, localId, randomSeed, numAlignments=2):
+    readBlockSize = 2**12
+
+    def __init__(
+            self, parentContainer, localId, randomSeed, readDepth=10,
+            readLength=100):
         super(SimulatedReadGroup, self).__init__(parentContainer, localId)
         self._randomSeed = randomSeed
-
-    def getReadAlignments(self, referenceId=None, start=None, end=None):
-        rng = random.Random(self._randomSeed)
-
-        # We seed reads with sequential seeds starting from here. We hope no
-        # ranges for two different simulated read groups ever overlap (because
-        # then we'd start seeing identical reads in the two groups.)
-        read_seed_start = rng.getrandbits(64)
-
-        for i in range(self.getNumAlignedReads()):
-            seed = read_seed_start + i
-            yield self._createReadAlignment(i, seed)
-
-    def _createReadAlignment(self, i, seed):
-        # TODO fill out a bit more
-        rng = random.Random(seed)
+        self._readLength = readLength
+        self._readsPerBase = readDepth / readLength
+
+    def _getBlockSeed(self, referenceName, blockIndex):
+        key = "{}:{}:{}".format(self._randomSeed, referenceName, blockIndex)
+        return int(hashlib.md5(key.encode("utf-8")).hexdigest(), 16)
+
+    def _startBlock(self, referenceName, blockIndex):
+        # Returns the random number generator of the specified block and
+        # the number of reads that start in it, leaving the generator
+        # ready to draw their starts.
+        randomNumberGenerator = random.Random(
+            self._getBlockSeed(referenceName, blockIndex))
+        expectedNumReads = self._readsPerBase * self.readBlockSize
+        numReads = int(expectedNumReads)
+        if randomNumberGenerator.random() < expectedNumReads - numReads:
+            numReads += 1
+        return randomNumberGenerator, numReads
+
+    def getReadStarts(self, referenceName, blockIndex):
+        """
+        Returns the sorted list of the start positions of the reads that
+        start in the block with the specified index on the specified
+        reference.
+        """
+        randomNumberGenerator, numReads = self._startBlock(
+            referenceName, blockIndex)
+        blockStart = blockIndex * self.readBlockSize
+        return sorted(
+            blockStart + int(
+                randomNumberGenerator.random() * self.readBlockSize)
+            for _ in range(numReads))
+
+    def getAlignedBases(
+            self, referenceName, start, end, readStartsCache=None):
+        """
+        Returns the number of bases of the reads in this ReadGroup that
+        are aligned to [start, end) of the specified reference, where end
+        is at most the length of the reference. Since every read is an
+        alignment match of readLength bases, each read starting in a
+        block that lies within [start, end - readLength] contributes
+        readLength bases, and only the starts of the reads in the blocks
+        at the edges of the range are generated. These are stored in the
+        readStartsCache dictionary, if it is not None.
+        """
+        if readStartsCache is None:
+            readStartsCache = {}
+        numBases = 0
+        firstStart = max(0, start - self._readLength + 1)
+        blockIndex = firstStart // self.readBlockSize
+        while blockIndex * self.readBlockSize < end:
+            blockStart = blockIndex * self.readBlockSize
+            blockEnd = blockStart + self.readBlockSize
+            if blockStart >= start and \
+                    blockEnd <= end - self._readLength + 1:
+                _, numReads = self._startBlock(referenceName, blockIndex)
+                numBases += numReads * self._readLength
+            else:
+                if blockIndex not in readStartsCache:
+                    readStartsCache[blockIndex] = self.getReadStarts(
+                        referenceName, blockIndex)
+                readStarts = readStartsCache[blockIndex]
+                for i in range(
+                        bisect.bisect_left(readStarts, firstStart),
+                        bisect.bisect_left(readStarts, end)):
+                    numBases += min(
+                        readStarts[i] + self._readLength, end) - max(
+                        readStarts[i], start)
+            blockIndex += 1
+        return numBases
+
+    def getReadAlignments(
+            self, reference, start=None, end=None, readFilter=None,
+            downsampler=None):
+        if start is None:
+            start = 0
+        if end is None or end > reference.getLength():
+            end = reference.getLength()
+        alignments = self._generateReadAlignments(
+            reference, start, end, readFilter)
+        if downsampler is None:
+            return alignments
+
+        def getPosition(alignment):
+            return alignment.alignment.position.position
+
+        def getKey(alignment):
+            return downsampler.getKey(
+                alignment.fragmentName, self._getFlag(alignment),
+                getPosition(alignment))
+
+        def getBucketKeys(bucketStart, bucketEnd):
+            return [
+                getKey(alignment)
+                for alignment in self._generateReadAlignments(
+                    reference, bucketStart,
+                    min(bucketEnd, reference.getLength()), readFilter)
+                if getPosition(alignment) >= bucketStart]
+
+        return downsampler.downsample(
+            alignments, getPosition, getKey, getBucketKeys, start, end)
+
+    def _generateReadAlignments(self, reference, start, end, readFilter):
+        referenceName = reference.getLocalId()
+        # Reads that start before the window but overlap it are included
+        firstStart = max(0, start - self._readLength + 1)
+        blockIndex = firstStart // self.readBlockSize
+        while blockIndex * self.readBlockSize < end:
+            readStarts = self.getReadStarts(referenceName, blockIndex)
+            blockSeed = self._getBlockSeed(referenceName, blockIndex)
+            for i in range(
+                    bisect.bisect_left(readStarts, firstStart),
+                    bisect.bisect_left(readStarts, end)):
+                alignment = self._createReadAlignment(
+                    referenceName, readStarts[i],
+                    "simulated.{}.{}.{}".format(
+                        referenceName, blockIndex, i),
+                    blockSeed + i)
+                if readFilter is None or self._matchesReadFilter(
+                        alignment, readFilter):
+                    yield alignment
+            blockIndex += 1
+
+    def _getFlag(self, alignment):
+        # Simulated reads set no flags other than the strand.
+        flag = 0
+        if alignment.alignment.position.strand == \
+                protocol.Strand.NEG_STRAND:
+            flag = SamFlags.REVERSED
+        return flag
+
+    def _matchesReadFilter(self, alignment, readFilter):
+        return readFilter.matches(
+            alignment.alignment.mappingQuality, self._getFlag(alignment),
+            len(alignment.alignedSequence))
+
+    def _createReadAlignment(self, referenceName, position, name, seed):
+        randomNumberGenerator = random.Random(seed)
+        # The bases and qualities are mapped from random bytes in C,
+        # rather than being drawn one at a time.
+        numBytes = 2 * self._readLength
+        randomBytes = bytearray(binascii.unhexlify("{:0{}x}".format(
+            randomNumberGenerator.getrandbits(8 * numBytes), 2 * numBytes)))
         alignment = protocol.ReadAlignment()
-        alignment.fragmentLength = rng.randint(10, 100)
-        alignment.alignedQuality = []
-        alignment.alignedSequence = ""
-        for i in range(alignment.fragmentLength):
-            # TODO: are these reasonable quality values?
-            alignment.alignedQuality.append(rng.randint(1, 20))
-            alignment.alignedSequence += rng.choice("ACGT")
-        alignment.fragmentId = "frag{}".format(seed)
+        alignment.fragmentLength = self._readLength
+        bases = randomBytes[:self._readLength].translate(_simulatedBases)
+        qualities = randomBytes[self._readLength:].translate(
+            _simulatedQualities)
+        alignment.alignedSequence = bytes(bases).decode()
+        alignment.alignedQuality = list(qualities)
+        alignment.fragmentId = name
         gaPosition = protocol.Position()
-        gaPosition.position = 0
-        gaPosition.referenceName = "NotImplemented"
+        gaPosition.position = position
+        gaPosition.referenceName = referenceName
         gaPosition.strand = protocol.Strand.POS_STRAND
+        if randomNumberGenerator.random() < 0.5:
+            gaPosition.strand = protocol.Strand.NEG_STRAND
+        gaCigarUnit = protocol.CigarUnit()
+        gaCigarUnit.operation = protocol.CigarOperation.ALIGNMENT_MATCH
+        gaCigarUnit.operationLength = self._readLength
+        gaCigarUnit.referenceSequence = None
         gaLinearAlignment = protocol.LinearAlignment()
         gaLinearAlignment.position = gaPosition
+        gaLinearAlignment.mappingQuality = 60
+        gaLinearAlignment.cigar = [gaCigarUnit]
         alignment.alignment = gaLinearAlignment
         alignment.duplicateFragment = False
         alignment.failedVendorQualityChecks = False
 
-        alignment.fragmentName = "simulated{}".format(i)
+        alignment.fragmentName = name
         alignment.info = {}
         alignment.nextMatePosition = None
         alignment.numberReads = None
@@ -482,7 +1047,10 @@ class SimulatedReadGroup(AbstractReadGroup):
         return alignment
 
     def getNumAlignedReads(self):
-        return self._parentContainer.getNumAlignedReads()
+        referenceSet = self._parentContainer.getReferenceSet()
+        return int(round(self._readsPerBase * sum(
+            reference.getLength()
+            for reference in referenceSet.getReferences())))
 
     def getNumUnalignedReads(self):
         return 0
@@ -550,26 +1118,88 @@ class HtslibReadGroup(datamodel.PysamDatamodelMixin, AbstractReadGroup):
     def getSamFilePath(self):
         return self._parentSamFilePath
 
-    def getReadAlignments(self, reference, start=None, end=None):
+    def getReadAlignments(
+            self, reference, start=None, end=None, readFilter=None,
+            downsampler=None):
+        """
+        Returns an iterator over the specified reads. Reads rejected by
+        the specified ReadAlignmentFilter, or dropped by the specified
+        ReadDownsampler, are skipped before they are converted.
+        """
+        readAlignments = self._getAlignedSegments(
+            reference, start, end, readFilter)
+        if downsampler is not None:
+
+            def getPosition(readAlignment):
+                return readAlignment.reference_start
+
+            def getKey(readAlignment):
+                return downsampler.getKey(
+                    readAlignment.query_name, readAlignment.flag,
+                    readAlignment.reference_start)
+
+            def getBucketKeys(bucketStart, bucketEnd):
+                return [
+                    getKey(readAlignment)
+                    for readAlignment in self._getAlignedSegments(
+                        reference, bucketStart, bucketEnd, readFilter)
+                    if readAlignment.reference_start >= bucketStart]
+
+            readAlignments = downsampler.downsample(
+                readAlignments, getPosition, getKey, getBucketKeys, start,
+                end)
+        for readAlignment in readAlignments:
+            yield self.convertReadAlignment(readAlignment)
+
+    def getCoverage(
+            self, reference, start, end, binSize, includeBaseCounts=False,
+            readFilter=None):
         """
-        Returns an iterator over the specified reads
+        Returns the list of CoverageBins of binSize positions over
+        [start, end) of the specified reference. The bins are
+        accumulated from the CIGARs of the pysam reads, which are never
+        converted.
         """
+        accumulator = CoverageAccumulator(
+            start, end, binSize, includeBaseCounts)
+        for readAlignment in self._getAlignedSegments(
+                reference, start, end, readFilter):
+            if readAlignment.cigar:
+                accumulator.addRead(
+                    readAlignment.reference_start, readAlignment.cigar,
+                    readAlignment.query_sequence)
+        return accumulator.getBins()
+
+    def _getAlignedSegments(self, reference, start, end, readFilter):
+        """
+        Returns an iterator over the pysam AlignedSegments of this read
+        group overlapping [start, end) of the specified reference that
+        pass the specified ReadAlignmentFilter.
+        """
+        if readFilter is not None and readFilter.isEmpty():
+            readFilter = None
         # TODO If reference is None, return against all references,
         # including unmapped reads.
-        samFile = self._parentContainer.getFileHandle(self._parentSamFilePath)
         referenceName = reference.getLocalId().encode()
         # TODO deal with errors from htslib
         start, end = self.sanitizeAlignmentFileFetch(start, end)
-        readAlignments = samFile.fetch(referenceName, start, end)
-        if self._filterReads:
-            for readAlignment in readAlignments:
-                tags = dict(readAlignment.tags)
-                if 'RG' in tags and tags['RG'] == self._localId:
-                    yield self.convertReadAlignment(readAlignment)
-        else:
-            for readAlignment in readAlignments:
-                yield self.convertReadAlignment(readAlignment)
+        with self._parentContainer.fileHandle(
+                self._parentSamFilePath) as samFile:
+            readAlignments = samFile.fetch(referenceName, start, end)
+            if readFilter is not None:
+                readAlignments = (
+                    readAlignment for readAlignment in readAlignments
+                    if readFilter.matchesRead(readAlignment))
+            if self._filterReads:
+                for readAlignment in readAlignments:
+                    tags = dict(readAlignment.tags)
+                    if 'RG' in tags and tags['RG'] == self._localId:
+                        yield readAlignment
+            else:
+                for readAlignment in readAlignments:
+                    yield readAlignment
 
+    @metrics.registry.timed("convert")
     def convertReadAlignment(self, read):
         """
         Convert a pysam ReadAlignment to a GA4GH ReadAlignment
@@ -586,10 +1216,8 @@ class HtslibReadGroup(datamodel.PysamDatamodelMixin, AbstractReadGroup):
         ret.alignment = protocol.LinearAlignment()
         ret.alignment.mappingQuality = read.mapping_quality
         ret.alignment.position = protocol.Position()
-        samFile = self._parentContainer.getFileHandle(
-            self._parentSamFilePath)
-        ret.alignment.position.referenceName = samFile.getrname(
-            read.reference_id)
+        ret.alignment.position.referenceName = \
+            self._parentContainer.getReferenceName(read.reference_id)
         ret.alignment.position.position = read.reference_start
         ret.alignment.position.strand = protocol.Strand.POS_STRAND
         if SamFlags.isFlagSet(read.flag, SamFlags.REVERSED):
@@ -611,8 +1239,9 @@ class HtslibReadGroup(datamodel.PysamDatamodelMixin, AbstractReadGroup):
         ret.nextMatePosition = None
         if read.next_reference_id != -1:
             ret.nextMatePosition = protocol.Position()
-            ret.nextMatePosition.referenceName = samFile.getrname(
-                read.next_reference_id)
+            ret.nextMatePosition.referenceName = \
+                self._parentContainer.getReferenceName(
+                    read.next_reference_id)
             ret.nextMatePosition.position = read.next_reference_start
             ret.nextMatePosition.strand = protocol.Strand.POS_STRAND
             if SamFlags.isFlagSet(read.flag, SamFlags.NEXT_MATE_REVERSED):
@@ -6,6 +6,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import binascii
 import hashlib
 import json
 import os
@@ -299,7 +300,9 @@ class SimulatedReferenceSet(AbstractReferenceSet):
     """
     A simulated referenceSet
     """
-    def __init__(self, localId, randomSeed=0, numReferences=1):
+    def __init__(
+            self, localId, randomSeed=0, numReferences=1,
+            referenceLength=200):
         super(SimulatedReferenceSet, self).__init__(localId)
         self._randomSeed = randomSeed
         self._randomGenerator = random.Random()
@@ -317,24 +320,33 @@ class SimulatedReferenceSet(AbstractReferenceSet):
             referenceSeed = self._randomGenerator.getrandbits(32)
             referenceLocalId = "srs{}".format(i)
             reference = SimulatedReference(
-                self, referenceLocalId, referenceSeed)
+                self, referenceLocalId, referenceSeed, referenceLength)
             self.addReference(reference)
 
 
+# Table mapping random bytes to the bases of simulated references.
+_simulatedBases = bytes(bytearray(ord("ACGT"[i % 4]) for i in range(256)))
+
+
 class SimulatedReference(AbstractReference):
     """
-    A simulated reference. Stores a random sequence of a given length, and
-    generates remaining attributes randomly.
+    A simulated reference of a given length, whose remaining attributes
+    are generated randomly. The bases of each block of baseBlockSize
+    bases are generated from a random number generator seeded with the
+    reference's seed and the index of the block, so no sequence is held
+    in memory, and any range of bases is generated at a cost
+    proportional to its length. The MD5 checksum is computed from the
+    generated blocks when it is first requested.
     """
+    baseBlockSize = 2**12
 
     def __init__(self, parentContainer, localId, randomSeed=0, length=200):
         super(SimulatedReference, self).__init__(parentContainer, localId)
         rng = random.Random()
         rng.seed(randomSeed)
+        self._randomSeed = randomSeed
         self._length = length
-        bases = [rng.choice('ACGT') for _ in range(self._length)]
-        self._bases = ''.join(bases)
-        self._md5checksum = hashlib.md5(self._bases).hexdigest()
+        self._md5checksum = None
         self._isDerived = bool(rng.randint(0, 1))
         self._sourceDivergence = 0
         if self._isDerived:
@@ -346,9 +358,39 @@ class SimulatedReference(AbstractReference):
                     random.randint(1, 2**32)))
         self._sourceUri = "http://example.com/reference.fa"
 
+    def _getBlockBases(self, blockIndex):
+        blockStart = blockIndex * self.baseBlockSize
+        numBases = min(self.baseBlockSize, self._length - blockStart)
+        key = "{}:{}".format(self._randomSeed, blockIndex)
+        randomNumberGenerator = random.Random(
+            int(hashlib.md5(key.encode("utf-8")).hexdigest(), 16))
+        # The bases are mapped from random bytes in C, rather than being
+        # drawn one at a time.
+        randomBytes = bytearray(binascii.unhexlify("{:0{}x}".format(
+            randomNumberGenerator.getrandbits(8 * numBases), 2 * numBases)))
+        return bytes(randomBytes.translate(_simulatedBases))
+
     def getBases(self, start, end):
         self.checkQueryRange(start, end)
-        return self._bases[start:end]
+        if start >= end:
+            return ""
+        firstBlockIndex = start // self.baseBlockSize
+        lastBlockIndex = (end - 1) // self.baseBlockSize
+        bases = b"".join(
+            self._getBlockBases(blockIndex)
+            for blockIndex in range(firstBlockIndex, lastBlockIndex + 1))
+        offset = firstBlockIndex * self.baseBlockSize
+        return bases[start - offset:end - offset].decode()
+
+    def getMd5Checksum(self):
+        if self._md5checksum is None:
+            md5 = hashlib.md5()
+            numBlocks = (self._length + self.baseBlockSize - 1) // \
+                self.baseBlockSize
+            for blockIndex in range(numBlocks):
+                md5.update(self._getBlockBases(blockIndex))
+            self._md5checksum = md5.hexdigest()
+        return self._md5checksum
 
 ##################################################################
 #
@@ -392,6 +434,23 @@ class HtslibReferenceSet(datamodel.PysamDatamodelMixin, AbstractReferenceSet):
         self.addReference(reference)
 
 
+def scanFastaFile(dataFile):
+    """
+    Scans the specified indexed FASTA file and returns a dictionary
+    containing the names and lengths of its references, suitable for
+    storing in the file catalog.
+    """
+    fastaFile = pysam.FastaFile(dataFile)
+    try:
+        fileInfo = {
+            'references': list(fastaFile.references),
+            'lengths': list(fastaFile.lengths),
+        }
+    finally:
+        fastaFile.close()
+    return fileInfo
+
+
 class HtslibReference(datamodel.PysamDatamodelMixin, AbstractReference):
     """
     A reference based on data stored in a file on the file system
@@ -399,15 +458,15 @@ class HtslibReference(datamodel.PysamDatamodelMixin, AbstractReference):
     def __init__(self, parentContainer, localId, dataFile, metadata):
         super(HtslibReference, self).__init__(parentContainer, localId)
         self._fastaFilePath = dataFile
-        fastaFile = self.getFileHandle(dataFile)
-        numReferences = len(fastaFile.references)
+        fileInfo = self.getFileInfo(dataFile)
+        numReferences = len(fileInfo['references'])
         if numReferences != 1:
             raise exceptions.NotExactlyOneReferenceException(
                 self._fastaFilePath, numReferences)
-        if fastaFile.references[0] != localId:
+        if fileInfo['references'][0] != localId:
             raise exceptions.InconsistentReferenceNameException(
                 self._fastaFilePath)
-        self._length = fastaFile.lengths[0]
+        self._length = fileInfo['lengths'][0]
         try:
             self._md5checksum = metadata["md5checksum"]
             self._sourceUri = metadata["sourceUri"]
@@ -427,9 +486,12 @@ class HtslibReference(datamodel.PysamDatamodelMixin, AbstractReference):
     def openFile(self, dataFile):
         return pysam.FastaFile(dataFile)
 
+    def scanFile(self, dataFile):
+        return scanFastaFile(dataFile)
+
     def getBases(self, start, end):
         self.checkQueryRange(start, end)
-        fastaFile = self.getFileHandle(self._fastaFilePath)
-        # TODO we should have some error checking here...
-        bases = fastaFile.fetch(self.getLocalId(), start, end)
+        with self.fileHandle(self._fastaFilePath) as fastaFile:
+            # TODO we should have some error checking here...
+            bases = fastaFile.fetch(self.getLocalId(), start, end)
         return bases
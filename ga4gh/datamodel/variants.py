@@ -6,15 +6,24 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import bisect
 import datetime
 import random
 import hashlib
+import io
+import math
+import os
+import struct
+import threading
 
 import pysam
 
 import ga4gh.protocol as protocol
 import ga4gh.exceptions as exceptions
 import ga4gh.datamodel as datamodel
+import ga4gh.datamodel.pyramids as pyramids
+import ga4gh.extensions as extensions
+import ga4gh.metrics as metrics
 
 
 def convertVCFPhaseset(vcfPhaseset):
@@ -47,6 +56,410 @@ def convertVCFGenotype(vcfGenotype, vcfPhaseset):
     return genotype, phaseset
 
 
+def formatGenotype(genotype, phased=False):
+    """
+    Returns the VCF GT string of the specified genotype, a list of
+    allele indexes in which -1 stands for an uncalled allele, as in the
+    genotype of a GA Call.
+    """
+    separator = "|" if phased else "/"
+    return separator.join(
+        "." if alleleIndex < 0 else str(alleleIndex)
+        for alleleIndex in genotype)
+
+
+def getRecordGenotypes(record, sampleIndexes):
+    """
+    Returns the list of the VCF GT strings of the samples with the
+    specified column indexes in the specified pysam variant record, or
+    "." for each sample if the record has no genotypes. The strings are
+    taken from the text of the record, as pysam does not yet say whether
+    a genotype is phased. pysam formats the whole record, including the
+    samples that were not requested, but the text is only split up to
+    the last requested sample column.
+    """
+    formatKeys = list(record.format.keys())
+    if len(formatKeys) == 0 or formatKeys[0] != "GT" or \
+            len(sampleIndexes) == 0:
+        return ["."] * len(sampleIndexes)
+    # REMOVAL once pysam says whether genotypes are phased
+    numColumns = 9 + max(sampleIndexes) + 1
+    sampleColumns = str(record).split("\t", numColumns)[9:numColumns]
+    return [
+        sampleColumns[sampleIndex].split(":", 1)[0].rstrip("\n")
+        for sampleIndex in sampleIndexes]
+
+
+VARIANT_CLASSES = ["SNV", "MNV", "INDEL", "OTHER"]
+
+
+def getVariantClass(referenceBases, alternateBases):
+    """
+    Returns the class of a variant with the specified reference and
+    alternate bases: SNV or MNV if all of the alternate alleles replace
+    the same number of bases, INDEL if they change the length of the
+    sequence, and OTHER for reference blocks and symbolic alleles.
+    """
+    if alternateBases is None or len(alternateBases) == 0:
+        return "OTHER"
+    lengths = set()
+    for alternate in alternateBases:
+        if alternate in ("", ".", "*") or alternate[0] == "<" or \
+                "[" in alternate or "]" in alternate:
+            return "OTHER"
+        lengths.add(len(alternate))
+    if lengths == set([len(referenceBases)]):
+        return "SNV" if len(referenceBases) == 1 else "MNV"
+    return "INDEL"
+
+
+def _toFloat32(value):
+    """
+    Returns the specified value rounded to single precision, which is
+    how BCF and htslib store QUAL and float INFO values.
+    """
+    if value is None:
+        return None
+    return struct.unpack(b"f", struct.pack(b"f", value))[0]
+
+
+class VariantSiteFilter(object):
+    """
+    A predicate on the sites of variants, evaluated on raw pysam records
+    so that the variants it rejects are never converted. The fields are
+    checked in increasing order of cost. A variant whose QUAL or AF is
+    missing does not meet a minimum on that value. Minimums are rounded
+    to single precision, so that a variant with AF=0.01 in the VCF meets
+    a minimum of 0.01.
+    """
+    def __init__(
+            self, passOnly=False, variantClasses=None, minQuality=None,
+            minAlleleFrequency=None):
+        if variantClasses is not None:
+            for variantClass in variantClasses:
+                if variantClass not in VARIANT_CLASSES:
+                    raise exceptions.BadVariantFilterException(
+                        "variantClasses", variantClass)
+            variantClasses = frozenset(variantClasses)
+        self._passOnly = bool(passOnly)
+        self._variantClasses = variantClasses
+        self._minQuality = _toFloat32(minQuality)
+        self._minAlleleFrequency = _toFloat32(minAlleleFrequency)
+
+    def isEmpty(self):
+        """
+        Returns True if this filter accepts every variant.
+        """
+        return (
+            not self._passOnly and self._variantClasses is None and
+            self._minQuality is None and self._minAlleleFrequency is None)
+
+    def _matchesAlleleFrequency(self, alleleFrequency):
+        if alleleFrequency is None:
+            return False
+        if not isinstance(alleleFrequency, (list, tuple)):
+            alleleFrequency = [alleleFrequency]
+        return any(
+            value is not None and float(value) >= self._minAlleleFrequency
+            for value in alleleFrequency)
+
+    def matchesRecord(self, record):
+        """
+        Returns True if the specified pysam variant record passes this
+        filter.
+        """
+        if self._minQuality is not None and (
+                record.qual is None or record.qual < self._minQuality):
+            return False
+        if self._passOnly and list(record.filter.keys()) != ["PASS"]:
+            return False
+        if self._variantClasses is not None and getVariantClass(
+                record.ref, record.alts) not in self._variantClasses:
+            return False
+        if self._minAlleleFrequency is not None:
+            alleleFrequency = None
+            if "AF" in record.info:
+                alleleFrequency = record.info["AF"]
+            if not self._matchesAlleleFrequency(alleleFrequency):
+                return False
+        return True
+
+    def matchesVariant(self, variant):
+        """
+        Returns True if the specified GA4GH Variant passes this filter.
+        The protocol Variant has no QUAL or FILTER, so it cannot pass a
+        filter on either.
+        """
+        if self._passOnly or self._minQuality is not None:
+            return False
+        if self._variantClasses is not None and getVariantClass(
+                variant.referenceBases,
+                variant.alternateBases) not in self._variantClasses:
+            return False
+        if self._minAlleleFrequency is not None and \
+                not self._matchesAlleleFrequency(variant.info.get("AF")):
+            return False
+        return True
+
+
+def isNonReference(alleleIndices):
+    """
+    Returns True if the specified genotype, a sequence of allele indexes,
+    contains an alternate allele. No-calls, which pysam reports as None
+    or -1, are not alternate alleles.
+    """
+    return any(index is not None and index > 0 for index in alleleIndices)
+
+
+class GenotypeFilter(object):
+    """
+    A predicate on the genotypes of the specified call sets at a variant,
+    evaluated on raw pysam records so that the variants it rejects are
+    never converted. A variant matches if any of anyNonReference and all
+    of allNonReference have an alternate allele in their genotypes. Either
+    list may be None, which places no condition on the variant; an empty
+    anyNonReference list matches no variants.
+    """
+    def __init__(self, anyNonReference=None, allNonReference=None):
+        self._anySampleNames = None
+        self._anyCallSetIds = None
+        if anyNonReference is not None:
+            self._anySampleNames = [
+                callSet.getSampleName() for callSet in anyNonReference]
+            self._anyCallSetIds = [
+                callSet.getId() for callSet in anyNonReference]
+        self._allSampleNames = None
+        self._allCallSetIds = None
+        if allNonReference is not None:
+            self._allSampleNames = [
+                callSet.getSampleName() for callSet in allNonReference]
+            self._allCallSetIds = [
+                callSet.getId() for callSet in allNonReference]
+
+    def isEmpty(self):
+        """
+        Returns True if this filter accepts every variant.
+        """
+        return self._anyCallSetIds is None and self._allCallSetIds is None
+
+    def matchesRecord(self, record):
+        """
+        Returns True if the specified pysam variant record passes this
+        filter. Only the genotypes of the call sets in the filter are
+        read from the record.
+        """
+        samples = record.samples
+        if self._allSampleNames is not None and not all(
+                isNonReference(samples[name].allele_indices)
+                for name in self._allSampleNames):
+            return False
+        if self._anySampleNames is not None and not any(
+                isNonReference(samples[name].allele_indices)
+                for name in self._anySampleNames):
+            return False
+        return True
+
+    def matchesVariant(self, variant):
+        """
+        Returns True if the specified GA4GH Variant passes this filter.
+        A call set without a call in the variant is not non-reference.
+        """
+        genotypes = dict(
+            (call.callSetId, call.genotype) for call in variant.calls)
+        if self._allCallSetIds is not None and not all(
+                isNonReference(genotypes.get(callSetId, []))
+                for callSetId in self._allCallSetIds):
+            return False
+        if self._anyCallSetIds is not None and not any(
+                isNonReference(genotypes.get(callSetId, []))
+                for callSetId in self._anyCallSetIds):
+            return False
+        return True
+
+
+VARIANT_SUMMARY_SUFFIX = ".summary"
+DEFAULT_SUMMARY_BIN_SIZES = [1000, 10000, 100000, 1000000]
+
+_summaryMagic = b"GA4GHVSM"
+_summaryGroupName = "variants"
+# The fields of a variant summary pyramid are the number of variants of
+# each class, the sum of the allele frequencies of the variants and the
+# number of variants that have an allele frequency.
+_summaryFields = [
+    (variantClass, pyramids.UNSIGNED_INT)
+    for variantClass in VARIANT_CLASSES] + [
+    ("alleleFrequencySum", pyramids.DOUBLE),
+    ("numAlleleFrequencies", pyramids.UNSIGNED_INT)]
+
+
+def getAlleleFrequency(genotypes):
+    """
+    Returns the fraction of the called alleles in the specified
+    genotypes, each a sequence of allele indexes, that are alternate
+    alleles, or None if no alleles are called. No-calls, which pysam
+    reports as None or -1, are not counted.
+    """
+    numCalled = 0
+    numAlternate = 0
+    for alleleIndices in genotypes:
+        for index in alleleIndices:
+            if index is not None and index >= 0:
+                numCalled += 1
+                if index > 0:
+                    numAlternate += 1
+    if numCalled == 0:
+        return None
+    return numAlternate / numCalled
+
+
+class VariantSummaryAccumulator(object):
+    """
+    Accumulates the number of variants of each class, and their mean
+    allele frequency, in the bins of the specified size along a
+    reference. Variants are counted in the bin holding their start, and
+    only the bins holding variants are stored, so that a whole
+    chromosome can be accumulated in a single pass.
+    """
+    def __init__(self, binSize):
+        self._binSize = binSize
+        self._bins = {}
+
+    def addVariant(self, position, variantClass, alleleFrequency):
+        """
+        Adds a variant of the specified class starting at the specified
+        position, with the specified allele frequency, which may be None.
+        """
+        binIndex = position // self._binSize
+        bin_ = self._bins.get(binIndex)
+        if bin_ is None:
+            bin_ = [0] * len(_summaryFields)
+            self._bins[binIndex] = bin_
+        bin_[VARIANT_CLASSES.index(variantClass)] += 1
+        if alleleFrequency is not None:
+            bin_[-2] += alleleFrequency
+            bin_[-1] += 1
+
+    def getValues(self, start, end):
+        """
+        Returns the dictionary mapping the fields of a variant summary
+        pyramid to their values in the bins covering [start, end), where
+        start is a multiple of the bin size, or None if there are no
+        variants in the region.
+        """
+        startBin = start // self._binSize
+        endBin = (end + self._binSize - 1) // self._binSize
+        columns = None
+        for binIndex in range(startBin, endBin):
+            bin_ = self._bins.get(binIndex)
+            if bin_ is None:
+                continue
+            if columns is None:
+                columns = [[0] * (endBin - startBin) for _ in _summaryFields]
+            for column, value in zip(columns, bin_):
+                column[binIndex - startBin] = value
+        if columns is None:
+            return None
+        return dict(
+            (name, column)
+            for (name, _), column in zip(_summaryFields, columns))
+
+
+def writeVariantSummaryPyramid(
+        fileObject, binSizes, references, accumulators, signature=None):
+    """
+    Writes the variant summary pyramid of the specified (name, length)
+    references to the specified file object, from the dictionary
+    mapping the name of each reference to the VariantSummaryAccumulator
+    of its variants, whose bin size must be the smallest of binSizes.
+    """
+    def getValues(groupName, referenceName, start, end):
+        return accumulators[referenceName].getValues(start, end)
+
+    pyramids.writePyramid(
+        fileObject, _summaryMagic, binSizes, _summaryFields,
+        [_summaryGroupName], references, getValues, signature)
+
+
+def buildVariantSummaryPyramid(
+        variantFilePath, binSizes=DEFAULT_SUMMARY_BIN_SIZES, outputPath=None):
+    """
+    Builds the variant summary pyramid of every contig with records in
+    the specified indexed VCF or BCF file and writes it to outputPath,
+    which is the variant file path with VARIANT_SUMMARY_SUFFIX by
+    default. Each contig is read in a single pass, and a contig whose
+    length is not given in the header extends to the end of its last
+    record. The pyramid is written to a temporary file that is then
+    renamed, so that a server never maps a partly written pyramid.
+    """
+    pyramids.checkBinSizes(binSizes)
+    if outputPath is None:
+        outputPath = variantFilePath + VARIANT_SUMMARY_SUFFIX
+    signature = pyramids.getDataSignature(variantFilePath)
+    contigs = scanVariantFile(variantFilePath)['contigs']
+    varFile = pysam.VariantFile(variantFilePath)
+    try:
+        references = []
+        accumulators = {}
+        for contig in contigs:
+            accumulator = VariantSummaryAccumulator(binSizes[0])
+            length = 0
+            if contig in varFile.header.contigs:
+                length = varFile.header.contigs[contig].length or 0
+            for record in varFile.fetch(contig):
+                accumulator.addVariant(
+                    record.start, getVariantClass(record.ref, record.alts),
+                    getAlleleFrequency(
+                        call.allele_indices
+                        for call in record.samples.values()))
+                length = max(length, record.stop)
+            references.append((contig, length))
+            accumulators[contig] = accumulator
+        temporaryPath = outputPath + ".tmp"
+        with open(temporaryPath, "wb") as fileObject:
+            writeVariantSummaryPyramid(
+                fileObject, binSizes, references, accumulators, signature)
+        os.rename(temporaryPath, outputPath)
+    finally:
+        varFile.close()
+    return outputPath
+
+
+class VariantSummaryPyramid(pyramids.Pyramid):
+    """
+    A variant summary pyramid read from a buffer holding the contents
+    of the pyramid file at the specified path, which is usually a memory
+    map of the file.
+    """
+    magic = _summaryMagic
+
+    def getSummaries(self, referenceName, binSize, startBin, endBin):
+        """
+        Returns the list of VariantSummaryBins with indexes in [startBin,
+        endBin) of the specified level. The last bin of a reference is
+        clipped to its end.
+        """
+        length = self.getReferenceLength(referenceName)
+        columns = [
+            self.getValues(
+                _summaryGroupName, referenceName, name, binSize, startBin,
+                endBin)
+            for name, _ in _summaryFields]
+        summaryBins = []
+        for binIndex, values in enumerate(zip(*columns), startBin):
+            summaryBin = extensions.VariantSummaryBin()
+            summaryBin.start = binIndex * binSize
+            summaryBin.end = min(summaryBin.start + binSize, length)
+            summaryBin.variantClassCounts = list(
+                values[:len(VARIANT_CLASSES)])
+            summaryBin.numVariants = sum(summaryBin.variantClassCounts)
+            alleleFrequencySum, numAlleleFrequencies = values[-2:]
+            if numAlleleFrequencies > 0:
+                summaryBin.meanAlleleFrequency = (
+                    alleleFrequencySum / numAlleleFrequencies)
+            summaryBins.append(summaryBin)
+        return summaryBins
+
+
 class CallSet(datamodel.DatamodelObject):
     """
     Class representing a CallSet. A CallSet basically represents the
@@ -103,6 +516,17 @@ class AbstractVariantSet(datamodel.DatamodelObject):
         """
         return self._updatedTime
 
+    def getVariantSummaryPyramid(self, referenceName):
+        """
+        Returns the VariantSummaryPyramid holding the summaries of the
+        variants of this VariantSet on the specified reference, or None
+        if it has no variants on the reference. A
+        VariantSummaryPyramidNotFoundException is raised if the
+        summaries have not been built.
+        """
+        raise exceptions.VariantSummaryPyramidNotFoundException(
+            self.getId(), referenceName)
+
     def addCallSet(self, sampleName):
         """
         Adds a CallSet for the specified sample name.
@@ -183,12 +607,62 @@ class AbstractVariantSet(datamodel.DatamodelObject):
         Returns an ID string suitable for the specified GA Variant
         object in this variant set.
         """
-        md5 = self.hashVariant(gaVariant)
+        return self.getSiteId(
+            gaVariant.referenceName, gaVariant.start,
+            gaVariant.referenceBases, gaVariant.alternateBases)
+
+    def getSiteId(
+            self, referenceName, start, referenceBases, alternateBases):
+        """
+        Returns the ID of the variant with the specified position and
+        alleles in this variant set, which is the ID of the GA Variant
+        object for it.
+        """
+        md5 = self.hashAlleles(referenceBases, alternateBases)
         compoundId = datamodel.VariantCompoundId(
-            self.getCompoundId(), gaVariant.referenceName,
-            gaVariant.start, md5)
+            self.getCompoundId(), referenceName, start, md5)
         return str(compoundId)
 
+    def _checkCallSetIds(self, callSetIds):
+        """
+        Returns the specified list of call set IDs, or the IDs of all of
+        the CallSets in this VariantSet if it is None. A
+        CallSetNotInVariantSetException is raised if any of the IDs is
+        not in this VariantSet.
+        """
+        if callSetIds is None:
+            return list(self._callSetIds)
+        for callSetId in callSetIds:
+            if callSetId not in self._callSetIdMap:
+                raise exceptions.CallSetNotInVariantSetException(
+                    callSetId, self.getId())
+        return list(callSetIds)
+
+    def getGenotypeMatrixRows(
+            self, referenceName, startPosition, endPosition,
+            callSetIds=None):
+        """
+        Returns an iterator over the GenotypeMatrixRows of the variants
+        overlapping the specified region, with a column for each of the
+        specified call sets, or for each of the CallSets of this
+        VariantSet if callSetIds is None. This implementation builds the
+        rows from the GA Variants returned by getVariants.
+        """
+        callSetIds = self._checkCallSetIds(callSetIds)
+        for variant in self.getVariants(
+                referenceName, startPosition, endPosition, callSetIds):
+            genotypes = dict(
+                (call.callSetId, formatGenotype(
+                    call.genotype, call.phaseset is not None))
+                for call in variant.calls)
+            yield extensions.GenotypeMatrixRow(
+                id=variant.id, start=variant.start, end=variant.end,
+                referenceBases=variant.referenceBases,
+                alternateBases=list(variant.alternateBases),
+                genotypes=",".join(
+                    genotypes.get(callSetId, ".")
+                    for callSetId in callSetIds))
+
     def getCallSetId(self, sampleName):
         """
         Returns the callSetId for the specified sampleName in this
@@ -204,20 +678,38 @@ class AbstractVariantSet(datamodel.DatamodelObject):
         Produces an MD5 hash of the ga variant object to uniquely
         identify it
         """
+        return cls.hashAlleles(
+            gaVariant.referenceBases, gaVariant.alternateBases)
+
+    @classmethod
+    def hashAlleles(cls, referenceBases, alternateBases):
+        """
+        Produces the MD5 hash identifying a variant with the specified
+        reference and alternate bases at its position.
+        """
         return hashlib.md5(
-            gaVariant.referenceBases +
-            str(tuple(gaVariant.alternateBases))).hexdigest()
+            referenceBases + str(tuple(alternateBases))).hexdigest()
 
 
 class SimulatedVariantSet(AbstractVariantSet):
     """
     A variant set that doesn't derive from a data store.
     Used mostly for testing.
+
+    The positions of the variants are generated independently for each
+    block of variantBlockSize bases, from a random number generator
+    seeded with the index of the block, so that the variants in a window
+    are the same however the window is requested.
     """
+    variantBlockSize = 2**12
+
     def __init__(
             self, parentContainer, localId, randomSeed=1, numCalls=1,
-            variantDensity=1):
+            variantDensity=1, referenceSet=None):
         super(SimulatedVariantSet, self).__init__(parentContainer, localId)
+        self._referenceSet = referenceSet
+        self._variantSummaryPyramids = {}
+        self._variantSummaryLock = threading.Lock()
         self._randomSeed = randomSeed
         self._numCalls = numCalls
         for j in range(numCalls):
@@ -230,6 +722,50 @@ class SimulatedVariantSet(AbstractVariantSet):
     def getNumVariants(self):
         return 0
 
+    def getVariantSummaryPyramid(self, referenceName):
+        """
+        Returns the VariantSummaryPyramid of the simulated variants on
+        the specified reference of the reference set of this VariantSet,
+        or None if the reference set has no such reference. The pyramid
+        of each reference is built in memory when it is first used, by a
+        single thread while any others requesting it wait, and the
+        allele frequencies depend on the genotypes of every variant, so
+        the cost of building it is proportional to the length of the
+        reference.
+        """
+        if self._referenceSet is None:
+            return super(SimulatedVariantSet, self).getVariantSummaryPyramid(
+                referenceName)
+        pyramid = self._variantSummaryPyramids.get(referenceName)
+        if pyramid is None:
+            with self._variantSummaryLock:
+                pyramid = self._variantSummaryPyramids.get(referenceName)
+                if pyramid is None:
+                    pyramid = self._buildVariantSummaryPyramid(referenceName)
+                    self._variantSummaryPyramids[referenceName] = pyramid
+        return pyramid
+
+    def _buildVariantSummaryPyramid(self, referenceName):
+        try:
+            reference = self._referenceSet.getReferenceByName(referenceName)
+        except exceptions.ReferenceNameNotFoundException:
+            return None
+        binSizes = DEFAULT_SUMMARY_BIN_SIZES
+        accumulator = VariantSummaryAccumulator(binSizes[0])
+        for variant in self.getVariants(
+                referenceName, 0, reference.getLength()):
+            accumulator.addVariant(
+                variant.start,
+                getVariantClass(
+                    variant.referenceBases, variant.alternateBases),
+                getAlleleFrequency(
+                    call.genotype for call in variant.calls))
+        fileObject = io.BytesIO()
+        writeVariantSummaryPyramid(
+            fileObject, binSizes, [(referenceName, reference.getLength())],
+            {referenceName: accumulator})
+        return VariantSummaryPyramid(fileObject.getvalue())
+
     def getMetadata(self):
         ret = []
         # TODO Add simulated metadata.
@@ -243,17 +779,55 @@ class SimulatedVariantSet(AbstractVariantSet):
             compoundId.referenceName, start, randomNumberGenerator)
         return variant
 
+    def getVariantPositions(self, blockIndex):
+        """
+        Returns the sorted list of the positions of the variants in the
+        block with the specified index. Each position holds a variant
+        with probability variantDensity, so the gaps between variants are
+        drawn from a geometric distribution, and the cost is proportional
+        to the number of variants rather than the size of the block.
+        """
+        blockStart = blockIndex * self.variantBlockSize
+        blockEnd = blockStart + self.variantBlockSize
+        if self._variantDensity >= 1:
+            return range(blockStart, blockEnd)
+        if self._variantDensity <= 0:
+            return []
+        randomNumberGenerator = random.Random()
+        randomNumberGenerator.seed((self._randomSeed << 32) + blockIndex)
+        logNoVariantProbability = math.log(1 - self._variantDensity)
+        positions = []
+        position = blockStart - 1
+        while True:
+            # 1 - random() is in (0, 1], so its log is defined
+            position += 1 + int(
+                math.log(1 - randomNumberGenerator.random()) /
+                logNoVariantProbability)
+            if position >= blockEnd:
+                break
+            positions.append(position)
+        return positions
+
     def getVariants(self, referenceName, startPosition, endPosition,
-                    callSetIds=None):
+                    callSetIds=None, siteFilter=None, genotypeFilter=None):
         randomNumberGenerator = random.Random()
-        randomNumberGenerator.seed(self._randomSeed)
-        i = startPosition
-        while i < endPosition:
-            if randomNumberGenerator.random() < self._variantDensity:
-                randomNumberGenerator.seed(self._randomSeed + i)
-                yield self.generateVariant(
-                    referenceName, i, randomNumberGenerator)
-            i += 1
+        blockIndex = startPosition // self.variantBlockSize
+        while blockIndex * self.variantBlockSize < endPosition:
+            positions = self.getVariantPositions(blockIndex)
+            for i in range(
+                    bisect.bisect_left(positions, startPosition),
+                    bisect.bisect_left(positions, endPosition)):
+                randomNumberGenerator.seed(self._randomSeed + positions[i])
+                variant = self.generateVariant(
+                    referenceName, positions[i], randomNumberGenerator)
+                if siteFilter is not None and \
+                        not siteFilter.matchesVariant(variant):
+                    continue
+                if genotypeFilter is not None and \
+                        not genotypeFilter.matchesVariant(variant):
+                    continue
+                yield variant
+            blockIndex += 1
 
     def generateVariant(self, referenceName, position, randomNumberGenerator):
         """
@@ -306,6 +880,70 @@ def isEmptyIter(it):
     return next(it, _nothing) is _nothing
 
 
+def _getMetadataFromVcf(varFile):
+    # All the metadata is available via each varFile.header, including:
+    #    records: header records
+    #    version: VCF version
+    #    samples -- not immediately needed
+    #    contigs -- not immediately needed
+    #    filters -- not immediately needed
+    #    info
+    #    formats
+    ret = []
+    header = varFile.header
+    formats = header.formats.items()
+    infos = header.info.items()
+    # TODO: currently ALT field is not implemented through pysam
+    # NOTE: contigs field is different between vcf files,
+    # so it's not included in metadata
+    # NOTE: filters in not included in metadata unless needed
+    for prefix, content in [("FORMAT", formats), ("INFO", infos)]:
+        for contentKey, value in content:
+            attrs = dict(value.header.attrs)
+            # TODO: refactor description at next pysam release
+            # since description will be implemented as a member of
+            # VariantMetadata
+            description = attrs.get('Description', '').strip('"')
+            key = "{0}.{1}".format(prefix, value.name)
+            if key != "FORMAT.GT":
+                ret.append([
+                    key, value.type, "{}".format(value.number),
+                    description])
+    return ret
+
+
+def scanVariantFile(filename):
+    """
+    Scans the specified indexed VCF or BCF file and returns a dictionary
+    describing the contigs that contain records, the samples and the
+    header metadata of the file. The returned dictionary can be stored
+    in the file catalog.
+    """
+    varFile = pysam.VariantFile(filename)
+    try:
+        if varFile.index is None:
+            raise exceptions.NotIndexedException(filename)
+        contigs = []
+        for chrom in varFile.index:
+            # Unlike Tabix indices, CSI indices include all contigs defined
+            # in the BCF header.  Thus we must test each one to see if
+            # records exist or else they are likely to trigger spurious
+            # overlapping errors.
+            chrom, _, _ = \
+                datamodel.PysamDatamodelMixin.sanitizeVariantFileFetch(chrom)
+            if not isEmptyIter(varFile.fetch(chrom)):
+                contigs.append(chrom)
+        fileInfo = {
+            'contigs': contigs,
+            'samples': list(varFile.header.samples),
+            'version': varFile.header.version,
+            'metadata': _getMetadataFromVcf(varFile),
+        }
+    finally:
+        varFile.close()
+    return fileInfo
+
+
 class HtslibVariantSet(datamodel.PysamDatamodelMixin, AbstractVariantSet):
     """
     Class representing a single variant set backed by a directory of indexed
@@ -316,22 +954,22 @@ class HtslibVariantSet(datamodel.PysamDatamodelMixin, AbstractVariantSet):
         self._dataDir = dataDir
         self._setAccessTimes(dataDir)
         self._chromFileMap = {}
+        self._variantSummaryPyramids = {}
         self._metadata = None
         self._scanDataFiles(dataDir, ['*.bcf', '*.vcf.gz'])
 
-    def _updateMetadata(self, variantFile):
+    def _updateMetadata(self, filename, fileInfo):
         """
         Updates the metadata for his variant set based on the specified
-        variant file, and ensures that it is consistent with already
-        existing metadata.
+        variant file information, and ensures that it is consistent with
+        already existing metadata.
         """
-        metadata = self._getMetadataFromVcf(variantFile)
+        metadata = self._getMetadataFromFileInfo(fileInfo)
         if self._metadata is None:
             self._metadata = metadata
         else:
             if self._metadata != metadata:
-                raise exceptions.InconsistentMetaDataException(
-                    variantFile.filename)
+                raise exceptions.InconsistentMetaDataException(filename)
 
     def getNumVariants(self):
         """
@@ -340,43 +978,70 @@ class HtslibVariantSet(datamodel.PysamDatamodelMixin, AbstractVariantSet):
         # TODO How do we get the number of records in a VariantFile?
         return 0
 
-    def _updateCallSetIds(self, variantFile):
+    def getVariantSummaryPyramid(self, referenceName):
         """
-        Updates the call set IDs based on the specified variant file.
+        Returns the VariantSummaryPyramid in the sidecar file next to
+        the variant file holding the specified reference, which is
+        memory mapped when it is first used and whenever it is rebuilt,
+        or None if there is no such variant file. A
+        VariantSummaryPyramidNotFoundException is raised if there is no
+        sidecar, or if it was built from an older version of the file.
+        """
+        if referenceName not in self._chromFileMap:
+            return None
+        varFileName = self._chromFileMap[referenceName]
+        path = varFileName + VARIANT_SUMMARY_SUFFIX
+        try:
+            signature = (
+                pyramids.getDataSignature(path),
+                pyramids.getDataSignature(varFileName))
+        except OSError:
+            raise exceptions.VariantSummaryPyramidNotFoundException(
+                self.getId(), referenceName)
+        cached = self._variantSummaryPyramids.get(varFileName)
+        if cached is None or cached[0] != signature:
+            pyramid = VariantSummaryPyramid.open(path)
+            if not pyramid.isCurrent(varFileName) or \
+                    pyramid.getReferenceLength(referenceName) is None:
+                raise exceptions.VariantSummaryPyramidNotFoundException(
+                    self.getId(), referenceName)
+            # The signature and pyramid are replaced together, so that
+            # concurrent requests always see a consistent pair.
+            cached = signature, pyramid
+            self._variantSummaryPyramids[varFileName] = cached
+        return cached[1]
+
+    def _updateCallSetIds(self, filename, fileInfo):
+        """
+        Updates the call set IDs based on the specified variant file
+        information.
         """
         # If this is the first file, we add in the samples. If not, we check
         # for consistency.
         if len(self._callSetIdMap) == 0:
-            for sample in variantFile.header.samples:
+            for sample in fileInfo['samples']:
                 self.addCallSet(sample)
         else:
             callSetIds = set([
                 self.getCallSetId(sample)
-                for sample in variantFile.header.samples])
+                for sample in fileInfo['samples']])
             if callSetIds != set(self._callSetIdMap.keys()):
-                raise exceptions.InconsistentCallSetIdException(
-                    variantFile.filename)
+                raise exceptions.InconsistentCallSetIdException(filename)
 
     def openFile(self, filename):
         return pysam.VariantFile(filename)
 
+    def scanFile(self, filename):
+        return scanVariantFile(filename)
+
     def _addDataFile(self, filename):
-        varFile = self.openFile(filename)
-        if varFile.index is None:
-            raise exceptions.NotIndexedException(filename)
-        for chrom in varFile.index:
-            # Unlike Tabix indices, CSI indices include all contigs defined
-            # in the BCF header.  Thus we must test each one to see if
-            # records exist or else they are likely to trigger spurious
-            # overlapping errors.
-            chrom, _, _ = self.sanitizeVariantFileFetch(chrom)
-            if not isEmptyIter(varFile.fetch(chrom)):
-                if chrom in self._chromFileMap:
-                    raise exceptions.OverlappingVcfException(filename, chrom)
-                self._updateMetadata(varFile)
-                self._updateCallSetIds(varFile)
-                self._chromFileMap[chrom] = filename
-        varFile.close()
+        fileInfo = self.getFileInfo(filename)
+        for chrom in fileInfo['contigs']:
+            if chrom in self._chromFileMap:
+                raise exceptions.OverlappingVcfException(filename, chrom)
+            self._updateMetadata(filename, fileInfo)
+            self._updateCallSetIds(filename, fileInfo)
+            self._chromFileMap[chrom] = filename
 
     def _convertGaCall(self, recordId, name, pysamCall, genotypeData):
         compoundId = self.getCallSetId(name)
@@ -410,6 +1075,7 @@ class HtslibVariantSet(datamodel.PysamDatamodelMixin, AbstractVariantSet):
                 call.info[key] = _encodeValue(value)
         return call
 
+    @metrics.registry.timed("convert")
     def convertVariant(self, record, callSetIds):
         """
         Converts the specified pysam variant record into a GA4GH Variant
@@ -456,39 +1122,82 @@ class HtslibVariantSet(datamodel.PysamDatamodelMixin, AbstractVariantSet):
         referenceName, startPosition, endPosition = \
             self.sanitizeVariantFileFetch(
                 compoundId.referenceName, start, start + 1)
-        cursor = self.getFileHandle(varFileName).fetch(
-            referenceName, startPosition, endPosition)
-        for record in cursor:
-            variant = self.convertVariant(record, self._callSetIds)
-            if (record.start == start and
-                    compoundId.md5 == self.hashVariant(variant)):
-                return variant
-            elif record.start > start:
-                raise exceptions.ObjectNotFoundException()
+        with self.fileHandle(varFileName) as varFile:
+            cursor = varFile.fetch(referenceName, startPosition, endPosition)
+            for record in cursor:
+                variant = self.convertVariant(record, self._callSetIds)
+                if (record.start == start and
+                        compoundId.md5 == self.hashVariant(variant)):
+                    return variant
+                elif record.start > start:
+                    raise exceptions.ObjectNotFoundException()
         raise exceptions.ObjectNotFoundException(compoundId)
 
     def getVariants(self, referenceName, startPosition, endPosition,
-                    callSetIds=None):
+                    callSetIds=None, siteFilter=None, genotypeFilter=None):
         """
         Returns an iterator over the specified variants. The parameters
         correspond to the attributes of a GASearchVariantsRequest object.
+        Records rejected by the specified VariantSiteFilter or
+        GenotypeFilter are skipped before they are converted.
         """
-        if callSetIds is None:
-            callSetIds = self._callSetIds
-        else:
-            for callSetId in callSetIds:
-                if callSetId not in self._callSetIds:
-                    raise exceptions.CallSetNotInVariantSetException(
-                        callSetId, self.getId())
+        if siteFilter is not None and siteFilter.isEmpty():
+            siteFilter = None
+        if genotypeFilter is not None and genotypeFilter.isEmpty():
+            genotypeFilter = None
+        callSetIds = self._checkCallSetIds(callSetIds)
         if referenceName in self._chromFileMap:
             varFileName = self._chromFileMap[referenceName]
             referenceName, startPosition, endPosition = \
                 self.sanitizeVariantFileFetch(
                     referenceName, startPosition, endPosition)
-            cursor = self.getFileHandle(varFileName).fetch(
+            with self.fileHandle(varFileName) as varFile:
+                cursor = varFile.fetch(
+                    referenceName, startPosition, endPosition)
+                for record in cursor:
+                    if siteFilter is not None and \
+                            not siteFilter.matchesRecord(record):
+                        continue
+                    if genotypeFilter is not None and \
+                            not genotypeFilter.matchesRecord(record):
+                        continue
+                    yield self.convertVariant(record, callSetIds)
+
+    def getGenotypeMatrixRows(
+            self, referenceName, startPosition, endPosition,
+            callSetIds=None):
+        """
+        Returns an iterator over the GenotypeMatrixRows of the variants
+        overlapping the specified region, as described in
+        AbstractVariantSet. The rows are built directly from the pysam
+        records, without converting them to GA Variants and Calls.
+        """
+        callSetIds = self._checkCallSetIds(callSetIds)
+        if referenceName not in self._chromFileMap:
+            return
+        varFileName = self._chromFileMap[referenceName]
+        sanitizedName, startPosition, endPosition = \
+            self.sanitizeVariantFileFetch(
                 referenceName, startPosition, endPosition)
+        with self.fileHandle(varFileName) as varFile:
+            # Files may list the same samples in different orders.
+            samples = list(varFile.header.samples)
+            sampleIndexes = [
+                samples.index(self.getCallSet(callSetId).getSampleName())
+                for callSetId in callSetIds]
+            cursor = varFile.fetch(sanitizedName, startPosition, endPosition)
             for record in cursor:
-                yield self.convertVariant(record, callSetIds)
+                alternateBases = []
+                if record.alts is not None:
+                    alternateBases = list(record.alts)
+                yield extensions.GenotypeMatrixRow(
+                    id=self.getSiteId(
+                        record.contig, record.start, record.ref,
+                        alternateBases),
+                    start=record.start, end=record.stop,
+                    referenceBases=record.ref, alternateBases=alternateBases,
+                    genotypes=",".join(
+                        getRecordGenotypes(record, sampleIndexes)))
 
     def getMetadata(self):
         return self._metadata
@@ -500,16 +1209,7 @@ class HtslibVariantSet(datamodel.PysamDatamodelMixin, AbstractVariantSet):
         return str(datamodel.VariantSetMetadataCompoundId(
             self.getCompoundId(), 'metadata:' + metadata.key))
 
-    def _getMetadataFromVcf(self, varFile):
-        # All the metadata is available via each varFile.header, including:
-        #    records: header records
-        #    version: VCF version
-        #    samples -- not immediately needed
-        #    contigs -- not immediately needed
-        #    filters -- not immediately needed
-        #    info
-        #    formats
-
+    def _getMetadataFromFileInfo(self, fileInfo):
         def buildMetadata(
                 key, type_="String", number="1", value="", id_="",
                 description=""):  # All input are strings
@@ -524,26 +1224,9 @@ class HtslibVariantSet(datamodel.PysamDatamodelMixin, AbstractVariantSet):
             metadata.id = id_
             return metadata
 
-        ret = []
-        header = varFile.header
-        ret.append(buildMetadata(key="version", value=header.version))
-        formats = header.formats.items()
-        infos = header.info.items()
-        # TODO: currently ALT field is not implemented through pysam
-        # NOTE: contigs field is different between vcf files,
-        # so it's not included in metadata
-        # NOTE: filters in not included in metadata unless needed
-        for prefix, content in [("FORMAT", formats), ("INFO", infos)]:
-            for contentKey, value in content:
-                attrs = dict(value.header.attrs)
-                # TODO: refactor description at next pysam release
-                # since description will be implemented as a member of
-                # VariantMetadata
-                description = attrs.get('Description', '').strip('"')
-                key = "{0}.{1}".format(prefix, value.name)
-                if key != "FORMAT.GT":
-                    ret.append(buildMetadata(
-                        key=key, type_=value.type,
-                        number="{}".format(value.number),
-                        description=description))
+        ret = [buildMetadata(key="version", value=fileInfo['version'])]
+        for key, type_, number, description in fileInfo['metadata']:
+            ret.append(buildMetadata(
+                key=key, type_=type_, number=number,
+                description=description))
         return ret
@@ -122,6 +122,23 @@ class BadPageSizeException(BadRequestException):
         self.message = "Request page size '{}' is invalid".format(pageSize)
 
 
+class BadBinSizeException(BadRequestException):
+    def __init__(self, binSize):
+        self.message = "Request bin size '{}' is invalid".format(binSize)
+
+
+class BadVariantFilterException(BadRequestException):
+    def __init__(self, attrName, value):
+        self.message = "Invalid value '{}' for variant filter {}".format(
+            value, attrName)
+
+
+class BadReadFilterException(BadRequestException):
+    def __init__(self, attrName, value):
+        self.message = "Invalid value '{}' for read filter {}".format(
+            value, attrName)
+
+
 class BadPageTokenException(BadRequestException):
     message = "Request page token invalid"
 
@@ -147,8 +164,17 @@ class RequestValidationFailureException(BadRequestException):
             "Request '{}' is not a valid instance of {}; "
             "invalid fields: {}")
         validator = avrotools.Validator(requestClass)
+        # Missing fields take their defaults, as in fromJsonDict, so that
+        # only the fields that are actually invalid are reported.
+        completeDict = jsonDict
+        if isinstance(jsonDict, dict):
+            completeDict = dict(
+                (field.name, field.default)
+                for field in requestClass.schema.fields
+                if field.has_default)
+            completeDict.update(jsonDict)
         self.message = messageString.format(
-            jsonDict, requestClass, validator.getInvalidFields(jsonDict))
+            jsonDict, requestClass, validator.getInvalidFields(completeDict))
 
 
 class BadReadsSearchRequestBothRefs(BadRequestException):
@@ -201,6 +227,27 @@ class DatasetNotFoundException(NotFoundException):
             datasetId)
 
 
+class CoveragePyramidNotFoundException(NotFoundException):
+    def __init__(self, readGroupSetId):
+        self.message = (
+            "No up to date coverage pyramid for ReadGroupSet '{}'".format(
+                readGroupSetId))
+
+
+class BinSizeNotFoundException(NotFoundException):
+    def __init__(self, binSize, binSizes):
+        self.message = (
+            "No tiles with bin size '{}'; the bin sizes are {}".format(
+                binSize, ", ".join(str(size) for size in binSizes)))
+
+
+class VariantSummaryPyramidNotFoundException(NotFoundException):
+    def __init__(self, variantSetId, referenceName):
+        self.message = (
+            "No up to date variant summary pyramid for reference '{}' "
+            "of VariantSet '{}'".format(referenceName, variantSetId))
+
+
 class ReadGroupNotFoundException(ObjectNotFoundException):
     def __init__(self, readGroupId):
         self.message = "readGroupId '{}' not found".format(readGroupId)
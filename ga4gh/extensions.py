@@ -0,0 +1,1188 @@
+"""
+Protocol elements for the server's extensions to the GA4GH API. These
+follow the same conventions as the classes generated from the schemas in
+_protocol_definitions, but are defined by this server, and so are kept
+separate from the classes of the protocol itself.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import avro.schema
+
+import ga4gh.protocol as protocol
+
+
+class SearchFilteredVariantsRequest(protocol.SearchRequest):
+    """
+    This request maps to the body of POST /variants/search as JSON. It
+    extends SearchVariantsRequest with optional filters on the sites of
+    the variants, which are applied by the server before the variants
+    are returned, so that a client need not download the variants it
+    would discard.
+    """
+    _schemaSource = """
+{"namespace": "org.ga4gh.extensions", "type": "record", "name":
+"SearchFilteredVariantsRequest", "fields": [{"doc": "", "type":
+"string", "name": "variantSetId"}, {"default": null, "doc": "", "type":
+["null", {"items": "string", "type": "array"}], "name": "callSetIds"},
+{"doc": "", "type": "string", "name": "referenceName"}, {"doc": "",
+"type": "long", "name": "start"}, {"doc": "", "type": "long", "name":
+"end"}, {"default": null, "doc": "", "type": ["null", "int"], "name":
+"pageSize"}, {"default": null, "doc": "", "type": ["null", "string"],
+"name": "pageToken"}, {"default": null, "doc": "", "type": ["null",
+"boolean"], "name": "passOnly"}, {"default": null, "doc": "", "type":
+["null", {"items": "string", "type": "array"}], "name":
+"variantClasses"}, {"default": null, "doc": "", "type": ["null",
+"double"], "name": "minQuality"}, {"default": null, "doc": "", "type":
+["null", "double"], "name": "minAlleleFrequency"}, {"default": null,
+"doc": "", "type": ["null", {"items": "string", "type": "array"}],
+"name": "anyNonReferenceCallSetIds"}, {"default": null, "doc": "",
+"type": ["null", {"items": "string", "type": "array"}], "name":
+"allNonReferenceCallSetIds"}], "doc": ""}
+"""
+    schema = avro.schema.parse(_schemaSource)
+    requiredFields = set([
+        "end",
+        "referenceName",
+        "start",
+        "variantSetId",
+    ])
+
+    @classmethod
+    def isEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+        return fieldName in embeddedTypes
+
+    @classmethod
+    def getEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+
+        return embeddedTypes[fieldName]
+
+    __slots__ = [
+        'allNonReferenceCallSetIds', 'anyNonReferenceCallSetIds',
+        'callSetIds', 'end', 'minAlleleFrequency', 'minQuality',
+        'pageSize', 'pageToken', 'passOnly', 'referenceName', 'start',
+        'variantClasses', 'variantSetId'
+    ]
+
+    def __init__(self, **kwargs):
+        self.allNonReferenceCallSetIds = kwargs.get(
+            'allNonReferenceCallSetIds', None)
+        """
+        If set, only return variants at which all of the call sets with
+        these IDs have an alternate allele in their genotypes. An empty
+        array places no condition on the variants.
+        """
+        self.anyNonReferenceCallSetIds = kwargs.get(
+            'anyNonReferenceCallSetIds', None)
+        """
+        If set, only return variants at which at least one of the call
+        sets with these IDs has an alternate allele in its genotype. If
+        an empty array, no variants are returned.
+        """
+        self.callSetIds = kwargs.get(
+            'callSetIds', None)
+        """
+        Only return variant calls which belong to call sets with these
+        IDs. If an empty array, returns variants without any call
+        objects. If null, returns all variant calls.
+        """
+        self.end = kwargs.get(
+            'end', None)
+        """
+        Required. The end of the window (0-based, exclusive) for which
+        overlapping variants should be returned.
+        """
+        self.minAlleleFrequency = kwargs.get(
+            'minAlleleFrequency', None)
+        """
+        If set, only return variants with an INFO/AF value of at least
+        this for one of their alternate alleles.
+        """
+        self.minQuality = kwargs.get(
+            'minQuality', None)
+        """
+        If set, only return variants with a QUAL of at least this.
+        """
+        self.pageSize = kwargs.get(
+            'pageSize', None)
+        """
+        Specifies the maximum number of results to return in a single
+        page. If unspecified, a system default will be used.
+        """
+        self.pageToken = kwargs.get(
+            'pageToken', None)
+        """
+        The continuation token, which is used to page through large
+        result sets. To get the next page of results, set this
+        parameter to the value of nextPageToken from the previous
+        response.
+        """
+        self.passOnly = kwargs.get(
+            'passOnly', None)
+        """
+        If true, only return variants that have passed all filters.
+        """
+        self.referenceName = kwargs.get(
+            'referenceName', None)
+        """
+        Required. Only return variants on this reference.
+        """
+        self.start = kwargs.get(
+            'start', None)
+        """
+        Required. The beginning of the window (0-based, inclusive) for
+        which overlapping variants should be returned.
+        """
+        self.variantClasses = kwargs.get(
+            'variantClasses', None)
+        """
+        If set, only return variants of these classes: SNV, MNV, INDEL
+        or OTHER.
+        """
+        self.variantSetId = kwargs.get(
+            'variantSetId', None)
+        """
+        Required. The ID of the variant set to search.
+        """
+
+
+class SearchMultiVariantSetsRequest(protocol.SearchRequest):
+    """
+    This request maps to the body of POST /variants/multi/search as JSON.
+    It searches for variants in several variant sets at once, returning
+    them in a single stream ordered by start position, with the variants
+    of each variant set in the order given by variantSetIds at equal
+    positions. The response is a SearchVariantsResponse. The variants
+    can be filtered as for a SearchFilteredVariantsRequest.
+    """
+    _schemaSource = """
+{"namespace": "org.ga4gh.extensions", "type": "record", "name":
+"SearchMultiVariantSetsRequest", "fields": [{"doc": "", "type":
+{"items": "string", "type": "array"}, "name": "variantSetIds"},
+{"default": null, "doc": "", "type": ["null", {"items": "string",
+"type": "array"}], "name": "callSetIds"}, {"doc": "", "type": "string",
+"name": "referenceName"}, {"doc": "", "type": "long", "name": "start"},
+{"doc": "", "type": "long", "name": "end"}, {"default": null, "doc": "",
+"type": ["null", "int"], "name": "pageSize"}, {"default": null, "doc":
+"", "type": ["null", "string"], "name": "pageToken"}, {"default": null,
+"doc": "", "type": ["null", "boolean"], "name": "passOnly"}, {"default":
+null, "doc": "", "type": ["null", {"items": "string", "type": "array"}],
+"name": "variantClasses"}, {"default": null, "doc": "", "type": ["null",
+"double"], "name": "minQuality"}, {"default": null, "doc": "", "type":
+["null", "double"], "name": "minAlleleFrequency"}, {"default": null,
+"doc": "", "type": ["null", {"items": "string", "type": "array"}],
+"name": "anyNonReferenceCallSetIds"}, {"default": null, "doc": "",
+"type": ["null", {"items": "string", "type": "array"}], "name":
+"allNonReferenceCallSetIds"}], "doc": ""}
+"""
+    schema = avro.schema.parse(_schemaSource)
+    requiredFields = set([
+        "end",
+        "referenceName",
+        "start",
+        "variantSetIds",
+    ])
+
+    @classmethod
+    def isEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+        return fieldName in embeddedTypes
+
+    @classmethod
+    def getEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+
+        return embeddedTypes[fieldName]
+
+    __slots__ = [
+        'allNonReferenceCallSetIds', 'anyNonReferenceCallSetIds',
+        'callSetIds', 'end', 'minAlleleFrequency', 'minQuality',
+        'pageSize', 'pageToken', 'passOnly', 'referenceName', 'start',
+        'variantClasses', 'variantSetIds'
+    ]
+
+    def __init__(self, **kwargs):
+        self.allNonReferenceCallSetIds = kwargs.get(
+            'allNonReferenceCallSetIds', None)
+        """
+        If set, only return variants at which all of the call sets with
+        these IDs that are in the variant's variant set have an alternate
+        allele in their genotypes. No variants are returned from a variant
+        set that contains none of these call sets. An empty array places
+        no condition on the variants.
+        """
+        self.anyNonReferenceCallSetIds = kwargs.get(
+            'anyNonReferenceCallSetIds', None)
+        """
+        If set, only return variants at which at least one of the call
+        sets with these IDs that are in the variant's variant set has an
+        alternate allele in its genotype. No variants are returned from
+        a variant set that contains none of these call sets, so if this
+        is an empty array, no variants are returned at all.
+        """
+        self.callSetIds = kwargs.get(
+            'callSetIds', None)
+        """
+        Only return variant calls which belong to call sets with these
+        IDs, each of which must be in one of the variant sets. If an
+        empty array, returns variants without any call objects. If
+        null, returns all variant calls.
+        """
+        self.end = kwargs.get(
+            'end', None)
+        """
+        Required. The end of the window (0-based, exclusive) for which
+        overlapping variants should be returned.
+        """
+        self.minAlleleFrequency = kwargs.get(
+            'minAlleleFrequency', None)
+        """
+        If set, only return variants with an INFO/AF value of at least
+        this for one of their alternate alleles.
+        """
+        self.minQuality = kwargs.get(
+            'minQuality', None)
+        """
+        If set, only return variants with a QUAL of at least this.
+        """
+        self.pageSize = kwargs.get(
+            'pageSize', None)
+        """
+        Specifies the maximum number of results to return in a single
+        page. If unspecified, a system default will be used.
+        """
+        self.pageToken = kwargs.get(
+            'pageToken', None)
+        """
+        The continuation token, which is used to page through large
+        result sets. To get the next page of results, set this
+        parameter to the value of nextPageToken from the previous
+        response.
+        """
+        self.passOnly = kwargs.get(
+            'passOnly', None)
+        """
+        If true, only return variants that have passed all filters.
+        """
+        self.referenceName = kwargs.get(
+            'referenceName', None)
+        """
+        Required. Only return variants on this reference.
+        """
+        self.start = kwargs.get(
+            'start', None)
+        """
+        Required. The beginning of the window (0-based, inclusive) for
+        which overlapping variants should be returned.
+        """
+        self.variantClasses = kwargs.get(
+            'variantClasses', None)
+        """
+        If set, only return variants of these classes: SNV, MNV, INDEL
+        or OTHER.
+        """
+        self.variantSetIds = kwargs.get(
+            'variantSetIds', [])
+        """
+        Required. The IDs of the variant sets to search.
+        """
+
+
+class SearchFilteredReadsRequest(protocol.SearchRequest):
+    """
+    This request maps to the body of POST /reads/search as JSON. It
+    extends SearchReadsRequest with optional filters on the mapping
+    quality, SAM flags and length of the reads, which are applied by the
+    server before the reads are returned, and with optional downsampling
+    of the reads that pass them.
+    """
+    _schemaSource = """
+{"namespace": "org.ga4gh.extensions", "type": "record", "name":
+"SearchFilteredReadsRequest", "fields": [{"doc": "", "type": {"items":
+"string", "type": "array"}, "name": "readGroupIds"}, {"default": null,
+"doc": "", "type": ["null", "string"], "name": "referenceId"},
+{"default": null, "doc": "", "type": ["null", "long"], "name":
+"start"}, {"default": null, "doc": "", "type": ["null", "long"],
+"name": "end"}, {"default": null, "doc": "", "type": ["null", "int"],
+"name": "pageSize"}, {"default": null, "doc": "", "type": ["null",
+"string"], "name": "pageToken"}, {"default": null, "doc": "", "type":
+["null", "int"], "name": "minMappingQuality"}, {"default": null,
+"doc": "", "type": ["null", "int"], "name": "requiredFlags"},
+{"default": null, "doc": "", "type": ["null", "int"], "name":
+"excludedFlags"}, {"default": null, "doc": "", "type": ["null",
+"int"], "name": "minReadLength"}, {"default": null, "doc": "", "type":
+["null", "int"], "name": "maxReadLength"}, {"default": null, "doc":
+"", "type": ["null", "int"], "name": "maxReadsPerBucket"}, {"default":
+null, "doc": "", "type": ["null", "int"], "name": "bucketSize"},
+{"default": null, "doc": "", "type": ["null", "long"], "name":
+"downsamplingSeed"}], "doc": ""}
+"""
+    schema = avro.schema.parse(_schemaSource)
+    requiredFields = set([
+        "readGroupIds",
+    ])
+
+    @classmethod
+    def isEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+        return fieldName in embeddedTypes
+
+    @classmethod
+    def getEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+
+        return embeddedTypes[fieldName]
+
+    __slots__ = [
+        'bucketSize', 'downsamplingSeed', 'end', 'excludedFlags',
+        'maxReadLength', 'maxReadsPerBucket', 'minMappingQuality',
+        'minReadLength', 'pageSize', 'pageToken', 'readGroupIds',
+        'referenceId', 'requiredFlags', 'start'
+    ]
+
+    def __init__(self, **kwargs):
+        self.bucketSize = kwargs.get(
+            'bucketSize', None)
+        """
+        The size of the buckets of positions that maxReadsPerBucket
+        applies to, which are aligned to multiples of it. Defaults to
+        100.
+        """
+        self.downsamplingSeed = kwargs.get(
+            'downsamplingSeed', None)
+        """
+        The seed that chooses the reads kept by downsampling. The same
+        reads are returned for the same seed. Defaults to 0.
+        """
+        self.end = kwargs.get(
+            'end', None)
+        """
+        The end position (0-based, exclusive) of this query. If a
+        reference is specified, this defaults to the reference's length.
+        """
+        self.excludedFlags = kwargs.get(
+            'excludedFlags', None)
+        """
+        If set, only return reads whose SAM flag has none of these bits
+        set. For example, 0xF00 excludes secondary, QC failed, duplicate
+        and supplementary alignments.
+        """
+        self.maxReadLength = kwargs.get(
+            'maxReadLength', None)
+        """
+        If set, only return reads with at most this many bases.
+        """
+        self.maxReadsPerBucket = kwargs.get(
+            'maxReadsPerBucket', None)
+        """
+        If set, return at most this many of the reads starting in each
+        bucket of bucketSize positions, chosen pseudo-randomly from
+        those passing the filters.
+        """
+        self.minMappingQuality = kwargs.get(
+            'minMappingQuality', None)
+        """
+        If set, only return reads with a mapping quality of at least
+        this.
+        """
+        self.minReadLength = kwargs.get(
+            'minReadLength', None)
+        """
+        If set, only return reads with at least this many bases.
+        """
+        self.pageSize = kwargs.get(
+            'pageSize', None)
+        """
+        Specifies the maximum number of results to return in a single
+        page. If unspecified, a system default will be used.
+        """
+        self.pageToken = kwargs.get(
+            'pageToken', None)
+        """
+        The continuation token, which is used to page through large
+        result sets. To get the next page of results, set this
+        parameter to the value of nextPageToken from the previous
+        response.
+        """
+        self.readGroupIds = kwargs.get(
+            'readGroupIds', None)
+        """
+        The ReadGroups to search. At least one readGroupId must be
+        specified.
+        """
+        self.referenceId = kwargs.get(
+            'referenceId', None)
+        """
+        The reference to query.
+        """
+        self.requiredFlags = kwargs.get(
+            'requiredFlags', None)
+        """
+        If set, only return reads whose SAM flag has all of these bits
+        set.
+        """
+        self.start = kwargs.get(
+            'start', None)
+        """
+        The start position (0-based) of this query. If a reference is
+        specified, this defaults to 0.
+        """
+
+
+class CoverageBin(protocol.ProtocolElement):
+    """
+    The depth of coverage of the reads of a read group over a bin of
+    positions on a reference.
+    """
+    _schemaSource = """
+{"namespace": "org.ga4gh.extensions", "type": "record", "name":
+"CoverageBin", "fields": [{"doc": "", "type": "long", "name":
+"start"}, {"doc": "", "type": "long", "name": "end"}, {"doc": "",
+"type": "double", "name": "meanDepth"}, {"default": null, "doc": "",
+"type": ["null", {"items": "long", "type": "array"}], "name":
+"baseCounts"}], "doc": ""}
+"""
+    schema = avro.schema.parse(_schemaSource)
+    requiredFields = set([
+        "end",
+        "meanDepth",
+        "start",
+    ])
+
+    @classmethod
+    def isEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+        return fieldName in embeddedTypes
+
+    @classmethod
+    def getEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+
+        return embeddedTypes[fieldName]
+
+    __slots__ = [
+        'baseCounts', 'end', 'meanDepth', 'start'
+    ]
+
+    def __init__(self, **kwargs):
+        self.baseCounts = kwargs.get(
+            'baseCounts', None)
+        """
+        The numbers of aligned A, C, G and T bases in the bin, in that
+        order, if they were requested.
+        """
+        self.end = kwargs.get(
+            'end', None)
+        """
+        The end of the bin (0-based, exclusive).
+        """
+        self.meanDepth = kwargs.get(
+            'meanDepth', None)
+        """
+        The mean number of aligned bases per position of the bin. Bases
+        in deletions, skips, insertions and clips are not counted.
+        """
+        self.start = kwargs.get(
+            'start', None)
+        """
+        The start of the bin (0-based, inclusive).
+        """
+
+
+class SearchCoverageRequest(protocol.SearchRequest):
+    """
+    This request maps to the body of POST /coverage/search as JSON. It
+    summarises the reads of a read group over a region of a reference as
+    consecutive bins of binSize positions, so that a coverage track can
+    be drawn without fetching the reads.
+    """
+    _schemaSource = """
+{"namespace": "org.ga4gh.extensions", "type": "record", "name":
+"SearchCoverageRequest", "fields": [{"doc": "", "type": "string",
+"name": "readGroupId"}, {"doc": "", "type": "string", "name":
+"referenceId"}, {"default": null, "doc": "", "type": ["null", "long"],
+"name": "start"}, {"default": null, "doc": "", "type": ["null",
+"long"], "name": "end"}, {"default": null, "doc": "", "type": ["null",
+"int"], "name": "binSize"}, {"default": null, "doc": "", "type":
+["null", "boolean"], "name": "includeBaseCounts"}, {"default": null,
+"doc": "", "type": ["null", "int"], "name": "minMappingQuality"},
+{"default": null, "doc": "", "type": ["null", "int"], "name":
+"requiredFlags"}, {"default": null, "doc": "", "type": ["null",
+"int"], "name": "excludedFlags"}, {"default": null, "doc": "", "type":
+["null", "int"], "name": "pageSize"}, {"default": null, "doc": "",
+"type": ["null", "string"], "name": "pageToken"}], "doc": ""}
+"""
+    schema = avro.schema.parse(_schemaSource)
+    requiredFields = set([
+        "readGroupId",
+        "referenceId",
+    ])
+
+    @classmethod
+    def isEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+        return fieldName in embeddedTypes
+
+    @classmethod
+    def getEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+
+        return embeddedTypes[fieldName]
+
+    __slots__ = [
+        'binSize', 'end', 'excludedFlags', 'includeBaseCounts',
+        'minMappingQuality', 'pageSize', 'pageToken', 'readGroupId',
+        'referenceId', 'requiredFlags', 'start'
+    ]
+
+    def __init__(self, **kwargs):
+        self.binSize = kwargs.get(
+            'binSize', None)
+        """
+        The number of positions in each bin. The last bin is shorter if
+        the region is not a multiple of this. Defaults to 1.
+        """
+        self.end = kwargs.get(
+            'end', None)
+        """
+        The end of the region (0-based, exclusive). Defaults to the
+        length of the reference.
+        """
+        self.excludedFlags = kwargs.get(
+            'excludedFlags', None)
+        """
+        If set, only count reads whose SAM flag has none of these bits
+        set.
+        """
+        self.includeBaseCounts = kwargs.get(
+            'includeBaseCounts', None)
+        """
+        If true, also return the numbers of each base in each bin.
+        """
+        self.minMappingQuality = kwargs.get(
+            'minMappingQuality', None)
+        """
+        If set, only count reads with a mapping quality of at least
+        this.
+        """
+        self.pageSize = kwargs.get(
+            'pageSize', None)
+        """
+        Specifies the maximum number of bins to return in a single page.
+        If unspecified, a system default will be used.
+        """
+        self.pageToken = kwargs.get(
+            'pageToken', None)
+        """
+        The continuation token, which is used to page through large
+        result sets. To get the next page of results, set this
+        parameter to the value of nextPageToken from the previous
+        response.
+        """
+        self.readGroupId = kwargs.get(
+            'readGroupId', None)
+        """
+        Required. The ID of the read group whose reads are counted.
+        """
+        self.referenceId = kwargs.get(
+            'referenceId', None)
+        """
+        Required. The ID of the reference to summarise.
+        """
+        self.requiredFlags = kwargs.get(
+            'requiredFlags', None)
+        """
+        If set, only count reads whose SAM flag has all of these bits
+        set.
+        """
+        self.start = kwargs.get(
+            'start', None)
+        """
+        The start of the region (0-based, inclusive). Defaults to 0.
+        """
+
+
+class SearchCoverageResponse(protocol.SearchResponse):
+    """
+    This is the response from POST /coverage/search expressed as JSON.
+    """
+    _schemaSource = """
+{"namespace": "org.ga4gh.extensions", "type": "record", "name":
+"SearchCoverageResponse", "fields": [{"default": [], "doc": "",
+"type": {"items": {"namespace": "org.ga4gh.extensions", "type":
+"record", "name": "CoverageBin", "fields": [{"doc": "", "type":
+"long", "name": "start"}, {"doc": "", "type": "long", "name": "end"},
+{"doc": "", "type": "double", "name": "meanDepth"}, {"default": null,
+"doc": "", "type": ["null", {"items": "long", "type": "array"}],
+"name": "baseCounts"}], "doc": ""}, "type": "array"}, "name": "bins"},
+{"default": null, "doc": "", "type": ["null", "string"], "name":
+"nextPageToken"}], "doc": ""}
+"""
+    schema = avro.schema.parse(_schemaSource)
+    requiredFields = set([])
+    _valueListName = "bins"
+
+    @classmethod
+    def isEmbeddedType(cls, fieldName):
+        embeddedTypes = {
+            'bins': CoverageBin,
+        }
+        return fieldName in embeddedTypes
+
+    @classmethod
+    def getEmbeddedType(cls, fieldName):
+        embeddedTypes = {
+            'bins': CoverageBin,
+        }
+
+        return embeddedTypes[fieldName]
+
+    __slots__ = [
+        'bins', 'nextPageToken'
+    ]
+
+    def __init__(self, **kwargs):
+        self.bins = kwargs.get(
+            'bins', [])
+        """
+        The bins of the region, in order of position.
+        """
+        self.nextPageToken = kwargs.get(
+            'nextPageToken', None)
+        """
+        The continuation token, which is used to page through large
+        result sets. Provide this value in a subsequent request to
+        return the next page of results. This field will be empty if
+        there aren't any additional results.
+        """
+
+
+class SearchCoverageTilesRequest(protocol.SearchRequest):
+    """
+    This request maps to the body of POST /coverage/tiles/search as JSON.
+    It returns bins of one level of the precomputed coverage pyramid of
+    a read group set, which are aligned to multiples of binSize, so that
+    a coverage track can be drawn at any zoom in constant time. The
+    response is a SearchCoverageResponse.
+    """
+    _schemaSource = """
+{"namespace": "org.ga4gh.extensions", "type": "record", "name":
+"SearchCoverageTilesRequest", "fields": [{"doc": "", "type": "string",
+"name": "readGroupId"}, {"doc": "", "type": "string", "name":
+"referenceId"}, {"doc": "", "type": "long", "name": "binSize"},
+{"default": null, "doc": "", "type": ["null", "long"], "name":
+"start"}, {"default": null, "doc": "", "type": ["null", "long"],
+"name": "end"}, {"default": null, "doc": "", "type": ["null", "int"],
+"name": "pageSize"}, {"default": null, "doc": "", "type": ["null",
+"string"], "name": "pageToken"}], "doc": ""}
+"""
+    schema = avro.schema.parse(_schemaSource)
+    requiredFields = set([
+        "binSize",
+        "readGroupId",
+        "referenceId",
+    ])
+
+    @classmethod
+    def isEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+        return fieldName in embeddedTypes
+
+    @classmethod
+    def getEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+
+        return embeddedTypes[fieldName]
+
+    __slots__ = [
+        'binSize', 'end', 'pageSize', 'pageToken', 'readGroupId',
+        'referenceId', 'start'
+    ]
+
+    def __init__(self, **kwargs):
+        self.binSize = kwargs.get(
+            'binSize', None)
+        """
+        Required. The bin size of the level of the pyramid to return,
+        which must be one of the bin sizes it was built with.
+        """
+        self.end = kwargs.get(
+            'end', None)
+        """
+        The end of the region (0-based, exclusive). Defaults to the
+        length of the reference.
+        """
+        self.pageSize = kwargs.get(
+            'pageSize', None)
+        """
+        Specifies the maximum number of bins to return in a single page.
+        If unspecified, a system default will be used.
+        """
+        self.pageToken = kwargs.get(
+            'pageToken', None)
+        """
+        The continuation token, which is used to page through large
+        result sets. To get the next page of results, set this
+        parameter to the value of nextPageToken from the previous
+        response.
+        """
+        self.readGroupId = kwargs.get(
+            'readGroupId', None)
+        """
+        Required. The ID of the read group whose coverage is returned.
+        """
+        self.referenceId = kwargs.get(
+            'referenceId', None)
+        """
+        Required. The ID of the reference to return the coverage of.
+        """
+        self.start = kwargs.get(
+            'start', None)
+        """
+        The start of the region (0-based, inclusive). Defaults to 0.
+        The bins returned are those overlapping the region.
+        """
+
+
+class VariantSummaryBin(protocol.ProtocolElement):
+    """
+    The number of variants of each class, and their mean allele
+    frequency, in a bin of positions on a reference.
+    """
+    _schemaSource = """
+{"namespace": "org.ga4gh.extensions", "type": "record", "name":
+"VariantSummaryBin", "fields": [{"doc": "", "type": "long", "name":
+"start"}, {"doc": "", "type": "long", "name": "end"}, {"doc": "",
+"type": "long", "name": "numVariants"}, {"default": [], "doc": "",
+"type": {"items": "long", "type": "array"}, "name":
+"variantClassCounts"}, {"default": null, "doc": "", "type": ["null",
+"double"], "name": "meanAlleleFrequency"}], "doc": ""}
+"""
+    schema = avro.schema.parse(_schemaSource)
+    requiredFields = set([
+        "end",
+        "numVariants",
+        "start",
+    ])
+
+    @classmethod
+    def isEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+        return fieldName in embeddedTypes
+
+    @classmethod
+    def getEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+
+        return embeddedTypes[fieldName]
+
+    __slots__ = [
+        'end', 'meanAlleleFrequency', 'numVariants', 'start',
+        'variantClassCounts'
+    ]
+
+    def __init__(self, **kwargs):
+        self.end = kwargs.get(
+            'end', None)
+        """
+        The end of the bin (0-based, exclusive).
+        """
+        self.meanAlleleFrequency = kwargs.get(
+            'meanAlleleFrequency', None)
+        """
+        The mean over the variants starting in the bin of the fraction
+        of the alleles called in their genotypes that are alternate
+        alleles. Variants without called alleles are not included, and
+        the field is null if there are no such variants.
+        """
+        self.numVariants = kwargs.get(
+            'numVariants', None)
+        """
+        The number of variants starting in the bin.
+        """
+        self.start = kwargs.get(
+            'start', None)
+        """
+        The start of the bin (0-based, inclusive).
+        """
+        self.variantClassCounts = kwargs.get(
+            'variantClassCounts', [])
+        """
+        The numbers of SNV, MNV, INDEL and OTHER variants starting in
+        the bin, in that order.
+        """
+
+
+class SearchVariantSummariesRequest(protocol.SearchRequest):
+    """
+    This request maps to the body of POST /variants/summaries/search as
+    JSON. It returns bins of one level of the precomputed variant
+    summary pyramid of a variant set, which are aligned to multiples of
+    binSize, so that a variant density track can be drawn at any zoom
+    without searching the variants.
+    """
+    _schemaSource = """
+{"namespace": "org.ga4gh.extensions", "type": "record", "name":
+"SearchVariantSummariesRequest", "fields": [{"doc": "", "type":
+"string", "name": "variantSetId"}, {"doc": "", "type": "string",
+"name": "referenceName"}, {"doc": "", "type": "long", "name":
+"binSize"}, {"default": null, "doc": "", "type": ["null", "long"],
+"name": "start"}, {"default": null, "doc": "", "type": ["null",
+"long"], "name": "end"}, {"default": null, "doc": "", "type": ["null",
+"int"], "name": "pageSize"}, {"default": null, "doc": "", "type":
+["null", "string"], "name": "pageToken"}], "doc": ""}
+"""
+    schema = avro.schema.parse(_schemaSource)
+    requiredFields = set([
+        "binSize",
+        "referenceName",
+        "variantSetId",
+    ])
+
+    @classmethod
+    def isEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+        return fieldName in embeddedTypes
+
+    @classmethod
+    def getEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+
+        return embeddedTypes[fieldName]
+
+    __slots__ = [
+        'binSize', 'end', 'pageSize', 'pageToken', 'referenceName',
+        'start', 'variantSetId'
+    ]
+
+    def __init__(self, **kwargs):
+        self.binSize = kwargs.get(
+            'binSize', None)
+        """
+        Required. The bin size of the level of the pyramid to return,
+        which must be one of the bin sizes it was built with.
+        """
+        self.end = kwargs.get(
+            'end', None)
+        """
+        The end of the region (0-based, exclusive). Defaults to the
+        length of the reference.
+        """
+        self.pageSize = kwargs.get(
+            'pageSize', None)
+        """
+        Specifies the maximum number of bins to return in a single page.
+        If unspecified, a system default will be used.
+        """
+        self.pageToken = kwargs.get(
+            'pageToken', None)
+        """
+        The continuation token, which is used to page through large
+        result sets. To get the next page of results, set this
+        parameter to the value of nextPageToken from the previous
+        response.
+        """
+        self.referenceName = kwargs.get(
+            'referenceName', None)
+        """
+        Required. The name of the reference to summarise the variants
+        of.
+        """
+        self.start = kwargs.get(
+            'start', None)
+        """
+        The start of the region (0-based, inclusive). Defaults to 0.
+        The bins returned are those overlapping the region.
+        """
+        self.variantSetId = kwargs.get(
+            'variantSetId', None)
+        """
+        Required. The ID of the variant set whose variants are
+        summarised.
+        """
+
+
+class SearchVariantSummariesResponse(protocol.SearchResponse):
+    """
+    This is the response from POST /variants/summaries/search expressed
+    as JSON.
+    """
+    _schemaSource = """
+{"namespace": "org.ga4gh.extensions", "type": "record", "name":
+"SearchVariantSummariesResponse", "fields": [{"default": [], "doc":
+"", "type": {"items": {"namespace": "org.ga4gh.extensions", "type":
+"record", "name": "VariantSummaryBin", "fields": [{"doc": "", "type":
+"long", "name": "start"}, {"doc": "", "type": "long", "name": "end"},
+{"doc": "", "type": "long", "name": "numVariants"}, {"default": [],
+"doc": "", "type": {"items": "long", "type": "array"}, "name":
+"variantClassCounts"}, {"default": null, "doc": "", "type": ["null",
+"double"], "name": "meanAlleleFrequency"}], "doc": ""}, "type":
+"array"}, "name": "bins"}, {"default": null, "doc": "", "type":
+["null", "string"], "name": "nextPageToken"}], "doc": ""}
+"""
+    schema = avro.schema.parse(_schemaSource)
+    requiredFields = set([])
+    _valueListName = "bins"
+
+    @classmethod
+    def isEmbeddedType(cls, fieldName):
+        embeddedTypes = {
+            'bins': VariantSummaryBin,
+        }
+        return fieldName in embeddedTypes
+
+    @classmethod
+    def getEmbeddedType(cls, fieldName):
+        embeddedTypes = {
+            'bins': VariantSummaryBin,
+        }
+
+        return embeddedTypes[fieldName]
+
+    __slots__ = [
+        'bins', 'nextPageToken'
+    ]
+
+    def __init__(self, **kwargs):
+        self.bins = kwargs.get(
+            'bins', [])
+        """
+        The bins of the region, in order of position.
+        """
+        self.nextPageToken = kwargs.get(
+            'nextPageToken', None)
+        """
+        The continuation token, which is used to page through large
+        result sets. Provide this value in a subsequent request to
+        return the next page of results. This field will be empty if
+        there aren't any additional results.
+        """
+
+
+class GenotypeMatrixRow(protocol.ProtocolElement):
+    """
+    A variant site and the genotypes of a set of call sets at it, which
+    are encoded as a single string rather than as Call objects.
+    """
+    _schemaSource = """
+{"namespace": "org.ga4gh.extensions", "type": "record", "name":
+"GenotypeMatrixRow", "fields": [{"doc": "", "type": "string", "name":
+"id"}, {"doc": "", "type": "long", "name": "start"}, {"doc": "",
+"type": "long", "name": "end"}, {"doc": "", "type": "string", "name":
+"referenceBases"}, {"default": [], "doc": "", "type": {"items":
+"string", "type": "array"}, "name": "alternateBases"}, {"doc": "",
+"type": "string", "name": "genotypes"}], "doc": ""}
+"""
+    schema = avro.schema.parse(_schemaSource)
+    requiredFields = set([
+        "end",
+        "genotypes",
+        "id",
+        "referenceBases",
+        "start",
+    ])
+
+    @classmethod
+    def isEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+        return fieldName in embeddedTypes
+
+    @classmethod
+    def getEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+
+        return embeddedTypes[fieldName]
+
+    __slots__ = [
+        'alternateBases', 'end', 'genotypes', 'id', 'referenceBases',
+        'start'
+    ]
+
+    def __init__(self, **kwargs):
+        self.alternateBases = kwargs.get(
+            'alternateBases', [])
+        """
+        The bases that appear instead of the reference bases.
+        """
+        self.end = kwargs.get(
+            'end', None)
+        """
+        The end position (exclusive), resulting in [start, end) closed-open
+        interval.
+        """
+        self.genotypes = kwargs.get(
+            'genotypes', None)
+        """
+        The genotypes of the columns of the matrix at this variant,
+        separated by commas. Each is written as a VCF GT value, such as
+        0/1, 1|0 or ./., and is . if the call set has no genotype here.
+        """
+        self.id = kwargs.get(
+            'id', None)
+        """
+        The ID of the variant, which is the ID of the Variant returned
+        by a variant search for this site.
+        """
+        self.referenceBases = kwargs.get(
+            'referenceBases', None)
+        """
+        The reference bases for this variant. They start at the given
+        start position.
+        """
+        self.start = kwargs.get(
+            'start', None)
+        """
+        The start position at which this variant occurs (0-based).
+        """
+
+
+class SearchGenotypeMatrixRequest(protocol.SearchRequest):
+    """
+    This request maps to the body of POST /variants/genotypematrix/search
+    as JSON. It returns the genotype matrix of the variants in a region
+    of a variant set, with a row per variant and a column per call set,
+    which is far smaller and faster to produce than the Call objects of
+    a variant search for a large cohort.
+    """
+    _schemaSource = """
+{"namespace": "org.ga4gh.extensions", "type": "record", "name":
+"SearchGenotypeMatrixRequest", "fields": [{"doc": "", "type":
+"string", "name": "variantSetId"}, {"default": null, "doc": "",
+"type": ["null", {"items": "string", "type": "array"}], "name":
+"callSetIds"}, {"doc": "", "type": "string", "name": "referenceName"},
+{"doc": "", "type": "long", "name": "start"}, {"doc": "", "type":
+"long", "name": "end"}, {"default": null, "doc": "", "type": ["null",
+"int"], "name": "pageSize"}, {"default": null, "doc": "", "type":
+["null", "string"], "name": "pageToken"}], "doc": ""}
+"""
+    schema = avro.schema.parse(_schemaSource)
+    requiredFields = set([
+        "end",
+        "referenceName",
+        "start",
+        "variantSetId",
+    ])
+
+    @classmethod
+    def isEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+        return fieldName in embeddedTypes
+
+    @classmethod
+    def getEmbeddedType(cls, fieldName):
+        embeddedTypes = {}
+
+        return embeddedTypes[fieldName]
+
+    __slots__ = [
+        'callSetIds', 'end', 'pageSize', 'pageToken', 'referenceName',
+        'start', 'variantSetId'
+    ]
+
+    def __init__(self, **kwargs):
+        self.callSetIds = kwargs.get(
+            'callSetIds', None)
+        """
+        The IDs of the call sets that are the columns of the matrix, in
+        order, each of which must be in the variant set. If null, the
+        columns are all of the call sets of the variant set, in the
+        order in which a call set search returns them.
+        """
+        self.end = kwargs.get(
+            'end', None)
+        """
+        Required. The end of the window (0-based, exclusive) for which
+        overlapping variants should be returned.
+        """
+        self.pageSize = kwargs.get(
+            'pageSize', None)
+        """
+        Specifies the maximum number of rows to return in a single page.
+        If unspecified, a system default will be used.
+        """
+        self.pageToken = kwargs.get(
+            'pageToken', None)
+        """
+        The continuation token, which is used to page through large
+        result sets. To get the next page of results, set this
+        parameter to the value of nextPageToken from the previous
+        response.
+        """
+        self.referenceName = kwargs.get(
+            'referenceName', None)
+        """
+        Required. Only return variants on this reference.
+        """
+        self.start = kwargs.get(
+            'start', None)
+        """
+        Required. The beginning of the window (0-based, inclusive) for
+        which overlapping variants should be returned.
+        """
+        self.variantSetId = kwargs.get(
+            'variantSetId', None)
+        """
+        Required. The ID of the variant set to search.
+        """
+
+
+class SearchGenotypeMatrixResponse(protocol.SearchResponse):
+    """
+    This is the response from POST /variants/genotypematrix/search
+    expressed as JSON.
+    """
+    _schemaSource = """
+{"namespace": "org.ga4gh.extensions", "type": "record", "name":
+"SearchGenotypeMatrixResponse", "fields": [{"default": [], "doc": "",
+"type": {"items": {"namespace": "org.ga4gh.extensions", "type":
+"record", "name": "GenotypeMatrixRow", "fields": [{"doc": "", "type":
+"string", "name": "id"}, {"doc": "", "type": "long", "name": "start"},
+{"doc": "", "type": "long", "name": "end"}, {"doc": "", "type":
+"string", "name": "referenceBases"}, {"default": [], "doc": "",
+"type": {"items": "string", "type": "array"}, "name":
+"alternateBases"}, {"doc": "", "type": "string", "name":
+"genotypes"}], "doc": ""}, "type": "array"}, "name": "rows"},
+{"default": null, "doc": "", "type": ["null", "string"], "name":
+"nextPageToken"}], "doc": ""}
+"""
+    schema = avro.schema.parse(_schemaSource)
+    requiredFields = set([])
+    _valueListName = "rows"
+
+    @classmethod
+    def isEmbeddedType(cls, fieldName):
+        embeddedTypes = {
+            'rows': GenotypeMatrixRow,
+        }
+        return fieldName in embeddedTypes
+
+    @classmethod
+    def getEmbeddedType(cls, fieldName):
+        embeddedTypes = {
+            'rows': GenotypeMatrixRow,
+        }
+
+        return embeddedTypes[fieldName]
+
+    __slots__ = [
+        'nextPageToken', 'rows'
+    ]
+
+    def __init__(self, **kwargs):
+        self.nextPageToken = kwargs.get(
+            'nextPageToken', None)
+        """
+        The continuation token, which is used to page through large
+        result sets. Provide this value in a subsequent request to
+        return the next page of results. This field will be empty if
+        there aren't any additional results.
+        """
+        self.rows = kwargs.get(
+            'rows', [])
+        """
+        The rows of the matrix, one per variant, in the order in which
+        a variant search returns the variants.
+        """
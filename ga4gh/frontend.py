@@ -10,6 +10,7 @@ from __future__ import unicode_literals
 import os
 import datetime
 import socket
+import threading
 import urlparse
 import functools
 
@@ -24,9 +25,12 @@ import requests
 
 import ga4gh
 import ga4gh.backend as backend
+import ga4gh.capture as capture
 import ga4gh.datamodel as datamodel
+import ga4gh.metrics as metrics
 import ga4gh.protocol as protocol
 import ga4gh.exceptions as exceptions
+import ga4gh.responsecache as responsecache
 
 
 MIMETYPE = "application/json"
@@ -36,6 +40,7 @@ SECRET_KEY_LENGTH = 24
 app = flask.Flask(__name__)
 assert not hasattr(app, 'urls')
 app.urls = []
+app.rescanThread = None
 
 
 class NoConverter(werkzeug.routing.BaseConverter):
@@ -142,6 +147,146 @@ class ServerStatus(object):
         """
         return app.backend.getReferenceSets()
 
+    def getEndpointMetrics(self):
+        """
+        Returns the list of metrics summaries for each endpoint.
+        """
+        return metrics.registry.getEndpointSummaries()
+
+    def getSlowRequests(self):
+        """
+        Returns the list of the most recent slow requests.
+        """
+        return metrics.registry.getSlowRequests()
+
+    def getFileHandleCacheStatistics(self):
+        """
+        Returns the statistics of the file handle cache.
+        """
+        return datamodel.fileHandleCache.getStatistics()
+
+    def getResponseCacheStatistics(self):
+        """
+        Returns the statistics of the response cache, or None if
+        responses are not cached.
+        """
+        responseCache = app.backend.getResponseCache()
+        if responseCache is None:
+            return None
+        return responseCache.getStatistics()
+
+
+def _getFileHandleCacheMetric(key):
+    """
+    Returns a metrics collector for the specified file handle cache
+    statistic.
+    """
+    def collector():
+        return [([], datamodel.fileHandleCache.getStatistics()[key])]
+    return collector
+
+
+metrics.registry.addCollector(
+    "ga4gh_file_handle_cache_hits_total", "counter",
+    "Number of file handle cache hits.", _getFileHandleCacheMetric("hits"))
+metrics.registry.addCollector(
+    "ga4gh_file_handle_cache_misses_total", "counter",
+    "Number of file handle cache misses.",
+    _getFileHandleCacheMetric("misses"))
+metrics.registry.addCollector(
+    "ga4gh_file_handle_cache_evictions_total", "counter",
+    "Number of file handles evicted from the cache.",
+    _getFileHandleCacheMetric("evictions"))
+metrics.registry.addCollector(
+    "ga4gh_file_handle_cache_open_handles", "gauge",
+    "Number of open file handles.", _getFileHandleCacheMetric("openHandles"))
+
+
+def _getResponseCacheMetric(key):
+    """
+    Returns a metrics collector for the specified response cache
+    statistic, which has no samples if responses are not cached.
+    """
+    def collector():
+        statistics = app.serverStatus.getResponseCacheStatistics()
+        if statistics is None:
+            return []
+        return [([], statistics[key])]
+    return collector
+
+
+metrics.registry.addCollector(
+    "ga4gh_response_cache_hits_total", "counter",
+    "Number of response cache hits.", _getResponseCacheMetric("hits"))
+metrics.registry.addCollector(
+    "ga4gh_response_cache_misses_total", "counter",
+    "Number of response cache misses.", _getResponseCacheMetric("misses"))
+metrics.registry.addCollector(
+    "ga4gh_response_cache_evictions_total", "counter",
+    "Number of responses evicted from the cache.",
+    _getResponseCacheMetric("evictions"))
+metrics.registry.addCollector(
+    "ga4gh_response_cache_bytes", "gauge",
+    "Total size of the cached responses.", _getResponseCacheMetric("bytes"))
+
+
+class DataRescanThread(threading.Thread):
+    """
+    A daemon thread that polls the data directory of the backend for
+    changes every interval seconds, and rescans it when any are found.
+    This is not used by the pre-forking server, whose master process
+    polls for changes itself.
+    """
+    def __init__(self, interval):
+        super(DataRescanThread, self).__init__()
+        self.daemon = True
+        self._interval = interval
+        self._stopEvent = threading.Event()
+
+    def run(self):
+        while not self._stopEvent.wait(self._interval):
+            try:
+                if hasBackendChanged():
+                    rescanBackend()
+            except Exception:
+                app.logger.exception("Rescanning the data directory failed")
+
+    def stop(self):
+        self._stopEvent.set()
+
+
+_rescanLock = threading.Lock()
+
+
+def rescanBackend():
+    """
+    Rescans the data directory of the FileSystemBackend and replaces
+    app.backend with the result. Replacing the backend is a single
+    assignment, so requests that are already in progress continue
+    to use the old backend.
+    """
+    with _rescanLock:
+        app.backend = app.backend.rescan()
+
+
+def hasBackendChanged():
+    """
+    Returns True if the data directory of app.backend has changed since
+    it was scanned.
+    """
+    return app.backend.hasChanged()
+
+
+def stopRescanThread():
+    """
+    Stops the thread that polls the data directory for changes, if it is
+    running, and waits for any rescan it is performing to finish.
+    """
+    if app.rescanThread is not None:
+        app.rescanThread.stop()
+        app.rescanThread.join()
+        app.rescanThread = None
+
 
 def reset():
     """
@@ -168,6 +313,16 @@ def configure(configFile=None, baseConfig="ProductionConfig",
     # Setup file handle cache max size
     datamodel.fileHandleCache.setMaxCacheSize(
         app.config["FILE_HANDLE_CACHE_MAX_SIZE"])
+    datamodel.fileHandleCache.setMaxCacheWeight(
+        app.config["FILE_HANDLE_CACHE_MAX_INDEX_SIZE"])
+    # Setup the catalog of scanned data files
+    datamodel.fileCatalog.setDatabasePath(app.config["FILE_CATALOG_PATH"])
+    metrics.registry.setSlowRequestThreshold(
+        app.config["SLOW_REQUEST_THRESHOLD"])
+    capture.requestCapture.configure(
+        app.config["REQUEST_CAPTURE_FILE"],
+        app.config["REQUEST_CAPTURE_MAX_BYTES"],
+        app.config["REQUEST_CAPTURE_BACKUP_COUNT"])
     # Setup CORS
     cors.CORS(app, allow_headers='Content-Type')
     app.serverStatus = ServerStatus()
@@ -187,19 +342,23 @@ def configure(configFile=None, baseConfig="ProductionConfig",
             "SIMULATED_BACKEND_NUM_REFERENCE_SETS"]
         numReferencesPerReferenceSet = app.config[
             "SIMULATED_BACKEND_NUM_REFERENCES_PER_REFERENCE_SET"]
-        numAlignmentsPerReadGroup = app.config[
-            "SIMULATED_BACKEND_NUM_ALIGNMENTS_PER_READ_GROUP"]
+        referenceLength = app.config["SIMULATED_BACKEND_REFERENCE_LENGTH"]
+        readDepth = app.config["SIMULATED_BACKEND_READ_DEPTH"]
+        readLength = app.config["SIMULATED_BACKEND_READ_LENGTH"]
         theBackend = backend.SimulatedBackend(
             randomSeed=randomSeed, numCalls=numCalls,
             variantDensity=variantDensity, numVariantSets=numVariantSets,
             numReferenceSets=numReferenceSets,
             numReferencesPerReferenceSet=numReferencesPerReferenceSet,
-            numAlignments=numAlignmentsPerReadGroup)
+            referenceLength=referenceLength, readDepth=readDepth,
+            readLength=readLength)
     elif dataSource.scheme == "empty":
         theBackend = backend.EmptyBackend()
     elif dataSource.scheme == "file":
-        theBackend = backend.FileSystemBackend(os.path.join(
-            dataSource.netLoc, dataSource.path))
+        theBackend = backend.FileSystemBackend(
+            os.path.join(dataSource.netloc, dataSource.path),
+            numScanWorkers=app.config["FILE_SCAN_WORKERS"],
+            lazyLoading=app.config["LAZY_LOADING"])
     else:
         raise exceptions.ConfigurationException(
             "Unsupported data source scheme: " + dataSource.scheme)
@@ -207,7 +366,15 @@ def configure(configFile=None, baseConfig="ProductionConfig",
     theBackend.setResponseValidation(app.config["RESPONSE_VALIDATION"])
     theBackend.setDefaultPageSize(app.config["DEFAULT_PAGE_SIZE"])
     theBackend.setMaxResponseLength(app.config["MAX_RESPONSE_LENGTH"])
+    theBackend.setResponseCache(responsecache.createResponseCache(
+        app.config["RESPONSE_CACHE_MAX_BYTES"],
+        app.config["RESPONSE_CACHE_PATH"]))
     app.backend = theBackend
+    stopRescanThread()
+    rescanInterval = app.config["DATA_RESCAN_INTERVAL"]
+    if dataSource.scheme == "file" and rescanInterval is not None:
+        app.rescanThread = DataRescanThread(rescanInterval)
+        app.rescanThread.start()
     app.secret_key = os.urandom(SECRET_KEY_LENGTH)
     app.oidcClient = None
     app.tokenMap = None
@@ -337,6 +504,38 @@ def startLogin():
     return flask.redirect(result.url)
 
 
+@app.before_request
+def startRequestMetrics():
+    """
+    Starts recording the metrics of the request.
+    """
+    metrics.registry.startRequest(flask.request.endpoint)
+
+
+@app.after_request
+def endRequestMetrics(response):
+    """
+    Records the metrics of the request, once its response is complete,
+    adds the Server-Timing header if it is enabled and writes the request
+    to the capture file if capture is enabled.
+    """
+    request = metrics.registry.getCurrentRequest()
+    if request is not None and (
+            app.config["SERVER_TIMING"] or
+            "serverTiming" in flask.request.args):
+        response.headers["Server-Timing"] = request.formatServerTiming()
+    if request is not None and capture.requestCapture.isEnabled():
+        capture.requestCapture.record(
+            flask.request.method, flask.request.path, request.endpoint,
+            flask.request.args.to_dict(),
+            flask.request.get_data(as_text=True) or None,
+            request.startTime, request.getDuration(), response.status_code,
+            response.content_length or 0)
+    metrics.registry.endRequest(
+        response.status_code, response.content_length or 0)
+    return response
+
+
 @app.before_request
 def checkAuthentication():
     """
@@ -436,6 +635,13 @@ def index():
     return flask.render_template('index.html', info=app.serverStatus)
 
 
+@app.route('/metrics')
+def getMetrics():
+    return flask.Response(
+        metrics.registry.formatText(),
+        content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @DisplayedRoute('/references/<id>')
 def getReference(id):
     return handleFlaskGetRequest(
@@ -496,6 +702,36 @@ def searchVariants():
         flask.request, app.backend.runSearchVariants)
 
 
+@DisplayedRoute('/variants/multi/search', postMethod=True)
+def searchMultiVariantSets():
+    return handleFlaskPostRequest(
+        flask.request, app.backend.runSearchMultiVariantSets)
+
+
+@DisplayedRoute('/variants/summaries/search', postMethod=True)
+def searchVariantSummaries():
+    return handleFlaskPostRequest(
+        flask.request, app.backend.runSearchVariantSummaries)
+
+
+@DisplayedRoute('/variants/genotypematrix/search', postMethod=True)
+def searchGenotypeMatrix():
+    return handleFlaskPostRequest(
+        flask.request, app.backend.runSearchGenotypeMatrix)
+
+
+@DisplayedRoute('/coverage/search', postMethod=True)
+def searchCoverage():
+    return handleFlaskPostRequest(
+        flask.request, app.backend.runSearchCoverage)
+
+
+@DisplayedRoute('/coverage/tiles/search', postMethod=True)
+def searchCoverageTiles():
+    return handleFlaskPostRequest(
+        flask.request, app.backend.runSearchCoverageTiles)
+
+
 @DisplayedRoute('/datasets/search', postMethod=True)
 def searchDatasets():
     return handleFlaskPostRequest(
@@ -0,0 +1,412 @@
+"""
+Collection of performance metrics for the GA4GH server.
+
+Metrics are kept per endpoint in a MetricsRegistry: request counts by
+HTTP status, latency histograms, bytes sent, the number of objects
+returned per page and the number of searches resumed from a page
+token. The stages of each request are timed, and requests that take
+longer than a threshold are logged with their stage timings. The
+metrics can be rendered in the Prometheus text exposition format.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import contextlib
+import functools
+import logging
+import threading
+import time
+
+
+def _formatLabels(labels):
+    """
+    Returns the specified list of (name, value) pairs formatted as a
+    Prometheus label set.
+    """
+    if len(labels) == 0:
+        return ""
+    formattedLabels = []
+    for name, value in labels:
+        value = "{}".format(value).replace("\\", "\\\\").replace(
+            "\n", "\\n").replace('"', '\\"')
+        formattedLabels.append('{}="{}"'.format(name, value))
+    return "{" + ",".join(formattedLabels) + "}"
+
+
+def _formatValue(value):
+    """
+    Returns the specified number formatted as a Prometheus sample value.
+    """
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else "{}".format(value)
+
+
+class Histogram(object):
+    """
+    A histogram of observed values, with the specified upper bounds for
+    its buckets. This class is not thread-safe; the registry guards it.
+    """
+    def __init__(self, buckets):
+        self._upperBounds = sorted(buckets) + [float("inf")]
+        self._bucketCounts = [0 for _ in self._upperBounds]
+        self._sum = 0
+        self._count = 0
+
+    def observe(self, value):
+        """
+        Records the specified value.
+        """
+        for i, upperBound in enumerate(self._upperBounds):
+            if value <= upperBound:
+                self._bucketCounts[i] += 1
+                break
+        self._sum += value
+        self._count += 1
+
+    def getCount(self):
+        """
+        Returns the number of observed values.
+        """
+        return self._count
+
+    def getSum(self):
+        """
+        Returns the sum of the observed values.
+        """
+        return self._sum
+
+    def getMean(self):
+        """
+        Returns the mean of the observed values, or None if there are
+        none.
+        """
+        if self._count == 0:
+            return None
+        return self._sum / self._count
+
+    def getCumulativeCounts(self):
+        """
+        Returns a list of (upperBound, count) pairs, where count is the
+        number of observed values less than or equal to upperBound.
+        """
+        ret = []
+        total = 0
+        for upperBound, count in zip(self._upperBounds, self._bucketCounts):
+            total += count
+            ret.append((upperBound, total))
+        return ret
+
+
+class RequestRecord(object):
+    """
+    The timings and statistics of a single request in progress. Stages
+    may be nested, in which case the time spent in the inner stage is
+    not counted in the outer one, and the times of a stage that is
+    entered more than once (such as the conversion of each object in a
+    page) are added together.
+    """
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.startTime = time.time()
+        self.numObjects = None
+        self.resumed = False
+        self._stageDurations = collections.OrderedDict()
+        # A list of [name, startTime, nestedDuration] for the stages
+        # that have been started but not ended, innermost last.
+        self._stageStack = []
+
+    def startStage(self, name):
+        """
+        Starts timing the stage with the specified name.
+        """
+        self._stageDurations.setdefault(name, 0)
+        self._stageStack.append([name, time.time(), 0])
+
+    def endStage(self):
+        """
+        Stops timing the innermost stage that has been started.
+        """
+        name, startTime, nestedDuration = self._stageStack.pop()
+        duration = time.time() - startTime
+        self._stageDurations[name] += duration - nestedDuration
+        if len(self._stageStack) > 0:
+            self._stageStack[-1][2] += duration
+
+    def getStages(self):
+        """
+        Returns a list of (name, duration) pairs for the stages of this
+        request, in the order in which they were first started.
+        """
+        return list(self._stageDurations.items())
+
+    def formatServerTiming(self):
+        """
+        Returns the stage timings of this request, and its total duration
+        so far, as the value of a Server-Timing HTTP header.
+        """
+        timings = self.getStages() + [("total", self.getDuration())]
+        return ", ".join(
+            "{};dur={:.3f}".format(name, duration * 1000)
+            for name, duration in timings)
+
+    def getDuration(self):
+        """
+        Returns the number of seconds since the request started.
+        """
+        return time.time() - self.startTime
+
+
+class EndpointMetrics(object):
+    """
+    The metrics collected for a single endpoint.
+    """
+    def __init__(self, latencyBuckets, objectsPerPageBuckets):
+        self.statusCounts = collections.Counter()
+        self.latency = Histogram(latencyBuckets)
+        self.objectsPerPage = Histogram(objectsPerPageBuckets)
+        self.bytesOut = 0
+        self.pageTokenResumes = 0
+
+
+class MetricsRegistry(object):
+    """
+    Collects the metrics for all of the requests handled by the server.
+    The request currently being handled by each thread is tracked in
+    thread local storage, so that the backend can record stage timings
+    and page statistics without having to pass the record around.
+    """
+    latencyBuckets = [
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+    objectsPerPageBuckets = [0, 1, 10, 100, 1000, 10000]
+    unknownEndpoint = "unknown"
+
+    def __init__(self, slowRequestThreshold=None, maxSlowRequests=100):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._endpoints = {}
+        self._collectors = []
+        self._slowRequestThreshold = slowRequestThreshold
+        self._slowRequests = collections.deque(maxlen=maxSlowRequests)
+        self._logger = logging.getLogger(__name__)
+
+    def setSlowRequestThreshold(self, threshold):
+        """
+        Sets the number of seconds after which a request is logged as
+        slow. If threshold is None, slow requests are not logged.
+        """
+        self._slowRequestThreshold = threshold
+
+    def addCollector(self, name, metricType, description, collector):
+        """
+        Adds a metric whose samples are obtained when the metrics are
+        rendered by calling collector, which must return a list of
+        (labels, value) pairs, where labels is a list of (name, value)
+        pairs.
+        """
+        self._collectors.append((name, metricType, description, collector))
+
+    def getCurrentRequest(self):
+        """
+        Returns the RequestRecord for the request being handled by the
+        calling thread, or None if there is none.
+        """
+        return getattr(self._local, "request", None)
+
+    def startRequest(self, endpoint):
+        """
+        Starts recording a request to the specified endpoint in the
+        calling thread.
+        """
+        if endpoint is None:
+            endpoint = self.unknownEndpoint
+        self._local.request = RequestRecord(endpoint)
+
+    def endRequest(self, status, numBytes):
+        """
+        Finishes recording the request being handled by the calling
+        thread, which returned a response with the specified HTTP status
+        and length in bytes.
+        """
+        request = self.getCurrentRequest()
+        if request is None:
+            return
+        self._local.request = None
+        duration = request.getDuration()
+        with self._lock:
+            endpointMetrics = self._getEndpointMetrics(request.endpoint)
+            endpointMetrics.statusCounts[status] += 1
+            endpointMetrics.latency.observe(duration)
+            endpointMetrics.bytesOut += numBytes
+            if request.numObjects is not None:
+                endpointMetrics.objectsPerPage.observe(request.numObjects)
+            if request.resumed:
+                endpointMetrics.pageTokenResumes += 1
+        threshold = self._slowRequestThreshold
+        if threshold is not None and duration >= threshold:
+            self._slowRequests.append((request, duration, status))
+            self._logger.warning(
+                "Slow request to %s took %.3fs (%s)", request.endpoint,
+                duration, ", ".join(
+                    "{}={:.3f}s".format(name, stageDuration)
+                    for name, stageDuration in request.getStages()))
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Context manager that records the time taken by the enclosed block
+        as the stage with the specified name of the current request.
+        """
+        request = self.getCurrentRequest()
+        if request is None:
+            yield
+        else:
+            request.startStage(name)
+            try:
+                yield
+            finally:
+                request.endStage()
+
+    def timed(self, name):
+        """
+        Returns a decorator that records the time taken by each call to
+        the decorated function as the stage with the specified name.
+        The decorated function is called directly when no request is
+        being recorded, since it may be called once per object.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                request = self.getCurrentRequest()
+                if request is None:
+                    return function(*args, **kwargs)
+                request.startStage(name)
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    request.endStage()
+            return wrapper
+        return decorator
+
+    def recordPage(self, numObjects, resumed):
+        """
+        Records that the current request returned a page of numObjects
+        objects (or None if the response is not a list of objects), which
+        was resumed from a page token if resumed is True.
+        """
+        request = self.getCurrentRequest()
+        if request is not None:
+            request.numObjects = numObjects
+            request.resumed = resumed
+
+    def _getEndpointMetrics(self, endpoint):
+        if endpoint not in self._endpoints:
+            self._endpoints[endpoint] = EndpointMetrics(
+                self.latencyBuckets, self.objectsPerPageBuckets)
+        return self._endpoints[endpoint]
+
+    def getEndpointSummaries(self):
+        """
+        Returns a list of dictionaries summarising the metrics of each
+        endpoint, sorted by endpoint name.
+        """
+        summaries = []
+        with self._lock:
+            for endpoint in sorted(self._endpoints.keys()):
+                endpointMetrics = self._endpoints[endpoint]
+                summaries.append({
+                    "endpoint": endpoint,
+                    "numRequests": endpointMetrics.latency.getCount(),
+                    "numErrors": sum(
+                        count for status, count in
+                        endpointMetrics.statusCounts.items()
+                        if status >= 400),
+                    "meanLatency": endpointMetrics.latency.getMean(),
+                    "bytesOut": endpointMetrics.bytesOut,
+                    "meanObjectsPerPage":
+                        endpointMetrics.objectsPerPage.getMean(),
+                    "pageTokenResumes": endpointMetrics.pageTokenResumes,
+                })
+        return summaries
+
+    def getSlowRequests(self):
+        """
+        Returns a list of (RequestRecord, duration, status) tuples for the
+        most recent slow requests, most recent first.
+        """
+        return list(reversed(self._slowRequests))
+
+    def formatText(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+
+        def addHeader(name, metricType, description):
+            lines.append("# HELP {} {}".format(name, description))
+            lines.append("# TYPE {} {}".format(name, metricType))
+
+        def addSample(name, labels, value):
+            lines.append("{}{} {}".format(
+                name, _formatLabels(labels), _formatValue(value)))
+
+        def addHistogram(name, labels, histogram):
+            for upperBound, count in histogram.getCumulativeCounts():
+                addSample(
+                    name + "_bucket",
+                    labels + [("le", _formatValue(upperBound))], count)
+            addSample(name + "_sum", labels, histogram.getSum())
+            addSample(name + "_count", labels, histogram.getCount())
+
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            addHeader(
+                "ga4gh_requests_total", "counter",
+                "Number of requests by endpoint and HTTP status.")
+            for endpoint, endpointMetrics in endpoints:
+                for status, count in sorted(
+                        endpointMetrics.statusCounts.items()):
+                    addSample(
+                        "ga4gh_requests_total",
+                        [("endpoint", endpoint), ("status", status)], count)
+            addHeader(
+                "ga4gh_request_duration_seconds", "histogram",
+                "Request latency by endpoint.")
+            for endpoint, endpointMetrics in endpoints:
+                addHistogram(
+                    "ga4gh_request_duration_seconds",
+                    [("endpoint", endpoint)], endpointMetrics.latency)
+            addHeader(
+                "ga4gh_response_bytes_total", "counter",
+                "Number of response body bytes sent by endpoint.")
+            for endpoint, endpointMetrics in endpoints:
+                addSample(
+                    "ga4gh_response_bytes_total", [("endpoint", endpoint)],
+                    endpointMetrics.bytesOut)
+            addHeader(
+                "ga4gh_objects_per_page", "histogram",
+                "Number of objects returned per page by endpoint.")
+            for endpoint, endpointMetrics in endpoints:
+                if endpointMetrics.objectsPerPage.getCount() > 0:
+                    addHistogram(
+                        "ga4gh_objects_per_page", [("endpoint", endpoint)],
+                        endpointMetrics.objectsPerPage)
+            addHeader(
+                "ga4gh_page_token_resumes_total", "counter",
+                "Number of requests resumed from a page token by endpoint.")
+            for endpoint, endpointMetrics in endpoints:
+                addSample(
+                    "ga4gh_page_token_resumes_total",
+                    [("endpoint", endpoint)],
+                    endpointMetrics.pageTokenResumes)
+        for name, metricType, description, collector in self._collectors:
+            addHeader(name, metricType, description)
+            for labels, value in collector():
+                addSample(name, labels, value)
+        return "\n".join(lines) + "\n"
+
+
+# The metrics of the server
+registry = MetricsRegistry()
@@ -0,0 +1,247 @@
+"""
+A pre-forking multi-process server for the GA4GH WSGI application.
+
+The master process binds the listening socket and forks a number of
+worker processes, each of which accepts and handles requests on the
+shared socket. Any data loaded by the master before forking (such as a
+FileSystemBackend) is shared copy-on-write with the workers.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import errno
+import logging
+import os
+import signal
+import time
+
+import werkzeug.serving
+
+import ga4gh.datamodel as datamodel
+
+
+class PreforkWSGIServer(werkzeug.serving.BaseWSGIServer):
+    """
+    A WSGI server whose listening socket is shared by several worker
+    processes.
+    """
+    multiprocess = True
+    numRequests = 0
+
+    def get_request(self):
+        # The listening socket is non-blocking, since all of the workers
+        # are woken up when a connection arrives but only one of them can
+        # accept it. The accepted connection must be blocking, however.
+        connection, address = self.socket.accept()
+        connection.setblocking(1)
+        return connection, address
+
+    def process_request(self, request, clientAddress):
+        self.numRequests += 1
+        super(PreforkWSGIServer, self).process_request(
+            request, clientAddress)
+
+
+class PreforkServer(object):
+    """
+    Runs the specified WSGI app in numWorkers worker processes. Each
+    worker exits after handling maxRequests requests (if this is not
+    None) and is replaced by a new one. On SIGHUP, the master calls
+    restartCallback (if it is not None) and then replaces all workers
+    gracefully: new workers are started, and the old ones finish the
+    request they are handling before exiting. If checkCallback is not
+    None, the master calls it every checkInterval seconds and restarts
+    in the same way whenever it returns True. SIGTERM and SIGINT shut
+    down the master and all workers gracefully.
+
+    The master runs all of these callbacks in its main thread, which is
+    also the thread that forks the workers, so that no other thread can
+    be holding a lock (such as that of the file handle cache) that a
+    worker would then inherit in its locked state.
+    """
+    pollInterval = 1  # seconds
+
+    def __init__(
+            self, app, host, port, numWorkers, maxRequests=None,
+            restartCallback=None, checkCallback=None, checkInterval=None):
+        if numWorkers <= 0:
+            raise ValueError("The number of workers must be positive")
+        if maxRequests is not None and maxRequests <= 0:
+            raise ValueError("The maximum number of requests must be positive")
+        self._app = app
+        self._host = host
+        self._port = port
+        self._numWorkers = numWorkers
+        self._maxRequests = maxRequests
+        self._restartCallback = restartCallback
+        self._checkCallback = checkCallback
+        self._checkInterval = checkInterval
+        self._workerPids = set()
+        self._server = None
+        self._stopping = False
+        self._restartRequested = False
+        self._logger = logging.getLogger(__name__)
+
+    def getNumWorkers(self):
+        """
+        Returns the number of worker processes currently running.
+        """
+        return len(self._workerPids)
+
+    def getServerAddress(self):
+        """
+        Returns the (host, port) address the server is listening on.
+        """
+        return self._server.server_address
+
+    def bind(self):
+        """
+        Creates the listening socket shared by the workers.
+        """
+        self._server = PreforkWSGIServer(self._host, self._port, self._app)
+        self._server.socket.setblocking(0)
+        self._server.timeout = self.pollInterval
+
+    def serveForever(self):
+        """
+        Starts the workers and supervises them until the server is
+        shut down.
+        """
+        if self._server is None:
+            self.bind()
+        signal.signal(signal.SIGTERM, self._handleStop)
+        signal.signal(signal.SIGINT, self._handleStop)
+        signal.signal(signal.SIGHUP, self._handleRestart)
+        self._logger.info(
+            "Serving on %s:%d with %d workers", self._host,
+            self.getServerAddress()[1], self._numWorkers)
+        try:
+            self._spawnWorkers()
+            nextCheckTime = time.time()
+            while not self._stopping:
+                if self._checkCallback is not None and \
+                        time.time() >= nextCheckTime:
+                    nextCheckTime = time.time() + self._checkInterval
+                    if self._check():
+                        self._restartRequested = True
+                if self._restartRequested:
+                    self._restartRequested = False
+                    self._restart()
+                self._reapWorkers()
+                if not self._stopping:
+                    self._spawnWorkers()
+                    time.sleep(self.pollInterval)
+        finally:
+            self._stopWorkers(self._workerPids)
+            self._server.server_close()
+
+    def _handleStop(self, signalNumber, frame):
+        self._stopping = True
+
+    def _handleRestart(self, signalNumber, frame):
+        self._restartRequested = True
+
+    def _check(self):
+        """
+        Returns the result of the check callback, or False if it fails.
+        """
+        try:
+            return self._checkCallback()
+        except Exception:
+            self._logger.exception("Check callback failed")
+            return False
+
+    def _restart(self):
+        """
+        Replaces all of the workers with new ones, after calling the
+        restart callback.
+        """
+        self._logger.info("Restarting workers")
+        if self._restartCallback is not None:
+            try:
+                self._restartCallback()
+            except Exception:
+                self._logger.exception("Restart callback failed")
+        oldWorkerPids = set(self._workerPids)
+        self._workerPids = set()
+        self._spawnWorkers()
+        for pid in oldWorkerPids:
+            self._signalWorker(pid, signal.SIGTERM)
+        self._waitForWorkers(oldWorkerPids)
+
+    def _spawnWorkers(self):
+        if len(self._workerPids) < self._numWorkers:
+            # Don't let the workers inherit handles opened in the master,
+            # since they would share file offsets with it.
+            datamodel.fileHandleCache.clear()
+        while len(self._workerPids) < self._numWorkers:
+            pid = os.fork()
+            if pid == 0:
+                exitCode = 0
+                try:
+                    self._runWorker()
+                except Exception:
+                    self._logger.exception("Worker failed")
+                    exitCode = 1
+                finally:
+                    os._exit(exitCode)
+            self._workerPids.add(pid)
+
+    def _reapWorkers(self):
+        """
+        Removes any workers that have exited from the set of workers.
+        """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as error:
+                if error.errno == errno.ECHILD:
+                    break
+                raise
+            if pid == 0:
+                break
+            self._workerPids.discard(pid)
+
+    def _signalWorker(self, pid, signalNumber):
+        try:
+            os.kill(pid, signalNumber)
+        except OSError as error:
+            if error.errno != errno.ESRCH:
+                raise
+
+    def _waitForWorkers(self, pids):
+        for pid in pids:
+            while True:
+                try:
+                    os.waitpid(pid, 0)
+                    break
+                except OSError as error:
+                    if error.errno == errno.EINTR:
+                        continue
+                    if error.errno != errno.ECHILD:
+                        raise
+                    break
+
+    def _stopWorkers(self, pids):
+        for pid in pids:
+            self._signalWorker(pid, signal.SIGTERM)
+        self._waitForWorkers(pids)
+        pids.clear()
+
+    def _runWorker(self):
+        """
+        The main loop of a worker process. Requests are handled until
+        the worker is asked to stop or has handled maxRequests requests.
+        """
+        signal.signal(signal.SIGTERM, self._handleStop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        self._stopping = False
+        self._workerPids = set()
+        datamodel.fileHandleCache.clear()
+        self._server.numRequests = 0
+        while not self._stopping and (
+                self._maxRequests is None or
+                self._server.numRequests < self._maxRequests):
+            self._server.handle_request()
@@ -0,0 +1,279 @@
+"""
+Caches of the serialized responses of the GA4GH server, so that a page
+that many clients ask for, such as a window around a popular gene, is
+only computed once.
+
+The backend builds the key of each response from the normalized request
+and the version of the data it was computed from, so entries never need
+to be invalidated when the data changes; stale entries are simply never
+asked for again, and are evicted in least recently used order once the
+total size of the entries exceeds the bound of the cache. The cache can
+either be held in the memory of each server process, or in an SQLite
+database that is shared by all of the worker processes of a server.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import os
+import sqlite3
+import threading
+import time
+
+
+def _getEntrySize(key, value):
+    # Responses are ASCII JSON, so their lengths are their sizes in bytes.
+    return len(key) + len(value)
+
+
+class AbstractResponseCache(object):
+    """
+    A cache mapping string keys to serialized responses, holding at most
+    maxBytes bytes of keys and values.
+    """
+    def __init__(self, maxBytes):
+        if maxBytes <= 0:
+            raise ValueError(
+                "The size of the cache must be a strictly positive value")
+        self._maxBytes = maxBytes
+        self._statisticsLock = threading.Lock()
+        self._numHits = 0
+        self._numMisses = 0
+        self._numEvictions = 0
+
+    def _countLookup(self, hit):
+        with self._statisticsLock:
+            if hit:
+                self._numHits += 1
+            else:
+                self._numMisses += 1
+
+    def _countEvictions(self, numEvictions):
+        with self._statisticsLock:
+            self._numEvictions += numEvictions
+
+    def get(self, key):
+        """
+        Returns the response stored under the specified key, or None if
+        there is none.
+        """
+        raise NotImplementedError()
+
+    def put(self, key, value):
+        """
+        Stores the specified response under the specified key, evicting
+        the least recently used entries as needed. Responses larger than
+        the cache are not stored.
+        """
+        raise NotImplementedError()
+
+    def clear(self):
+        """
+        Removes all entries from the cache.
+        """
+        raise NotImplementedError()
+
+    def _getContents(self):
+        """
+        Returns the number of entries in the cache and their total size.
+        """
+        raise NotImplementedError()
+
+    def getStatistics(self):
+        """
+        Returns a dictionary of the number of cache hits, misses and
+        evictions made by this process, and the number of entries in
+        the cache and their total size in bytes.
+        """
+        numEntries, numBytes = self._getContents()
+        with self._statisticsLock:
+            return {
+                "hits": self._numHits,
+                "misses": self._numMisses,
+                "evictions": self._numEvictions,
+                "entries": numEntries,
+                "bytes": numBytes,
+            }
+
+
+class MemoryResponseCache(AbstractResponseCache):
+    """
+    A response cache held in the memory of the server process. Entries
+    are kept in an OrderedDict in least recently used order.
+    """
+    def __init__(self, maxBytes):
+        super(MemoryResponseCache, self).__init__(maxBytes)
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._numBytes = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self._entries[key] = value
+        self._countLookup(value is not None)
+        return value
+
+    def put(self, key, value):
+        size = _getEntrySize(key, value)
+        if size > self._maxBytes:
+            return
+        numEvictions = 0
+        with self._lock:
+            oldValue = self._entries.pop(key, None)
+            if oldValue is not None:
+                self._numBytes -= _getEntrySize(key, oldValue)
+            self._entries[key] = value
+            self._numBytes += size
+            while self._numBytes > self._maxBytes:
+                evictedKey, evictedValue = self._entries.popitem(last=False)
+                self._numBytes -= _getEntrySize(evictedKey, evictedValue)
+                numEvictions += 1
+        self._countEvictions(numEvictions)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._numBytes = 0
+
+    def _getContents(self):
+        with self._lock:
+            return len(self._entries), self._numBytes
+
+
+class SqliteResponseCache(AbstractResponseCache):
+    """
+    A response cache held in the SQLite database at the specified path,
+    which can be shared by several server processes. Each thread of each
+    process opens its own connection, and as the cache is only an
+    optimisation, a lookup or store that fails because the database is
+    busy or unavailable is treated as a miss.
+
+    The database is kept in write-ahead logging mode, so that lookups
+    are not blocked by stores. The number and total size of the entries
+    are kept up to date by triggers in a table with a single row, and
+    the time an entry was last used is only rewritten by a lookup if it
+    is more than touchInterval seconds old, so that most lookups do not
+    write to the database.
+    """
+    timeout = 1.0
+    touchInterval = 60.0
+
+    def __init__(self, path, maxBytes):
+        super(SqliteResponseCache, self).__init__(maxBytes)
+        self._path = path
+        self._local = threading.local()
+        connection = self._getConnection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT, size INTEGER, "
+                "lastUsed REAL)")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS responsesLastUsed "
+                "ON responses (lastUsed)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS totals ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), "
+                "numEntries INTEGER, numBytes INTEGER)")
+            connection.execute(
+                "INSERT OR IGNORE INTO totals "
+                "SELECT 0, COUNT(*), IFNULL(SUM(size), 0) FROM responses")
+            connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS responsesInsert "
+                "AFTER INSERT ON responses BEGIN "
+                "UPDATE totals SET numEntries = numEntries + 1, "
+                "numBytes = numBytes + NEW.size; END")
+            connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS responsesDelete "
+                "AFTER DELETE ON responses BEGIN "
+                "UPDATE totals SET numEntries = numEntries - 1, "
+                "numBytes = numBytes - OLD.size; END")
+
+    def _getConnection(self):
+        # Connections must not be shared with forked worker processes.
+        pid = os.getpid()
+        if getattr(self._local, "pid", None) != pid:
+            self._local.connection = sqlite3.connect(
+                self._path, timeout=self.timeout)
+            self._local.pid = pid
+        return self._local.connection
+
+    def get(self, key):
+        value = None
+        try:
+            with self._getConnection() as connection:
+                row = connection.execute(
+                    "SELECT value, lastUsed FROM responses WHERE key = ?",
+                    (key,)).fetchone()
+                if row is not None:
+                    value, lastUsed = row
+                    now = time.time()
+                    if lastUsed <= now - self.touchInterval:
+                        connection.execute(
+                            "UPDATE responses SET lastUsed = ? "
+                            "WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            pass
+        self._countLookup(value is not None)
+        return value
+
+    def put(self, key, value):
+        size = _getEntrySize(key, value)
+        if size > self._maxBytes:
+            return
+        numEvictions = 0
+        try:
+            with self._getConnection() as connection:
+                # The triggers do not fire for rows removed by a REPLACE.
+                connection.execute(
+                    "DELETE FROM responses WHERE key = ?", (key,))
+                connection.execute(
+                    "INSERT INTO responses "
+                    "(key, value, size, lastUsed) VALUES (?, ?, ?, ?)",
+                    (key, value, size, time.time()))
+                while True:
+                    numEntries, numBytes = connection.execute(
+                        "SELECT numEntries, numBytes FROM totals").fetchone()
+                    if numBytes <= self._maxBytes:
+                        break
+                    # Evict as many of the least recently used entries as
+                    # should free enough space if they are of average size.
+                    numEvicted = -(
+                        -(numBytes - self._maxBytes) * numEntries // numBytes)
+                    cursor = connection.execute(
+                        "DELETE FROM responses WHERE key IN ("
+                        "SELECT key FROM responses ORDER BY lastUsed "
+                        "LIMIT ?)", (numEvicted,))
+                    numEvictions += cursor.rowcount
+        except sqlite3.Error:
+            numEvictions = 0
+        self._countEvictions(numEvictions)
+
+    def clear(self):
+        with self._getConnection() as connection:
+            connection.execute("DELETE FROM responses")
+
+    def _getContents(self):
+        try:
+            return self._getConnection().execute(
+                "SELECT numEntries, numBytes FROM totals").fetchone()
+        except sqlite3.Error:
+            return 0, 0
+
+
+def createResponseCache(maxBytes, path=None):
+    """
+    Returns a response cache holding at most maxBytes bytes, which is
+    kept in the SQLite database at the specified path if it is not None
+    and in memory otherwise. If maxBytes is None, None is returned, and
+    responses are not cached.
+    """
+    if maxBytes is None:
+        return None
+    if path is None:
+        return MemoryResponseCache(maxBytes)
+    return SqliteResponseCache(path, maxBytes)
@@ -29,9 +29,23 @@ class BaseConfig(object):
     SIMULATED_BACKEND_NUM_VARIANT_SETS = 1
     SIMULATED_BACKEND_NUM_REFERENCE_SETS = 1
     SIMULATED_BACKEND_NUM_REFERENCES_PER_REFERENCE_SET = 1
-    SIMULATED_BACKEND_NUM_ALIGNMENTS_PER_READ_GROUP = 2
+    SIMULATED_BACKEND_REFERENCE_LENGTH = 200
+    SIMULATED_BACKEND_READ_DEPTH = 10
+    SIMULATED_BACKEND_READ_LENGTH = 100
 
     FILE_HANDLE_CACHE_MAX_SIZE = 50
+    FILE_HANDLE_CACHE_MAX_INDEX_SIZE = None
+    FILE_CATALOG_PATH = None
+    RESPONSE_CACHE_MAX_BYTES = None
+    RESPONSE_CACHE_PATH = None
+    FILE_SCAN_WORKERS = None
+    LAZY_LOADING = False
+    DATA_RESCAN_INTERVAL = None
+    SLOW_REQUEST_THRESHOLD = 1.0
+    SERVER_TIMING = False
+    REQUEST_CAPTURE_FILE = None
+    REQUEST_CAPTURE_MAX_BYTES = 100 * 1024 * 1024  # 100MB
+    REQUEST_CAPTURE_BACKUP_COUNT = 5
 
 
 class DevelopmentConfig(BaseConfig):
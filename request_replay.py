@@ -0,0 +1,268 @@
+"""
+Replays the requests captured by a GA4GH server (see the
+REQUEST_CAPTURE_FILE configuration value) against a server, and compares
+the latencies of two replays, such as those of two builds of the server.
+
+    python request_replay.py replay capture.log.1 capture.log \\
+        --url http://localhost:8000 --speed 2 -o before.json
+    python request_replay.py compare before.json after.json
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import collections
+import json
+import posixpath
+import Queue
+import sys
+import threading
+import time
+
+import requests
+
+import ga4gh.capture as capture
+import server_benchmark
+
+
+class Replayer(object):
+    """
+    Re-issues captured requests against the server at serverUrl using
+    numThreads threads. The requests are started at their original
+    offsets from the first request divided by speed, or as fast as the
+    threads allow if speed is 0.
+    """
+    def __init__(self, serverUrl, numThreads=4, speed=1):
+        self._serverUrl = serverUrl
+        self._numThreads = numThreads
+        self._speed = speed
+        self._local = threading.local()
+
+    def _getSession(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.verify = False
+            self._local.session = session
+        return session
+
+    def sendRequest(self, entry):
+        """
+        Sends the specified captured request to the server, and returns
+        a dictionary of the result.
+        """
+        url = posixpath.join(self._serverUrl, entry["path"].lstrip("/"))
+        headers = {}
+        data = None
+        if entry["body"] is not None:
+            headers["Content-type"] = "application/json"
+            data = entry["body"].encode("utf-8")
+        startTime = time.time()
+        try:
+            response = self._getSession().request(
+                entry["method"], url, params=entry["args"], data=data,
+                headers=headers)
+            status = response.status_code
+            numBytes = len(response.content)
+        except requests.RequestException:
+            status = None
+            numBytes = 0
+        return {
+            "endpoint": entry["endpoint"],
+            "method": entry["method"],
+            "path": entry["path"],
+            "latency": time.time() - startTime,
+            "status": status,
+            "bytes": numBytes,
+            "originalDuration": entry["duration"],
+            "originalStatus": entry["status"],
+            "originalBytes": entry["bytes"],
+        }
+
+    def _work(self, queue, results):
+        while True:
+            item = queue.get()
+            if item is None:
+                break
+            index, entry = item
+            results[index] = self.sendRequest(entry)
+
+    def replay(self, entries):
+        """
+        Replays the specified captured requests, and returns the list of
+        their results, in the same order.
+        """
+        entries = list(entries)
+        results = [None for _ in entries]
+        queue = Queue.Queue(self._numThreads)
+        threads = [
+            threading.Thread(target=self._work, args=(queue, results))
+            for _ in range(self._numThreads)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        startTime = time.time()
+        for index, entry in enumerate(entries):
+            if self._speed > 0:
+                offset = (entry["time"] - entries[0]["time"]) / self._speed
+                delay = startTime + offset - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            queue.put((index, entry))
+        for _ in threads:
+            queue.put(None)
+        for thread in threads:
+            thread.join()
+        return results
+
+
+def summariseLatencies(results):
+    """
+    Returns a dictionary mapping each endpoint to a dictionary of the
+    number of requests, errors, and the p50 and p99 latencies in
+    milliseconds of the specified replay results.
+    """
+    latencies = collections.defaultdict(list)
+    numErrors = collections.Counter()
+    for result in results:
+        latencies[result["endpoint"]].append(result["latency"])
+        if result["status"] is None or result["status"] >= 400:
+            numErrors[result["endpoint"]] += 1
+    summary = {}
+    for endpoint, values in latencies.items():
+        values.sort()
+        summary[endpoint] = {
+            "numRequests": len(values),
+            "numErrors": numErrors[endpoint],
+            "p50": server_benchmark.percentile(values, 0.5) * 1000,
+            "p99": server_benchmark.percentile(values, 0.99) * 1000,
+        }
+    return summary
+
+
+def compareReplays(results, baseline):
+    """
+    Compares the specified replay results against those of a baseline
+    replay of the same captured requests, and returns a tuple of a
+    dictionary mapping each endpoint to its latency summaries and the
+    ratio of its median latencies, and the list of requests whose status
+    differs between the two replays.
+    """
+    if len(results) != len(baseline):
+        raise ValueError("The replays are of different requests")
+    summary = summariseLatencies(results)
+    baselineSummary = summariseLatencies(baseline)
+    comparison = {}
+    for endpoint in set(summary.keys()) | set(baselineSummary.keys()):
+        after = summary.get(endpoint)
+        before = baselineSummary.get(endpoint)
+        ratio = None
+        if after is not None and before is not None and before["p50"] > 0:
+            ratio = after["p50"] / before["p50"]
+        comparison[endpoint] = {
+            "baseline": before, "replay": after, "p50Ratio": ratio}
+    statusChanges = [
+        (result["method"], result["path"], baselineResult["status"],
+         result["status"])
+        for result, baselineResult in zip(results, baseline)
+        if result["status"] != baselineResult["status"]]
+    return comparison, statusChanges
+
+
+def formatComparison(comparison, statusChanges):
+    """
+    Returns the specified output of compareReplays formatted as a table.
+    """
+    lines = ["{:28} {:>8} {:>12} {:>12} {:>12} {:>12} {:>7}".format(
+        "", "requests", "base p50", "p50 (ms)", "base p99", "p99 (ms)",
+        "ratio")]
+
+    def formatField(summary, key):
+        if summary is None:
+            return "{:>12}".format("-")
+        return "{:12.2f}".format(summary[key])
+
+    for endpoint, values in sorted(comparison.items()):
+        before = values["baseline"]
+        after = values["replay"]
+        ratio = values["p50Ratio"]
+        lines.append("{:28} {:8d} {} {} {} {} {:>7}".format(
+            endpoint, (after or before)["numRequests"],
+            formatField(before, "p50"), formatField(after, "p50"),
+            formatField(before, "p99"), formatField(after, "p99"),
+            "-" if ratio is None else "{:.2f}".format(ratio)))
+    for method, path, before, after in statusChanges:
+        lines.append("Status of {} {} changed from {} to {}".format(
+            method, path, before, after))
+    return "\n".join(lines)
+
+
+def parseArgs(args):
+    parser = argparse.ArgumentParser(
+        description="Replays captured requests and compares replays")
+    subparsers = parser.add_subparsers(title="subcommands")
+    replayParser = subparsers.add_parser(
+        "replay", help="Replay captured requests against a server")
+    replayParser.set_defaults(command="replay")
+    replayParser.add_argument(
+        "captureFiles", nargs="+",
+        help="The capture files to replay")
+    replayParser.add_argument(
+        "--url", default="http://localhost:8000",
+        help="The URL of the server to replay the requests against")
+    replayParser.add_argument(
+        "--speed", "-s", default=1, type=float,
+        help="The factor by which to accelerate the original pace of the "
+        "requests, or 0 to send them as fast as possible")
+    replayParser.add_argument(
+        "--threads", "-t", default=4, type=int,
+        help="The maximum number of requests in progress at once")
+    replayParser.add_argument(
+        "--endpoint", "-e", action="append", default=None,
+        help="Only replay requests to this endpoint; may be repeated")
+    replayParser.add_argument(
+        "--output", "-o", default=None,
+        help="Write the results as JSON to this file")
+    compareParser = subparsers.add_parser(
+        "compare", help="Compare the latencies of two replays")
+    compareParser.set_defaults(command="compare")
+    compareParser.add_argument(
+        "baseline", help="The results of the baseline replay")
+    compareParser.add_argument(
+        "results", help="The results of the replay to compare")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parseArgs(sys.argv[1:] if args is None else args)
+    if args.command == "replay":
+        # The files of different worker processes are interleaved by the
+        # start times of their requests.
+        entries = sorted(
+            (entry for entry in capture.readCaptureFiles(args.captureFiles)
+             if args.endpoint is None or entry["endpoint"] in args.endpoint),
+            key=lambda entry: entry["time"])
+        replayer = Replayer(args.url, args.threads, args.speed)
+        results = replayer.replay(entries)
+        print("{:28} {:>8} {:>6} {:>10} {:>10}".format(
+            "", "requests", "errors", "p50 (ms)", "p99 (ms)"))
+        for endpoint, summary in sorted(summariseLatencies(results).items()):
+            print("{:28} {numRequests:8d} {numErrors:6d} {p50:10.2f} "
+                  "{p99:10.2f}".format(endpoint, **summary))
+        if args.output is not None:
+            with open(args.output, "w") as outputFile:
+                json.dump({
+                    "url": args.url, "speed": args.speed,
+                    "results": results}, outputFile, indent=4)
+    else:
+        with open(args.baseline) as baselineFile:
+            baseline = json.load(baselineFile)["results"]
+        with open(args.results) as resultsFile:
+            results = json.load(resultsFile)["results"]
+        print(formatComparison(*compareReplays(results, baseline)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+"""
+Generate a synthetic data repository in the layout read by the
+FileSystemBackend, for benchmarking the server at scale. The repository
+contains a reference set of random references, and a dataset of indexed
+BAM files and VCF (or BCF) files whose reads and variants are consistent
+with those references.
+
+    python scripts/generate_dataset.py synthetic-data \\
+        --numReferences 2 --referenceLength 1000000 \\
+        --readDepth 30 --numSamples 1000
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import binascii
+import hashlib
+import json
+import math
+import os
+import random
+import shutil
+
+import pysam
+
+import utils
+
+
+class DatasetGenerator(object):
+    """
+    Generates a synthetic data repository. All of the data is derived
+    from a pseudo-random number generator with the specified seed, so
+    that the same arguments always produce the same repository.
+    """
+    basesPerLine = 70
+    chunkSize = 2**20
+    referenceSetName = "synthetic"
+    bases = "ACGT"
+    # Maps each byte to one of the bases, so that random bytes can be
+    # turned into random sequence in a single call.
+    baseTable = (bases * (256 // len(bases))).encode("ascii")
+
+    def __init__(self, args):
+        self.outputDirectory = args.outputDirectory
+        self.datasetName = args.datasetName
+        self.numReferences = args.numReferences
+        self.referenceLength = args.referenceLength
+        self.readDepth = args.readDepth
+        self.readLength = args.readLength
+        self.numReadGroupSets = args.numReadGroupSets
+        self.numReadGroups = args.numReadGroups
+        self.numVariantSets = args.numVariantSets
+        self.numSamples = args.numSamples
+        self.variantDensity = args.variantDensity
+        self.variantFormat = args.variantFormat
+        self.randomSeed = args.randomSeed
+        self.referenceSetDirectory = os.path.join(
+            self.outputDirectory, "referenceSets", self.referenceSetName)
+        self.datasetDirectory = os.path.join(
+            self.outputDirectory, "datasets", self.datasetName)
+        self.references = []
+
+    def _getRandom(self, *key):
+        # Each file has its own generator, so that changing the
+        # number of one kind of file does not change the others.
+        seed = ":".join(str(part) for part in (self.randomSeed,) + key)
+        return random.Random(hashlib.md5(seed.encode("utf-8")).hexdigest())
+
+    def _writeJson(self, fileName, value):
+        with open(fileName, "w") as jsonFile:
+            json.dump(value, jsonFile, indent=4, sort_keys=True)
+
+    def _randomBases(self, randomGenerator, numBases):
+        numHexDigits = 2 * numBases
+        randomBytes = binascii.unhexlify("{:0{}x}".format(
+            randomGenerator.getrandbits(8 * numBases), numHexDigits))
+        return randomBytes.translate(self.baseTable)
+
+    def generateReferences(self):
+        """
+        Writes the bgzipped and indexed FASTA files of the references and
+        their metadata, keeping their sequences for the reads and
+        variants.
+        """
+        if not os.path.exists(self.referenceSetDirectory):
+            os.makedirs(self.referenceSetDirectory)
+        self._writeJson(self.referenceSetDirectory + ".json", {
+            "assemblyId": "synthetic",
+            "description": "Random references generated by "
+                           "generate_dataset.py",
+            "isDerived": False,
+            "ncbiTaxonId": 9606,
+            "sourceAccessions": [],
+            "sourceUri": "http://example.com/synthetic",
+        })
+        for index in range(self.numReferences):
+            referenceName = "chr{}".format(index + 1)
+            randomGenerator = self._getRandom("reference", referenceName)
+            chunks = []
+            basesRemaining = self.referenceLength
+            while basesRemaining > 0:
+                numBases = min(self.chunkSize, basesRemaining)
+                chunks.append(self._randomBases(randomGenerator, numBases))
+                basesRemaining -= numBases
+            sequence = b"".join(chunks)
+            fastaFileName = os.path.join(
+                self.referenceSetDirectory, referenceName + ".fa")
+            utils.log("writing {} bases to {} ...".format(
+                len(sequence), fastaFileName))
+            with open(fastaFileName, "w") as fastaFile:
+                print(">{} Generated by generate_dataset.py".format(
+                    referenceName), file=fastaFile)
+                for start in range(0, len(sequence), self.basesPerLine):
+                    print(sequence[start:start + self.basesPerLine].decode(
+                        "ascii"), file=fastaFile)
+            pysam.tabix_compress(
+                fastaFileName, fastaFileName + ".gz", force=True)
+            os.remove(fastaFileName)
+            # Opening the compressed file creates its indexes.
+            pysam.FastaFile(fastaFileName + ".gz").close()
+            self._writeJson(
+                os.path.join(self.referenceSetDirectory,
+                             referenceName + ".json"), {
+                    "md5checksum": hashlib.md5(sequence).hexdigest(),
+                    "sourceUri": "http://example.com/synthetic",
+                    "ncbiTaxonId": 9606,
+                    "isDerived": False,
+                    "sourceDivergence": None,
+                    "sourceAccessions": [],
+                })
+            self.references.append((referenceName, sequence))
+
+    def _getReadStarts(self, randomGenerator, referenceLength):
+        # The gaps between the starts of uniformly placed reads are
+        # exponentially distributed, so the starts can be generated in
+        # order without holding them all in memory.
+        lastStart = referenceLength - self.readLength
+        rate = self.readDepth / self.readLength
+        position = randomGenerator.expovariate(rate)
+        while position <= lastStart:
+            yield int(position)
+            position += randomGenerator.expovariate(rate)
+
+    def generateReadGroupSet(self, index):
+        """
+        Writes an indexed BAM file of reads sampled uniformly from the
+        references at the configured depth, spread across its read
+        groups.
+        """
+        readsDirectory = os.path.join(self.datasetDirectory, "reads")
+        if not os.path.exists(readsDirectory):
+            os.makedirs(readsDirectory)
+        readGroupSetName = "readGroupSet{}".format(index)
+        readGroupIds = [
+            "{}_rg{}".format(readGroupSetName, readGroupIndex)
+            for readGroupIndex in range(self.numReadGroups)]
+        header = {
+            "HD": {"VN": "1.3", "SO": "coordinate"},
+            "SQ": [{"SN": name, "LN": len(sequence),
+                    "AS": self.referenceSetName}
+                   for name, sequence in self.references],
+            "RG": [{"ID": readGroupId, "SM": "sample{}".format(index),
+                    "LB": readGroupId, "PL": "ILLUMINA"}
+                   for readGroupId in readGroupIds],
+            "PG": [{"ID": "generate_dataset", "PN": "generate_dataset.py",
+                    "VN": "1.0", "CL": "generate_dataset.py"}],
+        }
+        bamFileName = os.path.join(readsDirectory, readGroupSetName + ".bam")
+        utils.log("writing reads at {}x depth to {} ...".format(
+            self.readDepth, bamFileName))
+        randomGenerator = self._getRandom("reads", readGroupSetName)
+        # pysam expects byte strings throughout.
+        qualityStrings = [
+            b"".join(chr(33 + randomGenerator.randint(20, 40))
+                     for _ in range(self.readLength))
+            for _ in range(64)]
+        readGroupIds = [
+            readGroupId.encode("utf-8") for readGroupId in readGroupIds]
+        numReads = 0
+        bamFile = pysam.AlignmentFile(bamFileName, "wb", header=header)
+        try:
+            for referenceId, (name, sequence) in enumerate(self.references):
+                for start in self._getReadStarts(
+                        randomGenerator, len(sequence)):
+                    read = pysam.AlignedSegment()
+                    read.query_name = "{}.{}".format(
+                        readGroupSetName, numReads).encode("utf-8")
+                    read.flag = 16 if randomGenerator.random() < 0.5 else 0
+                    read.reference_id = referenceId
+                    read.reference_start = start
+                    read.mapping_quality = 60
+                    read.cigartuples = [(0, self.readLength)]
+                    read.query_sequence = sequence[
+                        start:start + self.readLength]
+                    read.query_qualities = pysam.fromQualityString(
+                        randomGenerator.choice(qualityStrings))
+                    read.tags = [
+                        ("RG", randomGenerator.choice(readGroupIds))]
+                    bamFile.write(read)
+                    numReads += 1
+        finally:
+            bamFile.close()
+        pysam.index(bamFileName.encode("utf-8"))
+        utils.log("wrote {} reads".format(numReads))
+
+    def _getVariantPositions(self, randomGenerator, referenceLength):
+        # Geometrically distributed gaps place a variant at each base
+        # independently with probability variantDensity.
+        if self.variantDensity >= 1:
+            logFailure = None
+        else:
+            logFailure = math.log(1 - self.variantDensity)
+        position = 0
+        while True:
+            if logFailure is not None:
+                position += int(
+                    math.log(1 - randomGenerator.random()) / logFailure)
+            if position >= referenceLength:
+                break
+            yield position
+            position += 1
+
+    def _writeVcf(self, vcfFileName, variantSetName, referenceName,
+                  sequence, sampleNames):
+        randomGenerator = self._getRandom(
+            "variants", variantSetName, referenceName)
+        numAlleles = 2 * len(sampleNames)
+        numVariants = 0
+        with open(vcfFileName, "w") as vcfFile:
+            print("##fileformat=VCFv4.2", file=vcfFile)
+            print("##source=generate_dataset.py", file=vcfFile)
+            print("##contig=<ID={},length={}>".format(
+                referenceName, len(sequence)), file=vcfFile)
+            print('##INFO=<ID=AF,Number=A,Type=Float,'
+                  'Description="Allele Frequency">', file=vcfFile)
+            print('##FORMAT=<ID=GT,Number=1,Type=String,'
+                  'Description="Genotype">', file=vcfFile)
+            print("\t".join(
+                ["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER",
+                 "INFO", "FORMAT"] + sampleNames), file=vcfFile)
+            for position in self._getVariantPositions(
+                    randomGenerator, len(sequence)):
+                referenceBase = sequence[
+                    position:position + 1].decode("ascii")
+                alternateBase = randomGenerator.choice(
+                    [base for base in self.bases if base != referenceBase])
+                # Most variants are rare, as in real populations; only
+                # the carriers of the alternate allele are drawn, which
+                # keeps large sample counts cheap.
+                numAlternate = max(1, int(
+                    numAlleles * randomGenerator.random() ** 4))
+                alleles = ["0"] * numAlleles
+                for alleleIndex in randomGenerator.sample(
+                        range(numAlleles), numAlternate):
+                    alleles[alleleIndex] = "1"
+                genotypes = [
+                    "{}|{}".format(alleles[i], alleles[i + 1])
+                    for i in range(0, numAlleles, 2)]
+                print("\t".join([
+                    referenceName, str(position + 1), ".", referenceBase,
+                    alternateBase, "50", "PASS",
+                    "AF={:.4g}".format(numAlternate / numAlleles), "GT"] +
+                    genotypes), file=vcfFile)
+                numVariants += 1
+        return numVariants
+
+    def generateVariantSet(self, index):
+        """
+        Writes a variant set of one indexed VCF (or BCF) file per
+        reference, with genotypes for the configured number of samples.
+        """
+        variantSetName = "variantSet{}".format(index)
+        variantSetDirectory = os.path.join(
+            self.datasetDirectory, "variants", variantSetName)
+        if not os.path.exists(variantSetDirectory):
+            os.makedirs(variantSetDirectory)
+        sampleNames = [
+            "sample{}".format(sampleIndex)
+            for sampleIndex in range(self.numSamples)]
+        for referenceName, sequence in self.references:
+            vcfFileName = os.path.join(
+                variantSetDirectory, referenceName + ".vcf")
+            utils.log("writing variants for {} samples to {} ...".format(
+                self.numSamples, vcfFileName))
+            numVariants = self._writeVcf(
+                vcfFileName, variantSetName, referenceName, sequence,
+                sampleNames)
+            # tabix_index compresses the file in place and indexes it.
+            pysam.tabix_index(vcfFileName, preset="vcf", force=True)
+            if self.variantFormat == "bcf":
+                bcfFileName = os.path.join(
+                    variantSetDirectory, referenceName + ".bcf")
+                utils.runCommand("bcftools view -O b -o {} {}.gz".format(
+                    bcfFileName, vcfFileName))
+                utils.runCommand("bcftools index {}".format(bcfFileName))
+                os.remove(vcfFileName + ".gz")
+                os.remove(vcfFileName + ".gz.tbi")
+            utils.log("wrote {} variants".format(numVariants))
+
+    def generate(self):
+        shutil.rmtree(self.referenceSetDirectory, ignore_errors=True)
+        shutil.rmtree(self.datasetDirectory, ignore_errors=True)
+        self.generateReferences()
+        if not os.path.exists(self.datasetDirectory):
+            os.makedirs(self.datasetDirectory)
+        self._writeJson(self.datasetDirectory + ".json", {
+            "description": "Synthetic data generated by generate_dataset.py"
+        })
+        # The backend expects both directories, even when empty.
+        os.makedirs(os.path.join(self.datasetDirectory, "reads"))
+        os.makedirs(os.path.join(self.datasetDirectory, "variants"))
+        for index in range(self.numReadGroupSets):
+            self.generateReadGroupSet(index)
+        for index in range(self.numVariantSets):
+            self.generateVariantSet(index)
+
+
+@utils.Timed()
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic data repository for benchmarks")
+    parser.add_argument(
+        "outputDirectory",
+        help="The data repository directory to write")
+    parser.add_argument(
+        "--datasetName", default="synthetic",
+        help="The name of the dataset")
+    parser.add_argument(
+        "--numReferences", default=1, type=int,
+        help="The number of references")
+    parser.add_argument(
+        "--referenceLength", default=10**6, type=int,
+        help="The number of bases in each reference")
+    parser.add_argument(
+        "--readDepth", default=30, type=float,
+        help="The average depth of coverage of each BAM file")
+    parser.add_argument(
+        "--readLength", default=100, type=int,
+        help="The length of each read")
+    parser.add_argument(
+        "--numReadGroupSets", default=1, type=int,
+        help="The number of BAM files")
+    parser.add_argument(
+        "--numReadGroups", default=1, type=int,
+        help="The number of read groups in each BAM file")
+    parser.add_argument(
+        "--numVariantSets", default=1, type=int,
+        help="The number of variant sets")
+    parser.add_argument(
+        "--numSamples", default=100, type=int,
+        help="The number of samples in each variant set")
+    parser.add_argument(
+        "--variantDensity", default=0.01, type=float,
+        help="The probability of a variant at each base")
+    parser.add_argument(
+        "--variantFormat", default="vcf", choices=["vcf", "bcf"],
+        help="Write bgzipped VCF files, or BCF files (which requires "
+        "bcftools)")
+    parser.add_argument(
+        "--randomSeed", default=0, type=int,
+        help="The seed for the random data")
+    generator = DatasetGenerator(parser.parse_args())
+    generator.generate()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,167 +1,562 @@
 """
-Stand-alone benchmark for the GA4GH reference implementation.
+Benchmark suite for the GA4GH reference implementation.
+
+Every search and GET endpoint of the backend, and the reference bases
+endpoint, is run repeatedly against each of the specified data sources.
+The throughput and latency percentiles of each endpoint are reported,
+and can be written to a JSON file and compared against the results of
+a previous run to detect performance regressions.
 """
 from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import re
-import time
-import pstats
 import argparse
 import cProfile
+import datetime
+import json
+import platform
+import pstats
+import sys
+import timeit
+import urlparse
 
-import ga4gh.backend
+import ga4gh
+import ga4gh.backend as backend
+import ga4gh.exceptions as exceptions
+import ga4gh.extensions as extensions
 import ga4gh.protocol as protocol
 
-import guppy
+
+# Candidate reference names used to find a region with variants when
+# they can't be found from the reference sets of the data source.
+DEFAULT_REFERENCE_NAMES = (
+    [str(i) for i in range(1, 23)] + ["X", "Y"] +
+    ["chr{}".format(i) for i in range(1, 23)] + ["chrX", "chrY"])
+
+# The errors raised by the tiles cases when the data source has no
+# up to date pyramid sidecars, which cause those cases to be skipped.
+SKIPPED_CASE_EXCEPTIONS = (
+    exceptions.CoveragePyramidNotFoundException,
+    exceptions.VariantSummaryPyramidNotFoundException,
+    exceptions.BinSizeNotFoundException)
+
+
+class BenchmarkException(Exception):
+    """
+    The data source doesn't contain the objects needed by a benchmark.
+    """
+
+
+class BenchmarkCase(object):
+    """
+    A single benchmarked endpoint. Each call of the case runs one
+    request to the backend, and search cases follow the nextPageToken
+    of their responses for up to pageLimit pages, one page per call.
+    """
+    def __init__(self, name, runMethod, request=None, id_=None):
+        self.name = name
+        self._runMethod = runMethod
+        self._request = request
+        self._id = id_
+
+    def getCalls(self, pageLimit):
+        """
+        Returns the list of zero-argument callables that run each request
+        of this case, following page tokens where necessary.
+        """
+        if self._request is None:
+            return [lambda: self._runMethod(self._id)]
+        calls = []
+        request = self._request
+        while len(calls) < pageLimit:
+            requestString = request.toJsonString()
+            if self._id is None:
+                calls.append(
+                    lambda requestString=requestString:
+                    self._runMethod(requestString))
+                response = json.loads(self._runMethod(requestString))
+            else:
+                args = dict(
+                    (key, value) for key, value in request.toJsonDict().items()
+                    if value is not None)
+                calls.append(
+                    lambda args=args: self._runMethod(self._id, args))
+                response = json.loads(self._runMethod(self._id, args))
+            pageToken = response.get("nextPageToken")
+            if pageToken is None:
+                break
+            request = request.fromJsonDict(request.toJsonDict())
+            request.pageToken = pageToken
+        return calls
 
 
-class HeapProfilerBackend(ga4gh.backend.FileSystemBackend):
-    def __init__(self, dataDir):
-        super(HeapProfilerBackend, self).__init__(dataDir)
-        self.profiler = guppy.hpy()
+def _getFirstVariant(theBackend, variantSet, referenceNames, pageSize):
+    """
+    Returns a SearchVariantsRequest for the first of the specified
+    reference names for which the variant set has variants, and the
+    first of the variants.
+    """
+    for referenceName in referenceNames:
+        request = protocol.SearchVariantsRequest()
+        request.variantSetId = variantSet.getId()
+        request.referenceName = referenceName
+        request.start = 0
+        request.end = 2**31 - 1
+        request.pageSize = 1
+        response = protocol.SearchVariantsResponse.fromJsonString(
+            theBackend.runSearchVariants(request.toJsonString()))
+        if len(response.variants) > 0:
+            request.pageSize = pageSize
+            return request, response.variants[0]
+    raise BenchmarkException("No variants found in {}".format(
+        variantSet.getId()))
 
-    def startProfile(self):
-        self.profiler.setrelheap()
 
-    def endProfile(self):
-        print(self.profiler.heap())
+def _getReadsRequest(theBackend, readGroup, referenceIds, pageSize):
+    """
+    Returns a SearchReadsRequest for the first of the specified
+    references for which the read group has alignments.
+    """
+    for referenceId in referenceIds:
+        request = protocol.SearchReadsRequest()
+        request.readGroupIds = [readGroup.getId()]
+        request.referenceId = referenceId
+        request.pageSize = 1
+        try:
+            response = protocol.SearchReadsResponse.fromJsonString(
+                theBackend.runSearchReads(request.toJsonString()))
+        except Exception:
+            continue
+        if len(response.alignments) > 0:
+            request.pageSize = pageSize
+            return request
+    raise BenchmarkException("No reads found in {}".format(
+        readGroup.getId()))
 
 
-class CpuProfilerBackend(ga4gh.backend.FileSystemBackend):
-    def __init__(self, dataDir):
-        super(CpuProfilerBackend, self).__init__(dataDir)
-        self.profiler = cProfile.Profile()
+def getBenchmarkCases(theBackend, pageSize=100, basesLength=10000):
+    """
+    Returns the list of BenchmarkCases covering every endpoint of the
+    specified backend, using the first object of each type that it
+    contains.
+    """
+    dataset = theBackend.getDatasets()[0]
+    referenceSet = theBackend.getReferenceSets()[0]
+    reference = referenceSet.getReferences()[0]
+    variantSet = dataset.getVariantSets()[0]
+    callSet = variantSet.getCallSets()[0]
+    readGroupSet = dataset.getReadGroupSets()[0]
+    readGroup = readGroupSet.getReadGroups()[0]
+    referenceNames = []
+    referenceIds = []
+    for aReferenceSet in theBackend.getReferenceSets():
+        for aReference in aReferenceSet.getReferences():
+            referenceNames.append(aReference.getLocalId())
+            referenceIds.append(aReference.getId())
+    referenceNames.extend(
+        name for name in DEFAULT_REFERENCE_NAMES
+        if name not in referenceNames)
+    variantsRequest, variant = _getFirstVariant(
+        theBackend, variantSet, referenceNames, pageSize)
+    readsRequest = _getReadsRequest(
+        theBackend, readGroup, referenceIds, pageSize)
 
-    def startProfile(self):
-        self.profiler.enable()
+    def searchRequest(requestClass, **fields):
+        request = requestClass()
+        request.pageSize = pageSize
+        for key, value in fields.items():
+            setattr(request, key, value)
+        return request
 
-    def endProfile(self):
-        self.profiler.disable()
+    basesRequest = protocol.ListReferenceBasesRequest()
+    basesRequest.start = 0
+    basesRequest.end = min(reference.getLength(), basesLength)
+    return [
+        BenchmarkCase(
+            "searchDatasets", theBackend.runSearchDatasets,
+            searchRequest(protocol.SearchDatasetsRequest)),
+        BenchmarkCase(
+            "searchReferenceSets", theBackend.runSearchReferenceSets,
+            searchRequest(protocol.SearchReferenceSetsRequest)),
+        BenchmarkCase(
+            "searchReferences", theBackend.runSearchReferences,
+            searchRequest(
+                protocol.SearchReferencesRequest,
+                referenceSetId=referenceSet.getId())),
+        BenchmarkCase(
+            "searchVariantSets", theBackend.runSearchVariantSets,
+            searchRequest(
+                protocol.SearchVariantSetsRequest,
+                datasetId=dataset.getId())),
+        BenchmarkCase(
+            "searchCallSets", theBackend.runSearchCallSets,
+            searchRequest(
+                protocol.SearchCallSetsRequest,
+                variantSetId=variantSet.getId())),
+        BenchmarkCase(
+            "searchVariants", theBackend.runSearchVariants,
+            variantsRequest),
+        BenchmarkCase(
+            "searchVariantsWithCalls", theBackend.runSearchVariants,
+            searchRequest(
+                protocol.SearchVariantsRequest,
+                variantSetId=variantsRequest.variantSetId,
+                referenceName=variantsRequest.referenceName,
+                start=variantsRequest.start, end=variantsRequest.end,
+                callSetIds=[
+                    aCallSet.getId()
+                    for aCallSet in variantSet.getCallSets()])),
+        BenchmarkCase(
+            "searchMultiVariantSets", theBackend.runSearchMultiVariantSets,
+            searchRequest(
+                extensions.SearchMultiVariantSetsRequest,
+                variantSetIds=[
+                    aVariantSet.getId()
+                    for aVariantSet in dataset.getVariantSets()],
+                referenceName=variantsRequest.referenceName,
+                start=variantsRequest.start, end=variantsRequest.end)),
+        BenchmarkCase(
+            "searchVariantSummaries", theBackend.runSearchVariantSummaries,
+            searchRequest(
+                extensions.SearchVariantSummariesRequest,
+                variantSetId=variantSet.getId(),
+                referenceName=variantsRequest.referenceName,
+                binSize=1000)),
+        BenchmarkCase(
+            "searchGenotypeMatrix", theBackend.runSearchGenotypeMatrix,
+            searchRequest(
+                extensions.SearchGenotypeMatrixRequest,
+                variantSetId=variantsRequest.variantSetId,
+                referenceName=variantsRequest.referenceName,
+                start=variantsRequest.start, end=variantsRequest.end)),
+        BenchmarkCase(
+            "searchReadGroupSets", theBackend.runSearchReadGroupSets,
+            searchRequest(
+                protocol.SearchReadGroupSetsRequest,
+                datasetId=dataset.getId())),
+        BenchmarkCase(
+            "searchReads", theBackend.runSearchReads, readsRequest),
+        BenchmarkCase(
+            "searchCoverage", theBackend.runSearchCoverage,
+            searchRequest(
+                extensions.SearchCoverageRequest,
+                readGroupId=readGroup.getId(),
+                referenceId=readsRequest.referenceId, binSize=1000,
+                includeBaseCounts=True)),
+        BenchmarkCase(
+            "searchCoverageTiles", theBackend.runSearchCoverageTiles,
+            searchRequest(
+                extensions.SearchCoverageTilesRequest,
+                readGroupId=readGroup.getId(),
+                referenceId=readsRequest.referenceId, binSize=100)),
+        BenchmarkCase(
+            "listReferenceBases", theBackend.runListReferenceBases,
+            basesRequest, reference.getId()),
+        BenchmarkCase(
+            "getDataset", theBackend.runGetDataset, id_=dataset.getId()),
+        BenchmarkCase(
+            "getReferenceSet", theBackend.runGetReferenceSet,
+            id_=referenceSet.getId()),
+        BenchmarkCase(
+            "getReference", theBackend.runGetReference,
+            id_=reference.getId()),
+        BenchmarkCase(
+            "getVariantSet", theBackend.runGetVariantSet,
+            id_=variantSet.getId()),
+        BenchmarkCase(
+            "getCallset", theBackend.runGetCallset, id_=callSet.getId()),
+        BenchmarkCase(
+            "getVariant", theBackend.runGetVariant, id_=variant.id),
+        BenchmarkCase(
+            "getReadGroupSet", theBackend.runGetReadGroupSet,
+            id_=readGroupSet.getId()),
+        BenchmarkCase(
+            "getReadGroup", theBackend.runGetReadGroup,
+            id_=readGroup.getId()),
+    ]
 
 
-def _heavyQuery(variantSetId, callSetIds):
+def percentile(sortedValues, fraction):
     """
-    Very heavy query: calls for the specified list of callSetIds
-    on chromosome 2 (11 pages, 90 seconds to fetch the entire thing
-    on a high-end desktop machine)
+    Returns the specified percentile (as a fraction between 0 and 1) of
+    the specified sorted list of values, using the nearest rank.
     """
-    request = protocol.GASearchVariantsRequest()
-    request.referenceName = '2'
-    request.variantSetIds = [variantSetId]
-    request.callSetIds = callSetIds
-    request.pageSize = 100
-    request.end = 100000
-    return request
+    index = int(round(fraction * (len(sortedValues) - 1)))
+    return sortedValues[index]
 
 
-def timeOneSearch(queryString):
+def benchmarkCase(case, repeatLimit, pageLimit):
     """
-    Returns (search result as JSON string, time elapsed during search)
+    Runs the specified case repeatLimit times, after one warm up run, and
+    returns a dictionary of its results. Latencies are in milliseconds,
+    and throughput is in requests per second. If the backend has no
+    pyramid sidecars for the tiles cases, the case is skipped and the
+    dictionary only holds the reason under "skipped", so that the other
+    cases can still be run. Any other error is raised.
     """
-    startTime = time.clock()
-    resultString = backend.searchVariants(queryString)
-    endTime = time.clock()
-    elapsedTime = endTime - startTime
-    return resultString, elapsedTime
+    latencies = []
+    totalTime = 0
+    try:
+        calls = case.getCalls(pageLimit)
+        for call in calls:
+            call()
+        for _ in range(repeatLimit):
+            for call in calls:
+                startTime = timeit.default_timer()
+                call()
+                elapsedTime = timeit.default_timer() - startTime
+                totalTime += elapsedTime
+                latencies.append(elapsedTime * 1000)
+    except SKIPPED_CASE_EXCEPTIONS as exception:
+        return {"skipped": "{}: {}".format(
+            type(exception).__name__, exception)}
+    latencies.sort()
+    return {
+        "numRequests": len(latencies),
+        "numPages": len(calls),
+        "throughput": len(latencies) / totalTime if totalTime > 0 else None,
+        "mean": sum(latencies) / len(latencies),
+        "min": latencies[0],
+        "p50": percentile(latencies, 0.5),
+        "p90": percentile(latencies, 0.9),
+        "p99": percentile(latencies, 0.99),
+        "max": latencies[-1],
+    }
 
 
-def extractNextPageToken(resultString):
+def getBackend(dataSource, args):
     """
-    Calling GASearchVariantsResponse.fromJsonString() can be slower
-    than doing the variant search in the first place; instead we use
-    a regexp to extract the next page token.
+    Returns the backend for the specified data source, which is either a
+    simulated:// URL or the path of a data directory.
     """
-    m = re.search('(?<=nextPageToken": )(?:")?([0-9]*?:[0-9]*)|null',
-                  resultString)
-    if m is not None:
-        return m.group(1)
-    return None
+    url = urlparse.urlparse(dataSource, "file")
+    if url.scheme == "simulated":
+        return backend.SimulatedBackend(
+            randomSeed=args.randomSeed, numCalls=args.numCalls,
+            variantDensity=args.variantDensity,
+            readDepth=args.readDepth, readLength=args.readLength)
+    return backend.FileSystemBackend(dataSource)
 
 
-def benchmarkOneQuery(request, repeatLimit=3, pageLimit=3):
+def runBenchmarks(dataSources, args, profiler=None):
     """
-    Repeat the query several times; perhaps don't go through *all* the
-    pages.  Returns minimum time to run backend.searchVariants() to execute
-    the query (as far as pageLimit allows), *not* including JSON
-    processing to prepare queries or parse responses.
+    Runs all of the benchmark cases against each of the specified data
+    sources and returns the dictionary of results, keyed by data source
+    and then by case name. Skipped cases are reported but have no
+    results, and the result of a case that fails only holds the error
+    under "failed".
     """
-    times = []
-    queryString = request.toJsonString()
-    for i in range(0, repeatLimit):
-        resultString, elapsedTime = timeOneSearch(queryString)
-        accruedTime = elapsedTime
-        pageCount = 1
-        token = extractNextPageToken(resultString)
-        # Iterate to go beyond the first page of results.
-        while token is not None and pageCount < pageLimit:
-            pageRequest = request
-            pageRequest.pageToken = token
-            pageRequestString = pageRequest.toJsonString()
-            resultString, elapsedTime = timeOneSearch(pageRequestString)
-            accruedTime += elapsedTime
-            pageCount = pageCount + 1
-            token = extractNextPageToken(resultString)
-        times.append(accruedTime)
+    results = {}
+    for dataSource in dataSources:
+        theBackend = getBackend(dataSource, args)
+        cases = getBenchmarkCases(theBackend, args.pageSize, args.basesLength)
+        results[dataSource] = {}
+        for case in cases:
+            if args.cases is not None and case.name not in args.cases:
+                continue
+            if profiler is not None:
+                profiler.enable()
+            try:
+                result = benchmarkCase(case, args.repeatLimit, args.pageLimit)
+            except Exception as exception:
+                result = {"failed": "{}: {}".format(
+                    type(exception).__name__, exception)}
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+            if "skipped" in result:
+                print("{:<20} {:<26} skipped ({})".format(
+                    dataSource[-20:], case.name, result["skipped"]))
+                continue
+            if "failed" in result:
+                results[dataSource][case.name] = result
+                print("{:<20} {:<26} FAILED ({})".format(
+                    dataSource[-20:], case.name, result["failed"]))
+                continue
+            results[dataSource][case.name] = result
+            print(formatResult(dataSource, case.name, result))
+    return results
+
 
-    # TODO: more sophisticated statistics. Sometimes we want min(),
-    # sometimes mean = sum() / len(), sometimes other measures,
-    # perhaps exclude outliers...
+def formatResult(dataSource, caseName, result):
+    """
+    Returns a one line summary of the specified result.
+    """
+    return (
+        "{:<20} {:<26} {:>9.1f} req/s  p50 {:>8.2f}ms  p90 {:>8.2f}ms  "
+        "p99 {:>8.2f}ms".format(
+            dataSource[-20:], caseName, result["throughput"] or 0,
+            result["p50"], result["p90"], result["p99"]))
 
-    # If we compute average we should throw out at least the first one.
-    # return sum(times[2:])/len(times[2:])
-    return min(times)
 
-if __name__ == '__main__':
+def getFailures(results):
+    """
+    Returns a list of messages describing the cases that failed.
+    """
+    return [
+        "{} {}: {}".format(dataSource, caseName, result["failed"])
+        for dataSource, caseResults in sorted(results.items())
+        for caseName, result in sorted(caseResults.items())
+        if "failed" in result]
+
+
+def compareResults(results, baseline, tolerance, caseNames=None):
+    """
+    Compares the specified results to the baseline results and returns a
+    list of messages describing the cases whose median latency increased,
+    or whose throughput decreased, by more than the specified fraction,
+    and the cases of the baseline that did not produce a result. If
+    caseNames is not None, only the cases it lists are compared.
+    """
+    regressions = []
+    for dataSource, caseResults in sorted(results.items()):
+        baselineCases = baseline.get(dataSource, {})
+        for caseName in sorted(baselineCases):
+            if caseNames is not None and caseName not in caseNames:
+                continue
+            result = caseResults.get(caseName)
+            if result is None or "failed" in result:
+                regressions.append(
+                    "{} {}: no result, but the baseline has one".format(
+                        dataSource, caseName))
+        for caseName, result in sorted(caseResults.items()):
+            if caseName not in baselineCases or "failed" in result:
+                continue
+            baselineResult = baselineCases[caseName]
+            if result["p50"] > baselineResult["p50"] * (1 + tolerance):
+                regressions.append(
+                    "{} {}: p50 latency {:.2f}ms > baseline {:.2f}ms".format(
+                        dataSource, caseName, result["p50"],
+                        baselineResult["p50"]))
+            if (result["throughput"] is not None and
+                    baselineResult["throughput"] is not None and
+                    result["throughput"] <
+                    baselineResult["throughput"] * (1 - tolerance)):
+                regressions.append(
+                    "{} {}: throughput {:.1f} req/s < baseline {:.1f} "
+                    "req/s".format(
+                        dataSource, caseName, result["throughput"],
+                        baselineResult["throughput"]))
+    return regressions
+
+
+def parseArgs(argv=None):
     parser = argparse.ArgumentParser(
         description="GA4GH reference server benchmark")
     parser.add_argument(
-        'variantSetId',
-        help="The variant set ID to run the query against")
+        "dataSources", nargs="*",
+        default=["simulated://", "ga4gh-example-data"],
+        help=(
+            "The data sources to benchmark: simulated:// for a simulated "
+            "backend, or the path of a data directory "
+            "(default: %(default)s)"))
+    parser.add_argument(
+        "--cases", default=None, type=lambda value: value.split(","),
+        help="A comma separated list of the cases to run (default: all)")
+    parser.add_argument(
+        "--profile", default="none", choices=["none", "heap", "cpu"],
+        help=(
+            '"heap" prints the heap usage of the benchmark cases, "cpu" '
+            'runs a cpu profiler over them.'))
+    parser.add_argument(
+        "--repeatLimit", type=int, default=10, metavar="N",
+        help="How many times to run each test case (default: %(default)s)")
+    parser.add_argument(
+        "--pageLimit", type=int, default=3, metavar="N",
+        help=(
+            "How many pages (max) to load from each search "
+            "(default: %(default)s)"))
     parser.add_argument(
-        '--profile', default='none',
-        choices=['none', 'heap', 'cpu'],
-        help='"heap" runs a heap profiler once inside the backend, '
-             '"cpu" runs a cpu profiler.')
+        "--pageSize", type=int, default=100, metavar="N",
+        help="The page size of searches (default: %(default)s)")
     parser.add_argument(
-        '--repeatLimit', type=int, default=3, metavar='N',
-        help='how many times to run each test case (default: %(default)s)')
+        "--basesLength", type=int, default=10000, metavar="N",
+        help=(
+            "The number of bases to request from a reference "
+            "(default: %(default)s)"))
     parser.add_argument(
-        '--pageLimit', type=int, default=3, metavar='N',
-        help='how many pages (max) to load '
-             'from each test case (default: %(default)s)')
+        "--randomSeed", type=int, default=0,
+        help="The random seed of the simulated backend")
     parser.add_argument(
-        "--callSetIds", "-c", default=[],
-        help="""Return variant calls which belong to call sets
-            with these IDs. Pass in IDs as a comma separated list (no spaces),
-            or '*' (with the single quotes!) to indicate 'all call sets'.
-            Omit this option to indicate 'no call sets'.
-            """)
-
-    args = parser.parse_args()
-
-    backendClass = ga4gh.backend.FileSystemBackend
-    if args.profile == 'heap':
-        backendClass = HeapProfilerBackend
+        "--numCalls", type=int, default=10,
+        help="The number of calls per variant of the simulated backend")
+    parser.add_argument(
+        "--variantDensity", type=float, default=0.5,
+        help="The variant density of the simulated backend")
+    parser.add_argument(
+        "--readDepth", type=float, default=30,
+        help="The mean read depth of the simulated backend")
+    parser.add_argument(
+        "--readLength", type=int, default=100,
+        help="The read length of the simulated backend")
+    parser.add_argument(
+        "--output", "-o", default=None,
+        help="Write the results to this file in JSON format")
+    parser.add_argument(
+        "--baseline", "-b", default=None,
+        help=(
+            "Compare the results against those in this JSON file, and exit "
+            "with a non-zero status if there are regressions"))
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2,
+        help=(
+            "The fractional change from the baseline allowed before a "
+            "result is flagged as a regression (default: %(default)s)"))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parseArgs(argv)
+    profiler = None
+    heapProfiler = None
+    if args.profile == "cpu":
+        profiler = cProfile.Profile()
+    elif args.profile == "heap":
+        import guppy
+        heapProfiler = guppy.hpy()
+        heapProfiler.setrelheap()
         args.repeatLimit = 1
         args.pageLimit = 1
-    elif args.profile == 'cpu':
-        backendClass = CpuProfilerBackend
-    # Get our list of callSetids
-    callSetIds = args.callSetIds
-    if callSetIds != []:
-        callSetIds = None
-        if args.callSetIds != "*":
-            callSetIds = args.callSetIds.split(",")
-
-    backend = backendClass("ga4gh-example-data")
-    minTime = benchmarkOneQuery(
-        _heavyQuery(args.variantSetId, callSetIds), args.repeatLimit,
-        args.pageLimit)
-    print(minTime)
-
-    if args.profile == 'cpu':
-        stats = pstats.Stats(backend.profiler)
+    results = runBenchmarks(args.dataSources, args, profiler)
+    output = {
+        "metadata": {
+            "date": datetime.datetime.now().isoformat(),
+            "serverVersion": ga4gh.__version__,
+            "pythonVersion": platform.python_version(),
+            "platform": platform.platform(),
+            "repeatLimit": args.repeatLimit,
+            "pageLimit": args.pageLimit,
+            "pageSize": args.pageSize,
+        },
+        "results": results,
+    }
+    if args.output is not None:
+        with open(args.output, "w") as outputFile:
+            json.dump(output, outputFile, indent=4, sort_keys=True)
+    if profiler is not None:
+        stats = pstats.Stats(profiler)
         stats.sort_stats('time')
         stats.print_stats(.25)
+    if heapProfiler is not None:
+        print(heapProfiler.heap())
+    status = 0
+    failures = getFailures(results)
+    for failure in failures:
+        print("FAILURE:", failure)
+    if len(failures) > 0:
+        status = 1
+    if args.baseline is not None:
+        with open(args.baseline) as baselineFile:
+            baseline = json.load(baselineFile)["results"]
+        regressions = compareResults(
+            results, baseline, args.tolerance, args.cases)
+        for regression in regressions:
+            print("REGRESSION:", regression)
+        if len(regressions) > 0:
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
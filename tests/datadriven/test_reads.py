@@ -273,6 +273,135 @@ class ReadGroupSetTest(datadriven.DataDrivenTest):
                 self.assertAlignmentListsEqual(
                     gaAlignments, alignments, readGroupInfo)
 
+    def _matchesReadFilter(
+            self, alignment, minMappingQuality=0, requiredFlags=0,
+            excludedFlags=0, minReadLength=0, maxReadLength=2**30):
+        return (
+            alignment.mapping_quality >= minMappingQuality and
+            alignment.flag & requiredFlags == requiredFlags and
+            alignment.flag & excludedFlags == 0 and
+            minReadLength <= len(alignment.query_sequence) <= maxReadLength)
+
+    def testGetReadAlignmentsFiltered(self):
+        # test that filtered reads are those of an unfiltered search that
+        # pass the filter
+        filterArgs = [
+            {"minMappingQuality": 10},
+            {"requiredFlags": 0x1},
+            {"excludedFlags": 0x10 | 0x400},
+            {"minReadLength": 10, "maxReadLength": 91},
+            {"minMappingQuality": 1, "requiredFlags": 0x2,
+             "excludedFlags": 0x100},
+        ]
+        readGroupSet = self._gaObject
+        for readGroup in readGroupSet.getReadGroups():
+            readGroupInfo = self._readGroupInfos[readGroup.getLocalId()]
+            for name, alignments in readGroupInfo.mappedReads.items():
+                reference = self._referenceSet.getReferenceByName(name)
+                for kwargs in filterArgs:
+                    readFilter = reads.ReadAlignmentFilter(**kwargs)
+                    expected = [
+                        alignment for alignment in alignments
+                        if self._matchesReadFilter(alignment, **kwargs)]
+                    self.assertAlignmentListsEqual(
+                        list(readGroup.getReadAlignments(
+                            reference, readFilter=readFilter)),
+                        expected, readGroupInfo)
+
+    def testGetReadAlignmentsDownsampled(self):
+        # test that each bucket keeps at most maxReads of the reads
+        # starting in it, whatever the region searched
+        bucketSize = 50
+        maxReads = 2
+        readGroupSet = self._gaObject
+        for readGroup in readGroupSet.getReadGroups():
+            readGroupInfo = self._readGroupInfos[readGroup.getLocalId()]
+            for name, alignments in readGroupInfo.mappedReads.items():
+                reference = self._referenceSet.getReferenceByName(name)
+                downsampler = reads.ReadDownsampler(
+                    maxReads, bucketSize, seed=7)
+                gaAlignments = list(readGroup.getReadAlignments(
+                    reference, downsampler=downsampler))
+                bucketKeys = collections.defaultdict(list)
+                keys = [
+                    downsampler.getKey(
+                        alignment.query_name, alignment.flag,
+                        alignment.reference_start)
+                    for alignment in alignments]
+                for alignment, key in zip(alignments, keys):
+                    bucketKeys[
+                        alignment.reference_start // bucketSize].append(key)
+                expected = [
+                    alignment for alignment, key in zip(alignments, keys)
+                    if key in sorted(bucketKeys[
+                        alignment.reference_start // bucketSize])[:maxReads]]
+                self.assertAlignmentListsEqual(
+                    gaAlignments, expected, readGroupInfo)
+                if len(gaAlignments) > 0:
+                    start = gaAlignments[len(gaAlignments) // 2].alignment.\
+                        position.position
+                    windowAlignments = list(readGroup.getReadAlignments(
+                        reference, start, downsampler=downsampler))
+                    self.assertEqual(
+                        [gaAlignment for gaAlignment in windowAlignments
+                         if gaAlignment.alignment.position.position >=
+                         start],
+                        [gaAlignment for gaAlignment in gaAlignments
+                         if gaAlignment.alignment.position.position >=
+                         start])
+
+    def _getExpectedCoverage(self, alignments, start, end, binSize):
+        depths = collections.Counter()
+        baseCounts = collections.defaultdict(collections.Counter)
+        for alignment in alignments:
+            for queryPosition, position in alignment.get_aligned_pairs():
+                if queryPosition is not None and position is not None:
+                    depths[position] += 1
+                    queryBase = alignment.query_sequence[queryPosition]
+                    baseCounts[position][queryBase] += 1
+        expected = []
+        for binStart in range(start, end, binSize):
+            binEnd = min(binStart + binSize, end)
+            positions = range(binStart, binEnd)
+            meanDepth = sum(depths[i] for i in positions) / len(positions)
+            counts = [
+                sum(baseCounts[i][base] for i in positions)
+                for base in "ACGT"]
+            expected.append((binStart, binEnd, meanDepth, counts))
+        return expected
+
+    def testGetCoverage(self):
+        # test that the bins accumulated from the CIGARs agree with the
+        # aligned pairs of the pysam reads
+        readGroupSet = self._gaObject
+        for readGroup in readGroupSet.getReadGroups():
+            readGroupInfo = self._readGroupInfos[readGroup.getLocalId()]
+            for name, alignments in readGroupInfo.mappedReads.items():
+                reference = self._referenceSet.getReferenceByName(name)
+                start = max(
+                    min(read.reference_start for read in alignments) - 5, 0)
+                end = max(read.reference_end for read in alignments) + 5
+                for binSize in [1, 7, end - start]:
+                    coverageBins = readGroup.getCoverage(
+                        reference, start, end, binSize,
+                        includeBaseCounts=True)
+                    self.assertEqual(
+                        [(coverageBin.start, coverageBin.end,
+                          coverageBin.meanDepth, coverageBin.baseCounts)
+                         for coverageBin in coverageBins],
+                        self._getExpectedCoverage(
+                            alignments, start, end, binSize))
+                    # the generic implementation over the converted reads
+                    # gives the same bins
+                    genericBins = reads.AbstractReadGroup.getCoverage(
+                        readGroup, reference, start, end, binSize,
+                        includeBaseCounts=True)
+                    self.assertEqual(
+                        [coverageBin.toJsonDict()
+                         for coverageBin in coverageBins],
+                        [coverageBin.toJsonDict()
+                         for coverageBin in genericBins])
+
     def testGetReadAlignmentSearchRanges(self):
         # test that various range searches work
         readGroupSet = self._gaObject
@@ -8,6 +8,7 @@ from __future__ import unicode_literals
 import os
 import glob
 import hashlib
+import re
 
 import vcf
 
@@ -229,6 +230,81 @@ class VariantSetTest(datadriven.DataDrivenTest):
         self.assertGreaterEqual(len(gaVariants), 0)
         self._verifyVariantsEqual(gaVariants, pyvcfVariants)
 
+    def _pyvcfVariantMatches(self, record, siteFilter):
+        passOnly, variantClasses, minQuality, minAlleleFrequency = siteFilter
+        if minQuality is not None and (
+                record.QUAL is None or record.QUAL < minQuality):
+            return False
+        if passOnly and record.FILTER != []:
+            return False
+        if variantClasses is not None:
+            alternateBases = [
+                str(alt) for alt in record.ALT if alt is not None]
+            variantClass = variants.getVariantClass(
+                record.REF, alternateBases)
+            if variantClass not in variantClasses:
+                return False
+        if minAlleleFrequency is not None:
+            alleleFrequency = record.INFO.get("AF")
+            if not isinstance(alleleFrequency, list):
+                alleleFrequency = [alleleFrequency]
+            if not any(value is not None and value >= minAlleleFrequency
+                       for value in alleleFrequency):
+                return False
+        return True
+
+    def testSiteFilters(self):
+        end = datamodel.PysamDatamodelMixin.vcfMax
+        siteFilters = [
+            (True, None, None, None),
+            (False, ["SNV"], None, None),
+            (False, ["MNV", "INDEL", "OTHER"], None, None),
+            (False, None, 30, None),
+            (False, None, None, 0.1),
+            (True, ["SNV", "INDEL"], 10, 0.01),
+        ]
+        for siteFilter in siteFilters:
+            variantSiteFilter = variants.VariantSiteFilter(*siteFilter)
+            for referenceName in self._referenceNames:
+                gaVariants = list(self._gaObject.getVariants(
+                    referenceName, 0, end, [],
+                    siteFilter=variantSiteFilter))
+                pyvcfVariants = [
+                    record for record in self._getPyvcfVariants(referenceName)
+                    if self._pyvcfVariantMatches(record, siteFilter)]
+                self._verifyVariantsEqual(gaVariants, pyvcfVariants)
+
+    def _pyvcfIsNonReference(self, record, sampleName):
+        alleles = re.split("[/|]", record.genotype(sampleName).data.GT)
+        return any(allele not in ("0", ".") for allele in alleles)
+
+    def testGenotypeFilters(self):
+        end = datamodel.PysamDatamodelMixin.vcfMax
+        callSets = self._gaObject.getCallSets()
+        for anyCallSets, allCallSets in [
+                (callSets[:1], None), (callSets[-2:], None),
+                (None, callSets[:2]), (callSets[1:], callSets[:1])]:
+            genotypeFilter = variants.GenotypeFilter(
+                anyNonReference=anyCallSets, allNonReference=allCallSets)
+            for referenceName in self._referenceNames:
+                gaVariants = list(self._gaObject.getVariants(
+                    referenceName, 0, end, [],
+                    genotypeFilter=genotypeFilter))
+                pyvcfVariants = []
+                for record in self._getPyvcfVariants(referenceName):
+                    if anyCallSets is not None and not any(
+                            self._pyvcfIsNonReference(
+                                record, callSet.getSampleName())
+                            for callSet in anyCallSets):
+                        continue
+                    if allCallSets is not None and not all(
+                            self._pyvcfIsNonReference(
+                                record, callSet.getSampleName())
+                            for callSet in allCallSets):
+                        continue
+                    pyvcfVariants.append(record)
+                self._verifyVariantsEqual(gaVariants, pyvcfVariants)
+
     def testVariantInSegments(self):
         for referenceName in self._referenceNames:
             localVariants = self._getPyvcfVariants(referenceName)
@@ -386,6 +462,43 @@ class VariantSetTest(datadriven.DataDrivenTest):
                 for call, someId in zip(record.calls, someCallSetIds):
                     self.assertEqual(call.callSetId, someId)
 
+    def testGetGenotypeMatrixRows(self):
+        variantSet = self._gaObject
+        end = datamodel.PysamDatamodelMixin.vcfMax
+        callSets = variantSet.getCallSets()
+        for columns in [None, callSets[::-1], callSets[1:2], []]:
+            callSetIds = None
+            if columns is not None:
+                callSetIds = [callSet.getId() for callSet in columns]
+            else:
+                columns = callSets
+            for referenceName in self._referenceNames:
+                rows = list(variantSet.getGenotypeMatrixRows(
+                    referenceName, 0, end, callSetIds))
+                gaVariants = list(variantSet.getVariants(
+                    referenceName, 0, end, []))
+                pyvcfVariants = self._getPyvcfVariants(referenceName)
+                self.assertEqual(len(rows), len(pyvcfVariants))
+                for row, gaVariant, pyvcfVariant in zip(
+                        rows, gaVariants, pyvcfVariants):
+                    self.assertTrue(row.validate(row.toJsonDict()))
+                    self.assertEqual(row.id, gaVariant.id)
+                    self.assertEqual(row.start, pyvcfVariant.start)
+                    self.assertEqual(row.end, gaVariant.end)
+                    self.assertEqual(row.referenceBases, pyvcfVariant.REF)
+                    self.assertEqual(
+                        row.alternateBases, gaVariant.alternateBases)
+                    genotypes = []
+                    for callSet in columns:
+                        data = pyvcfVariant.genotype(
+                            callSet.getSampleName()).data
+                        genotypes.append(getattr(data, "GT", None) or ".")
+                    self.assertEqual(row.genotypes, ",".join(genotypes))
+        self.assertRaises(
+            exceptions.CallSetNotInVariantSetException,
+            list, variantSet.getGenotypeMatrixRows(
+                "1", 0, end, ["notACallSet"]))
+
     def testGetVariant(self):
         variantSet = self._gaObject
         for referenceName in self._referenceNames:
@@ -0,0 +1,421 @@
+"""
+A load generator for the GA4GH server.
+
+Launches the server with the specified data source and worker
+configuration, and drives a number of concurrent HTTP clients through
+paging workloads against it: "browser", which fetches the variants,
+reads and reference bases of random windows as a genome browser would,
+and "scan", which pages through the variants and reads of a whole
+reference. The latency percentiles, throughput and error rates of each
+type of request and workload are reported at the end of the run.
+
+Run from the root of the repository, for example:
+
+    python -m tests.end_to_end.loadtest --workers 4 --clients 16
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import collections
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+
+import ga4gh.client as client
+import ga4gh.exceptions as exceptions
+import server_benchmark
+import tests.end_to_end.server as server
+
+
+class LoadTestException(Exception):
+    """
+    The server doesn't contain the objects needed by the workloads.
+    """
+
+
+class LoadRecorder(object):
+    """
+    Records the latency and outcome of every request and workload run
+    by the clients. This class is thread-safe.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = collections.defaultdict(list)
+        self._numErrors = collections.Counter()
+
+    def record(self, name, latency, error):
+        """
+        Records that the request or workload with the specified name
+        took latency seconds, and failed if error is True.
+        """
+        with self._lock:
+            self._latencies[name].append(latency)
+            if error:
+                self._numErrors[name] += 1
+
+    def getSummary(self, elapsed):
+        """
+        Returns a dictionary mapping the name of each request type and
+        workload to a dictionary of its results over a run that took
+        elapsed seconds. Latencies are in milliseconds.
+        """
+        summary = {}
+        with self._lock:
+            for name, latencies in self._latencies.items():
+                latencies = sorted(latencies)
+                numErrors = self._numErrors[name]
+                summary[name] = {
+                    "numRequests": len(latencies),
+                    "numErrors": numErrors,
+                    "errorRate": numErrors / len(latencies),
+                    "p50": server_benchmark.percentile(latencies, 0.5) * 1000,
+                    "p99": server_benchmark.percentile(
+                        latencies, 0.99) * 1000,
+                    "throughput": len(latencies) / elapsed,
+                }
+        return summary
+
+
+class TimedHttpClient(client.HttpClient):
+    """
+    An HttpClient that records the latency and outcome of each of its
+    HTTP requests with a LoadRecorder.
+    """
+    def __init__(self, urlPrefix, recorder):
+        super(TimedHttpClient, self).__init__(
+            urlPrefix, logLevel=logging.CRITICAL)
+        self._recorder = recorder
+
+    def _timeRequest(self, name, function, *args):
+        startTime = time.time()
+        error = True
+        try:
+            result = function(*args)
+            error = False
+            return result
+        finally:
+            self._recorder.record(name, time.time() - startTime, error)
+
+    def _runSearchPageRequest(
+            self, protocolRequest, objectName, protocolResponseClass):
+        return self._timeRequest(
+            "POST /{}/search".format(objectName),
+            super(TimedHttpClient, self)._runSearchPageRequest,
+            protocolRequest, objectName, protocolResponseClass)
+
+    def _runGetRequest(self, objectName, protocolResponseClass, id_):
+        return self._timeRequest(
+            "GET /{}/<id>".format(objectName),
+            super(TimedHttpClient, self)._runGetRequest,
+            objectName, protocolResponseClass, id_)
+
+    def _runListReferenceBasesPageRequest(self, id_, request):
+        return self._timeRequest(
+            "GET /references/<id>/bases",
+            super(TimedHttpClient, self)._runListReferenceBasesPageRequest,
+            id_, request)
+
+
+class LoadTarget(object):
+    """
+    The objects on the server that the workloads are run against: a
+    variant set and the reference name of a region with variants, and a
+    read group and a reference that its reads are aligned to. Each
+    region starts at the first object found in it, and ends at the end
+    of its reference, or defaultLength bases later if the length of the
+    reference is unknown or smaller than that.
+    """
+    def __init__(self, theClient, defaultLength=10**6):
+        self._defaultLength = defaultLength
+        theClient.setPageSize(1)
+        dataset = self._first(theClient.searchDatasets(), "datasets")
+        self.variantSetId = self._first(
+            theClient.searchVariantSets(dataset.id), "variant sets").id
+        readGroupSet = self._first(
+            theClient.searchReadGroupSets(dataset.id), "read group sets")
+        self.readGroupIds = [readGroupSet.readGroups[0].id]
+        references = []
+        for referenceSet in theClient.searchReferenceSets():
+            references.extend(theClient.searchReferences(referenceSet.id))
+        referenceLengths = dict(
+            (reference.name, reference.length) for reference in references)
+        self.variantsReferenceName = None
+        for name in itertools.chain(
+                referenceLengths.keys(),
+                server_benchmark.DEFAULT_REFERENCE_NAMES):
+            variant = next(theClient.searchVariants(
+                self.variantSetId, 0, 2**31 - 1, name), None)
+            if variant is not None:
+                self.variantsReferenceName = name
+                self.variantsRegion = self._getRegion(
+                    variant.start, referenceLengths.get(name))
+                break
+        if self.variantsReferenceName is None:
+            raise LoadTestException("No variants found")
+        self.readsReferenceId = None
+        for reference in references:
+            try:
+                read = next(theClient.searchReads(
+                    self.readGroupIds, reference.id), None)
+            except exceptions.RequestNonSuccessException:
+                continue
+            if read is not None:
+                self.readsReferenceId = reference.id
+                self.readsRegion = self._getRegion(
+                    read.alignment.position.position, reference.length)
+                self.basesLength = reference.length
+                break
+        if self.readsReferenceId is None:
+            raise LoadTestException("No reads found")
+
+    def _first(self, objects, description):
+        obj = next(objects, None)
+        if obj is None:
+            raise LoadTestException("No {} found".format(description))
+        return obj
+
+    def _getRegion(self, start, referenceLength):
+        end = start + self._defaultLength
+        if referenceLength is not None and referenceLength > start:
+            end = referenceLength
+        return start, end
+
+
+class BrowserWorkload(object):
+    """
+    Fetches all of the variants, reads and reference bases in randomly
+    placed windows of windowSize bases, as a genome browser would.
+    """
+    name = "browser"
+
+    def __init__(self, target, windowSize):
+        self._target = target
+        self._windowSize = windowSize
+
+    def _getWindow(self, randomNumberGenerator, regionStart, regionEnd):
+        start = randomNumberGenerator.randint(
+            regionStart, max(regionStart, regionEnd - self._windowSize))
+        return start, min(regionEnd, start + self._windowSize)
+
+    def run(self, theClient, randomNumberGenerator):
+        """
+        Runs the workload using the specified client.
+        """
+        target = self._target
+        start, end = self._getWindow(
+            randomNumberGenerator, *target.variantsRegion)
+        for _ in theClient.searchVariants(
+                target.variantSetId, start, end,
+                target.variantsReferenceName):
+            pass
+        start, end = self._getWindow(
+            randomNumberGenerator, *target.readsRegion)
+        for _ in theClient.searchReads(
+                target.readGroupIds, target.readsReferenceId, start, end):
+            pass
+        start, end = self._getWindow(
+            randomNumberGenerator, 0, target.basesLength)
+        theClient.listReferenceBases(target.readsReferenceId, start, end)
+
+
+class ScanWorkload(object):
+    """
+    Pages through the variants and reads of a whole reference, stopping
+    after maxPages pages of each.
+    """
+    name = "scan"
+
+    def __init__(self, target, maxPages):
+        self._target = target
+        self._maxPages = maxPages
+
+    def run(self, theClient, randomNumberGenerator):
+        """
+        Runs the workload using the specified client.
+        """
+        target = self._target
+        maxObjects = self._maxPages * theClient.getPageSize()
+        start, end = target.variantsRegion
+        variants = theClient.searchVariants(
+            target.variantSetId, start, end, target.variantsReferenceName)
+        for _ in itertools.islice(variants, maxObjects):
+            pass
+        start, end = target.readsRegion
+        reads = theClient.searchReads(
+            target.readGroupIds, target.readsReferenceId, start, end)
+        for _ in itertools.islice(reads, maxObjects):
+            pass
+
+
+class LoadClient(threading.Thread):
+    """
+    A client thread that runs randomly chosen workloads until the
+    deadline passes or it has run numIterations workloads.
+    """
+    def __init__(
+            self, serverUrl, pageSize, recorder, workloads, deadline,
+            numIterations=None, randomSeed=0):
+        super(LoadClient, self).__init__()
+        self.daemon = True
+        self._client = TimedHttpClient(serverUrl, recorder)
+        self._client.setPageSize(pageSize)
+        self._recorder = recorder
+        self._workloads = workloads
+        self._deadline = deadline
+        self._numIterations = numIterations
+        self._randomNumberGenerator = random.Random(randomSeed)
+
+    def run(self):
+        iterations = itertools.count()
+        while (time.time() < self._deadline and
+                next(iterations) != self._numIterations):
+            workload = self._randomNumberGenerator.choice(self._workloads)
+            startTime = time.time()
+            error = True
+            try:
+                workload.run(self._client, self._randomNumberGenerator)
+                error = False
+            except Exception:
+                # Failed requests have already been recorded by the client
+                pass
+            self._recorder.record(
+                "workload " + workload.name, time.time() - startTime, error)
+
+
+def runLoad(
+        serverUrl, workloadNames, numClients, duration, numIterations=None,
+        pageSize=100, windowSize=10000, maxScanPages=10, randomSeed=0):
+    """
+    Runs the named workloads against the server at serverUrl with
+    numClients concurrent clients, for duration seconds or until each
+    client has run numIterations workloads, and returns a dictionary of
+    the results.
+    """
+    target = LoadTarget(
+        client.HttpClient(serverUrl, logLevel=logging.CRITICAL))
+    workloadClasses = {
+        BrowserWorkload.name: lambda: BrowserWorkload(target, windowSize),
+        ScanWorkload.name: lambda: ScanWorkload(target, maxScanPages),
+    }
+    workloads = [workloadClasses[name]() for name in workloadNames]
+    recorder = LoadRecorder()
+    startTime = time.time()
+    clients = [
+        LoadClient(
+            serverUrl, pageSize, recorder, workloads, startTime + duration,
+            numIterations, randomSeed + i)
+        for i in range(numClients)]
+    for loadClient in clients:
+        loadClient.start()
+    for loadClient in clients:
+        loadClient.join()
+    elapsed = time.time() - startTime
+    return {
+        "numClients": numClients,
+        "elapsed": elapsed,
+        "results": recorder.getSummary(elapsed),
+    }
+
+
+def formatResults(results):
+    """
+    Returns the specified results of runLoad formatted as a table.
+    """
+    lines = ["{} clients for {:.1f}s".format(
+        results["numClients"], results["elapsed"])]
+    lines.append("{:32} {:>8} {:>7} {:>10} {:>10} {:>10}".format(
+        "", "requests", "errors", "p50 (ms)", "p99 (ms)", "per sec"))
+    for name, result in sorted(results["results"].items()):
+        lines.append(
+            "{:32} {:8d} {:6.1%} {:10.2f} {:10.2f} {:10.1f}".format(
+                name, result["numRequests"], result["errorRate"],
+                result["p50"], result["p99"], result["throughput"]))
+    return "\n".join(lines)
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(
+        description="Runs concurrent paging workloads against a server")
+    parser.add_argument(
+        "--dataSource", default="simulated://",
+        help="The data source of the launched server")
+    parser.add_argument(
+        "--workers", default=0, type=int,
+        help="The number of worker processes of the launched server")
+    parser.add_argument(
+        "--async-threads", default=0, type=int,
+        help="The number of async threads of the launched server")
+    parser.add_argument(
+        "--port", default=server.ga4ghPort, type=int,
+        help="The port of the launched server")
+    parser.add_argument(
+        "--url", default=None,
+        help="Run against the server at this URL instead of launching one")
+    parser.add_argument(
+        "--clients", "-c", default=4, type=int,
+        help="The number of concurrent clients")
+    parser.add_argument(
+        "--duration", "-d", default=30, type=float,
+        help="The number of seconds to run the clients for")
+    parser.add_argument(
+        "--iterations", "-n", default=None, type=int,
+        help="The maximum number of workloads each client runs")
+    parser.add_argument(
+        "--workloads", default="browser,scan",
+        help="A comma separated list of the workloads to run")
+    parser.add_argument(
+        "--pageSize", default=100, type=int,
+        help="The page size of the clients' search requests")
+    parser.add_argument(
+        "--windowSize", default=10000, type=int,
+        help="The number of bases in each browser window")
+    parser.add_argument(
+        "--scanPages", default=10, type=int,
+        help="The maximum number of pages fetched by each scan")
+    parser.add_argument(
+        "--seed", default=0, type=int,
+        help="The seed of the clients' random number generators")
+    parser.add_argument(
+        "--output", default=None,
+        help="Write the results as JSON to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parseArgs()
+    testServer = None
+    serverUrl = args.url
+    if serverUrl is None:
+        testServer = server.Ga4ghServerForLoadTesting(
+            args.dataSource, args.workers, args.async_threads,
+            port=args.port)
+        testServer.start()
+        serverUrl = testServer.getUrl()
+    try:
+        results = runLoad(
+            serverUrl, args.workloads.split(","), args.clients,
+            args.duration, args.iterations, args.pageSize, args.windowSize,
+            args.scanPages, args.seed)
+    finally:
+        if testServer is not None:
+            testServer.shutdown()
+    results["server"] = {"url": serverUrl}
+    if testServer is not None:
+        results["server"].update({
+            "dataSource": args.dataSource,
+            "workers": args.workers,
+            "asyncThreads": args.async_threads,
+        })
+    print(formatResults(results))
+    if args.output is not None:
+        with open(args.output, "w") as outputFile:
+            json.dump(results, outputFile, indent=4, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -226,6 +226,42 @@ DEBUG = True""".format(self.dataDir)
         return config
 
 
+class Ga4ghServerForLoadTesting(Ga4ghServerForTesting):
+    """
+    A test server that reads data from the specified data source and
+    handles requests with the specified number of worker processes or
+    async threads. The server is terminated rather than killed on
+    shutdown, so that its worker processes exit with it.
+    """
+    def __init__(
+            self, dataSource="simulated://", numWorkers=0,
+            numAsyncThreads=0, extraConfig={}, port=ga4ghPort):
+        super(Ga4ghServerForLoadTesting, self).__init__()
+        self.dataSource = dataSource
+        self.numWorkers = numWorkers
+        self.numAsyncThreads = numAsyncThreads
+        self.extraConfig = extraConfig
+        self.port = port
+        self.serverUrl = "http://{}:{}".format(socket.gethostname(), port)
+
+    def getConfig(self):
+        config = 'DATA_SOURCE = "{}"\n'.format(self.dataSource)
+        for key, value in self.extraConfig.items():
+            config += "{} = {!r}\n".format(key, value)
+        return config
+
+    def getCmdLine(self):
+        cmdLine = super(Ga4ghServerForLoadTesting, self).getCmdLine()
+        return cmdLine + "--workers {} --async-threads {} ".format(
+            self.numWorkers, self.numAsyncThreads)
+
+    def shutdown(self):
+        if self.server is not None and self.server.returncode is None:
+            self.server.terminate()
+            self.server.wait()
+        super(Ga4ghServerForLoadTesting, self).shutdown()
+
+
 class OidcOpServerForTesting(ServerForTesting):
     """
     Runs a test OP server on localhost
@@ -0,0 +1,35 @@
+"""
+Runs a short load test against a multi-worker server
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import loadtest
+import server
+import server_test
+
+
+class TestLoad(server_test.ServerTest):
+    """
+    Drives concurrent clients through each workload
+    """
+    def getServer(self):
+        return server.Ga4ghServerForLoadTesting(numWorkers=2)
+
+    def testLoad(self):
+        results = loadtest.runLoad(
+            self.server.getUrl(), ["browser", "scan"], numClients=3,
+            duration=60, numIterations=2, pageSize=10)
+        self.assertEqual(results["numClients"], 3)
+        workloadResults = [
+            result for name, result in results["results"].items()
+            if name.startswith("workload ")]
+        self.assertEqual(
+            sum(result["numRequests"] for result in workloadResults), 6)
+        for name, result in results["results"].items():
+            self.assertEqual(result["numErrors"], 0, name)
+            self.assertLessEqual(result["p50"], result["p99"])
+        self.assertIn("POST /variants/search", results["results"])
+        self.assertTrue(
+            loadtest.formatResults(results).startswith("3 clients"))
@@ -0,0 +1,167 @@
+"""
+Tests the event driven server
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import socket
+import threading
+import time
+import unittest
+
+import requests
+
+import ga4gh.asyncserver as asyncserver
+import ga4gh.frontend as frontend
+import ga4gh.protocol as protocol
+
+
+class ConcurrencyApp(object):
+    """
+    A WSGI app that echoes the request body, and records the maximum
+    number of requests it has handled concurrently.
+    """
+    def __init__(self, delay=0):
+        self._delay = delay
+        self._lock = threading.Lock()
+        self._numRunning = 0
+        self.maxRunning = 0
+
+    def __call__(self, environ, startResponse):
+        with self._lock:
+            self._numRunning += 1
+            self.maxRunning = max(self.maxRunning, self._numRunning)
+        try:
+            time.sleep(self._delay)
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+            body = environ["wsgi.input"].read(length)
+            startResponse(b'200 OK', [(b'Content-Type', b'text/plain')])
+            return [environ["PATH_INFO"].encode(), b":", body]
+        finally:
+            with self._lock:
+                self._numRunning -= 1
+
+
+class TestAsyncWSGIServer(unittest.TestCase):
+    """
+    Runs the server in a separate thread and sends requests to it.
+    """
+    def _startServer(
+            self, app, numThreads, keepAliveTimeout=60, maxBodySize=2**20):
+        self._server = asyncserver.AsyncWSGIServer(
+            app, "127.0.0.1", 0, numThreads, keepAliveTimeout, maxBodySize)
+        self._server.pollInterval = 0.05
+        self._port = self._server.getServerAddress()[1]
+        self._url = "http://127.0.0.1:{}".format(self._port)
+        self._thread = threading.Thread(target=self._server.serveForever)
+        self._thread.start()
+
+    def tearDown(self):
+        self._server.stop()
+        self._thread.join(10)
+        self.assertFalse(self._thread.is_alive())
+
+    def _waitFor(self, condition):
+        for _ in range(200):
+            if condition():
+                return
+            time.sleep(0.05)
+        self.fail("Timed out waiting for the server")
+
+    def testRequestBody(self):
+        self._startServer(ConcurrencyApp(), 1)
+        response = requests.post(self._url + "/echo", data=b"hello")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, "/echo:hello")
+
+    def testBodyTooLarge(self):
+        self._startServer(ConcurrencyApp(), 1, maxBodySize=10)
+        response = requests.post(self._url + "/echo", data=b"x" * 10)
+        self.assertEqual(response.text, "/echo:" + "x" * 10)
+        # the body is refused from its declared length, before it is sent
+        connection = socket.create_connection(("127.0.0.1", self._port))
+        try:
+            connection.sendall(
+                b"POST /echo HTTP/1.1\r\nContent-Length: 1000000000\r\n\r\n")
+            response = connection.recv(1024)
+        finally:
+            connection.close()
+        self.assertTrue(response.startswith(b"HTTP/1.1 413"))
+
+    def testKeepAlive(self):
+        self._startServer(ConcurrencyApp(), 2)
+        session = requests.Session()
+        for i in range(5):
+            response = session.post(self._url + "/echo", data=str(i))
+            self.assertEqual(response.text, "/echo:{}".format(i))
+        self.assertEqual(self._server.getNumConnections(), 1)
+
+    def testConnectionClose(self):
+        self._startServer(ConcurrencyApp(), 1)
+        response = requests.get(
+            self._url + "/echo", headers={"Connection": "close"})
+        self.assertEqual(response.headers["Connection"], "close")
+        self._waitFor(lambda: self._server.getNumConnections() == 0)
+
+    def testIdleConnectionsClosed(self):
+        self._startServer(ConcurrencyApp(), 1, keepAliveTimeout=0.1)
+        session = requests.Session()
+        session.get(self._url + "/echo")
+        self._waitFor(lambda: self._server.getNumConnections() == 0)
+
+    def testIdleConnectionsDontUseThreads(self):
+        self._startServer(ConcurrencyApp(), 1)
+        idleSockets = []
+        try:
+            for _ in range(50):
+                idleSockets.append(socket.create_connection(
+                    ("127.0.0.1", self._port)))
+            response = requests.get(self._url + "/echo")
+            self.assertEqual(response.status_code, 200)
+        finally:
+            for idleSocket in idleSockets:
+                idleSocket.close()
+
+    def testConcurrencyBounded(self):
+        app = ConcurrencyApp(delay=0.1)
+        self._startServer(app, 2)
+        threads = [
+            threading.Thread(target=requests.get, args=(self._url,))
+            for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(app.maxRunning, 2)
+
+    def testBadRequest(self):
+        self._startServer(ConcurrencyApp(), 1)
+        connection = socket.create_connection(("127.0.0.1", self._port))
+        try:
+            connection.sendall(b"nonsense\r\n\r\n")
+            response = connection.recv(1024)
+        finally:
+            connection.close()
+        self.assertTrue(response.startswith(b"HTTP/1.1 400"))
+
+    def testFrontend(self):
+        frontend.configure(baseConfig="TestConfig")
+        self._startServer(frontend.app, 2)
+        request = protocol.SearchDatasetsRequest()
+        response = requests.post(
+            self._url + "/datasets/search", data=request.toJsonString(),
+            headers={"Content-Type": "application/json"})
+        self.assertEqual(response.status_code, 200)
+        expected = frontend.app.test_client().post(
+            "/datasets/search", data=request.toJsonString(),
+            headers={"Content-Type": "application/json"})
+        self.assertEqual(
+            protocol.SearchDatasetsResponse.fromJsonString(response.text),
+            protocol.SearchDatasetsResponse.fromJsonString(expected.data))
+        response = requests.post(
+            self._url + "/datasets/search", data="not json",
+            headers={"Content-Type": "application/json"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("errorCode", json.loads(response.text))
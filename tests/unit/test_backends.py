@@ -7,13 +7,57 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import json
 import os
+import shutil
+import tempfile
 import unittest
 
+import mock
+
 import ga4gh.exceptions as exceptions
 import ga4gh.backend as backend
+import ga4gh.extensions as extensions
+import ga4gh.protocol as protocol
+import ga4gh.responsecache as responsecache
+import ga4gh.datamodel.coverage as coverage
 import ga4gh.datamodel.datasets as datasets
 import ga4gh.datamodel.references as references
+import ga4gh.datamodel.variants as variants
+
+
+def _searchAllPages(runSearchMethod, request, responseClass, fieldName):
+    """
+    Runs the specified search request with runSearchMethod from its first
+    page, following the page tokens of the responses, and returns the
+    list of the objects in the fieldName field of all of the pages. The
+    page token of the request is reset afterwards.
+    """
+    objects = []
+    request.pageToken = None
+    while True:
+        response = responseClass.fromJsonString(
+            runSearchMethod(request.toJsonString()))
+        objects.extend(getattr(response, fieldName))
+        if response.nextPageToken is None:
+            request.pageToken = None
+            return objects
+        request.pageToken = response.nextPageToken
+
+
+class DataDirectoryCopyTest(unittest.TestCase):
+    """
+    Base class of the tests that modify a copy of the tests/data
+    directory, from which self._backend is built.
+    """
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp(prefix="ga4gh_backend")
+        self._dataDir = os.path.join(self._tempdir, "data")
+        shutil.copytree(os.path.join("tests", "data"), self._dataDir)
+        self._backend = backend.FileSystemBackend(self._dataDir)
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir)
 
 
 class TestAbstractBackend(unittest.TestCase):
@@ -172,6 +216,644 @@ class TestFileSystemBackend(unittest.TestCase):
             self.assertEqual(self._backend.getReferenceSet(rs.getId()), rs)
             self.assertEqual(self._backend.getReferenceSetByName(name), rs)
 
+    def _searchVariants(self, request):
+        return _searchAllPages(
+            self._backend.runSearchVariants, request,
+            protocol.SearchVariantsResponse, "variants")
+
+    def testFilteredVariantsSearch(self):
+        dataset = self._backend.getDatasetByIndex(0)
+        variantSet, = [
+            variantSet for variantSet in dataset.getVariantSets()
+            if variantSet.getLocalId() == "1kgPhase1"]
+        request = extensions.SearchFilteredVariantsRequest()
+        request.variantSetId = variantSet.getId()
+        request.referenceName = "1"
+        request.start = 0
+        request.end = 2**30
+        request.callSetIds = []
+        allVariants = self._searchVariants(request)
+        # Page tokens refer to the filtered stream, so small pages give
+        # the same variants as filtering everything at once.
+        request.minAlleleFrequency = 0.1
+        request.variantClasses = ["SNV"]
+        for pageSize in [None, 1, 7]:
+            request.pageSize = pageSize
+            filteredVariants = self._searchVariants(request)
+            self.assertEqual(
+                [variant.id for variant in filteredVariants],
+                [variant.id for variant in allVariants
+                 if len(variant.referenceBases) == 1 and
+                 len(variant.alternateBases[0]) == 1 and
+                 max(map(float, variant.info["AF"])) >= 0.1])
+        self.assertGreater(len(filteredVariants), 0)
+        self.assertLess(len(filteredVariants), len(allVariants))
+        request.variantClasses = ["SNP"]
+        self.assertRaises(
+            exceptions.BadVariantFilterException,
+            self._backend.runSearchVariants, request.toJsonString())
+
+    def testGenotypeFilteredVariantsSearch(self):
+        dataset = self._backend.getDatasetByIndex(0)
+        variantSets = dict(
+            (variantSet.getLocalId(), variantSet)
+            for variantSet in dataset.getVariantSets())
+        variantSet = variantSets["1kgPhase1"]
+        callSetIds = [
+            callSet.getId() for callSet in variantSet.getCallSets()[:3]]
+        request = extensions.SearchFilteredVariantsRequest()
+        request.variantSetId = variantSet.getId()
+        request.referenceName = "1"
+        request.start = 0
+        request.end = 2**30
+        request.callSetIds = callSetIds
+        allVariants = self._searchVariants(request)
+        request.anyNonReferenceCallSetIds = callSetIds[1:]
+        request.allNonReferenceCallSetIds = callSetIds[:1]
+
+        def isNonReference(variant, callSetId):
+            call, = [call for call in variant.calls
+                     if call.callSetId == callSetId]
+            return any(allele > 0 for allele in call.genotype)
+
+        expected = [
+            variant.id for variant in allVariants
+            if isNonReference(variant, callSetIds[0]) and (
+                isNonReference(variant, callSetIds[1]) or
+                isNonReference(variant, callSetIds[2]))]
+        for pageSize in [None, 1, 3]:
+            request.pageSize = pageSize
+            self.assertEqual(
+                [variant.id for variant in self._searchVariants(request)],
+                expected)
+        self.assertGreater(len(expected), 0)
+        self.assertLess(len(expected), len(allVariants))
+        # An empty any list matches no variants, and an empty all list
+        # places no condition on them.
+        request.pageSize = None
+        request.anyNonReferenceCallSetIds = []
+        self.assertEqual(self._searchVariants(request), [])
+        request.anyNonReferenceCallSetIds = None
+        request.allNonReferenceCallSetIds = []
+        self.assertEqual(
+            len(self._searchVariants(request)), len(allVariants))
+        # Call sets in other variant sets are rejected.
+        request.anyNonReferenceCallSetIds = [
+            variantSets["1kgPhase3"].getCallSets()[0].getId()]
+        self.assertRaises(
+            exceptions.CallSetNotInVariantSetException,
+            self._backend.runSearchVariants, request.toJsonString())
+        # Across several variant sets, each variant is tested against the
+        # call sets of its own variant set.
+        multiRequest = extensions.SearchMultiVariantSetsRequest()
+        multiRequest.variantSetIds = [
+            variantSet.getId(), variantSets["1kgPhase3"].getId()]
+        multiRequest.referenceName = "1"
+        multiRequest.start = 0
+        multiRequest.end = 2**30
+        multiRequest.callSetIds = callSetIds
+        multiRequest.anyNonReferenceCallSetIds = callSetIds[1:]
+        multiRequest.allNonReferenceCallSetIds = callSetIds[:1]
+        response = protocol.SearchVariantsResponse.fromJsonString(
+            self._backend.runSearchMultiVariantSets(
+                multiRequest.toJsonString()))
+        self.assertEqual(
+            [variant.id for variant in response.variants], expected)
+        # A variant set without any of the all call sets matches nothing.
+        multiRequest.anyNonReferenceCallSetIds = None
+        response = protocol.SearchVariantsResponse.fromJsonString(
+            self._backend.runSearchMultiVariantSets(
+                multiRequest.toJsonString()))
+        self.assertEqual(
+            [variant.id for variant in response.variants],
+            [variant.id for variant in allVariants
+             if isNonReference(variant, callSetIds[0])])
+
+    def testGenotypeMatrixSearch(self):
+        dataset = self._backend.getDatasetByIndex(0)
+        variantSet, = [
+            variantSet for variantSet in dataset.getVariantSets()
+            if variantSet.getLocalId() == "1kgPhase1"]
+        callSetIds = [
+            callSet.getId() for callSet in variantSet.getCallSets()]
+        variantsRequest = protocol.SearchVariantsRequest()
+        variantsRequest.variantSetId = variantSet.getId()
+        variantsRequest.referenceName = "1"
+        variantsRequest.start = 0
+        variantsRequest.end = 2**30
+        variantsRequest.callSetIds = callSetIds[:2]
+        allVariants = self._searchVariants(variantsRequest)
+        request = extensions.SearchGenotypeMatrixRequest()
+        request.variantSetId = variantSet.getId()
+        request.referenceName = "1"
+        request.start = 0
+        request.end = 2**30
+        request.callSetIds = callSetIds[1::-1]
+        for pageSize in [None, 1, 7]:
+            request.pageSize = pageSize
+            rows = _searchAllPages(
+                self._backend.runSearchGenotypeMatrix, request,
+                extensions.SearchGenotypeMatrixResponse, "rows")
+            self.assertEqual(
+                [row.id for row in rows],
+                [variant.id for variant in allVariants])
+            # the columns are in the order of the request
+            self.assertEqual(
+                [row.genotypes for row in rows],
+                [",".join(
+                    variants.formatGenotype(
+                        call.genotype, call.phaseset is not None)
+                    for call in variant.calls[::-1])
+                 for variant in allVariants])
+        request.callSetIds = ["notACallSet"]
+        self.assertRaises(
+            exceptions.CallSetNotInVariantSetException,
+            self._backend.runSearchGenotypeMatrix, request.toJsonString())
+
+    def testFilteredReadsSearch(self):
+        dataset = self._backend.getDatasetByIndex(0)
+        readGroupSet, = [
+            readGroupSet for readGroupSet in dataset.getReadGroupSets()
+            if readGroupSet.getLocalId().startswith("HG00096")]
+        readGroup = readGroupSet.getReadGroups()[0]
+        reference = readGroupSet.getReferenceSet().getReferenceByName("1")
+        request = extensions.SearchFilteredReadsRequest()
+        request.readGroupIds = [readGroup.getId()]
+        request.referenceId = reference.getId()
+        request.start = 0
+        request.end = 2**30
+
+        def searchReads():
+            return _searchAllPages(
+                self._backend.runSearchReads, request,
+                protocol.SearchReadsResponse, "alignments")
+
+        allAlignments = searchReads()
+        request.minMappingQuality = 10
+        request.requiredFlags = 0x2
+        expected = [
+            alignment.fragmentName for alignment in allAlignments
+            if alignment.alignment.mappingQuality >= 10 and
+            alignment.properPlacement]
+        self.assertGreater(len(expected), 0)
+        self.assertLess(len(expected), len(allAlignments))
+        for pageSize in [None, 1, 2]:
+            request.pageSize = pageSize
+            self.assertEqual(
+                [alignment.fragmentName for alignment in searchReads()],
+                expected)
+        request.minMappingQuality = -1
+        self.assertRaises(
+            exceptions.BadReadFilterException,
+            self._backend.runSearchReads, request.toJsonString())
+        # downsampled reads are paged in a stable order for a seed
+        request.minMappingQuality = None
+        request.requiredFlags = None
+        request.maxReadsPerBucket = 1
+        request.bucketSize = 10000
+        request.downsamplingSeed = 3
+        request.pageSize = None
+        expected = [alignment.fragmentName for alignment in searchReads()]
+        self.assertGreater(len(expected), 0)
+        self.assertLess(len(expected), len(allAlignments))
+        for pageSize in [1, 2]:
+            request.pageSize = pageSize
+            self.assertEqual(
+                [alignment.fragmentName for alignment in searchReads()],
+                expected)
+        request.bucketSize = 0
+        self.assertRaises(
+            exceptions.BadReadFilterException,
+            self._backend.runSearchReads, request.toJsonString())
+
+    def testCoverageSearch(self):
+        dataset = self._backend.getDatasetByIndex(0)
+        readGroupSet, = [
+            readGroupSet for readGroupSet in dataset.getReadGroupSets()
+            if readGroupSet.getLocalId().startswith("HG00096")]
+        readGroup = readGroupSet.getReadGroups()[0]
+        reference = readGroupSet.getReferenceSet().getReferenceByName("1")
+        request = extensions.SearchCoverageRequest()
+        request.readGroupId = readGroup.getId()
+        request.referenceId = reference.getId()
+        request.start = 9900
+        request.end = 10305
+        request.binSize = 10
+        request.includeBaseCounts = True
+
+        def searchCoverage():
+            return _searchAllPages(
+                self._backend.runSearchCoverage, request,
+                extensions.SearchCoverageResponse, "bins")
+
+        expected = readGroup.getCoverage(
+            reference, 9900, 10305, 10, includeBaseCounts=True)
+        self.assertEqual(len(expected), 41)
+        self.assertEqual(expected[-1].end, 10305)
+        self.assertGreater(max(bin_.meanDepth for bin_ in expected), 0)
+        for pageSize in [None, 1, 7]:
+            request.pageSize = pageSize
+            self.assertEqual(searchCoverage(), expected)
+        request.binSize = 0
+        self.assertRaises(
+            exceptions.BadBinSizeException,
+            self._backend.runSearchCoverage, request.toJsonString())
+        request.binSize = 10
+        request.start = 10305
+        request.end = 9900
+        self.assertRaises(
+            exceptions.ReferenceRangeErrorException,
+            self._backend.runSearchCoverage, request.toJsonString())
+
+
+class TestCoverageTiles(DataDirectoryCopyTest):
+    """
+    Tests serving coverage tiles from the pyramid of a BAM file.
+    """
+    def setUp(self):
+        super(TestCoverageTiles, self).setUp()
+        dataset = self._backend.getDatasetByIndex(0)
+        self._readGroupSet, = [
+            readGroupSet for readGroupSet in dataset.getReadGroupSets()
+            if readGroupSet.getLocalId().startswith("HG00096")]
+        self._readGroup = self._readGroupSet.getReadGroups()[0]
+        self._reference = self._readGroupSet.getReferenceSet(
+            ).getReferenceByName("1")
+
+    def _searchTiles(self, request):
+        return _searchAllPages(
+            self._backend.runSearchCoverageTiles, request,
+            extensions.SearchCoverageResponse, "bins")
+
+    def testTiles(self):
+        request = extensions.SearchCoverageTilesRequest()
+        request.readGroupId = self._readGroup.getId()
+        request.referenceId = self._reference.getId()
+        request.binSize = 100
+        request.start = 9950
+        request.end = 10305
+        self.assertRaises(
+            exceptions.CoveragePyramidNotFoundException,
+            self._backend.runSearchCoverageTiles, request.toJsonString())
+        coverage.buildCoveragePyramid(
+            self._readGroupSet.getSamFilePath(), [100, 10000, 1000000])
+        # the bins overlapping the region are aligned to the bin size
+        expected = self._readGroup.getCoverage(
+            self._reference, 9900, 10400, 100)
+        self.assertGreater(max(bin_.meanDepth for bin_ in expected), 0)
+        for pageSize in [None, 1, 2]:
+            request.pageSize = pageSize
+            self.assertEqual(self._searchTiles(request), expected)
+        request.binSize = 10000
+        coverageBins = self._searchTiles(request)
+        self.assertEqual(
+            [(bin_.start, bin_.end) for bin_ in coverageBins],
+            [(0, 10000), (10000, 20000)])
+        request.binSize = 1
+        self.assertRaises(
+            exceptions.BinSizeNotFoundException,
+            self._backend.runSearchCoverageTiles, request.toJsonString())
+        # the pyramid is not used once the BAM file changes
+        request.binSize = 100
+        samFilePath = self._readGroupSet.getSamFilePath()
+        stat = os.stat(samFilePath)
+        os.utime(samFilePath, (stat.st_atime, stat.st_mtime + 10))
+        self.assertRaises(
+            exceptions.CoveragePyramidNotFoundException,
+            self._backend.runSearchCoverageTiles, request.toJsonString())
+
+
+class TestVariantSummaries(DataDirectoryCopyTest):
+    """
+    Tests serving variant summaries from the pyramids of VCF files.
+    """
+    def setUp(self):
+        super(TestVariantSummaries, self).setUp()
+        dataset = self._backend.getDatasetByIndex(0)
+        self._variantSet, = [
+            variantSet for variantSet in dataset.getVariantSets()
+            if variantSet.getLocalId() == "1kgPhase1"]
+        self._variantFilePath = os.path.join(
+            self._dataDir, "datasets", "dataset1", "variants", "1kgPhase1",
+            "chr1.vcf.gz")
+
+    def _searchSummaries(self, request):
+        return _searchAllPages(
+            self._backend.runSearchVariantSummaries, request,
+            extensions.SearchVariantSummariesResponse, "bins")
+
+    def testSummaries(self):
+        request = extensions.SearchVariantSummariesRequest()
+        request.variantSetId = self._variantSet.getId()
+        request.referenceName = "1"
+        request.binSize = 1000
+        request.start = 10500
+        request.end = 13200
+        self.assertRaises(
+            exceptions.VariantSummaryPyramidNotFoundException,
+            self._backend.runSearchVariantSummaries, request.toJsonString())
+        variants.buildVariantSummaryPyramid(
+            self._variantFilePath, [1000, 100000])
+        # the bins overlapping the region are aligned to the bin size
+        gaVariants = list(self._variantSet.getVariants("1", 10000, 14000))
+        expected = []
+        for start in range(10000, 14000, 1000):
+            binVariants = [
+                variant for variant in gaVariants
+                if start <= variant.start < start + 1000]
+            expected.append((start, start + 1000, len(binVariants)))
+        self.assertGreater(sum(count for _, _, count in expected), 0)
+        for pageSize in [None, 1, 3]:
+            request.pageSize = pageSize
+            self.assertEqual(
+                [(bin_.start, bin_.end, bin_.numVariants)
+                 for bin_ in self._searchSummaries(request)], expected)
+        request.binSize = 100000
+        summaryBins = self._searchSummaries(request)
+        self.assertEqual(len(summaryBins), 1)
+        self.assertEqual(summaryBins[0].start, 0)
+        self.assertEqual(summaryBins[0].numVariants, 100)
+        request.binSize = 10
+        self.assertRaises(
+            exceptions.BinSizeNotFoundException,
+            self._backend.runSearchVariantSummaries, request.toJsonString())
+        # there are no summaries of references without variants
+        request.binSize = 1000
+        request.referenceName = "22"
+        self.assertEqual(self._searchSummaries(request), [])
+        # the pyramid is not used once the variant file changes
+        request.referenceName = "1"
+        stat = os.stat(self._variantFilePath)
+        os.utime(self._variantFilePath, (stat.st_atime, stat.st_mtime + 10))
+        self.assertRaises(
+            exceptions.VariantSummaryPyramidNotFoundException,
+            self._backend.runSearchVariantSummaries, request.toJsonString())
+
+
+class TestLazyFileSystemBackend(unittest.TestCase):
+    """
+    Tests that a lazily loaded filesystem backend only opens sets when
+    they are used, and that they are the same as those loaded eagerly.
+    """
+    def setUp(self):
+        self._dataDir = os.path.join("tests", "data")
+        self._backend = backend.FileSystemBackend(
+            self._dataDir, lazyLoading=True)
+        self._eagerBackend = backend.FileSystemBackend(self._dataDir)
+
+    def testReferenceSets(self):
+        referenceSets = self._backend.getReferenceSets()
+        eagerReferenceSets = self._eagerBackend.getReferenceSets()
+        self.assertEqual(len(referenceSets), len(eagerReferenceSets))
+        for referenceSet, eagerReferenceSet in zip(
+                referenceSets, eagerReferenceSets):
+            self.assertFalse(referenceSet.isLoaded())
+            self.assertEqual(referenceSet.getId(), eagerReferenceSet.getId())
+            self.assertEqual(
+                self._backend.getReferenceSet(referenceSet.getId()),
+                referenceSet)
+            self.assertFalse(referenceSet.isLoaded())
+            self.assertEqual(
+                referenceSet.toProtocolElement(),
+                eagerReferenceSet.toProtocolElement())
+            self.assertTrue(referenceSet.isLoaded())
+
+    def testVariantSets(self):
+        dataset = self._backend.getDatasetByIndex(0)
+        eagerDataset = self._eagerBackend.getDatasetByIndex(0)
+        variantSets = dataset.getVariantSets()
+        eagerVariantSets = eagerDataset.getVariantSets()
+        self.assertEqual(len(variantSets), len(eagerVariantSets))
+        for variantSet, eagerVariantSet in zip(variantSets, eagerVariantSets):
+            self.assertFalse(variantSet.isLoaded())
+            self.assertEqual(variantSet.getId(), eagerVariantSet.getId())
+            self.assertEqual(
+                [callSet.getId() for callSet in variantSet.getCallSets()],
+                [callSet.getId() for callSet in eagerVariantSet.getCallSets()])
+            self.assertTrue(variantSet.isLoaded())
+
+    def testReadGroupSets(self):
+        dataset = self._backend.getDatasetByIndex(0)
+        eagerDataset = self._eagerBackend.getDatasetByIndex(0)
+        readGroupSets = dataset.getReadGroupSets()
+        eagerReadGroupSets = eagerDataset.getReadGroupSets()
+        self.assertEqual(len(readGroupSets), len(eagerReadGroupSets))
+        for readGroupSet, eagerReadGroupSet in zip(
+                readGroupSets, eagerReadGroupSets):
+            self.assertFalse(readGroupSet.isLoaded())
+            self.assertEqual(readGroupSet.getId(), eagerReadGroupSet.getId())
+            self.assertEqual(
+                [readGroup.getId()
+                 for readGroup in readGroupSet.getReadGroups()],
+                [readGroup.getId()
+                 for readGroup in eagerReadGroupSet.getReadGroups()])
+            self.assertTrue(readGroupSet.isLoaded())
+
+
+class TestResponseCache(unittest.TestCase):
+    """
+    Tests serving responses from the response cache.
+    """
+    def setUp(self):
+        self._backend = backend.SimulatedBackend(
+            randomSeed=1, numCalls=2, variantDensity=1)
+        self._responseCache = responsecache.MemoryResponseCache(2**20)
+        self._backend.setResponseCache(self._responseCache)
+        self._variantSet = self._backend.getDatasetByIndex(
+            0).getVariantSets()[0]
+
+    def _assertStatistics(self, hits, misses):
+        statistics = self._responseCache.getStatistics()
+        self.assertEqual(statistics["hits"], hits)
+        self.assertEqual(statistics["misses"], misses)
+
+    def testSearch(self):
+        request = protocol.SearchVariantsRequest()
+        request.variantSetId = self._variantSet.getId()
+        request.referenceName = "1"
+        request.start = 0
+        request.end = 50
+        request.pageSize = 10
+        response = self._backend.runSearchVariants(request.toJsonString())
+        self._assertStatistics(0, 1)
+        # requests that differ only in formatting and in fields left at
+        # their defaults share a response
+        requestDict = request.toJsonDict()
+        del requestDict["pageToken"]
+        self.assertEqual(
+            self._backend.runSearchVariants(
+                json.dumps(requestDict, indent=4)), response)
+        self._assertStatistics(1, 1)
+        request.pageToken = protocol.SearchVariantsResponse.fromJsonString(
+            response).nextPageToken
+        self.assertNotEqual(
+            self._backend.runSearchVariants(request.toJsonString()),
+            response)
+        self._assertStatistics(1, 2)
+        # requests without a page size use the default page size
+        request.pageToken = None
+        request.pageSize = None
+        self._backend.setDefaultPageSize(10)
+        self._backend.runSearchVariants(request.toJsonString())
+        self._backend.setDefaultPageSize(5)
+        self._backend.runSearchVariants(request.toJsonString())
+        self._assertStatistics(2, 3)
+        # invalid requests are rejected without consulting the cache
+        request.pageSize = 0
+        self.assertRaises(
+            exceptions.BadPageSizeException,
+            self._backend.runSearchVariants, request.toJsonString())
+        self._assertStatistics(2, 3)
+
+    def testGet(self):
+        variantSetId = self._variantSet.getId()
+        response = self._backend.runGetVariantSet(variantSetId)
+        self.assertEqual(
+            self._backend.runGetVariantSet(variantSetId), response)
+        self._assertStatistics(1, 1)
+        # responses to different endpoints are cached separately
+        self.assertRaises(
+            exceptions.DatasetNotFoundException,
+            self._backend.runGetDataset, variantSetId)
+        self._assertStatistics(1, 2)
+
+    def testDataVersion(self):
+        otherBackend = backend.SimulatedBackend(
+            randomSeed=2, numCalls=2, variantDensity=1)
+        self.assertNotEqual(
+            otherBackend.getDataVersion(), self._backend.getDataVersion())
+        self.assertEqual(
+            backend.SimulatedBackend(
+                randomSeed=1, numCalls=2,
+                variantDensity=1).getDataVersion(),
+            self._backend.getDataVersion())
+        # backends that do not know the version of their data do not
+        # cache responses
+        emptyBackend = backend.EmptyBackend()
+        emptyBackend.setResponseCache(self._responseCache)
+        emptyBackend.runSearchDatasets(
+            protocol.SearchDatasetsRequest().toJsonString())
+        self._assertStatistics(0, 0)
+
+
+class TestFileSystemBackendRescan(DataDirectoryCopyTest):
+    """
+    Tests that rescanning a filesystem backend reloads only the
+    reference sets and datasets that have changed.
+    """
+    def _addDataset(self, datasetName):
+        datasetDir = os.path.join(self._dataDir, "datasets")
+        shutil.copytree(
+            os.path.join(datasetDir, "dataset1"),
+            os.path.join(datasetDir, datasetName))
+        shutil.copy(
+            os.path.join(datasetDir, "dataset1.json"),
+            os.path.join(datasetDir, "{}.json".format(datasetName)))
+
+    def testUnchanged(self):
+        self.assertFalse(self._backend.hasChanged())
+        newBackend = self._backend.rescan()
+        self.assertIsNot(newBackend, self._backend)
+        self.assertEqual(
+            newBackend.getDatasets(), self._backend.getDatasets())
+        self.assertEqual(
+            newBackend.getReferenceSets(), self._backend.getReferenceSets())
+
+    def testSettingsCopied(self):
+        self._backend.setDefaultPageSize(7)
+        self._backend.setRequestValidation(True)
+        responseCache = responsecache.MemoryResponseCache(2**20)
+        self._backend.setResponseCache(responseCache)
+        newBackend = self._backend.rescan()
+        self.assertEqual(newBackend._defaultPageSize, 7)
+        self.assertTrue(newBackend._requestValidation)
+        self.assertIs(newBackend.getResponseCache(), responseCache)
+
+    def testDataVersion(self):
+        self.assertIsNotNone(self._backend.getDataVersion())
+        self._backend.setResponseCache(
+            responsecache.MemoryResponseCache(2**20))
+        dataset = self._backend.getDatasetByName("dataset1")
+        response = self._backend.runGetDataset(dataset.getId())
+        self.assertEqual(
+            self._backend.rescan().getDataVersion(),
+            self._backend.getDataVersion())
+        metadataFile = os.path.join(self._dataDir, "datasets", "dataset1.json")
+        with open(metadataFile, "w") as f:
+            f.write('{"description": "A changed description"}')
+        newBackend = self._backend.rescan()
+        self.assertNotEqual(
+            newBackend.getDataVersion(), self._backend.getDataVersion())
+        # the response cached for the old data is not served
+        newResponse = protocol.Dataset.fromJsonString(
+            newBackend.runGetDataset(dataset.getId()))
+        self.assertEqual(newResponse.description, "A changed description")
+        self.assertEqual(
+            self._backend.runGetDataset(dataset.getId()), response)
+
+    def testDatasetAdded(self):
+        dataset = self._backend.getDatasetByName("dataset1")
+        self._addDataset("dataset2")
+        self.assertTrue(self._backend.hasChanged())
+        newBackend = self._backend.rescan()
+        self.assertFalse(newBackend.hasChanged())
+        self.assertEqual(self._backend.getNumDatasets(), 1)
+        self.assertEqual(newBackend.getNumDatasets(), 2)
+        self.assertIs(newBackend.getDatasetByName("dataset1"), dataset)
+        self.assertEqual(
+            newBackend.getReferenceSets(), self._backend.getReferenceSets())
+
+    def testRescanIsSerial(self):
+        # Rescans run on server threads, so must not fork scan workers.
+        self._backend = backend.FileSystemBackend(
+            self._dataDir, numScanWorkers=2)
+        self._addDataset("dataset2")
+        with mock.patch(
+                "multiprocessing.Pool", side_effect=AssertionError(
+                    "Unexpected process pool")):
+            newBackend = self._backend.rescan()
+        self.assertEqual(newBackend.getNumDatasets(), 2)
+
+    def testDatasetRemoved(self):
+        self._addDataset("dataset2")
+        self._backend = self._backend.rescan()
+        shutil.rmtree(os.path.join(self._dataDir, "datasets", "dataset2"))
+        newBackend = self._backend.rescan()
+        self.assertEqual(newBackend.getNumDatasets(), 1)
+        self.assertIs(
+            newBackend.getDatasetByName("dataset1"),
+            self._backend.getDatasetByName("dataset1"))
+
+    def testDatasetChanged(self):
+        dataset = self._backend.getDatasetByName("dataset1")
+        metadataFile = os.path.join(self._dataDir, "datasets", "dataset1.json")
+        with open(metadataFile, "w") as f:
+            f.write('{"description": "A changed description"}')
+        newBackend = self._backend.rescan()
+        newDataset = newBackend.getDatasetByName("dataset1")
+        self.assertIsNot(newDataset, dataset)
+        self.assertEqual(newDataset.getId(), dataset.getId())
+        self.assertEqual(
+            newBackend.getReferenceSets(), self._backend.getReferenceSets())
+
+    def testReferenceSetChanged(self):
+        dataset = self._backend.getDatasetByName("dataset1")
+        referenceSet = self._backend.getReferenceSetByName("example_1")
+        otherReferenceSet = self._backend.getReferenceSetByName("example_2")
+        metadataFile = os.path.join(
+            self._dataDir, "referenceSets", "example_1.json")
+        with open(metadataFile) as f:
+            metadata = f.read()
+        with open(metadataFile, "w") as f:
+            f.write(metadata + "\n")
+        newBackend = self._backend.rescan()
+        self.assertIsNot(
+            newBackend.getReferenceSetByName("example_1"), referenceSet)
+        self.assertIs(
+            newBackend.getReferenceSetByName("example_2"), otherReferenceSet)
+        # Datasets are rebuilt so that they refer to the new reference sets
+        self.assertIsNot(newBackend.getDatasetByName("dataset1"), dataset)
+
 
 class TestTopLevelObjectGenerator(unittest.TestCase):
     """
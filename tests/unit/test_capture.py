@@ -0,0 +1,116 @@
+"""
+Tests the capture of requests
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import ga4gh.capture as capture
+import ga4gh.frontend as frontend
+import ga4gh.protocol as protocol
+
+
+class TestRequestCapture(unittest.TestCase):
+    """
+    Tests writing requests to a rotating capture file.
+    """
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self._path = os.path.join(self._directory, "capture.log")
+        self._capture = capture.RequestCapture()
+
+    def tearDown(self):
+        self._capture.configure(None)
+        shutil.rmtree(self._directory)
+
+    def _record(self, path="/datasets/search"):
+        self._capture.record(
+            "POST", path, "searchDatasets",
+            {"key": "secret", "serverTiming": "true"}, '{"pageSize": 1}',
+            1000.0, 0.5, 200, 123)
+
+    def testDisabled(self):
+        self.assertFalse(self._capture.isEnabled())
+        self._record()
+        self.assertEqual(os.listdir(self._directory), [])
+
+    def testRecord(self):
+        self._capture.configure(self._path)
+        self.assertTrue(self._capture.isEnabled())
+        self._record()
+        self._record("/variants/search")
+        entries = list(capture.readCaptureFiles([self._path]))
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0], {
+            "time": 1000.0, "method": "POST", "path": "/datasets/search",
+            "endpoint": "searchDatasets", "args": {"serverTiming": "true"},
+            "body": '{"pageSize": 1}', "duration": 0.5, "status": 200,
+            "bytes": 123, "pid": os.getpid()})
+        self.assertEqual(entries[1]["path"], "/variants/search")
+
+    def testRotation(self):
+        self._capture.configure(self._path, maxBytes=300, backupCount=2)
+        for _ in range(10):
+            self._record()
+        self.assertEqual(
+            sorted(os.listdir(self._directory)),
+            ["capture.log", "capture.log.1", "capture.log.2"])
+        paths = [self._path + ".2", self._path + ".1", self._path]
+        for entry in capture.readCaptureFiles(paths):
+            self.assertEqual(entry["endpoint"], "searchDatasets")
+
+    def testPidInPath(self):
+        self._capture.configure(
+            os.path.join(self._directory, "capture-{pid}.log"))
+        self._record()
+        self.assertEqual(
+            os.listdir(self._directory),
+            ["capture-{}.log".format(os.getpid())])
+
+
+class TestFrontendCapture(unittest.TestCase):
+    """
+    Tests that the frontend captures its requests when configured to.
+    """
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self._path = os.path.join(self._directory, "capture.log")
+        config = {
+            "DATA_SOURCE": "simulated://",
+            "REQUEST_CAPTURE_FILE": self._path,
+        }
+        frontend.reset()
+        frontend.configure(baseConfig="TestConfig", extraConfig=config)
+        self._app = frontend.app.test_client()
+
+    def tearDown(self):
+        capture.requestCapture.configure(None)
+        shutil.rmtree(self._directory)
+
+    def testCapture(self):
+        request = protocol.SearchDatasetsRequest()
+        request.pageSize = 1
+        response = self._app.post(
+            "/datasets/search?key=secret", data=request.toJsonString(),
+            headers={"Content-type": "application/json"})
+        self._app.get("/datasets/notAnId")
+        entries = list(capture.readCaptureFiles([self._path]))
+        self.assertEqual(len(entries), 2)
+        entry = entries[0]
+        self.assertEqual(entry["endpoint"], "searchDatasets")
+        self.assertEqual(entry["method"], "POST")
+        self.assertEqual(entry["args"], {})
+        self.assertEqual(
+            json.loads(entry["body"]), request.toJsonDict())
+        self.assertEqual(entry["status"], 200)
+        self.assertEqual(entry["bytes"], len(response.data))
+        self.assertGreater(entry["duration"], 0)
+        self.assertEqual(entries[1]["path"], "/datasets/notAnId")
+        self.assertEqual(entries[1]["status"], 404)
+        self.assertIsNone(entries[1]["body"])
@@ -5,6 +5,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import logging
 import unittest
 
 import mock
@@ -197,6 +198,7 @@ class DummyResponse(object):
     def __init__(self, text):
         self.text = text
         self.status_code = 200
+        self.headers = {}
 
 
 class DummyRequestsSession(object):
@@ -301,7 +303,7 @@ class ExhaustiveListingsMixin(object):
             numVariantSets=3, numCalls=3, variantDensity=0.5,
             numReferenceSets=3, numReferencesPerReferenceSet=3,
             numReadGroupSets=3, numReadGroupsPerReadGroupSet=3,
-            numAlignments=3)
+            readDepth=100)
 
     def setUp(self):
         self.client = self.getClient()
@@ -489,3 +491,30 @@ class TestPagingHttp(PagingMixin, unittest.TestCase):
 
     def getClient(self):
         return DummyHttpClient(self.backend)
+
+
+class TestServerTiming(unittest.TestCase):
+    """
+    Tests that the HTTP client requests and logs the server's stage
+    timings when debug logging is enabled.
+    """
+    def testServerTimingLogged(self):
+        httpClient = client.HttpClient(
+            "http://example.com", logLevel=logging.DEBUG)
+        response = DummyResponse(
+            protocol.SearchDatasetsResponse().toJsonString())
+        response.url = "http://example.com/datasets/search"
+        response.headers["Server-Timing"] = "fetch;dur=1.000"
+        httpClient._session.post = mock.Mock(return_value=response)
+        with mock.patch.object(httpClient._logger, "debug") as debug:
+            list(httpClient.searchDatasets())
+        params = httpClient._session.post.call_args[1]["params"]
+        self.assertEqual(params["serverTiming"], "true")
+        self.assertIn(
+            mock.call(
+                "Server-Timing for %s: %s", response.url, "fetch;dur=1.000"),
+            debug.call_args_list)
+
+    def testServerTimingNotRequested(self):
+        httpClient = client.HttpClient("http://example.com")
+        self.assertNotIn("serverTiming", httpClient._getHttpParameters())
@@ -0,0 +1,146 @@
+"""
+Tests the coverage pyramid file format
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import array
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import pysam
+
+import ga4gh.datamodel.coverage as coverage
+import ga4gh.exceptions as exceptions
+
+
+class TestCoveragePyramid(unittest.TestCase):
+    """
+    Tests writing pyramids and reading their levels back.
+    """
+    def _writePyramid(self, binSizes, references, depths):
+        def getDepths(readGroupName, referenceName, start, end):
+            values = depths[readGroupName][referenceName][start:end]
+            if sum(values) == 0:
+                return None
+            return array.array(b"l", values)
+
+        fileObject = io.BytesIO()
+        coverage.writeCoveragePyramid(
+            fileObject, binSizes, sorted(depths.keys()), references,
+            getDepths, signature=[1, 2.5])
+        return coverage.CoveragePyramid(fileObject.getvalue())
+
+    def testLevels(self):
+        depths = {
+            "rg1": {
+                "chr1": [i % 7 for i in range(250)],
+                "chr2": [0] * 30,
+            },
+            "rg2": {
+                "chr1": [0] * 200 + [3] * 50,
+                "chr2": [1] * 30,
+            },
+        }
+        references = [("chr1", 250), ("chr2", 30)]
+        pyramid = self._writePyramid([1, 10, 100], references, depths)
+        self.assertEqual(pyramid.getBinSizes(), [1, 10, 100])
+        self.assertEqual(pyramid.getReadGroupNames(), ["rg1", "rg2"])
+        self.assertEqual(pyramid.getReferenceLength("chr1"), 250)
+        self.assertIsNone(pyramid.getReferenceLength("chr3"))
+        for readGroupName, referenceDepths in depths.items():
+            for referenceName, length in references:
+                values = referenceDepths[referenceName]
+                for binSize in [1, 10, 100]:
+                    numBins = pyramid.getNumBins(referenceName, binSize)
+                    self.assertEqual(
+                        numBins, (length + binSize - 1) // binSize)
+                    expected = [
+                        sum(values[i:i + binSize])
+                        for i in range(0, length, binSize)]
+                    self.assertEqual(list(pyramid.getAlignedBases(
+                        readGroupName, referenceName, binSize, 0,
+                        numBins)), expected)
+        # the last bin is clipped to the end of the reference
+        coverageBins = pyramid.getCoverage("rg2", "chr1", 100, 1, 3)
+        self.assertEqual(
+            [(bin_.start, bin_.end, bin_.meanDepth)
+             for bin_ in coverageBins],
+            [(100, 200, 0), (200, 250, 3)])
+
+    def testBadBinSizes(self):
+        for binSizes in [[], [0, 10], [10, 10], [10, 25], [100, 10]]:
+            self.assertRaises(
+                exceptions.BadBinSizeException,
+                coverage.writeCoveragePyramid, io.BytesIO(), binSizes,
+                ["rg"], [("chr1", 100)], lambda *args: None)
+
+    def testBadFile(self):
+        self.assertRaises(
+            exceptions.FileOpenFailedException,
+            coverage.CoveragePyramid, b"not a pyramid")
+
+    def testAlignedBlocks(self):
+        # 2S 3M 2I 2M 3D 4M 10N 1= 1X 1H
+        cigar = [(4, 2), (0, 3), (1, 2), (0, 2), (2, 3), (0, 4), (3, 10),
+                 (7, 1), (8, 1), (5, 1)]
+        self.assertEqual(list(coverage.getAlignedBlocks(100, cigar)), [
+            (100, 103, 2), (103, 105, 7), (108, 112, 9), (122, 123, 13),
+            (123, 124, 14)])
+
+
+class TestBuildCoveragePyramid(unittest.TestCase):
+    """
+    Tests building the pyramid of a BAM file.
+    """
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        fileName = "chr17.1-250.bam"
+        for suffix in ["", ".bai"]:
+            shutil.copy(
+                os.path.join(
+                    "tests", "data", "datasets", "dataset1", "reads",
+                    fileName + suffix),
+                self._directory)
+        self._samFilePath = os.path.join(self._directory, fileName)
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def testBuild(self):
+        binSizes = [1, 50, 500]
+        outputPath = coverage.buildCoveragePyramid(
+            self._samFilePath, binSizes)
+        self.assertEqual(
+            outputPath, self._samFilePath + coverage.PYRAMID_SUFFIX)
+        pyramid = coverage.CoveragePyramid.open(outputPath)
+        self.assertTrue(pyramid.isCurrent(self._samFilePath))
+        samFile = pysam.AlignmentFile(self._samFilePath)
+        referenceName = samFile.references[0]
+        length = samFile.lengths[0]
+        readGroupName = "cow"
+        self.assertIn(readGroupName, pyramid.getReadGroupNames())
+        expected = [0] * length
+        for read in samFile.fetch(referenceName):
+            if dict(read.tags).get("RG") != readGroupName:
+                continue
+            for start, end, _ in coverage.getAlignedBlocks(
+                    read.reference_start, read.cigar):
+                for position in range(start, end):
+                    expected[position] += 1
+        samFile.close()
+        self.assertGreater(sum(expected), 0)
+        for binSize in binSizes:
+            numBins = pyramid.getNumBins(referenceName, binSize)
+            self.assertEqual(list(pyramid.getAlignedBases(
+                readGroupName, referenceName, binSize, 0, numBins)), [
+                sum(expected[i:i + binSize])
+                for i in range(0, length, binSize)])
+        # the pyramid is out of date once the BAM file changes
+        stat = os.stat(self._samFilePath)
+        os.utime(self._samFilePath, (stat.st_atime, stat.st_mtime + 10))
+        self.assertFalse(pyramid.isCurrent(self._samFilePath))
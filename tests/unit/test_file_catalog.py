@@ -0,0 +1,280 @@
+"""
+Tests the catalog of scanned data files
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import glob
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import mock
+
+import ga4gh.backend as backend
+import ga4gh.datamodel as datamodel
+import ga4gh.datamodel.reads as reads
+import ga4gh.datamodel.references as references
+import ga4gh.datamodel.variants as variants
+
+
+class TestFileCatalog(unittest.TestCase):
+    """
+    Tests the caching and persistence of file information.
+    """
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp(prefix="ga4gh_file_catalog")
+        self._dataFile = os.path.join(self._tempdir, "data.txt")
+        self._databasePath = os.path.join(self._tempdir, "catalog.db")
+        with open(self._dataFile, "w") as dataFile:
+            dataFile.write("data")
+        self._numScans = 0
+
+    def tearDown(self):
+        shutil.rmtree(self._tempdir)
+
+    def _scanFile(self, dataFile):
+        self._numScans += 1
+        with open(dataFile) as f:
+            return {"contents": f.read()}
+
+    def _failScan(self, dataFile):
+        self.fail("Unexpected scan of {}".format(dataFile))
+
+    def testScannedOnce(self):
+        catalog = datamodel.PysamFileCatalog()
+        info = catalog.getFileInfo(self._dataFile, self._scanFile)
+        self.assertEqual(info, {"contents": "data"})
+        info = catalog.getFileInfo(self._dataFile, self._scanFile)
+        self.assertEqual(info, {"contents": "data"})
+        self.assertEqual(self._numScans, 1)
+
+    def testChangedFileRescanned(self):
+        catalog = datamodel.PysamFileCatalog()
+        catalog.getFileInfo(self._dataFile, self._scanFile)
+        with open(self._dataFile, "a") as dataFile:
+            dataFile.write("more")
+        info = catalog.getFileInfo(self._dataFile, self._scanFile)
+        self.assertEqual(info, {"contents": "datamore"})
+        self.assertEqual(self._numScans, 2)
+
+    def testChangedIndexRescanned(self):
+        catalog = datamodel.PysamFileCatalog()
+        catalog.getFileInfo(self._dataFile, self._scanFile)
+        with open(self._dataFile + ".tbi", "w") as indexFile:
+            indexFile.write("index")
+        catalog.getFileInfo(self._dataFile, self._scanFile)
+        self.assertEqual(self._numScans, 2)
+
+    def testPersistence(self):
+        catalog = datamodel.PysamFileCatalog()
+        catalog.setDatabasePath(self._databasePath)
+        catalog.getFileInfo(self._dataFile, self._scanFile)
+        catalog.commit()
+        catalog = datamodel.PysamFileCatalog()
+        catalog.setDatabasePath(self._databasePath)
+        self.assertEqual(
+            catalog.getCatalogedFiles(), [os.path.abspath(self._dataFile)])
+        info = catalog.getFileInfo(self._dataFile, self._failScan)
+        self.assertEqual(info, {"contents": "data"})
+
+    def testUncommittedEntriesNotPersisted(self):
+        catalog = datamodel.PysamFileCatalog()
+        catalog.setDatabasePath(self._databasePath)
+        catalog.getFileInfo(self._dataFile, self._scanFile)
+        catalog = datamodel.PysamFileCatalog()
+        catalog.setDatabasePath(self._databasePath)
+        self.assertEqual(catalog.getCatalogedFiles(), [])
+
+    def testUnseenFilesRemoved(self):
+        otherFile = os.path.join(self._tempdir, "other.txt")
+        with open(otherFile, "w") as dataFile:
+            dataFile.write("other")
+        catalog = datamodel.PysamFileCatalog()
+        catalog.setDatabasePath(self._databasePath)
+        catalog.getFileInfo(self._dataFile, self._scanFile)
+        catalog.getFileInfo(otherFile, self._scanFile)
+        catalog.commit()
+        os.unlink(otherFile)
+        catalog = datamodel.PysamFileCatalog()
+        catalog.setDatabasePath(self._databasePath)
+        catalog.startScan()
+        catalog.getFileInfo(self._dataFile, self._failScan)
+        catalog.removeUnseenFiles(self._tempdir)
+        self.assertEqual(
+            catalog.getCatalogedFiles(), [os.path.abspath(self._dataFile)])
+        catalog.commit()
+        catalog = datamodel.PysamFileCatalog()
+        catalog.setDatabasePath(self._databasePath)
+        self.assertEqual(
+            catalog.getCatalogedFiles(), [os.path.abspath(self._dataFile)])
+
+    def testConcurrentCommits(self):
+        # entries added by other threads while committing are not lost
+        dataFiles = []
+        for i in range(100):
+            dataFile = os.path.join(self._tempdir, "data{}.txt".format(i))
+            with open(dataFile, "w") as f:
+                f.write("data")
+            dataFiles.append(dataFile)
+        catalog = datamodel.PysamFileCatalog()
+        catalog.setDatabasePath(self._databasePath)
+        threads = [
+            threading.Thread(
+                target=lambda files=dataFiles[i::4]: [
+                    catalog.getFileInfo(f, self._scanFile) for f in files])
+            for i in range(4)]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            catalog.commit()
+        for thread in threads:
+            thread.join()
+        catalog.commit()
+        catalog = datamodel.PysamFileCatalog()
+        catalog.setDatabasePath(self._databasePath)
+        self.assertEqual(
+            sorted(catalog.getCatalogedFiles()),
+            sorted(os.path.abspath(f) for f in dataFiles))
+
+    def testFilesOutsideDirectoryKept(self):
+        catalog = datamodel.PysamFileCatalog()
+        catalog.getFileInfo(self._dataFile, self._scanFile)
+        catalog.startScan()
+        catalog.removeUnseenFiles(os.path.join(self._tempdir, "subdir"))
+        self.assertEqual(
+            catalog.getCatalogedFiles(), [os.path.abspath(self._dataFile)])
+
+
+class TestFileSystemBackendCatalog(unittest.TestCase):
+    """
+    Tests that a backend built from a persisted catalog is the same as
+    one built by scanning the data files.
+    """
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp(prefix="ga4gh_file_catalog")
+        self._databasePath = os.path.join(self._tempdir, "catalog.db")
+        self._dataDir = os.path.join("tests", "data")
+
+    def tearDown(self):
+        datamodel.fileCatalog.setDatabasePath(None)
+        shutil.rmtree(self._tempdir)
+
+    def _getVariantSets(self, theBackend):
+        dataset = theBackend.getDatasetByIndex(0)
+        return dataset.getVariantSets()
+
+    def _buildBackend(self):
+        # Returns a backend built from the data directory along with the
+        # number of data files that were scanned while building it.
+        patches = [
+            mock.patch.object(
+                module, name, side_effect=getattr(module, name))
+            for module, name in [
+                (references, "scanFastaFile"),
+                (variants, "scanVariantFile"),
+                (reads, "scanAlignmentFile")]]
+        scanMethods = [patch.start() for patch in patches]
+        try:
+            theBackend = backend.FileSystemBackend(self._dataDir)
+        finally:
+            for patch in patches:
+                patch.stop()
+        return theBackend, sum(method.call_count for method in scanMethods)
+
+    def testCatalogedBackend(self):
+        datamodel.fileCatalog.setDatabasePath(self._databasePath)
+        scannedBackend, numScans = self._buildBackend()
+        self.assertGreater(numScans, 0)
+        datamodel.fileCatalog.setDatabasePath(self._databasePath)
+        self.assertGreater(len(datamodel.fileCatalog.getCatalogedFiles()), 0)
+        catalogedBackend, numScans = self._buildBackend()
+        self.assertEqual(numScans, 0)
+        scannedVariantSets = self._getVariantSets(scannedBackend)
+        catalogedVariantSets = self._getVariantSets(catalogedBackend)
+        self.assertEqual(len(scannedVariantSets), len(catalogedVariantSets))
+        for scanned, cataloged in zip(
+                scannedVariantSets, catalogedVariantSets):
+            self.assertEqual(scanned.getId(), cataloged.getId())
+            self.assertEqual(
+                scanned.getMetadata(), cataloged.getMetadata())
+            self.assertEqual(
+                [callSet.getId() for callSet in scanned.getCallSets()],
+                [callSet.getId() for callSet in cataloged.getCallSets()])
+            self.assertEqual(
+                scanned.toProtocolElement(), cataloged.toProtocolElement())
+
+    def testLazyLoadsCommitted(self):
+        datamodel.fileCatalog.setDatabasePath(self._databasePath)
+        lazyBackend = backend.FileSystemBackend(
+            self._dataDir, lazyLoading=True)
+        catalog = datamodel.PysamFileCatalog()
+        catalog.setDatabasePath(self._databasePath)
+        self.assertEqual(catalog.getCatalogedFiles(), [])
+        variantSet = self._getVariantSets(lazyBackend)[0]
+        self.assertGreater(len(variantSet.getCallSets()), 0)
+        catalog.setDatabasePath(self._databasePath)
+        variantFiles = [
+            path for path in catalog.getCatalogedFiles()
+            if path.endswith(".vcf.gz")]
+        self.assertGreater(len(variantFiles), 0)
+
+
+class TestParallelScanning(unittest.TestCase):
+    """
+    Tests prefetching file information using a pool of worker processes.
+    """
+    def setUp(self):
+        self._dataDir = os.path.join("tests", "data")
+
+    def tearDown(self):
+        datamodel.fileCatalog.setDatabasePath(None)
+
+    def _failScan(self, dataFile):
+        self.fail("Unexpected scan of {}".format(dataFile))
+
+    def testPrefetch(self):
+        variantFiles = glob.glob(os.path.join(
+            self._dataDir, "datasets", "*", "variants", "*", "*.vcf.gz"))
+        self.assertGreater(len(variantFiles), 0)
+        catalog = datamodel.PysamFileCatalog()
+        catalog.prefetch(
+            [(f, variants.scanVariantFile) for f in variantFiles], 2)
+        for variantFile in variantFiles:
+            self.assertEqual(
+                catalog.getFileInfo(variantFile, self._failScan),
+                variants.scanVariantFile(variantFile))
+
+    def testPrefetchSkipsBadFiles(self):
+        badFile = glob.glob(os.path.join(
+            "tests", "faultydata", "variants", "no_indexed_vcf",
+            "*.vcf.gz"))[0]
+        catalog = datamodel.PysamFileCatalog()
+        catalog.prefetch([(badFile, variants.scanVariantFile)], 2)
+        self.assertEqual(catalog.getCatalogedFiles(), [])
+
+    def testParallelBackend(self):
+        sequentialBackend = backend.FileSystemBackend(self._dataDir)
+        datamodel.fileCatalog.setDatabasePath(None)
+        parallelBackend = backend.FileSystemBackend(
+            self._dataDir, numScanWorkers=2)
+        self.assertEqual(
+            [referenceSet.getId()
+             for referenceSet in sequentialBackend.getReferenceSets()],
+            [referenceSet.getId()
+             for referenceSet in parallelBackend.getReferenceSets()])
+        sequentialDataset = sequentialBackend.getDatasetByIndex(0)
+        parallelDataset = parallelBackend.getDatasetByIndex(0)
+        self.assertEqual(
+            [variantSet.getId()
+             for variantSet in sequentialDataset.getVariantSets()],
+            [variantSet.getId()
+             for variantSet in parallelDataset.getVariantSets()])
+        self.assertEqual(
+            [readGroupSet.getId()
+             for readGroupSet in sequentialDataset.getReadGroupSets()],
+            [readGroupSet.getId()
+             for readGroupSet in parallelDataset.getReadGroupSets()])
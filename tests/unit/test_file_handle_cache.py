@@ -10,57 +10,124 @@ import os
 import shutil
 import tempfile
 import unittest
-import uuid
 
 import ga4gh.datamodel as datamodel
 
 
-class TestFileHandleCache(datamodel.PysamFileHandleCache, unittest.TestCase):
-    def __init__(self, *args, **kwargs):
-        super(TestFileHandleCache, self).__init__()
-        unittest.TestCase.__init__(self, *args, **kwargs)
+class FakeHandle(object):
+    """
+    A file handle that records whether it has been closed.
+    """
+    def __init__(self, dataFile):
+        self.dataFile = dataFile
+        self.closed = False
 
-    def setUp(self):
-        self._tempdir = tempfile.mkdtemp(prefix="ga4gh_file_cache",
-                                         dir=tempfile.gettempdir())
-
-    def _getFileHandle(self, dataFile):
-        def openMethod(dataFile):
-            return open(dataFile, 'w')
-        return self.getFileHandle(dataFile, openMethod)
-
-    def testGetFileHandle(self):
-        def genFileName(x):
-            return os.path.join(self._tempdir, str(uuid.uuid4()))
-
-        # Set cache size to 9 files max
-        self.setMaxCacheSize(9)
+    def close(self):
+        self.closed = True
 
-        # Build a list of 10 files and add their handles to the cache
-        fileList = map(genFileName, range(0, 10))
 
-        for f in fileList:
-            handle = self._getFileHandle(f)
-            self.assertEquals(self._cache.count((f, handle)), 1)
+class TestFileHandleCache(unittest.TestCase):
+    """
+    Tests the LRU eviction and checkout semantics of the cache.
+    """
+    def setUp(self):
+        self._tempdir = tempfile.mkdtemp(prefix="ga4gh_file_cache")
+        self._cache = datamodel.PysamFileHandleCache()
+        self._fileList = []
+        for i in range(10):
+            dataFile = os.path.join(self._tempdir, "file{}".format(i))
+            with open(dataFile, "w") as f:
+                f.write("data")
+            self._fileList.append(dataFile)
+        self._numOpens = 0
 
-        self.assertEquals(len(self._memoTable), len(self._cache))
+    def tearDown(self):
+        shutil.rmtree(self._tempdir)
 
-        # Ensure that the first added file has been removed from the cache
-        self.assertEquals(filter(lambda x: x[0] == fileList[0], self._cache),
-                          [])
+    def _openFile(self, dataFile):
+        self._numOpens += 1
+        return FakeHandle(dataFile)
 
-        topIndex = len(self._cache) - 1
+    def _useFile(self, dataFile):
+        with self._cache.fileHandle(dataFile, self._openFile) as handle:
+            self.assertEqual(handle.dataFile, dataFile)
+            self.assertFalse(handle.closed)
+        return handle
 
-        # Update priority of this file and ensure it's no longer the
-        # least recently used
-        self.assertEquals(self._cache[topIndex][0], fileList[1])
-        self._getFileHandle(fileList[1])
-        self.assertNotEqual(self._cache[topIndex][0], fileList[1])
-        self.assertEquals(self._cache[0][0], fileList[1])
+    def testGetFileHandle(self):
+        self._cache.setMaxCacheSize(9)
+        handles = [self._useFile(f) for f in self._fileList]
+        self.assertEqual(self._numOpens, 10)
+        # The first file has been evicted and its handle closed
+        self.assertTrue(handles[0].closed)
+        self.assertTrue(all(not handle.closed for handle in handles[1:]))
+        self.assertEqual(
+            sorted(self._cache.getCachedFiles()), sorted(self._fileList[1:]))
+        # Using a cached file reuses its handle and makes it the most
+        # recently used, so the next eviction removes the second file
+        self.assertIs(self._useFile(self._fileList[1]), handles[1])
+        self._useFile(self._fileList[0])
+        self.assertEqual(self._numOpens, 11)
+        self.assertFalse(handles[1].closed)
+        self.assertTrue(handles[2].closed)
+
+    def testHandleInUseNotClosed(self):
+        self._cache.setMaxCacheSize(1)
+        with self._cache.fileHandle(
+                self._fileList[0], self._openFile) as handle:
+            for dataFile in self._fileList[1:]:
+                self._useFile(dataFile)
+            self.assertFalse(handle.closed)
+        self.assertEqual(self._cache.getCachedFiles(), [self._fileList[0]])
+
+    def testConcurrentCheckouts(self):
+        dataFile = self._fileList[0]
+        with self._cache.fileHandle(dataFile, self._openFile) as handle1:
+            with self._cache.fileHandle(dataFile, self._openFile) as handle2:
+                self.assertIsNot(handle1, handle2)
+        self.assertEqual(self._numOpens, 2)
+        self.assertIn(self._useFile(dataFile), [handle1, handle2])
+        self.assertEqual(self._numOpens, 2)
+
+    def testHandleCheckedInOnError(self):
+        dataFile = self._fileList[0]
+        with self.assertRaises(ZeroDivisionError):
+            with self._cache.fileHandle(dataFile, self._openFile) as handle:
+                1 / 0
+        self.assertIs(self._useFile(dataFile), handle)
+
+    def testMaxCacheWeight(self):
+        for dataFile in self._fileList[:3]:
+            with open(dataFile + ".bai", "w") as indexFile:
+                indexFile.write("x" * 100)
+        self.assertEqual(datamodel.estimateIndexSize(self._fileList[0]), 100)
+        self._cache.setMaxCacheWeight(250)
+        handles = [self._useFile(f) for f in self._fileList[:3]]
+        self.assertTrue(handles[0].closed)
+        self.assertFalse(handles[1].closed)
+        self.assertFalse(handles[2].closed)
+
+    def testRemoveFileHandles(self):
+        idleHandle = self._useFile(self._fileList[0])
+        with self._cache.fileHandle(
+                self._fileList[1], self._openFile) as busyHandle:
+            self._cache.removeFileHandles(self._tempdir)
+            self.assertTrue(idleHandle.closed)
+            self.assertFalse(busyHandle.closed)
+        self.assertTrue(busyHandle.closed)
+        self.assertEqual(self._cache.getCachedFiles(), [])
+
+    def testStatistics(self):
+        self._cache.setMaxCacheSize(2)
+        for dataFile in self._fileList[:3] + self._fileList[2:3]:
+            self._useFile(dataFile)
+        statistics = self._cache.getStatistics()
+        self.assertEqual(statistics["hits"], 1)
+        self.assertEqual(statistics["misses"], 3)
+        self.assertEqual(statistics["evictions"], 1)
+        self.assertEqual(statistics["openHandles"], 2)
 
     def testSetCacheMaxSize(self):
-        self.assertRaises(ValueError, self.setMaxCacheSize, 0)
-        self.assertRaises(ValueError, self.setMaxCacheSize, -1)
-
-    def tearDown(self):
-        shutil.rmtree(self._tempdir)
+        self.assertRaises(ValueError, self._cache.setMaxCacheSize, 0)
+        self.assertRaises(ValueError, self._cache.setMaxCacheSize, -1)
+        self.assertRaises(ValueError, self._cache.setMaxCacheWeight, 0)
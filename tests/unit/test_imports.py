@@ -154,25 +154,34 @@ class ImportGraphLayerChecker(object):
     # each file/module is in one and only one moduleGroup
     moduleGroupNames = {
         'cli': ['ga4gh/cli.py'],
+        'servers': ['ga4gh/asyncserver.py',
+                    'ga4gh/prefork.py'],
         'client': ['ga4gh/client.py'],
         'frontend': ['ga4gh/frontend.py'],
         'backend': ['ga4gh/backend.py'],
         'exceptions': ['ga4gh/exceptions.py'],
-        'datamodel': ['ga4gh/datamodel/reads.py',
+        'datamodel': ['ga4gh/datamodel/coverage.py',
+                      'ga4gh/datamodel/pyramids.py',
+                      'ga4gh/datamodel/reads.py',
                       'ga4gh/datamodel/references.py',
                       'ga4gh/datamodel/variants.py',
                       'ga4gh/datamodel/datasets.py'],
         'libraries': ['ga4gh/converters.py',
                       'ga4gh/configtest.py'],
         'protocol': ['ga4gh/protocol.py',
+                     'ga4gh/extensions.py',
                      'ga4gh/_protocol_definitions.py'],
         'config': ['ga4gh/serverconfig.py'],
         'avrotools': ['ga4gh/avrotools.py'],
+        'metrics': ['ga4gh/metrics.py',
+                    'ga4gh/capture.py',
+                    'ga4gh/responsecache.py'],
     }
 
     # each moduleGroupName has one and only one entry here
     layers = [
         ['cli'],
+        ['servers'],
         ['client'],
         ['frontend'],
         ['backend'],
@@ -182,6 +191,7 @@ class ImportGraphLayerChecker(object):
         ['avrotools'],
         ['config'],
         ['protocol'],
+        ['metrics'],
     ]
 
     def __init__(self, graph):
@@ -0,0 +1,210 @@
+"""
+Tests the collection of server metrics
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+import time
+import unittest
+
+import mock
+
+import ga4gh.frontend as frontend
+import ga4gh.metrics as metrics
+import ga4gh.protocol as protocol
+
+
+class TestHistogram(unittest.TestCase):
+    """
+    Tests the bucketing of observed values.
+    """
+    def testObserve(self):
+        histogram = metrics.Histogram([1, 10])
+        self.assertIsNone(histogram.getMean())
+        for value in [0, 1, 2, 20]:
+            histogram.observe(value)
+        self.assertEqual(
+            histogram.getCumulativeCounts(),
+            [(1, 2), (10, 3), (float("inf"), 4)])
+        self.assertEqual(histogram.getCount(), 4)
+        self.assertEqual(histogram.getSum(), 23)
+        self.assertEqual(histogram.getMean(), 23 / 4)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """
+    Tests the recording of requests and the text format.
+    """
+    def setUp(self):
+        self._registry = metrics.MetricsRegistry()
+
+    def _runRequest(self, endpoint, status, numObjects=None, resumed=False):
+        self._registry.startRequest(endpoint)
+        with self._registry.stage("search"):
+            pass
+        self._registry.recordPage(numObjects, resumed)
+        self._registry.endRequest(status, 100)
+
+    def testEndpointSummaries(self):
+        self._runRequest("searchReads", 200, 10, True)
+        self._runRequest("searchReads", 404)
+        self._runRequest("getDataset", 200)
+        summaries = self._registry.getEndpointSummaries()
+        self.assertEqual(
+            [summary["endpoint"] for summary in summaries],
+            ["getDataset", "searchReads"])
+        summary = summaries[1]
+        self.assertEqual(summary["numRequests"], 2)
+        self.assertEqual(summary["numErrors"], 1)
+        self.assertEqual(summary["bytesOut"], 200)
+        self.assertEqual(summary["meanObjectsPerPage"], 10)
+        self.assertEqual(summary["pageTokenResumes"], 1)
+        self.assertIsNone(summaries[0]["meanObjectsPerPage"])
+
+    def testNoCurrentRequest(self):
+        with self._registry.stage("search"):
+            pass
+        self._registry.recordPage(1, False)
+        self._registry.endRequest(200, 0)
+        self.assertEqual(self._registry.getEndpointSummaries(), [])
+
+    def testTimedWithoutRequest(self):
+        @self._registry.timed("convert")
+        def convert(value):
+            return value + 1
+
+        with mock.patch.object(
+                metrics.RequestRecord, "startStage") as startStage, \
+                mock.patch.object(metrics.RequestRecord, "endStage"):
+            self.assertEqual(convert(1), 2)
+            self.assertFalse(startStage.called)
+            self._registry.startRequest("searchReads")
+            self.assertEqual(convert(2), 3)
+            startStage.assert_called_once_with("convert")
+
+    def testSlowRequests(self):
+        self._runRequest("searchReads", 200)
+        self.assertEqual(self._registry.getSlowRequests(), [])
+        self._registry.setSlowRequestThreshold(0)
+        logging.getLogger("ga4gh.metrics").setLevel(logging.CRITICAL)
+        self._runRequest("searchVariants", 200)
+        slowRequests = self._registry.getSlowRequests()
+        self.assertEqual(len(slowRequests), 1)
+        request, duration, status = slowRequests[0]
+        self.assertEqual(request.endpoint, "searchVariants")
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            [name for name, _ in request.getStages()], ["search"])
+
+    def testNestedStages(self):
+        self._registry.startRequest("searchReads")
+
+        @self._registry.timed("convert")
+        def convert():
+            time.sleep(0.02)
+
+        with self._registry.stage("fetch"):
+            for _ in range(2):
+                convert()
+        request = self._registry.getCurrentRequest()
+        stages = dict(request.getStages())
+        self.assertEqual(sorted(stages.keys()), ["convert", "fetch"])
+        self.assertGreaterEqual(stages["convert"], 0.04)
+        self.assertLess(stages["fetch"], 0.02)
+        serverTiming = request.formatServerTiming().split(", ")
+        self.assertEqual(
+            [timing.split(";")[0] for timing in serverTiming],
+            ["fetch", "convert", "total"])
+        # the durations are in milliseconds
+        self.assertAlmostEqual(
+            float(serverTiming[1].split("dur=")[1]),
+            stages["convert"] * 1000, places=2)
+        self.assertGreaterEqual(float(serverTiming[1].split("dur=")[1]), 40)
+
+    def testFormatText(self):
+        self._registry.addCollector(
+            "test_gauge", "gauge", "A test gauge.",
+            lambda: [([("name", 'a"b')], 3)])
+        self._runRequest("searchReads", 200, 10, True)
+        lines = self._registry.formatText().splitlines()
+        self.assertIn(
+            'ga4gh_requests_total{endpoint="searchReads",status="200"} 1',
+            lines)
+        self.assertIn(
+            'ga4gh_request_duration_seconds_bucket'
+            '{endpoint="searchReads",le="+Inf"} 1', lines)
+        self.assertIn(
+            'ga4gh_objects_per_page_bucket'
+            '{endpoint="searchReads",le="10"} 1', lines)
+        self.assertIn(
+            'ga4gh_response_bytes_total{endpoint="searchReads"} 100', lines)
+        self.assertIn(
+            'ga4gh_page_token_resumes_total{endpoint="searchReads"} 1',
+            lines)
+        self.assertIn('test_gauge{name="a\\"b"} 3', lines)
+        self.assertIn("# TYPE test_gauge gauge", lines)
+
+
+class TestFrontendMetrics(unittest.TestCase):
+    """
+    Tests that the frontend records the metrics of its requests.
+    """
+    @classmethod
+    def setUpClass(cls):
+        config = {
+            "DATA_SOURCE": "simulated://",
+            "SIMULATED_BACKEND_NUM_VARIANT_SETS": 1,
+        }
+        frontend.reset()
+        frontend.configure(baseConfig="TestConfig", extraConfig=config)
+        cls.app = frontend.app.test_client()
+
+    def _getSummary(self, endpoint):
+        for summary in metrics.registry.getEndpointSummaries():
+            if summary["endpoint"] == endpoint:
+                return summary
+        return None
+
+    def testSearchMetrics(self):
+        before = self._getSummary("searchDatasets")
+        numRequests = 0 if before is None else before["numRequests"]
+        request = protocol.SearchDatasetsRequest()
+        response = self.app.post(
+            "/datasets/search", data=request.toJsonString(),
+            headers={"Content-type": "application/json"})
+        self.assertEqual(response.status_code, 200)
+        summary = self._getSummary("searchDatasets")
+        self.assertEqual(summary["numRequests"], numRequests + 1)
+        self.assertGreater(summary["bytesOut"], 0)
+        self.assertIsNotNone(summary["meanObjectsPerPage"])
+        response = self.app.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'ga4gh_requests_total{endpoint="searchDatasets",status="200"}',
+            response.data)
+        self.assertIn("ga4gh_file_handle_cache_hits_total", response.data)
+
+    def testServerTiming(self):
+        request = protocol.SearchDatasetsRequest()
+        response = self.app.post(
+            "/datasets/search", data=request.toJsonString(),
+            headers={"Content-type": "application/json"})
+        self.assertNotIn("Server-Timing", response.headers)
+        response = self.app.post(
+            "/datasets/search?serverTiming=true",
+            data=request.toJsonString(),
+            headers={"Content-type": "application/json"})
+        stages = [
+            timing.split(";")[0] for timing in
+            response.headers["Server-Timing"].split(", ")]
+        for stage in ["parse", "validate", "fetch", "serialize", "total"]:
+            self.assertIn(stage, stages)
+
+    def testIndexSummary(self):
+        self.app.get("/metrics")
+        response = self.app.get("/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("getMetrics", response.data)
+        self.assertIn("File handle cache", response.data)
@@ -0,0 +1,121 @@
+"""
+Tests the pre-forking multi-process server
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import time
+import unittest
+
+import requests
+
+import ga4gh.prefork as prefork
+
+
+def pidApp(environ, startResponse):
+    """
+    A WSGI app that responds with the pid of the process handling the
+    request.
+    """
+    startResponse(b'200 OK', [(b'Content-Type', b'text/plain')])
+    return [str(os.getpid()).encode()]
+
+
+class TestPreforkServer(unittest.TestCase):
+    """
+    Runs a pre-forking server in a separate process and checks that the
+    requests are handled by its workers.
+    """
+    def _startServer(
+            self, numWorkers, maxRequests=None, checkCallback=None,
+            checkInterval=None):
+        self._server = prefork.PreforkServer(
+            pidApp, "127.0.0.1", 0, numWorkers, maxRequests,
+            checkCallback=checkCallback, checkInterval=checkInterval)
+        self._server.pollInterval = 0.1
+        self._server.bind()
+        self._url = "http://127.0.0.1:{}/".format(
+            self._server.getServerAddress()[1])
+        self._process = multiprocessing.Process(
+            target=self._server.serveForever)
+        self._process.start()
+
+    def tearDown(self):
+        os.kill(self._process.pid, signal.SIGTERM)
+        self._process.join(10)
+        self.assertFalse(self._process.is_alive())
+
+    def _getPid(self):
+        response = requests.get(self._url, timeout=10)
+        self.assertEqual(response.status_code, 200)
+        return int(response.text)
+
+    def _getPids(self, numRequests):
+        return [self._getPid() for _ in range(numRequests)]
+
+    def testWorkersHandleRequests(self):
+        self._startServer(2)
+        pids = self._getPids(10)
+        self.assertNotIn(os.getpid(), pids)
+        self.assertNotIn(self._process.pid, pids)
+        self.assertLessEqual(len(set(pids)), 2)
+
+    def testMaxRequests(self):
+        self._startServer(1, maxRequests=2)
+        pids = self._getPids(6)
+        self.assertEqual(len(set(pids)), 3)
+        for i in range(0, 6, 2):
+            self.assertEqual(pids[i], pids[i + 1])
+
+    def _waitForNewWorker(self, pid):
+        for _ in range(100):
+            if self._getPid() != pid:
+                break
+            time.sleep(0.1)
+        else:
+            self.fail("Worker was not replaced on restart")
+
+    def testRestart(self):
+        self._startServer(1)
+        pid = self._getPid()
+        os.kill(self._process.pid, signal.SIGHUP)
+        self._waitForNewWorker(pid)
+
+    def testCheckCallback(self):
+        # The callback runs in the master, so the test signals it by
+        # creating a file.
+        tempdir = tempfile.mkdtemp(prefix="ga4gh_prefork")
+        try:
+            flagPath = os.path.join(tempdir, "changed")
+
+            def checkCallback():
+                if os.path.exists(flagPath):
+                    os.unlink(flagPath)
+                    return True
+                return False
+
+            self._startServer(
+                1, checkCallback=checkCallback, checkInterval=0.1)
+            pid = self._getPid()
+            self.assertEqual(self._getPid(), pid)
+            open(flagPath, "w").close()
+            self._waitForNewWorker(pid)
+        finally:
+            shutil.rmtree(tempdir)
+
+
+class TestPreforkServerArguments(unittest.TestCase):
+    """
+    Tests the validation of the pre-forking server's arguments.
+    """
+    def testBadArguments(self):
+        self.assertRaises(
+            ValueError, prefork.PreforkServer, pidApp, "127.0.0.1", 0, 0)
+        self.assertRaises(
+            ValueError, prefork.PreforkServer, pidApp, "127.0.0.1", 0, 1, 0)
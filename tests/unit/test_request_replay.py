@@ -0,0 +1,85 @@
+"""
+Tests the replay of captured requests
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+import time
+import unittest
+
+import werkzeug.serving
+
+import ga4gh.frontend as frontend
+import ga4gh.protocol as protocol
+import request_replay
+
+
+class TestReplay(unittest.TestCase):
+    """
+    Replays requests against a server running in a separate thread.
+    """
+    def setUp(self):
+        frontend.reset()
+        frontend.configure(
+            baseConfig="TestConfig",
+            extraConfig={"DATA_SOURCE": "simulated://"})
+        self._server = werkzeug.serving.make_server(
+            "127.0.0.1", 0, frontend.app, threaded=True)
+        self._url = "http://127.0.0.1:{}".format(self._server.server_port)
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.start()
+
+    def tearDown(self):
+        self._server.shutdown()
+        self._thread.join()
+
+    def _getEntries(self):
+        request = protocol.SearchDatasetsRequest()
+        entries = []
+        for i in range(4):
+            entries.append({
+                "time": 1000 + i * 0.1, "method": "POST",
+                "path": "/datasets/search", "endpoint": "searchDatasets",
+                "args": {}, "body": request.toJsonString(), "duration": 0.01,
+                "status": 200, "bytes": 100})
+        entries.append({
+            "time": 1000.4, "method": "GET", "path": "/datasets/notAnId",
+            "endpoint": "getDataset", "args": {}, "body": None,
+            "duration": 0.01, "status": 404, "bytes": 100})
+        return entries
+
+    def testReplay(self):
+        replayer = request_replay.Replayer(self._url, numThreads=2, speed=0)
+        results = replayer.replay(self._getEntries())
+        self.assertEqual(
+            [result["status"] for result in results], [200] * 4 + [404])
+        summary = request_replay.summariseLatencies(results)
+        self.assertEqual(summary["searchDatasets"]["numRequests"], 4)
+        self.assertEqual(summary["searchDatasets"]["numErrors"], 0)
+        self.assertEqual(summary["getDataset"]["numErrors"], 1)
+
+    def testPace(self):
+        replayer = request_replay.Replayer(self._url, numThreads=2, speed=2)
+        startTime = time.time()
+        replayer.replay(self._getEntries())
+        self.assertGreaterEqual(time.time() - startTime, 0.2)
+
+    def testCompare(self):
+        replayer = request_replay.Replayer(self._url, numThreads=2, speed=0)
+        baseline = replayer.replay(self._getEntries())
+        results = replayer.replay(self._getEntries())
+        results[0]["status"] = 500
+        comparison, statusChanges = request_replay.compareReplays(
+            results, baseline)
+        self.assertEqual(
+            sorted(comparison.keys()), ["getDataset", "searchDatasets"])
+        self.assertIsNotNone(comparison["searchDatasets"]["p50Ratio"])
+        self.assertEqual(
+            statusChanges, [("POST", "/datasets/search", 200, 500)])
+        self.assertIn(
+            "changed from 200 to 500",
+            request_replay.formatComparison(comparison, statusChanges))
+        with self.assertRaises(ValueError):
+            request_replay.compareReplays(results[1:], baseline)
@@ -5,6 +5,10 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import sys
+import time
+import traceback
+
 import unittest
 
 import ga4gh.backend as backend
@@ -26,7 +30,8 @@ class MockVariantSet(variants.AbstractVariantSet):
         self.numVariants = numVariants
 
     def getVariants(self, referenceName, startPosition, endPosition,
-                    variantName=None, callSetIds=None):
+                    variantName=None, callSetIds=None, siteFilter=None,
+                    genotypeFilter=None):
         for i in range(self.numVariants):
             yield generateVariant()
 
@@ -99,7 +104,8 @@ class MockReadGroup(reads.AbstractReadGroup):
         self.numAlignments = numAlignments
 
     def getReadAlignments(self, referenceName=None, referenceId=None,
-                          start=None, end=None):
+                          start=None, end=None, readFilter=None,
+                          downsampler=None):
         for i in range(self.numAlignments):
             yield generateReadAlignment(i)
 
@@ -110,7 +116,7 @@ class TestReadsGenerator(unittest.TestCase):
     """
     def setUp(self):
         self.request = protocol.SearchReadsRequest()
-        self.backend = backend.SimulatedBackend(numAlignments=0)
+        self.backend = backend.SimulatedBackend()
         referenceSet = self.backend.getReferenceSetByIndex(0)
         reference = referenceSet.getReferenceByIndex(0)
         self.request.referenceId = reference.getId()
@@ -171,6 +177,107 @@ class TestReadsGenerator(unittest.TestCase):
         self.request.readGroupIds = [readGroup.getId()]
 
 
+class ClosingIterator(object):
+    """
+    An iterator over a list that records whether it has been closed.
+    """
+    def __init__(self, values):
+        self.iterator = iter(values)
+        self.closed = False
+
+    def next(self):
+        return next(self.iterator)
+
+    def __iter__(self):
+        return self
+
+    def close(self):
+        self.closed = True
+
+
+class TestMergeIterators(unittest.TestCase):
+    """
+    Tests the merging of iterators for multi variant set searches
+    """
+    def testMerge(self):
+        iterators = [
+            ClosingIterator([1, 3, 3, 8]), ClosingIterator([]),
+            ClosingIterator([0, 3, 9])]
+        merged = backend.mergeIterators(iterators, lambda value: value)
+        self.assertEqual(list(merged), [0, 1, 3, 3, 3, 8, 9])
+        self.assertTrue(all(iterator.closed for iterator in iterators))
+
+    def testTiesInIteratorOrder(self):
+        iterators = [
+            ClosingIterator([(1, "a"), (2, "a")]),
+            ClosingIterator([(1, "b"), (2, "b")])]
+        merged = backend.mergeIterators(iterators, lambda value: value[0])
+        self.assertEqual(
+            [name for _, name in merged], ["a", "b", "a", "b"])
+
+    def testCloseEarly(self):
+        iterators = [ClosingIterator(range(10)), ClosingIterator(range(10))]
+        merged = backend.mergeIterators(iterators, lambda value: value)
+        self.assertEqual(next(merged), 0)
+        merged.close()
+        self.assertTrue(all(iterator.closed for iterator in iterators))
+
+
+class TestPrefetchingIterator(unittest.TestCase):
+    """
+    Tests the iterator that reads ahead in a background thread
+    """
+    def testValues(self):
+        iterator = ClosingIterator(range(100))
+        prefetchingIterator = backend.PrefetchingIterator(iterator, 7)
+        self.assertEqual(list(prefetchingIterator), range(100))
+        self.assertTrue(iterator.closed)
+
+    def testException(self):
+        def failingGenerator():
+            yield 1
+            raise exceptions.BadPageTokenException()
+        prefetchingIterator = backend.PrefetchingIterator(
+            failingGenerator(), 10)
+        self.assertEqual(next(prefetchingIterator), 1)
+        self.assertRaises(
+            exceptions.BadPageTokenException, next, prefetchingIterator)
+        # the traceback leads to where the exception was raised
+        prefetchingIterator = backend.PrefetchingIterator(
+            failingGenerator(), 10)
+        next(prefetchingIterator)
+        try:
+            next(prefetchingIterator)
+        except exceptions.BadPageTokenException:
+            functionNames = [
+                frame[2] for frame in traceback.extract_tb(sys.exc_info()[2])]
+            self.assertIn("failingGenerator", functionNames)
+        else:
+            self.fail("Exception not re-raised")
+
+    def testBufferSize(self):
+        consumed = []
+
+        def countingGenerator():
+            for value in range(100):
+                consumed.append(value)
+                yield value
+        prefetchingIterator = backend.PrefetchingIterator(
+            countingGenerator(), 5)
+        time.sleep(0.1)
+        # five values are buffered, and the thread waits with the sixth
+        self.assertLessEqual(len(consumed), 6)
+        self.assertEqual(list(prefetchingIterator), range(100))
+
+    def testClose(self):
+        iterator = ClosingIterator(range(1000))
+        prefetchingIterator = backend.PrefetchingIterator(iterator, 2)
+        self.assertEqual(next(prefetchingIterator), 0)
+        prefetchingIterator.close()
+        self.assertEqual(list(prefetchingIterator), [])
+        self.assertTrue(iterator.closed)
+
+
 class TestVariantsIntervalIteratorClassMethods(unittest.TestCase):
     """
     Test the variants interval iterator class methods
@@ -0,0 +1,192 @@
+"""
+Tests the caches of serialized responses
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import ga4gh.responsecache as responsecache
+
+
+def _useSharedCache(cache, workerIndex, numEntries):
+    # Run in a worker process, which stores and looks up its own entries
+    # in the cache it inherited from the parent process.
+    for i in range(numEntries):
+        key = "{}:{}".format(workerIndex, i)
+        value = "value{}".format(i) * 10
+        cache.put(key, value)
+        if cache.get(key) not in (None, value):
+            raise AssertionError("Wrong value for {}".format(key))
+
+
+class ResponseCacheTest(object):
+    """
+    Tests common to every kind of response cache.
+    """
+    def _createCache(self, maxBytes):
+        raise NotImplementedError()
+
+    def testGetAndPut(self):
+        cache = self._createCache(100)
+        self.assertIsNone(cache.get("k1"))
+        cache.put("k1", "value1")
+        cache.put("k2", "value2")
+        self.assertEqual(cache.get("k1"), "value1")
+        self.assertEqual(cache.get("k2"), "value2")
+        cache.put("k1", "new value")
+        self.assertEqual(cache.get("k1"), "new value")
+        statistics = cache.getStatistics()
+        self.assertEqual(statistics["hits"], 3)
+        self.assertEqual(statistics["misses"], 1)
+        self.assertEqual(statistics["evictions"], 0)
+        self.assertEqual(statistics["entries"], 2)
+        self.assertEqual(statistics["bytes"], len("k1new valuek2value2"))
+        cache.clear()
+        self.assertIsNone(cache.get("k1"))
+        self.assertEqual(cache.getStatistics()["bytes"], 0)
+
+    def testEviction(self):
+        # each entry is 10 bytes, so the cache holds three of them
+        cache = self._createCache(35)
+        for key in ["k1", "k2", "k3"]:
+            cache.put(key, "12345678")
+        # k1 is now more recently used than k2
+        self.assertIsNotNone(cache.get("k1"))
+        cache.put("k4", "12345678")
+        self.assertIsNone(cache.get("k2"))
+        for key in ["k1", "k3", "k4"]:
+            self.assertIsNotNone(cache.get(key))
+        statistics = cache.getStatistics()
+        self.assertEqual(statistics["evictions"], 1)
+        self.assertEqual(statistics["bytes"], 30)
+        # entries larger than the cache are not stored
+        cache.put("k5", "x" * 40)
+        self.assertIsNone(cache.get("k5"))
+        self.assertEqual(cache.getStatistics()["entries"], 3)
+
+    def testBadSize(self):
+        self.assertRaises(ValueError, self._createCache, 0)
+
+
+class TestMemoryResponseCache(ResponseCacheTest, unittest.TestCase):
+    """
+    Tests the response cache held in memory.
+    """
+    def _createCache(self, maxBytes):
+        return responsecache.MemoryResponseCache(maxBytes)
+
+
+class TestSqliteResponseCache(ResponseCacheTest, unittest.TestCase):
+    """
+    Tests the response cache held in an SQLite database.
+    """
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self._path = os.path.join(self._directory, "responses.db")
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def _createCache(self, maxBytes):
+        cache = responsecache.SqliteResponseCache(self._path, maxBytes)
+        # record every lookup, so that the order of evictions is exact
+        cache.touchInterval = 0
+        return cache
+
+    def _getLastUsed(self, key):
+        connection = sqlite3.connect(self._path)
+        try:
+            lastUsed, = connection.execute(
+                "SELECT lastUsed FROM responses WHERE key = ?",
+                (key,)).fetchone()
+        finally:
+            connection.close()
+        return lastUsed
+
+    def testShared(self):
+        # caches opened on the same database share their entries
+        cache1 = self._createCache(100)
+        cache2 = self._createCache(100)
+        cache1.put("key", "value")
+        self.assertEqual(cache2.get("key"), "value")
+        self.assertEqual(cache1.getStatistics()["hits"], 0)
+        self.assertEqual(cache2.getStatistics()["hits"], 1)
+
+    def testTouchInterval(self):
+        # lookups only record recent uses of entries that were last used
+        # more than touchInterval seconds ago
+        cache = self._createCache(100)
+        cache.touchInterval = 3600
+        cache.put("key", "value")
+        lastUsed = self._getLastUsed("key")
+        self.assertEqual(cache.get("key"), "value")
+        self.assertEqual(self._getLastUsed("key"), lastUsed)
+        cache.touchInterval = 0
+        self.assertEqual(cache.get("key"), "value")
+        self.assertGreater(self._getLastUsed("key"), lastUsed)
+
+    def testMultipleProcesses(self):
+        numWorkers = 4
+        numEntries = 50
+        maxBytes = 2000
+        cache = self._createCache(maxBytes)
+        cache.put("parent", "value")
+        workers = [
+            multiprocessing.Process(
+                target=_useSharedCache, args=(cache, i, numEntries))
+            for i in range(numWorkers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+        # the totals agree with the entries, which fit in the cache
+        statistics = cache.getStatistics()
+        connection = sqlite3.connect(self._path)
+        try:
+            numEntries, numBytes = connection.execute(
+                "SELECT COUNT(*), SUM(size) FROM responses").fetchone()
+        finally:
+            connection.close()
+        self.assertGreater(numEntries, 0)
+        self.assertEqual(statistics["entries"], numEntries)
+        self.assertEqual(statistics["bytes"], numBytes)
+        self.assertLessEqual(numBytes, maxBytes)
+        cache.put("parent", "new value")
+        self.assertEqual(cache.get("parent"), "new value")
+
+    def testDatabaseErrors(self):
+        # failed lookups are misses, and failed stores are ignored
+        cache = self._createCache(100)
+        connection = sqlite3.connect(self._path)
+        connection.execute("DROP TABLE responses")
+        connection.close()
+        cache.put("key", "value")
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.getStatistics()["misses"], 1)
+
+
+class TestCreateResponseCache(unittest.TestCase):
+    """
+    Tests choosing the kind of response cache from the configuration.
+    """
+    def testCreate(self):
+        self.assertIsNone(responsecache.createResponseCache(None))
+        self.assertIsInstance(
+            responsecache.createResponseCache(100),
+            responsecache.MemoryResponseCache)
+        directory = tempfile.mkdtemp()
+        try:
+            self.assertIsInstance(
+                responsecache.createResponseCache(
+                    100, os.path.join(directory, "responses.db")),
+                responsecache.SqliteResponseCache)
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,112 @@
+"""
+Tests the server benchmark suite
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import unittest
+
+import mock
+
+import ga4gh.backend as backend
+import server_benchmark
+
+
+class TestServerBenchmark(unittest.TestCase):
+    """
+    Runs the benchmark cases against a small simulated backend.
+    """
+    def setUp(self):
+        self._backend = backend.SimulatedBackend(
+            randomSeed=1, numCalls=2, variantDensity=1, readDepth=1)
+
+    def testAllEndpointsCovered(self):
+        cases = server_benchmark.getBenchmarkCases(self._backend, pageSize=2)
+        runMethods = set(
+            name for name in dir(self._backend)
+            if name.startswith("runSearch") or name.startswith("runGet") or
+            name == "runListReferenceBases")
+        runMethods.discard("runGetRequest")
+        runMethods.discard("runSearchRequest")
+        self.assertEqual(
+            set(case._runMethod.__name__ for case in cases), runMethods)
+
+    def testBenchmarkCase(self):
+        cases = server_benchmark.getBenchmarkCases(self._backend, pageSize=2)
+        for case in cases:
+            result = server_benchmark.benchmarkCase(case, 2, 2)
+            self.assertNotIn("skipped", result, case.name)
+            self.assertLessEqual(result["numPages"], 2)
+            self.assertEqual(result["numRequests"], 2 * result["numPages"])
+            self.assertLessEqual(result["min"], result["p50"])
+            self.assertLessEqual(result["p50"], result["p90"])
+            self.assertLessEqual(result["p99"], result["max"])
+
+    def testSkippedCases(self):
+        # The test data has no pyramid sidecars, so the tiles cases fail
+        # and are skipped.
+        fileSystemBackend = backend.FileSystemBackend("tests/data")
+        cases = dict(
+            (case.name, case) for case in
+            server_benchmark.getBenchmarkCases(fileSystemBackend, pageSize=2))
+        result = server_benchmark.benchmarkCase(
+            cases["searchCoverageTiles"], 1, 1)
+        self.assertIn("CoveragePyramidNotFoundException", result["skipped"])
+        result = server_benchmark.benchmarkCase(
+            cases["searchVariantSummaries"], 1, 1)
+        self.assertIn(
+            "VariantSummaryPyramidNotFoundException", result["skipped"])
+
+    def testFailedCases(self):
+        # Errors other than missing pyramids are reported as failures.
+        case = server_benchmark.BenchmarkCase(
+            "broken", mock.Mock(side_effect=KeyError("x")), id_="x")
+        self.assertRaises(
+            KeyError, server_benchmark.benchmarkCase, case, 1, 1)
+        args = argparse.Namespace(
+            randomSeed=1, numCalls=2, variantDensity=1, readDepth=1,
+            readLength=100, pageSize=2, basesLength=100, repeatLimit=1,
+            pageLimit=1, cases=["getDataset", "getReference"])
+        with mock.patch.object(
+                backend.SimulatedBackend, "runGetDataset",
+                side_effect=KeyError("x")):
+            results = server_benchmark.runBenchmarks(["simulated://"], args)
+        self.assertIn("KeyError", results["simulated://"]["getDataset"][
+            "failed"])
+        failure, = server_benchmark.getFailures(results)
+        self.assertIn("getDataset", failure)
+        baseline = {"simulated://": {
+            "getDataset": {"p50": 1, "throughput": 1000},
+            "getReference": {"p50": 1000, "throughput": 1},
+            "searchReads": {"p50": 10, "throughput": 100},
+        }}
+        regressions = server_benchmark.compareResults(
+            results, baseline, 0.2, args.cases)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("getDataset", regressions[0])
+
+    def testCompareResults(self):
+        baseline = {"simulated://": {
+            "searchReads": {"p50": 10, "throughput": 100},
+            "getDataset": {"p50": 1, "throughput": 1000},
+        }}
+        results = {"simulated://": {
+            "searchReads": {"p50": 11, "throughput": 90},
+            "getDataset": {"p50": 2, "throughput": 500},
+            "searchVariants": {"p50": 100, "throughput": 10},
+        }}
+        regressions = server_benchmark.compareResults(
+            results, baseline, 0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all("getDataset" in message
+                            for message in regressions))
+        self.assertEqual(
+            server_benchmark.compareResults(results, baseline, 1.5), [])
+        # Cases of the baseline without a result are regressions.
+        del results["simulated://"]["searchReads"]
+        regressions = server_benchmark.compareResults(
+            results, baseline, 1.5)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("searchReads", regressions[0])
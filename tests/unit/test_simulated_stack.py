@@ -13,6 +13,7 @@ import random
 import ga4gh.datamodel.reads as reads
 import ga4gh.datamodel.references as references
 import ga4gh.datamodel.variants as variants
+import ga4gh.extensions as extensions
 import ga4gh.frontend as frontend
 import ga4gh.protocol as protocol
 
@@ -36,7 +37,7 @@ class TestSimulatedStack(unittest.TestCase):
             "SIMULATED_BACKEND_NUM_VARIANT_SETS": 4,
             "SIMULATED_BACKEND_NUM_REFERENCE_SETS": 3,
             "SIMULATED_BACKEND_NUM_REFERENCES_PER_REFERENCE_SET": 4,
-            "SIMULATED_BACKEND_NUM_ALIGNMENTS_PER_READ_GROUP": 5
+            "SIMULATED_BACKEND_READ_DEPTH": 5,
         }
         frontend.reset()
         frontend.configure(
@@ -287,6 +288,46 @@ class TestSimulatedStack(unittest.TestCase):
             request.variantSetId = badId
             self.verifySearchMethodFails(request, path)
 
+    def testMultiVariantSetsSearch(self):
+        path = '/variants/multi/search'
+        dataset = self.backend.getDatasets()[0]
+        variantSets = dataset.getVariantSets()
+        referenceName, start, end = '1', 100, 110
+        request = extensions.SearchMultiVariantSetsRequest()
+        request.variantSetIds = [
+            variantSet.getId() for variantSet in variantSets]
+        request.referenceName = referenceName
+        request.start = start
+        request.end = end
+        request.callSetIds = [variantSets[1].getCallSets()[0].getId()]
+        request.pageSize = 3
+        results = []
+        while True:
+            responseData = self.sendSearchRequest(
+                path, request, protocol.SearchVariantsResponse)
+            results.extend(responseData.variants)
+            if responseData.nextPageToken is None:
+                break
+            request.pageToken = responseData.nextPageToken
+        # The variants of all the sets are merged by start position, with
+        # ties in the order of the requested variant sets.
+        expected = []
+        for index, variantSet in enumerate(variantSets):
+            for variant in variantSet.getVariants(
+                    referenceName, start, end, []):
+                expected.append((variant.start, index, variant.id))
+        expected.sort()
+        self.assertEqual(
+            [variant.id for variant in results],
+            [variantId for _, _, variantId in expected])
+        # A call set that is not in any of the variant sets is rejected.
+        request.pageToken = None
+        request.variantSetIds = [variantSets[0].getId()]
+        self.verifySearchMethodFails(request, path)
+        for badId in self.getBadIds():
+            request.variantSetIds = [badId]
+            self.verifySearchMethodFails(request, path)
+
     def testReadGroupSetsSearch(self):
         path = '/readgroupsets/search'
         for dataset in self.backend.getDatasets():
@@ -5,13 +5,18 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import hashlib
 import unittest
 
+import mock
+
 import ga4gh.datamodel as datamodel
 import ga4gh.datamodel.datasets as datasets
 import ga4gh.datamodel.reads as reads
 import ga4gh.datamodel.references as references
 import ga4gh.datamodel.variants as variants
+import ga4gh.exceptions as exceptions
+import ga4gh.protocol as protocol
 
 
 class TestSimulatedVariantSet(unittest.TestCase):
@@ -108,6 +113,68 @@ class TestSimulatedVariantSet(unittest.TestCase):
         variantListTwo = self._getSimulatedVariantsList()
         self.assertEqual(variantListOne, variantListTwo)
 
+    def testWindowsConsistent(self):
+        # the variants in a window should be the same however the window
+        # is requested, across block boundaries
+        dataset = datasets.AbstractDataset('dataset1')
+        variantSet = variants.SimulatedVariantSet(
+            dataset, 'variantSet1', randomSeed=5, variantDensity=0.01)
+        blockSize = variantSet.variantBlockSize
+        start, end = blockSize // 2, 3 * blockSize + 7
+        allVariants = list(variantSet.getVariants('ref', 0, 4 * blockSize))
+        windowVariants = list(variantSet.getVariants('ref', start, end))
+        expected = [
+            variant for variant in allVariants
+            if start <= variant.start < end]
+        self.assertGreater(len(expected), 0)
+        self._assertEqualVariantLists(windowVariants, expected)
+        for variant in windowVariants:
+            compoundId = datamodel.VariantCompoundId.parse(variant.id)
+            self._assertEqualVariantLists(
+                [variantSet.getVariant(compoundId)], [variant])
+
+    def testVariantDensity(self):
+        dataset = datasets.AbstractDataset('dataset1')
+        for density in [0, 0.001, 0.1, 0.5]:
+            variantSet = variants.SimulatedVariantSet(
+                dataset, 'variantSet1', variantDensity=density)
+            numPositions = 0
+            for blockIndex in range(25):
+                positions = variantSet.getVariantPositions(blockIndex)
+                self.assertEqual(positions, sorted(set(positions)))
+                numPositions += len(positions)
+            expected = density * 25 * variantSet.variantBlockSize
+            self.assertLessEqual(
+                abs(numPositions - expected), 5 * expected ** 0.5)
+
+    def testGenotypeMatrixRows(self):
+        callSetIds = [
+            callSet.getId()
+            for callSet in self.simulatedVariantSet.getCallSets()]
+        variantList = self._getSimulatedVariantsList()
+        for columns in [None, callSetIds[::-1], []]:
+            rows = list(self.simulatedVariantSet.getGenotypeMatrixRows(
+                self.referenceName, self.startPosition, self.endPosition,
+                columns))
+            if columns is None:
+                columns = callSetIds
+            self.assertEqual(len(rows), len(variantList))
+            for row, variant in zip(rows, variantList):
+                self.assertEqual(row.id, variant.id)
+                self.assertEqual(row.start, variant.start)
+                self.assertEqual(row.alternateBases, variant.alternateBases)
+                genotypes = dict(
+                    (call.callSetId, "/".join(map(str, call.genotype)))
+                    for call in variant.calls)
+                self.assertEqual(
+                    row.genotypes,
+                    ",".join(genotypes[callSetId] for callSetId in columns))
+        self.assertRaises(
+            exceptions.CallSetNotInVariantSetException, list,
+            self.simulatedVariantSet.getGenotypeMatrixRows(
+                self.referenceName, self.startPosition, self.endPosition,
+                ["notACallSet"]))
+
     def _assertEqualVariantLists(self, variantListOne, variantListTwo):
         # need to make time-dependent fields equal before the comparison,
         # otherwise we're introducing a race condition
@@ -123,12 +190,356 @@ class TestSimulatedReadGroupSet(unittest.TestCase):
     """
     Test properties of the simulated ReadGroupSet
     """
-    def testCreation(self):
+    def setUp(self):
         dataset = datasets.AbstractDataset('dataset1')
-        localId = "readGroupSetId"
-        referenceSet = references.SimulatedReferenceSet("srs1")
-        simulatedReadGroupSet = reads.SimulatedReadGroupSet(
-            dataset, localId, referenceSet)
-        for readGroup in simulatedReadGroupSet.getReadGroups():
-            alignments = list(readGroup.getReadAlignments())
+        self.referenceSet = references.SimulatedReferenceSet(
+            "srs1", referenceLength=5 * reads.SimulatedReadGroup.readBlockSize)
+        self.reference = self.referenceSet.getReferences()[0]
+        self.readLength = 50
+        self.simulatedReadGroupSet = reads.SimulatedReadGroupSet(
+            dataset, "readGroupSetId", self.referenceSet, readDepth=20,
+            readLength=self.readLength)
+        self.readGroup = self.simulatedReadGroupSet.getReadGroups()[0]
+        self.blockSize = self.readGroup.readBlockSize
+
+    def _getStarts(self, alignments):
+        return [
+            alignment.alignment.position.position
+            for alignment in alignments]
+
+    def testCreation(self):
+        for readGroup in self.simulatedReadGroupSet.getReadGroups():
+            alignments = list(readGroup.getReadAlignments(self.reference))
             self.assertGreater(len(alignments), 0)
+            for alignment in alignments:
+                self.assertEqual(
+                    len(alignment.alignedSequence), self.readLength)
+                self.assertEqual(
+                    len(alignment.alignedQuality), self.readLength)
+                self.assertEqual(
+                    alignment.alignment.position.referenceName,
+                    self.reference.getLocalId())
+
+    def testWindow(self):
+        start, end = self.blockSize - 10, 2 * self.blockSize + 10
+        alignments = list(self.readGroup.getReadAlignments(
+            self.reference, start, end))
+        starts = self._getStarts(alignments)
+        self.assertEqual(starts, sorted(starts))
+        for position in starts:
+            self.assertGreater(position + self.readLength, start)
+            self.assertLess(position, end)
+        # the window is the same when generated as part of a larger one
+        allAlignments = list(self.readGroup.getReadAlignments(
+            self.reference, 0, 3 * self.blockSize))
+        expected = [
+            alignment for alignment, position in zip(
+                allAlignments, self._getStarts(allAlignments))
+            if start - self.readLength < position < end]
+        self.assertEqual(alignments, expected)
+        self.assertEqual(
+            len(set(alignment.id for alignment in allAlignments)),
+            len(allAlignments))
+
+    def testDepth(self):
+        numBases = 4 * self.blockSize
+        alignments = list(self.readGroup.getReadAlignments(
+            self.reference, 0, numBases))
+        depth = len(alignments) * self.readLength / numBases
+        self.assertAlmostEqual(depth, 20, delta=1)
+        # reads don't extend past the end of the reference
+        referenceLength = self.reference.getLength()
+        alignments = list(self.readGroup.getReadAlignments(
+            self.reference, referenceLength - 10, 2 * referenceLength))
+        self.assertGreater(len(alignments), 0)
+        for position in self._getStarts(alignments):
+            self.assertLess(position, referenceLength)
+        self.assertEqual(
+            self.readGroup.getNumAlignedReads(),
+            round(self.reference.getLength() * 20 / self.readLength))
+
+    def testReadFilter(self):
+        end = 2 * self.blockSize
+        alignments = list(self.readGroup.getReadAlignments(
+            self.reference, 0, end))
+        reverseFilter = reads.ReadAlignmentFilter(
+            requiredFlags=reads.SamFlags.REVERSED)
+        forwardFilter = reads.ReadAlignmentFilter(
+            excludedFlags=reads.SamFlags.REVERSED)
+        reverse = list(self.readGroup.getReadAlignments(
+            self.reference, 0, end, readFilter=reverseFilter))
+        forward = list(self.readGroup.getReadAlignments(
+            self.reference, 0, end, readFilter=forwardFilter))
+        self.assertGreater(len(reverse), 0)
+        self.assertGreater(len(forward), 0)
+        self.assertEqual(
+            sorted(reverse + forward, key=alignments.index), alignments)
+        for alignment in reverse:
+            self.assertEqual(
+                alignment.alignment.position.strand,
+                protocol.Strand.NEG_STRAND)
+        for kwargs in [{"minMappingQuality": 61},
+                       {"minReadLength": self.readLength + 1},
+                       {"maxReadLength": self.readLength - 1}]:
+            readFilter = reads.ReadAlignmentFilter(**kwargs)
+            self.assertEqual(list(self.readGroup.getReadAlignments(
+                self.reference, 0, end, readFilter=readFilter)), [])
+
+    def testDownsampling(self):
+        end = 2 * self.blockSize
+        alignments = list(self.readGroup.getReadAlignments(
+            self.reference, 0, end))
+        downsampler = reads.ReadDownsampler(5, 100, seed=1)
+        downsampled = list(self.readGroup.getReadAlignments(
+            self.reference, 0, end, downsampler=downsampler))
+        self.assertEqual(
+            sorted(downsampled, key=alignments.index), downsampled)
+        for alignment in downsampled:
+            self.assertIn(alignment, alignments)
+        starts = self._getStarts(downsampled)
+        for bucketStart in range(0, end, 100):
+            numReads = len([
+                start for start in self._getStarts(alignments)
+                if bucketStart <= start < bucketStart + 100])
+            self.assertGreater(numReads, 5)
+            self.assertEqual(len([
+                start for start in starts
+                if bucketStart <= start < bucketStart + 100]), 5)
+        # the same reads are kept whatever the region searched
+        windowAlignments = list(self.readGroup.getReadAlignments(
+            self.reference, 250, 730, downsampler=downsampler))
+        firstStart = 250 - self.readLength + 1
+        self.assertEqual(windowAlignments, [
+            alignment for alignment in downsampled
+            if firstStart <= alignment.alignment.position.position < 730])
+        # the keys of a bucket come from the reads of the search, and the
+        # reads are only fetched again for the parts of the buckets at the
+        # edges of the region that the search does not cover
+        with mock.patch.object(
+                self.readGroup, "_generateReadAlignments",
+                wraps=self.readGroup._generateReadAlignments) as generate:
+            self.assertEqual(list(self.readGroup.getReadAlignments(
+                self.reference, 0, end, downsampler=downsampler)),
+                downsampled)
+            bucketEnd = (end // 100 + 1) * 100
+            self.assertEqual(
+                [call[0][1:3] for call in generate.call_args_list],
+                [(0, end), (end, bucketEnd)])
+            generate.reset_mock()
+            list(self.readGroup.getReadAlignments(
+                self.reference, 250, 730, downsampler=downsampler))
+            self.assertEqual(
+                [call[0][1:3] for call in generate.call_args_list],
+                [(250, 730), (200, 250), (730, 800)])
+        otherSeed = list(self.readGroup.getReadAlignments(
+            self.reference, 0, end,
+            downsampler=reads.ReadDownsampler(5, 100, seed=2)))
+        self.assertEqual(len(otherSeed), len(downsampled))
+        self.assertNotEqual(otherSeed, downsampled)
+        for maxReads, bucketSize in [(0, 100), (5, 0)]:
+            self.assertRaises(
+                exceptions.BadReadFilterException, reads.ReadDownsampler,
+                maxReads, bucketSize)
+
+
+class TestSimulatedReference(unittest.TestCase):
+    """
+    Tests the generation of simulated reference bases in blocks
+    """
+    def setUp(self):
+        self.length = 3 * references.SimulatedReference.baseBlockSize + 10
+        self.referenceSet = references.SimulatedReferenceSet(
+            "srs", randomSeed=5, referenceLength=self.length)
+        self.reference = self.referenceSet.getReferences()[0]
+
+    def testBases(self):
+        bases = self.reference.getBases(0, self.length)
+        self.assertEqual(len(bases), self.length)
+        self.assertEqual(set(bases), set("ACGT"))
+        self.assertEqual(self.reference.getBases(5, 5), "")
+        blockSize = references.SimulatedReference.baseBlockSize
+        for start, end in [
+                (0, 1), (blockSize - 3, blockSize + 3),
+                (blockSize, 2 * blockSize), (10, 3 * blockSize + 1),
+                (self.length - 4, self.length)]:
+            self.assertEqual(
+                self.reference.getBases(start, end), bases[start:end])
+        self.assertRaises(
+            exceptions.ReferenceRangeErrorException,
+            self.reference.getBases, 0, self.length + 1)
+
+    def testConsistency(self):
+        otherReferenceSet = references.SimulatedReferenceSet(
+            "srs", randomSeed=5, referenceLength=self.length)
+        otherReference = otherReferenceSet.getReferences()[0]
+        self.assertEqual(
+            self.reference.getBases(100, 200),
+            otherReference.getBases(100, 200))
+
+    def testMd5Checksum(self):
+        bases = self.reference.getBases(0, self.length)
+        self.assertEqual(
+            self.reference.getMd5Checksum(),
+            hashlib.md5(bases.encode()).hexdigest())
+
+
+class TestCoverageAccumulator(unittest.TestCase):
+    """
+    Tests the accumulation of coverage bins from read CIGARs
+    """
+    def _getBins(self, accumulator):
+        return [
+            (coverageBin.start, coverageBin.end, coverageBin.meanDepth,
+             coverageBin.baseCounts)
+            for coverageBin in accumulator.getBins()]
+
+    def testDepth(self):
+        accumulator = reads.CoverageAccumulator(10, 25, 4)
+        # 2S 3M 2I 2M 3D 4M: aligned over 9-12, 12-14 and 17-21
+        accumulator.addRead(9, [(4, 2), (0, 3), (1, 2), (0, 2), (2, 3),
+                                (0, 4)], None)
+        # 5M 100N 5M: aligned over 20-25 and 125-130
+        accumulator.addRead(20, [(0, 5), (3, 100), (0, 5)], None)
+        self.assertEqual(self._getBins(accumulator), [
+            (10, 14, 1, None), (14, 18, 0.25, None), (18, 22, 1.25, None),
+            (22, 25, 1, None)])
+
+    def testBaseCounts(self):
+        accumulator = reads.CoverageAccumulator(
+            0, 4, 2, includeBaseCounts=True)
+        accumulator.addRead(0, [(4, 1), (0, 2), (1, 1), (8, 2)], "TACGTN")
+        accumulator.addRead(1, [(7, 2)], "GG")
+        self.assertEqual(self._getBins(accumulator), [
+            (0, 2, 1.5, [1, 1, 1, 0]), (2, 4, 1.5, [0, 0, 1, 1])])
+
+    def testEmpty(self):
+        accumulator = reads.CoverageAccumulator(
+            0, 5, 10, includeBaseCounts=True)
+        accumulator.addRead(5, [(0, 10)], "A" * 10)
+        self.assertEqual(
+            self._getBins(accumulator), [(0, 5, 0, [0, 0, 0, 0])])
+        self.assertEqual(reads.CoverageAccumulator(3, 3, 1).getBins(), [])
+
+
+class TestSimulatedCoveragePyramid(unittest.TestCase):
+    """
+    Tests the coverage pyramid derived from the starts of simulated reads
+    """
+    def _checkPyramid(self, referenceLength, binSizes):
+        dataset = datasets.AbstractDataset('dataset1')
+        referenceSet = references.SimulatedReferenceSet(
+            "srs1", referenceLength=referenceLength)
+        reference = referenceSet.getReferences()[0]
+        readGroupSet = reads.SimulatedReadGroupSet(
+            dataset, "readGroupSetId", referenceSet, numReadGroups=2,
+            readDepth=5, readLength=50)
+        pyramid = readGroupSet.getCoveragePyramid()
+        self.assertIs(readGroupSet.getCoveragePyramid(), pyramid)
+        for readGroup in readGroupSet.getReadGroups():
+            for binSize in binSizes:
+                numBins = pyramid.getNumBins(reference.getLocalId(), binSize)
+                self.assertEqual(
+                    pyramid.getCoverage(
+                        readGroup.getLocalId(), reference.getLocalId(),
+                        binSize, 0, numBins),
+                    readGroup.getCoverage(
+                        reference, 0, referenceLength, binSize))
+
+    def testPyramid(self):
+        self._checkPyramid(1050, [1, 100])
+
+    def testSeveralBlocks(self):
+        # Bins larger than a block count the reads of interior blocks
+        # without generating their starts.
+        self._checkPyramid(
+            3 * reads.SimulatedReadGroup.readBlockSize + 500,
+            [100, 10000, 1000000])
+
+
+class TestReadAlignmentFilter(unittest.TestCase):
+    """
+    Tests the predicates of read alignment filters
+    """
+    def testMatches(self):
+        readFilter = reads.ReadAlignmentFilter()
+        self.assertTrue(readFilter.isEmpty())
+        self.assertTrue(readFilter.matches(0, 0xfff, 0))
+        readFilter = reads.ReadAlignmentFilter(
+            minMappingQuality=20, requiredFlags=0x3, excludedFlags=0x400,
+            minReadLength=50, maxReadLength=100)
+        self.assertFalse(readFilter.isEmpty())
+        self.assertTrue(readFilter.matches(20, 0x63, 50))
+        self.assertTrue(readFilter.matches(60, 0x3, 100))
+        self.assertFalse(readFilter.matches(19, 0x3, 50))
+        self.assertFalse(readFilter.matches(20, 0x1, 50))
+        self.assertFalse(readFilter.matches(20, 0x403, 50))
+        self.assertFalse(readFilter.matches(20, 0x3, 49))
+        self.assertFalse(readFilter.matches(20, 0x3, 101))
+
+    def testBadValues(self):
+        for kwargs in [{"minMappingQuality": -1}, {"requiredFlags": -1},
+                       {"excludedFlags": 0x1000}, {"minReadLength": -5},
+                       {"maxReadLength": -1}]:
+            self.assertRaises(
+                exceptions.BadReadFilterException,
+                reads.ReadAlignmentFilter, **kwargs)
+
+
+class TestSimulatedVariantSummaryPyramid(unittest.TestCase):
+    """
+    Tests the variant summary pyramids built in memory for simulated
+    variants
+    """
+    def testPyramid(self):
+        dataset = datasets.AbstractDataset('dataset1')
+        referenceSet = references.SimulatedReferenceSet(
+            "srs1", referenceLength=2500)
+        referenceName = referenceSet.getReferences()[0].getLocalId()
+        variantSet = variants.SimulatedVariantSet(
+            dataset, "variantSetId", numCalls=3, variantDensity=0.1,
+            referenceSet=referenceSet)
+        pyramid = variantSet.getVariantSummaryPyramid(referenceName)
+        self.assertIs(
+            variantSet.getVariantSummaryPyramid(referenceName), pyramid)
+        summaryBins = pyramid.getSummaries(referenceName, 1000, 0, 3)
+        self.assertEqual(
+            [(bin_.start, bin_.end) for bin_ in summaryBins],
+            [(0, 1000), (1000, 2000), (2000, 2500)])
+        for summaryBin in summaryBins:
+            gaVariants = list(variantSet.getVariants(
+                referenceName, summaryBin.start, summaryBin.end))
+            self.assertGreater(len(gaVariants), 0)
+            # the simulated variants are all SNVs
+            self.assertEqual(
+                summaryBin.variantClassCounts, [len(gaVariants), 0, 0, 0])
+            self.assertEqual(summaryBin.numVariants, len(gaVariants))
+            alleleFrequencies = [
+                variants.getAlleleFrequency(
+                    call.genotype for call in variant.calls)
+                for variant in gaVariants]
+            self.assertAlmostEqual(
+                summaryBin.meanAlleleFrequency,
+                sum(alleleFrequencies) / len(alleleFrequencies))
+
+    def testPyramidPerReference(self):
+        referenceSet = references.SimulatedReferenceSet(
+            "srs1", numReferences=2, referenceLength=2500)
+        referenceNames = [
+            reference.getLocalId()
+            for reference in referenceSet.getReferences()]
+        variantSet = variants.SimulatedVariantSet(
+            datasets.AbstractDataset('dataset1'), "variantSetId",
+            variantDensity=0.1, referenceSet=referenceSet)
+        pyramid = variantSet.getVariantSummaryPyramid(referenceNames[0])
+        self.assertEqual(pyramid.getReferenceLength(referenceNames[0]), 2500)
+        self.assertIsNone(pyramid.getReferenceLength(referenceNames[1]))
+        self.assertIsNot(
+            variantSet.getVariantSummaryPyramid(referenceNames[1]), pyramid)
+        self.assertIsNone(variantSet.getVariantSummaryPyramid("notThere"))
+
+    def testNoReferenceSet(self):
+        variantSet = variants.SimulatedVariantSet(
+            datasets.AbstractDataset('dataset1'), "variantSetId")
+        self.assertRaises(
+            exceptions.VariantSummaryPyramidNotFoundException,
+            variantSet.getVariantSummaryPyramid, "1")
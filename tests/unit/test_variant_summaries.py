@@ -0,0 +1,135 @@
+"""
+Tests the variant summary pyramids of variant files
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import pysam
+
+import ga4gh.datamodel.coverage as coverage
+import ga4gh.datamodel.variants as variants
+import ga4gh.exceptions as exceptions
+
+
+class TestVariantSummaryPyramid(unittest.TestCase):
+    """
+    Tests writing variant summary pyramids and reading their levels
+    back.
+    """
+    def testAlleleFrequency(self):
+        self.assertEqual(variants.getAlleleFrequency([(0, 1), (1, 1)]), 0.75)
+        self.assertEqual(
+            variants.getAlleleFrequency([(0, None), [-1], (2,)]), 0.5)
+        self.assertIsNone(variants.getAlleleFrequency([(None, None), []]))
+        self.assertIsNone(variants.getAlleleFrequency([]))
+
+    def testLevels(self):
+        accumulator = variants.VariantSummaryAccumulator(10)
+        accumulator.addVariant(3, "SNV", 0.5)
+        accumulator.addVariant(9, "INDEL", None)
+        accumulator.addVariant(12, "SNV", 0.25)
+        accumulator.addVariant(125, "OTHER", 1)
+        accumulator.addVariant(125, "MNV", 0)
+        self.assertIsNone(accumulator.getValues(20, 100))
+        fileObject = io.BytesIO()
+        variants.writeVariantSummaryPyramid(
+            fileObject, [10, 100], [("chr1", 130)], {"chr1": accumulator})
+        pyramid = variants.VariantSummaryPyramid(fileObject.getvalue())
+        self.assertEqual(pyramid.getBinSizes(), [10, 100])
+        self.assertEqual(pyramid.getReferenceLength("chr1"), 130)
+        self.assertEqual(pyramid.getNumBins("chr1", 10), 13)
+        summaryBins = pyramid.getSummaries("chr1", 10, 0, 13)
+        self.assertEqual(
+            [(bin_.start, bin_.end, bin_.numVariants, bin_.variantClassCounts,
+              bin_.meanAlleleFrequency)
+             for bin_ in summaryBins if bin_.numVariants > 0],
+            [(0, 10, 2, [1, 0, 1, 0], 0.5), (10, 20, 1, [1, 0, 0, 0], 0.25),
+             (120, 130, 2, [0, 1, 0, 1], 0.5)])
+        self.assertIsNone(summaryBins[2].meanAlleleFrequency)
+        # the last bin is clipped to the end of the reference
+        self.assertEqual(
+            [(bin_.start, bin_.end, bin_.numVariants,
+              bin_.meanAlleleFrequency)
+             for bin_ in pyramid.getSummaries("chr1", 100, 0, 2)],
+            [(0, 100, 3, 0.375), (100, 130, 2, 0.5)])
+
+    def testBadFile(self):
+        fileObject = io.BytesIO()
+        coverage.writeCoveragePyramid(
+            fileObject, [1], ["rg"], [("chr1", 10)], lambda *args: None)
+        self.assertRaises(
+            exceptions.FileOpenFailedException,
+            variants.VariantSummaryPyramid, fileObject.getvalue())
+
+
+class TestBuildVariantSummaryPyramid(unittest.TestCase):
+    """
+    Tests building the pyramid of a VCF file.
+    """
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        fileName = "chr1.vcf.gz"
+        for suffix in ["", ".tbi"]:
+            shutil.copy(
+                os.path.join(
+                    "tests", "data", "datasets", "dataset1", "variants",
+                    "1kgPhase1", fileName + suffix),
+                self._directory)
+        self._variantFilePath = os.path.join(self._directory, fileName)
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def testBuild(self):
+        binSizes = [1000, 10000]
+        outputPath = variants.buildVariantSummaryPyramid(
+            self._variantFilePath, binSizes)
+        self.assertEqual(
+            outputPath,
+            self._variantFilePath + variants.VARIANT_SUMMARY_SUFFIX)
+        pyramid = variants.VariantSummaryPyramid.open(outputPath)
+        self.assertTrue(pyramid.isCurrent(self._variantFilePath))
+        varFile = pysam.VariantFile(self._variantFilePath)
+        records = list(varFile.fetch("1"))
+        # the header has no contig lengths, so the reference ends at the
+        # end of its last record
+        length = max(record.stop for record in records)
+        self.assertEqual(pyramid.getReferenceLength("1"), length)
+        for binSize in binSizes:
+            numBins = pyramid.getNumBins("1", binSize)
+            summaryBins = pyramid.getSummaries("1", binSize, 0, numBins)
+            self.assertEqual(
+                sum(bin_.numVariants for bin_ in summaryBins), len(records))
+            for summaryBin in summaryBins:
+                binRecords = [
+                    record for record in records
+                    if summaryBin.start <= record.start < summaryBin.end]
+                self.assertEqual(summaryBin.numVariants, len(binRecords))
+                self.assertEqual(summaryBin.variantClassCounts, [
+                    sum(1 for record in binRecords
+                        if variants.getVariantClass(
+                            record.ref, record.alts) == variantClass)
+                    for variantClass in variants.VARIANT_CLASSES])
+                if len(binRecords) == 0:
+                    self.assertIsNone(summaryBin.meanAlleleFrequency)
+                    continue
+                alleleFrequencies = [
+                    variants.getAlleleFrequency(
+                        call.allele_indices
+                        for call in record.samples.values())
+                    for record in binRecords]
+                self.assertAlmostEqual(
+                    summaryBin.meanAlleleFrequency,
+                    sum(alleleFrequencies) / len(alleleFrequencies))
+        varFile.close()
+        # the pyramid is out of date once the variant file changes
+        stat = os.stat(self._variantFilePath)
+        os.utime(self._variantFilePath, (stat.st_atime, stat.st_mtime + 10))
+        self.assertFalse(pyramid.isCurrent(self._variantFilePath))
@@ -12,6 +12,7 @@ import ga4gh.exceptions as exceptions
 import ga4gh.backend as backend
 import ga4gh.datamodel.variants as variants
 import ga4gh.datamodel.datasets as datasets
+import ga4gh.protocol as protocol
 
 
 class TestGenotypes(unittest.TestCase):
@@ -75,6 +76,99 @@ class TestGenotypes(unittest.TestCase):
         self.verifyGenotypeConversion("1", "376", [1], None)
 
 
+class TestVariantSiteFilter(unittest.TestCase):
+    """
+    Unit tests for variant classes and site filters.
+    """
+    def testGetVariantClass(self):
+        self.assertEqual(variants.getVariantClass("A", ["C"]), "SNV")
+        self.assertEqual(variants.getVariantClass("A", ["C", "G"]), "SNV")
+        self.assertEqual(variants.getVariantClass("AC", ["GT"]), "MNV")
+        self.assertEqual(variants.getVariantClass("AC", ["A"]), "INDEL")
+        self.assertEqual(variants.getVariantClass("A", ["C", "AT"]), "INDEL")
+        self.assertEqual(variants.getVariantClass("A", []), "OTHER")
+        self.assertEqual(variants.getVariantClass("A", None), "OTHER")
+        self.assertEqual(variants.getVariantClass("A", ["<DEL>"]), "OTHER")
+        self.assertEqual(variants.getVariantClass("A", ["*"]), "OTHER")
+        self.assertEqual(variants.getVariantClass("A", ["A[2:10["]), "OTHER")
+
+    def testBadVariantClass(self):
+        self.assertRaises(
+            exceptions.BadVariantFilterException,
+            variants.VariantSiteFilter, variantClasses=["SNP"])
+
+    def testMatchesVariant(self):
+        variant = protocol.Variant()
+        variant.referenceBases = "A"
+        variant.alternateBases = ["C"]
+        variant.info = {"AF": ["0.01"]}
+        self.assertTrue(variants.VariantSiteFilter().isEmpty())
+        self.assertTrue(variants.VariantSiteFilter().matchesVariant(variant))
+        siteFilter = variants.VariantSiteFilter(
+            variantClasses=["SNV"], minAlleleFrequency=0.01)
+        self.assertFalse(siteFilter.isEmpty())
+        self.assertTrue(siteFilter.matchesVariant(variant))
+        for siteFilter in [
+                variants.VariantSiteFilter(variantClasses=["INDEL"]),
+                variants.VariantSiteFilter(minAlleleFrequency=0.02),
+                variants.VariantSiteFilter(passOnly=True),
+                variants.VariantSiteFilter(minQuality=0)]:
+            self.assertFalse(siteFilter.matchesVariant(variant))
+        variant.info = {}
+        self.assertFalse(variants.VariantSiteFilter(
+            minAlleleFrequency=0).matchesVariant(variant))
+
+
+class TestGenotypeFilter(unittest.TestCase):
+    """
+    Unit tests for genotype filters.
+    """
+    def setUp(self):
+        dataset = datasets.AbstractDataset("ds")
+        self._variantSet = variants.AbstractVariantSet(dataset, "vs")
+        for sampleName in ["a", "b", "c"]:
+            self._variantSet.addCallSet(sampleName)
+        self._variant = protocol.Variant()
+        for callSet, genotype in zip(
+                self._variantSet.getCallSets(), [[0, 1], [0, 0], [-1, -1]]):
+            call = protocol.Call()
+            call.callSetId = callSet.getId()
+            call.genotype = genotype
+            self._variant.calls.append(call)
+
+    def _matches(self, anyIndexes, allIndexes):
+        callSets = self._variantSet.getCallSets()
+        anyNonReference, allNonReference = None, None
+        if anyIndexes is not None:
+            anyNonReference = [callSets[index] for index in anyIndexes]
+        if allIndexes is not None:
+            allNonReference = [callSets[index] for index in allIndexes]
+        genotypeFilter = variants.GenotypeFilter(
+            anyNonReference, allNonReference)
+        return genotypeFilter.matchesVariant(self._variant)
+
+    def testIsNonReference(self):
+        self.assertTrue(variants.isNonReference((0, 1)))
+        self.assertTrue(variants.isNonReference((2,)))
+        self.assertFalse(variants.isNonReference((0, 0)))
+        self.assertFalse(variants.isNonReference((-1, -1)))
+        self.assertFalse(variants.isNonReference((None, 0)))
+        self.assertFalse(variants.isNonReference(()))
+
+    def testMatchesVariant(self):
+        self.assertTrue(variants.GenotypeFilter().isEmpty())
+        self.assertTrue(self._matches(None, None))
+        self.assertTrue(self._matches([0], None))
+        self.assertTrue(self._matches([1, 0], None))
+        self.assertFalse(self._matches([1, 2], None))
+        self.assertFalse(self._matches([], None))
+        self.assertTrue(self._matches(None, [0]))
+        self.assertFalse(self._matches(None, [0, 1]))
+        self.assertTrue(self._matches(None, []))
+        self.assertTrue(self._matches([0], [0]))
+        self.assertFalse(self._matches([2], [0]))
+
+
 class TestAbstractVariantSet(unittest.TestCase):
     """
     Unit tests for the abstract variant set.
@@ -54,7 +54,8 @@ class TestFrontend(unittest.TestCase):
         cls.readGroupSetId = cls.readGroupSet.getId()
         cls.readGroup = cls.readGroupSet.getReadGroups()[0]
         cls.readGroupId = cls.readGroup.getId()
-        cls.readAlignment = cls.readGroup.getReadAlignments().next()
+        cls.readAlignment = cls.readGroup.getReadAlignments(
+            cls.reference).next()
         cls.readAlignmentId = cls.readAlignment.id
 
     def sendPostRequest(self, path, request):
@@ -365,7 +366,9 @@ class TestFrontend(unittest.TestCase):
         self.assertEqual(200, response.status_code)
         responseData = protocol.SearchReadsResponse.fromJsonString(
             response.data)
-        self.assertEqual(len(responseData.alignments), 2)
+        self.assertEqual(
+            len(responseData.alignments),
+            len(list(self.readGroup.getReadAlignments(self.reference))))
         self.assertEqual(
             responseData.alignments[0].id,
             self.readAlignmentId)